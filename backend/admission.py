@@ -0,0 +1,338 @@
+"""Process-wide admission control for provider sessions.
+
+Every ``/generate-code`` request fans out to several concurrent agents. Without
+a global cap, a burst of users hits provider rate limits and all variants fail
+together. ``AdmissionController`` caps concurrent sessions per provider and
+(optionally) per model, and queues the excess.
+
+Queued sessions are served round-robin across tenants (one tenant = one
+client-supplied API key set, or one client address when server keys are used)
+and FIFO within a tenant, so one heavy user can't starve everyone else. A
+waiter that can't run because its provider/model is saturated doesn't block
+waiters for other providers behind it.
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+)
+
+from config import (
+    ADMISSION_DEFAULT_PROVIDER_LIMIT,
+    ADMISSION_MAX_QUEUED,
+    ADMISSION_MODEL_LIMITS,
+    ADMISSION_PROVIDER_LIMITS,
+)
+from llm import MODEL_PROVIDER, Llm
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+class AdmissionQueueFull(Exception):
+    """Raised when the admission queue is at ``max_queued``."""
+
+
+@dataclass
+class AdmissionLimits:
+    default_provider_limit: int = 16
+    provider_limits: Dict[str, int] = field(default_factory=dict)
+    model_limits: Dict[str, int] = field(default_factory=dict)
+    # 0 means unbounded.
+    max_queued: int = 0
+
+    def provider_limit(self, provider: str) -> int:
+        return self.provider_limits.get(provider, self.default_provider_limit)
+
+    def model_limit(self, model: str) -> int | None:
+        return self.model_limits.get(model)
+
+
+def parse_limit_overrides(raw: str) -> Dict[str, int]:
+    """Parse ``"openai=8,anthropic=4"`` into a dict.
+
+    Model names contain spaces and parentheses, so each entry is split on its
+    last ``=``. Malformed entries are skipped with a log line.
+    """
+    limits: Dict[str, int] = {}
+    for entry in raw.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, sep, value = entry.rpartition("=")
+        try:
+            if not sep or not name.strip():
+                raise ValueError(entry)
+            limits[name.strip()] = max(1, int(value))
+        except ValueError:
+            print(f"[ADMISSION] Ignoring malformed limit entry: {entry!r}")
+    return limits
+
+
+def limits_from_config() -> AdmissionLimits:
+    return AdmissionLimits(
+        default_provider_limit=ADMISSION_DEFAULT_PROVIDER_LIMIT,
+        provider_limits=parse_limit_overrides(ADMISSION_PROVIDER_LIMITS),
+        model_limits=parse_limit_overrides(ADMISSION_MODEL_LIMITS),
+        max_queued=ADMISSION_MAX_QUEUED,
+    )
+
+
+def tenant_key(api_keys: List[str | None], client_host: str | None) -> str:
+    """Identify who a request is queued for without keeping raw API keys."""
+    supplied = [key for key in api_keys if key]
+    if supplied:
+        digest = hashlib.sha256("\n".join(supplied).encode("utf-8")).hexdigest()
+        return f"key:{digest[:12]}"
+    return f"client:{client_host or 'unknown'}"
+
+
+class _Waiter:
+    def __init__(self, tenant: str, provider: str, model: str):
+        self.tenant = tenant
+        self.provider = provider
+        self.model = model
+        self.granted = False
+        self.position = 0
+        self.changed = asyncio.Event()
+
+
+class AdmissionController:
+    def __init__(self, limits: AdmissionLimits | None = None):
+        self.limits = limits or AdmissionLimits()
+        self._active_by_provider: Dict[str, int] = {}
+        self._active_by_model: Dict[str, int] = {}
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._active_by_tenant: Dict[str, int] = {}
+        # Grant counter value at each tenant's latest admission. Tenants with
+        # nothing active or queued are forgotten, so they rank as new again.
+        self._last_served: Dict[str, int] = {}
+        self.admitted_total = 0
+        self.queued_total = 0
+        self.rejected_total = 0
+
+    def slot(
+        self,
+        tenant: str,
+        model: Llm,
+        on_position: PositionCallback | None = None,
+    ) -> AsyncContextManager[None]:
+        """Hold one provider session slot for the duration of the block.
+
+        ``on_position`` is awaited with the 1-based queue position whenever it
+        changes while waiting (never called if admitted immediately).
+        """
+        return self.provider_slot(
+            tenant, MODEL_PROVIDER.get(model, "unknown"), model.value, on_position
+        )
+
+    @asynccontextmanager
+    async def provider_slot(
+        self,
+        tenant: str,
+        provider: str,
+        model: str,
+        on_position: PositionCallback | None = None,
+    ) -> AsyncIterator[None]:
+        """``slot`` for calls that aren't made with an ``Llm``, such as the
+        Gemini helper calls, counted against ``provider`` and ``model``."""
+        waiter = await self._acquire(tenant, provider, model, on_position)
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    async def _acquire(
+        self,
+        tenant: str,
+        provider: str,
+        model: str,
+        on_position: PositionCallback | None,
+    ) -> _Waiter:
+        waiter = _Waiter(tenant, provider, model)
+        # Queued waiters never fit (see ``_dispatch``), so a waiter that fits
+        # now isn't jumping ahead of anyone competing for the same slots.
+        if self._has_capacity(provider, model):
+            self._grant(waiter)
+            return waiter
+
+        if self.limits.max_queued and self._queued_count() >= self.limits.max_queued:
+            self.rejected_total += 1
+            raise AdmissionQueueFull(
+                "The server is at capacity. Please try again in a moment."
+            )
+
+        self._queues.setdefault(tenant, deque()).append(waiter)
+        self.queued_total += 1
+        self._dispatch()
+
+        reported = 0
+        try:
+            while not waiter.granted:
+                if on_position is not None and waiter.position != reported:
+                    reported = waiter.position
+                    await on_position(reported)
+                    continue
+                waiter.changed.clear()
+                await waiter.changed.wait()
+        except BaseException:
+            if waiter.granted:
+                self._release(waiter)
+            else:
+                self._remove(waiter)
+            raise
+        return waiter
+
+    def _has_capacity(self, provider: str, model: str) -> bool:
+        if self._active_by_provider.get(provider, 0) >= self.limits.provider_limit(
+            provider
+        ):
+            return False
+        model_limit = self.limits.model_limit(model)
+        return model_limit is None or self._active_by_model.get(model, 0) < model_limit
+
+    def _grant(self, waiter: _Waiter) -> None:
+        waiter.granted = True
+        self._active_by_provider[waiter.provider] = (
+            self._active_by_provider.get(waiter.provider, 0) + 1
+        )
+        self._active_by_model[waiter.model] = (
+            self._active_by_model.get(waiter.model, 0) + 1
+        )
+        self._active_by_tenant[waiter.tenant] = (
+            self._active_by_tenant.get(waiter.tenant, 0) + 1
+        )
+        self.admitted_total += 1
+        self._last_served[waiter.tenant] = self.admitted_total
+        waiter.changed.set()
+
+    def _release(self, waiter: _Waiter) -> None:
+        if not waiter.granted:
+            return
+        waiter.granted = False
+        self._active_by_provider[waiter.provider] -= 1
+        self._active_by_model[waiter.model] -= 1
+        self._active_by_tenant[waiter.tenant] -= 1
+        self._forget_idle_tenant(waiter.tenant)
+        self._dispatch()
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.tenant)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[waiter.tenant]
+            self._forget_idle_tenant(waiter.tenant)
+        self._dispatch()
+
+    def _forget_idle_tenant(self, tenant: str) -> None:
+        if self._active_by_tenant.get(tenant) or tenant in self._queues:
+            return
+        self._active_by_tenant.pop(tenant, None)
+        self._last_served.pop(tenant, None)
+
+    def _fair_order(self) -> List[_Waiter]:
+        """All waiters in service order: round-robin by tenant, FIFO within.
+
+        Tenants take turns least-recently-served first (never-served tenants
+        first, in arrival order).
+        """
+        order: List[_Waiter] = []
+        tenants = sorted(self._queues, key=lambda t: self._last_served.get(t, 0))
+        queues = [list(self._queues[tenant]) for tenant in tenants]
+        depth = 0
+        while True:
+            row = [queue[depth] for queue in queues if depth < len(queue)]
+            if not row:
+                return order
+            order.extend(row)
+            depth += 1
+
+    def _dispatch(self) -> None:
+        """Admit every waiter that fits, in fair order, then renumber the rest."""
+        progressed = True
+        while progressed:
+            progressed = False
+            for waiter in self._fair_order():
+                if not self._has_capacity(waiter.provider, waiter.model):
+                    continue
+                queue = self._queues[waiter.tenant]
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[waiter.tenant]
+                self._grant(waiter)
+                progressed = True
+                break
+
+        for position, waiter in enumerate(self._fair_order(), start=1):
+            if waiter.position != position:
+                waiter.position = position
+                waiter.changed.set()
+
+    def _queued_count(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def snapshot(self, include_tenants: bool = False) -> Dict[str, Any]:
+        """Limits and live state for the introspection endpoint.
+
+        Tenant keys identify clients (``client:<ip>``), so per-tenant counts
+        are only included with ``include_tenants``; otherwise only the number
+        of tenants is.
+        """
+        queued_by_tenant = {
+            tenant: len(queue) for tenant, queue in self._queues.items()
+        }
+        queued_by_provider: Dict[str, int] = {}
+        for waiter in self._fair_order():
+            queued_by_provider[waiter.provider] = (
+                queued_by_provider.get(waiter.provider, 0) + 1
+            )
+        active: Dict[str, Any] = {
+            "byProvider": {
+                name: count for name, count in self._active_by_provider.items() if count
+            },
+            "byModel": {
+                name: count for name, count in self._active_by_model.items() if count
+            },
+        }
+        queued: Dict[str, Any] = {
+            "total": self._queued_count(),
+            "byProvider": queued_by_provider,
+        }
+        if include_tenants:
+            active["byTenant"] = dict(self._active_by_tenant)
+            queued["byTenant"] = queued_by_tenant
+        else:
+            active["tenants"] = sum(
+                1 for count in self._active_by_tenant.values() if count
+            )
+            queued["tenants"] = len(queued_by_tenant)
+        return {
+            "limits": {
+                "defaultProviderLimit": self.limits.default_provider_limit,
+                "providerLimits": dict(self.limits.provider_limits),
+                "modelLimits": dict(self.limits.model_limits),
+                "maxQueued": self.limits.max_queued,
+            },
+            "active": active,
+            "queued": queued,
+            "totals": {
+                "admitted": self.admitted_total,
+                "queued": self.queued_total,
+                "rejected": self.rejected_total,
+            },
+        }
+
+
+admission_controller = AdmissionController(limits_from_config())
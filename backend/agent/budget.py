@@ -0,0 +1,157 @@
+"""Per-variant wall-clock, output-token, cost and step budgets.
+
+The agent loop checks the budget before every model turn:
+
+- below ``wind_down_at`` of every limit, all tools are offered;
+- past it, only the cheap file tools are offered (no image generation,
+  Replicate, Gemini extraction or Chromium screenshots);
+- once any limit is reached (or on the last allowed step), the turn is
+  forced to be the final one: no tools at all, so the model has to finish.
+
+Limits of 0 are unlimited. Cost is priced from each turn's ``TokenUsage``
+with the provider's ``MODEL_PRICING`` entry; models without pricing don't
+count towards the cost limit.
+
+A variant that runs several agents (sectioned generation) gives each one a
+tracker with a shared ``parent``: every agent counts its own steps, but
+time, tokens and cost come out of the parent's single allowance.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Literal
+
+from agent.providers.pricing import ModelPricing
+from agent.providers.token_usage import TokenUsage
+from config import (
+    VARIANT_BUDGET_WIND_DOWN_AT,
+    VARIANT_MAX_COST_USD,
+    VARIANT_MAX_OUTPUT_TOKENS,
+    VARIANT_MAX_SECONDS,
+    VARIANT_MAX_STEPS,
+)
+
+BudgetPhase = Literal["normal", "wind_down", "final"]
+
+# Tools still offered while winding down.
+WIND_DOWN_TOOLS = frozenset({"create_file", "edit_file", "retrieve_option", "save_assets"})
+
+
+def _tighter(limit: float, requested: float | None) -> float:
+    if requested is None or requested <= 0:
+        return limit
+    if limit <= 0:
+        return requested
+    return min(limit, requested)
+
+
+@dataclass(frozen=True)
+class VariantBudget:
+    max_seconds: float = 0.0
+    max_output_tokens: int = 0
+    max_cost_usd: float = 0.0
+    max_steps: int = 20
+    wind_down_at: float = 0.8
+
+    def tightened(
+        self,
+        max_seconds: float | None = None,
+        max_output_tokens: int | None = None,
+        max_cost_usd: float | None = None,
+    ) -> "VariantBudget":
+        """Apply per-request limits, keeping whichever limit is stricter."""
+        return VariantBudget(
+            max_seconds=_tighter(self.max_seconds, max_seconds),
+            max_output_tokens=int(_tighter(self.max_output_tokens, max_output_tokens)),
+            max_cost_usd=_tighter(self.max_cost_usd, max_cost_usd),
+            max_steps=self.max_steps,
+            wind_down_at=self.wind_down_at,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "maxSeconds": self.max_seconds,
+            "maxOutputTokens": self.max_output_tokens,
+            "maxCostUsd": self.max_cost_usd,
+            "maxSteps": self.max_steps,
+        }
+
+
+def budget_from_config() -> VariantBudget:
+    return VariantBudget(
+        max_seconds=VARIANT_MAX_SECONDS,
+        max_output_tokens=VARIANT_MAX_OUTPUT_TOKENS,
+        max_cost_usd=VARIANT_MAX_COST_USD,
+        max_steps=max(VARIANT_MAX_STEPS, 1),
+        wind_down_at=VARIANT_BUDGET_WIND_DOWN_AT,
+    )
+
+
+class BudgetTracker:
+    def __init__(
+        self,
+        budget: VariantBudget,
+        clock: Callable[[], float] = time.monotonic,
+        parent: "BudgetTracker | None" = None,
+    ):
+        self.budget = budget
+        self.clock = clock
+        self.parent = parent
+        self.started_at = clock()
+        self.usage = TokenUsage()
+        self.cost_usd = 0.0
+        self.steps = 0
+        self.phase: BudgetPhase = "normal"
+
+    def record_turn(
+        self, usage: TokenUsage | None, pricing: ModelPricing | None
+    ) -> None:
+        self.steps += 1
+        if self.parent is not None:
+            self.parent.record_turn(usage, pricing)
+        if usage is None:
+            return
+        self.usage.accumulate(usage)
+        if pricing is not None:
+            self.cost_usd += usage.cost(pricing)
+
+    def elapsed_seconds(self) -> float:
+        return self.clock() - self.started_at
+
+    def fraction_used(self) -> float:
+        """The largest share used of any limit (1.0 = a limit is reached)."""
+        budget = self.budget
+        fractions = [self.steps / budget.max_steps if budget.max_steps else 0.0]
+        shared = self.parent or self
+        if budget.max_seconds > 0:
+            fractions.append(shared.elapsed_seconds() / budget.max_seconds)
+        if budget.max_output_tokens > 0:
+            fractions.append(shared.usage.output / budget.max_output_tokens)
+        if budget.max_cost_usd > 0:
+            fractions.append(shared.cost_usd / budget.max_cost_usd)
+        return max(fractions)
+
+    def next_phase(self) -> BudgetPhase:
+        """Phase for the next model turn; phases only move forward."""
+        if self.phase != "final":
+            # The last allowed step is always final.
+            if self.steps + 1 >= self.budget.max_steps:
+                self.phase = "final"
+            else:
+                used = self.fraction_used()
+                if used >= 1:
+                    self.phase = "final"
+                elif used >= self.budget.wind_down_at:
+                    self.phase = "wind_down"
+        return self.phase
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "elapsedSeconds": round(self.elapsed_seconds(), 3),
+            "inputTokens": self.usage.total_input_tokens(),
+            "outputTokens": self.usage.output,
+            "costUsd": round(self.cost_usd, 6),
+            "steps": self.steps,
+            "phase": self.phase,
+            "limits": self.budget.to_dict(),
+        }
@@ -0,0 +1,42 @@
+import asyncio
+from typing import Optional, Set
+
+
+class CancellationScope:
+    """Cancels all work for one generation request together.
+
+    The generation stage tracks each variant task here, and the socket layer
+    calls ``cancel`` when the client disconnects. Cancelling the variant tasks
+    raises ``CancelledError`` inside whatever each agent is awaiting: a provider
+    stream read, a tool call, a Replicate poll, or a Chromium render. Each of
+    those cleans up on the way out. The engine and tool runtime also call
+    ``raise_if_cancelled`` before starting new work, so a cancel that lands
+    between awaits can't start another provider turn or tool call.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Set["asyncio.Task[object]"] = set()
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def track(self, task: "asyncio.Task[object]") -> None:
+        if self.cancelled:
+            task.cancel()
+            return
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def cancel(self, reason: str) -> None:
+        if self.cancelled:
+            return
+        self.reason = reason
+        print(f"[CANCEL] Cancelling {len(self._tasks)} generation task(s): {reason}")
+        for task in list(self._tasks):
+            task.cancel()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise asyncio.CancelledError(self.reason)
@@ -0,0 +1,268 @@
+"""Piece-table text document used for the agent's working file.
+
+``edit_file`` batches can carry dozens of replacements against a large page.
+Working on a plain string means every replacement rescans and copies the whole
+file. A ``Document`` records each edit as a split of its piece list instead,
+and only joins the pieces when the text is read.
+
+Searching does not need the joined text either: each piece is searched in
+place, plus a short window around each piece boundary. A line index over the
+original buffer gives line numbers without rescanning, and the document keeps
+the spans touched since ``mark_clean`` so diffs can be limited to them.
+"""
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+# Re-base onto the joined text once edits fragment the document this much.
+MAX_PIECES = 256
+
+
+@dataclass(frozen=True)
+class Piece:
+    buffer: str
+    start: int
+    end: int
+    original: bool
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start
+
+    def text(self) -> str:
+        return self.buffer[self.start : self.end]
+
+
+@dataclass(frozen=True)
+class TouchedSpan:
+    """``[start, end)`` in the current text replaced ``original_length`` characters."""
+
+    start: int
+    end: int
+    original_length: int
+
+
+class Document:
+    def __init__(self, text: str = ""):
+        self._reset(text)
+
+    def _reset(self, text: str) -> None:
+        self._original = text
+        self._pieces: List[Piece] = [Piece(text, 0, len(text), True)] if text else []
+        self._length = len(text)
+        self._text: Optional[str] = text
+        self._offsets: Optional[List[int]] = None
+        self._newlines: Optional[List[int]] = None
+        self._touched: List[TouchedSpan] = []
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(piece.text() for piece in self._pieces)
+            if len(self._pieces) > MAX_PIECES:
+                touched = self._touched
+                self._reset(self._text)
+                self._touched = touched
+        return self._text
+
+    @property
+    def piece_count(self) -> int:
+        return len(self._pieces)
+
+    def _piece_offsets(self) -> List[int]:
+        if self._offsets is None:
+            offsets: List[int] = []
+            position = 0
+            for piece in self._pieces:
+                offsets.append(position)
+                position += piece.length
+            self._offsets = offsets
+        return self._offsets
+
+    def _original_newlines(self) -> List[int]:
+        if self._newlines is None:
+            original = self._original
+            newlines: List[int] = []
+            position = original.find("\n")
+            while position != -1:
+                newlines.append(position)
+                position = original.find("\n", position + 1)
+            self._newlines = newlines
+        return self._newlines
+
+    def _count_newlines(self, piece: Piece, end: int) -> int:
+        if not piece.original:
+            return piece.buffer.count("\n", piece.start, end)
+        newlines = self._original_newlines()
+        return bisect_left(newlines, end) - bisect_left(newlines, piece.start)
+
+    def line_number(self, offset: int) -> int:
+        """Zero-based line containing ``offset`` (newlines before it)."""
+        count = 0
+        for piece_offset, piece in zip(self._piece_offsets(), self._pieces):
+            if piece_offset >= offset:
+                break
+            count += self._count_newlines(
+                piece, piece.start + min(offset - piece_offset, piece.length)
+            )
+        return count
+
+    def slice(self, start: int, end: int) -> str:
+        if self._text is not None:
+            return self._text[start:end]
+        start, end = max(start, 0), min(end, self._length)
+        if start >= end:
+            return ""
+        offsets = self._piece_offsets()
+        first = max(bisect_left(offsets, start + 1) - 1, 0)
+        chunks: List[str] = []
+        for piece_offset, piece in zip(offsets[first:], self._pieces[first:]):
+            if piece_offset >= end:
+                break
+            lo = piece.start + max(start - piece_offset, 0)
+            hi = piece.start + min(end - piece_offset, piece.length)
+            chunks.append(piece.buffer[lo:hi])
+        return "".join(chunks)
+
+    def find_all(self, needle: str, limit: Optional[int] = None) -> List[int]:
+        """Start offsets of non-overlapping matches, leftmost first (as str.replace)."""
+        if not needle:
+            return []
+        if self._text is not None:
+            return _scan(self._text, needle, limit)
+
+        matches: List[int] = []
+        next_free = 0
+        for position in self._iter_matches(needle):
+            if position < next_free:
+                continue
+            matches.append(position)
+            next_free = position + len(needle)
+            if limit is not None and len(matches) >= limit:
+                break
+        return matches
+
+    def _iter_matches(self, needle: str) -> Iterator[int]:
+        """Every match start in ascending order, overlapping ones included.
+
+        Matches inside a piece are found with str.find on its buffer. A match
+        crossing a piece's end is found in a short window around that boundary,
+        restricted to starts within the piece so no match is reported twice.
+        """
+        reach = len(needle) - 1
+        offsets = self._piece_offsets()
+        for index, (piece_offset, piece) in enumerate(zip(offsets, self._pieces)):
+            position = piece.buffer.find(needle, piece.start, piece.end)
+            while position != -1:
+                yield piece_offset + position - piece.start
+                position = piece.buffer.find(needle, position + 1, piece.end)
+
+            boundary = piece_offset + piece.length
+            if not reach or index + 1 == len(self._pieces):
+                continue
+            lo = max(boundary - reach, piece_offset)
+            window = self.slice(lo, boundary + reach)
+            position = window.find(needle)
+            while position != -1 and lo + position < boundary:
+                yield lo + position
+                position = window.find(needle, position + 1)
+
+    def replace(self, start: int, end: int, text: str) -> None:
+        """Replace ``[start, end)`` with ``text``."""
+        self._touch(start, end, len(text))
+
+        pieces: List[Piece] = []
+        inserted = False
+        for piece_offset, piece in zip(self._piece_offsets(), self._pieces):
+            piece_end = piece_offset + piece.length
+            if piece_end <= start or piece_offset >= end:
+                if piece_offset >= end and not inserted:
+                    if text:
+                        pieces.append(Piece(text, 0, len(text), False))
+                    inserted = True
+                pieces.append(piece)
+                continue
+            if piece_offset < start:
+                pieces.append(
+                    Piece(
+                        piece.buffer,
+                        piece.start,
+                        piece.start + start - piece_offset,
+                        piece.original,
+                    )
+                )
+            if not inserted:
+                if text:
+                    pieces.append(Piece(text, 0, len(text), False))
+                inserted = True
+            if piece_end > end:
+                pieces.append(
+                    Piece(
+                        piece.buffer,
+                        piece.start + end - piece_offset,
+                        piece.end,
+                        piece.original,
+                    )
+                )
+        if not inserted and text:
+            pieces.append(Piece(text, 0, len(text), False))
+
+        self._pieces = pieces
+        self._length += len(text) - (end - start)
+        self._text = None
+        self._offsets = None
+
+    def checkpoint(self) -> Dict[str, object]:
+        """Cheap snapshot for ``rollback``; pieces and buffers are immutable."""
+        return dict(self.__dict__)
+
+    def rollback(self, checkpoint: Dict[str, object]) -> None:
+        self.__dict__.update(checkpoint)
+
+    def _touch(self, start: int, end: int, new_length: int) -> None:
+        delta = new_length - (end - start)
+        merged_start, merged_end = start, end
+        current, original = 0, 0
+        kept: List[TouchedSpan] = []
+        for span in self._touched:
+            if span.end < start:
+                kept.append(span)
+            elif span.start > end:
+                kept.append(
+                    TouchedSpan(
+                        span.start + delta, span.end + delta, span.original_length
+                    )
+                )
+            else:
+                merged_start = min(merged_start, span.start)
+                merged_end = max(merged_end, span.end)
+                current += span.end - span.start
+                original += span.original_length
+        # Untouched characters inside the merged span are still original.
+        original += (merged_end - merged_start) - current
+        kept.append(TouchedSpan(merged_start, merged_end + delta, original))
+        kept.sort(key=lambda span: span.start)
+        self._touched = kept
+
+    def touched_spans(self) -> List[TouchedSpan]:
+        """Spans changed since ``mark_clean``, in current offsets, left to right."""
+        return list(self._touched)
+
+    def mark_clean(self) -> None:
+        self._touched = []
+
+
+def _scan(text: str, needle: str, limit: Optional[int]) -> List[int]:
+    matches: List[int] = []
+    position = text.find(needle)
+    while position != -1:
+        matches.append(position)
+        if limit is not None and len(matches) >= limit:
+            break
+        position = text.find(needle, position + len(needle))
+    return matches
+
@@ -1,19 +1,33 @@
 import asyncio
 import uuid
-from typing import Any, Awaitable, Callable, Dict, List, Optional, cast
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, cast
 
 from openai.types.chat import ChatCompletionMessageParam
 
 from codegen.utils import extract_html_content
+from config import LIVE_EDIT_PREVIEW_ENABLED
 from llm import Llm
 
+from agent.budget import (
+    WIND_DOWN_TOOLS,
+    BudgetTracker,
+    VariantBudget,
+    budget_from_config,
+)
+from agent.cancellation import CancellationScope
+from agent.live_edits import LiveEditPreview
 from agent.providers.base import ExecutedToolCall, ProviderSession, StreamEvent
 from agent.providers.factory import create_provider_session
 from agent.state import AgentFileState, seed_file_state_from_messages
 from agent.tools import (
+    SPECULATIVE_TOOLS,
     AgentToolRuntime,
+    StreamingToolArguments,
+    ToolCall,
+    ToolExecutionResult,
+    cancel_pending,
     extract_content_from_args,
-    extract_path_from_args,
+    schedule_tool_calls,
     summarize_text,
     summarize_tool_input,
 )
@@ -37,6 +51,9 @@ class AgentEngine:
         asset_base_url: str = "",
         initial_file_state: Optional[Dict[str, str]] = None,
         option_codes: Optional[List[str]] = None,
+        cancellation_scope: Optional[CancellationScope] = None,
+        budget: Optional[VariantBudget] = None,
+        parent_budget_tracker: Optional[BudgetTracker] = None,
     ):
         self.send_message = send_message
         self.variant_index = variant_index
@@ -47,6 +64,10 @@ class AgentEngine:
         self.replicate_api_key = replicate_api_key
         self.should_generate_images = should_generate_images
         self.should_extract_assets = should_extract_assets
+        self.cancellation_scope = cancellation_scope or CancellationScope()
+        self.budget = budget or budget_from_config()
+        self.parent_budget_tracker = parent_budget_tracker
+        self.budget_tracker: Optional[BudgetTracker] = None
 
         self.file_state = AgentFileState()
         if initial_file_state and initial_file_state.get("content"):
@@ -62,6 +83,7 @@ class AgentEngine:
             replicate_api_key=replicate_api_key,
             asset_base_url=asset_base_url,
             option_codes=option_codes,
+            cancellation_scope=self.cancellation_scope,
         )
         self._tool_preview_lengths: Dict[str, int] = {}
 
@@ -139,32 +161,38 @@ class AgentEngine:
         event: StreamEvent,
         started_tool_ids: set[str],
         streamed_lengths: Dict[str, int],
+        live_edits: LiveEditPreview,
     ) -> None:
-        if event.type != "tool_call_delta":
+        if event.type != "tool_call_delta" or not event.tool_call_id:
             return
-        if event.tool_name != "create_file":
+        if event.tool_name == "edit_file":
+            await self._preview_streamed_edits(event, live_edits)
             return
-        if not event.tool_call_id:
+        if event.tool_name != "create_file":
             return
+        # The shadow copy is based on the file this create_file replaces.
+        live_edits.stop()
 
-        content = extract_content_from_args(event.tool_arguments)
-        if content is None:
+        stream = event.argument_stream
+        if stream is None:
+            stream = StreamingToolArguments.from_arguments(
+                event.tool_arguments if isinstance(event.tool_arguments, dict) else {}
+            )
+        content_length = stream.length("content")
+        if content_length is None:
             return
 
         tool_event_id = event.tool_call_id
         if tool_event_id not in started_tool_ids:
-            path = (
-                extract_path_from_args(event.tool_arguments)
-                or self.file_state.path
-                or "index.html"
-            )
+            content = stream.value("content") or ""
+            path = stream.value("path") or self.file_state.path or "index.html"
             await self._send(
                 "toolStart",
                 data={
                     "name": "create_file",
                     "input": {
                         "path": path,
-                        "contentLength": len(content),
+                        "contentLength": content_length,
                         "preview": summarize_text(content, 200),
                     },
                 },
@@ -172,24 +200,98 @@ class AgentEngine:
             )
             started_tool_ids.add(tool_event_id)
 
+        # Only join the decoded content when a preview is actually sent.
         last_len = streamed_lengths.get(tool_event_id, 0)
-        if last_len == 0 and content:
-            streamed_lengths[tool_event_id] = len(content)
-            await self._send("setCode", content)
-            self._mark_preview_length(tool_event_id, len(content))
-        elif len(content) - last_len >= 40:
-            streamed_lengths[tool_event_id] = len(content)
-            await self._send("setCode", content)
-            self._mark_preview_length(tool_event_id, len(content))
+        if (last_len == 0 and content_length) or content_length - last_len >= 40:
+            streamed_lengths[tool_event_id] = content_length
+            await self._send("setCode", stream.value("content"))
+            self._mark_preview_length(tool_event_id, content_length)
+
+    async def _preview_streamed_edits(
+        self, event: StreamEvent, live_edits: LiveEditPreview
+    ) -> None:
+        """Show each edit_file edit as soon as its object closes in the stream."""
+        if not LIVE_EDIT_PREVIEW_ENABLED or not event.tool_call_id:
+            return
+        stream = event.argument_stream
+        if stream is None:
+            stream = StreamingToolArguments.from_arguments(
+                event.tool_arguments if isinstance(event.tool_arguments, dict) else {}
+            )
+        if live_edits.apply_new(event.tool_call_id, stream.items("edits")):
+            live_edits.shown = True
+            await self._send("setCode", live_edits.content)
+
+    async def _start_speculative_tool(
+        self,
+        event: StreamEvent,
+        started_tool_ids: set[str],
+        speculative: Dict[str, Tuple[ToolCall, "asyncio.Task[ToolExecutionResult]"]],
+    ) -> None:
+        """Start a side-effect-free tool while the turn is still streaming."""
+        tool_event_id = event.tool_call_id
+        if (
+            event.tool_name not in SPECULATIVE_TOOLS
+            or not tool_event_id
+            or tool_event_id in speculative
+            or not isinstance(event.tool_arguments, dict)
+        ):
+            return
+        tool_call = ToolCall(
+            id=tool_event_id,
+            name=event.tool_name,
+            arguments=cast(Dict[str, Any], event.tool_arguments),
+        )
+        if tool_event_id not in started_tool_ids:
+            await self._send(
+                "toolStart",
+                data={
+                    "name": tool_call.name,
+                    "input": summarize_tool_input(tool_call, self.file_state),
+                },
+                event_id=tool_event_id,
+            )
+            started_tool_ids.add(tool_event_id)
+        speculative[tool_event_id] = (
+            tool_call,
+            asyncio.create_task(self.tool_runtime.execute(tool_call)),
+        )
+
+    def _apply_budget_phase(
+        self, session: ProviderSession, tracker: BudgetTracker
+    ) -> bool:
+        """Restrict tools as the budget runs out; True if this turn is final."""
+        previous = tracker.phase
+        phase = tracker.next_phase()
+        if phase != previous:
+            print(
+                f"[BUDGET] Variant {self.variant_index + 1}: {phase} after "
+                f"{tracker.steps} step(s), {tracker.elapsed_seconds():.1f}s, "
+                f"{tracker.usage.output} output tokens, ${tracker.cost_usd:.4f}"
+            )
+            session.limit_tools(set() if phase == "final" else set(WIND_DOWN_TOOLS))
+        return phase == "final"
+
+    def budget_report(self) -> Optional[Dict[str, Any]]:
+        if self.budget_tracker is None:
+            return None
+        return self.budget_tracker.report()
 
     async def _run_with_session(self, session: ProviderSession) -> str:
-        max_steps = 20
+        tracker = BudgetTracker(self.budget, parent=self.parent_budget_tracker)
+        self.budget_tracker = tracker
 
-        for _ in range(max_steps):
+        while True:
+            self.cancellation_scope.raise_if_cancelled()
+            is_final_turn = self._apply_budget_phase(session, tracker)
             assistant_event_id = self._next_event_id("assistant")
             thinking_event_id = self._next_event_id("thinking")
             started_tool_ids: set[str] = set()
             streamed_lengths: Dict[str, int] = {}
+            live_edits = LiveEditPreview(self.file_state.content)
+            speculative: Dict[
+                str, Tuple[ToolCall, "asyncio.Task[ToolExecutionResult]"]
+            ] = {}
 
             async def on_event(event: StreamEvent) -> None:
                 if event.type == "assistant_delta":
@@ -215,16 +317,47 @@ class AgentEngine:
                         event,
                         started_tool_ids,
                         streamed_lengths,
+                        live_edits,
+                    )
+                    return
+
+                if event.type == "tool_call_complete":
+                    await self._start_speculative_tool(
+                        event, started_tool_ids, speculative
                     )
 
-            turn = await session.stream_turn(on_event)
+            try:
+                turn = await session.stream_turn(on_event)
+            except BaseException:
+                await cancel_pending([task for _, task in speculative.values()])
+                raise
+
+            tracker.record_turn(turn.usage, turn.pricing)
+
+            # Drop speculation the final turn doesn't confirm (the call is
+            # missing, or its final arguments differ).
+            final_calls = {tool_call.id: tool_call for tool_call in turn.tool_calls}
+            unconfirmed = [
+                tool_event_id
+                for tool_event_id, (started_call, _) in speculative.items()
+                if tool_event_id not in final_calls
+                or final_calls[tool_event_id].name != started_call.name
+                or final_calls[tool_event_id].arguments != started_call.arguments
+            ]
+            await cancel_pending(
+                [speculative.pop(tool_event_id)[1] for tool_event_id in unconfirmed]
+            )
 
-            if not turn.tool_calls:
+            if not turn.tool_calls or is_final_turn:
+                # A final turn shouldn't call tools; if it does anyway, the
+                # file as it stands is the result.
+                await cancel_pending([task for _, task in speculative.values()])
                 return await self._finalize_response(turn.assistant_text)
 
-            executed_tool_calls: List[ExecutedToolCall] = []
+            tool_event_ids: List[str] = []
             for tool_call in turn.tool_calls:
                 tool_event_id = tool_call.id or self._next_event_id("tool")
+                tool_event_ids.append(tool_event_id)
                 if tool_event_id not in started_tool_ids:
                     await self._send(
                         "toolStart",
@@ -235,31 +368,60 @@ class AgentEngine:
                         event_id=tool_event_id,
                     )
 
+            async def run_tool(index: int, tool_call: ToolCall) -> ToolExecutionResult:
+                tool_event_id = tool_event_ids[index]
                 if tool_call.name == "create_file":
                     content = extract_content_from_args(tool_call.arguments)
                     if content:
                         await self._stream_code_preview(tool_event_id, content)
 
-                tool_result = await self.tool_runtime.execute(tool_call)
-                if tool_result.updated_content:
+                started = speculative.pop(tool_call.id, None) if tool_call.id else None
+                if started is not None:
+                    tool_result = await started[1]
+                else:
+                    tool_result = await self.tool_runtime.execute(tool_call)
+                previewed = (
+                    tool_call.name == "edit_file"
+                    and live_edits.shown
+                    and not live_edits.stopped
+                )
+                if tool_result.updated_content and not previewed:
                     await self._send("setCode", tool_result.updated_content)
+                return tool_result
 
-                await self._send(
-                    "toolResult",
-                    data={
-                        "name": tool_call.name,
-                        "output": tool_result.summary,
-                        "ok": tool_result.ok,
-                    },
-                    event_id=tool_event_id,
-                )
-                executed_tool_calls.append(
-                    ExecutedToolCall(tool_call=tool_call, result=tool_result)
+            # Independent tools run concurrently; results are still reported
+            # and appended in call order.
+            tool_tasks = schedule_tool_calls(turn.tool_calls, run_tool)
+            executed_tool_calls: List[ExecutedToolCall] = []
+            try:
+                for tool_call, tool_event_id, task in zip(
+                    turn.tool_calls, tool_event_ids, tool_tasks
+                ):
+                    tool_result = await task
+                    await self._send(
+                        "toolResult",
+                        data={
+                            "name": tool_call.name,
+                            "output": tool_result.summary,
+                            "ok": tool_result.ok,
+                        },
+                        event_id=tool_event_id,
+                    )
+                    executed_tool_calls.append(
+                        ExecutedToolCall(tool_call=tool_call, result=tool_result)
+                    )
+            finally:
+                await cancel_pending(
+                    tool_tasks + [task for _, task in speculative.values()]
                 )
 
-            await session.append_tool_results(turn, executed_tool_calls)
+            if live_edits.shown and (
+                live_edits.stopped or live_edits.content != self.file_state.content
+            ):
+                # Reconcile the streamed preview with the applied edits.
+                await self._send("setCode", self.file_state.content)
 
-        raise Exception("Agent exceeded max tool turns")
+            await session.append_tool_results(turn, executed_tool_calls)
 
     async def run(self, model: Llm, prompt_messages: List[ChatCompletionMessageParam]) -> str:
         self.tool_runtime.input_images = self._extract_input_images(prompt_messages)
@@ -0,0 +1,54 @@
+from typing import Any, Dict, List, Optional
+
+from agent.document import Document
+from agent.state import ensure_str
+from agent.tools.runtime import apply_edit
+
+
+class LiveEditPreview:
+    """Applies ``edit_file`` edits to a shadow copy of the file as each one
+    finishes streaming, so the client sees them before the turn ends.
+
+    The shadow is only a preview: the runtime still applies the edits to the
+    real file state once the turn completes. If an edit can't be applied
+    (or a ``create_file`` in the same turn replaces the file), previewing
+    stops for the rest of the turn and the authoritative result is sent as
+    usual.
+    """
+
+    def __init__(self, content: str):
+        self._document = Document(content)
+        self._applied: Dict[str, int] = {}
+        self.stopped = not content
+        self.shown = False
+
+    @property
+    def content(self) -> str:
+        return self._document.text
+
+    def stop(self) -> None:
+        self.stopped = True
+
+    def apply_new(self, tool_call_id: str, edits: Optional[List[Any]]) -> bool:
+        """Apply edits of this call that closed since the last call; True if
+        the shadow changed."""
+        if self.stopped or not edits:
+            return False
+        applied = self._applied.get(tool_call_id, 0)
+        changed = False
+        for edit in edits[applied:]:
+            applied += 1
+            if not isinstance(edit, dict):
+                continue
+            old_text = ensure_str(edit.get("old_text"))
+            count = edit.get("count")
+            if not old_text or (count is not None and not isinstance(count, int)):
+                self.stop()
+                break
+            new_text = ensure_str(edit.get("new_text"))
+            if apply_edit(self._document, old_text, new_text, count) == 0:
+                self.stop()
+                break
+            changed = True
+        self._applied[tool_call_id] = applied
+        return changed
@@ -1,10 +1,10 @@
 # pyright: reportUnknownVariableType=false
 import base64
 import copy
-import json
 import uuid
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, cast
+from functools import partial
+from typing import Any, Dict, List, Set, cast
 
 from anthropic import AsyncAnthropic
 from openai.types.chat import ChatCompletionMessageParam
@@ -15,6 +15,7 @@ from agent.providers.base import (
     ProviderSession,
     ProviderTurn,
     StreamEvent,
+    emit_tool_call_complete,
 )
 from agent.providers.anthropic.image import (
     CLAUDE_MANY_IMAGE_MAX_DIMENSION,
@@ -22,9 +23,18 @@ from agent.providers.anthropic.image import (
     process_image,
     process_image_bytes,
 )
+from agent.providers.clients import ClientLease
+from agent.providers.compaction import ToolOutputCompactor
+from agent.providers.result_encoding import ToolResultEncoder, dumps_tool_result
 from agent.providers.pricing import MODEL_PRICING
+from agent.providers.prompt_cache import anthropic_cache_layout, prompt_cache_stats
 from agent.providers.token_usage import TokenUsage
-from agent.tools import CanonicalToolDefinition, ToolCall, parse_json_arguments
+from agent.tools import (
+    CanonicalToolDefinition,
+    StreamingToolArguments,
+    ToolCall,
+    parse_json_arguments,
+)
 from fs_logging.prompt_reports import PromptReportLogger
 from llm import Llm
 
@@ -192,7 +202,9 @@ def serialize_anthropic_tools(
 class AnthropicParseState:
     assistant_text: str = ""
     tool_blocks: Dict[int, Dict[str, Any]] = field(default_factory=dict)
-    tool_json_buffers: Dict[int, str] = field(default_factory=dict)
+    tool_argument_streams: Dict[int, StreamingToolArguments] = field(
+        default_factory=dict
+    )
 
 
 async def _parse_stream_event(
@@ -212,7 +224,12 @@ async def _parse_stream_event(
             "id": tool_id,
             "name": tool_name,
         }
-        state.tool_json_buffers[event.index] = ""
+        stream = (
+            StreamingToolArguments.from_arguments(args)
+            if isinstance(args, dict) and args
+            else StreamingToolArguments()
+        )
+        state.tool_argument_streams[event.index] = stream
         if args:
             await on_event(
                 StreamEvent(
@@ -220,10 +237,20 @@ async def _parse_stream_event(
                     tool_call_id=tool_id,
                     tool_name=tool_name,
                     tool_arguments=args,
+                    argument_stream=stream,
                 )
             )
         return
 
+    if event.type == "content_block_stop":
+        meta = state.tool_blocks.get(event.index)
+        stream = state.tool_argument_streams.get(event.index)
+        if meta and stream is not None:
+            await emit_tool_call_complete(
+                on_event, meta.get("id"), meta.get("name"), stream.raw_text
+            )
+        return
+
     if event.type != "content_block_delta":
         return
 
@@ -243,8 +270,11 @@ async def _parse_stream_event(
     if not partial_json:
         return
 
-    buffer = state.tool_json_buffers.get(event.index, "") + partial_json
-    state.tool_json_buffers[event.index] = buffer
+    stream = state.tool_argument_streams.get(event.index)
+    if stream is None:
+        stream = StreamingToolArguments()
+        state.tool_argument_streams[event.index] = stream
+    stream.feed(partial_json)
     meta = state.tool_blocks.get(event.index)
     if not meta:
         return
@@ -254,7 +284,8 @@ async def _parse_stream_event(
             type="tool_call_delta",
             tool_call_id=meta.get("id"),
             tool_name=meta.get("name"),
-            tool_arguments=buffer,
+            tool_arguments=partial_json,
+            argument_stream=stream,
         )
     )
 
@@ -307,6 +338,17 @@ def _extract_anthropic_usage(final_message: Any) -> TokenUsage:
     )
 
 
+def _replace_with_text_block(block: Dict[str, Any], text: str) -> None:
+    block.clear()
+    block.update({"type": "text", "text": text})
+
+
+def _replace_tool_result_content(
+    block: Dict[str, Any], result: Dict[str, Any]
+) -> None:
+    block["content"] = dumps_tool_result(result)
+
+
 class AnthropicProviderSession(ProviderSession):
     def __init__(
         self,
@@ -314,11 +356,16 @@ class AnthropicProviderSession(ProviderSession):
         model: Llm,
         prompt_messages: List[ChatCompletionMessageParam],
         tools: List[Dict[str, Any]],
+        client_lease: ClientLease | None = None,
     ):
+        """A pooled ``client`` comes with its ``client_lease``, which is
+        released on close instead of closing the client."""
         self._client = client
+        self._client_lease = client_lease
         self._model = model
         self._tools = tools
         self._total_usage = TokenUsage()
+        self._tool_filter: Set[str] | None = None
         self._prompt_report_logger = PromptReportLogger(
             provider="anthropic",
             model=model,
@@ -327,10 +374,13 @@ class AnthropicProviderSession(ProviderSession):
         system_prompt, claude_messages = _convert_openai_messages_to_claude(prompt_messages)
         self._system_prompt = system_prompt
         self._messages = claude_messages
+        self._initial_message_count = len(claude_messages)
         self._many_image_limit_active = (
             len(_anthropic_image_blocks(self._messages))
             > CLAUDE_MANY_IMAGE_THRESHOLD
         )
+        self._compactor = ToolOutputCompactor(provider="anthropic")
+        self._result_encoder = ToolResultEncoder()
 
     def _ensure_many_image_dimension_limit(self) -> None:
         if self._many_image_limit_active:
@@ -340,17 +390,31 @@ class AnthropicProviderSession(ProviderSession):
         )
 
     async def stream_turn(self, on_event: EventSink) -> ProviderTurn:
+        self._compactor.compact()
         # Tool screenshots accumulate across turns. Re-check before every API
         # call so crossing 20 images cannot leave earlier images above 2000 px.
         self._ensure_many_image_dimension_limit()
+        tools = self._tools
+        tool_choice: Dict[str, Any] | None = None
+        if self._tool_filter is not None:
+            allowed = [tool for tool in self._tools if tool["name"] in self._tool_filter]
+            if allowed:
+                tools = allowed
+            else:
+                # Requests with tool_use history must still define the tools.
+                tool_choice = {"type": "none"}
+        system, tools, messages = anthropic_cache_layout(
+            self._system_prompt, tools, self._messages, self._initial_message_count
+        )
         stream_kwargs: Dict[str, Any] = {
             "model": _get_anthropic_api_model_name(self._model),
             "max_tokens": 50000,
-            "system": self._system_prompt,
-            "messages": self._messages,
-            "tools": self._tools,
-            "cache_control": {"type": "ephemeral"},
+            "system": system,
+            "messages": messages,
+            "tools": tools,
         }
+        if tool_choice is not None:
+            stream_kwargs["tool_choice"] = tool_choice
 
         if self._model.value in ADAPTIVE_THINKING_MODELS:
             stream_kwargs["thinking"] = {
@@ -367,7 +431,9 @@ class AnthropicProviderSession(ProviderSession):
         else:
             stream_kwargs["temperature"] = 0.0
 
-        self._prompt_report_logger.record_request(stream_kwargs)
+        self._prompt_report_logger.record_request(
+            stream_kwargs, tool_result_encoding=self._result_encoder.report()
+        )
 
         state = AnthropicParseState()
         async with self._client.messages.stream(**stream_kwargs) as stream:
@@ -378,14 +444,20 @@ class AnthropicProviderSession(ProviderSession):
         turn_usage = _extract_anthropic_usage(final_message)
         self._prompt_report_logger.record_usage(turn_usage)
         self._total_usage.accumulate(turn_usage)
+        prompt_cache_stats.record("anthropic", turn_usage)
 
         tool_calls = _extract_tool_calls(final_message)
         return ProviderTurn(
             assistant_text=state.assistant_text,
             tool_calls=tool_calls,
             assistant_turn=final_message,
+            usage=turn_usage,
+            pricing=MODEL_PRICING.get(_get_anthropic_api_model_name(self._model)),
         )
 
+    def limit_tools(self, tool_names: Set[str] | None) -> None:
+        self._tool_filter = tool_names
+
     def _image_block(self, part: Any) -> Dict[str, Any] | None:
         """A public URL goes as a url source; local bytes go as base64."""
         if part.image_url:
@@ -438,7 +510,9 @@ class AnthropicProviderSession(ProviderSession):
 
         tool_result_blocks: List[Dict[str, Any]] = []
         for executed in executed_tool_calls:
-            result_json = json.dumps(executed.result.result)
+            encoded, result_json = self._result_encoder.encode(
+                executed.tool_call.name, executed.result.result
+            )
             is_error = not executed.result.ok
             parts = executed.result.multimodal_parts or []
             content: str | List[Dict[str, Any]]
@@ -452,16 +526,26 @@ class AnthropicProviderSession(ProviderSession):
                         continue
                     content.append({"type": "text", "text": part.display_name})
                     content.append(block)
+                    self._compactor.track_preview_image(
+                        executed.tool_call.name,
+                        part,
+                        partial(_replace_with_text_block, block),
+                    )
             else:
                 content = result_json
-            tool_result_blocks.append(
-                {
-                    "type": "tool_result",
-                    "tool_use_id": executed.tool_call.id,
-                    "content": content,
-                    "is_error": is_error,
-                }
-            )
+            result_block = {
+                "type": "tool_result",
+                "tool_use_id": executed.tool_call.id,
+                "content": content,
+                "is_error": is_error,
+            }
+            tool_result_blocks.append(result_block)
+            if isinstance(content, str) and not is_error:
+                self._compactor.track_edit_diff(
+                    executed.tool_call.name,
+                    encoded,
+                    partial(_replace_tool_result_content, result_block),
+                )
 
         self._messages.append({"role": "user", "content": tool_result_blocks})
         self._ensure_many_image_dimension_limit()
@@ -478,4 +562,7 @@ class AnthropicProviderSession(ProviderSession):
             f"cache_read={u.cache_read} cache_write={u.cache_write} "
             f"total={u.total}{cache_hit_rate_str}{cost_str}"
         )
-        await self._client.close()
+        if self._client_lease is not None:
+            self._client_lease.release()
+        else:
+            await self._client.close()
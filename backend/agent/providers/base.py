@@ -1,13 +1,23 @@
 from dataclasses import dataclass
-from typing import Any, Awaitable, Callable, Literal, Optional, Protocol
+from typing import Any, Awaitable, Callable, Literal, Optional, Protocol, Set
 
-from agent.tools import ToolCall, ToolExecutionResult
+from agent.providers.pricing import ModelPricing
+from agent.providers.token_usage import TokenUsage
+from agent.tools import (
+    StreamingToolArguments,
+    ToolCall,
+    ToolExecutionResult,
+    parse_json_arguments,
+)
 
 
 StreamEventType = Literal[
     "assistant_delta",
     "thinking_delta",
     "tool_call_delta",
+    # A tool call's arguments finished streaming; ``tool_arguments`` holds
+    # them parsed. The turn itself may still be streaming.
+    "tool_call_complete",
 ]
 
 
@@ -17,7 +27,12 @@ class StreamEvent:
     text: str = ""
     tool_call_id: Optional[str] = None
     tool_name: Optional[str] = None
+    # The argument text this event added, or the whole arguments when the
+    # provider delivers them parsed.
     tool_arguments: Any = None
+    # Incremental decoder for this tool call's arguments, fed by the provider
+    # before the event is emitted.
+    argument_stream: Optional[StreamingToolArguments] = None
 
 
 @dataclass
@@ -26,6 +41,9 @@ class ProviderTurn:
     tool_calls: list[ToolCall]
     # Provider-native assistant turn object required to continue the conversation.
     assistant_turn: Any = None
+    # What this turn consumed, and the rates to price it (None if unknown).
+    usage: Optional[TokenUsage] = None
+    pricing: Optional[ModelPricing] = None
 
 
 @dataclass
@@ -37,6 +55,28 @@ class ExecutedToolCall:
 EventSink = Callable[[StreamEvent], Awaitable[None]]
 
 
+async def emit_tool_call_complete(
+    on_event: EventSink,
+    tool_call_id: Optional[str],
+    tool_name: Optional[str],
+    raw_arguments: Any,
+) -> None:
+    """Emit ``tool_call_complete`` if the finished arguments parse."""
+    if not tool_call_id or not tool_name:
+        return
+    arguments, error = parse_json_arguments(raw_arguments)
+    if error:
+        return
+    await on_event(
+        StreamEvent(
+            type="tool_call_complete",
+            tool_call_id=tool_call_id,
+            tool_name=tool_name,
+            tool_arguments=arguments,
+        )
+    )
+
+
 class ProviderSession(Protocol):
     async def stream_turn(self, on_event: EventSink) -> ProviderTurn:
         ...
@@ -48,5 +88,10 @@ class ProviderSession(Protocol):
     ) -> None:
         ...
 
+    def limit_tools(self, tool_names: Optional[Set[str]]) -> None:
+        """Offer only ``tool_names`` from the next turn on (an empty set
+        forbids tool calls; None offers every tool again)."""
+        ...
+
     async def close(self) -> None:
         ...
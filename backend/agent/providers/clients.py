@@ -0,0 +1,281 @@
+"""Process-wide pool of provider SDK clients.
+
+Every variant used to build its own ``AsyncOpenAI``, ``AsyncAnthropic`` or
+``genai.Client`` and close it at the end of the session, paying DNS, TCP and
+TLS setup each time. ``provider_clients`` instead keeps one SDK client per
+provider, API key and base URL. All clients for the same endpoint share one
+``httpx.AsyncClient``, so a request's variants and later requests reuse
+keep-alive connections (multiplexed over HTTP/2 when ``h2`` is installed).
+
+Sessions hold a ``ClientLease`` and release it on close instead of closing
+the client. Clients nobody holds are dropped after
+``PROVIDER_CLIENT_IDLE_SECONDS``, and their connection pool is closed once no
+client uses it.
+"""
+
+import asyncio
+import importlib.util
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Literal, Tuple
+
+import httpx
+from anthropic import AsyncAnthropic
+from google import genai
+from google.genai import types
+from openai import AsyncOpenAI
+
+from config import (
+    ANTHROPIC_API_KEY,
+    GEMINI_API_KEY,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    PROVIDER_CLIENT_IDLE_SECONDS,
+    PROVIDER_HTTP2_ENABLED,
+    PROVIDER_HTTP_CONNECT_TIMEOUT_SECONDS,
+    PROVIDER_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    PROVIDER_HTTP_MAX_CONNECTIONS,
+    PROVIDER_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    PROVIDER_HTTP_READ_TIMEOUT_SECONDS,
+)
+
+PooledProvider = Literal["openai", "anthropic", "gemini"]
+
+# Endpoints opened by ``warm``: any response means the connection is up.
+DEFAULT_BASE_URLS: Dict[str, str] = {
+    "openai": "https://api.openai.com/v1",
+    "anthropic": "https://api.anthropic.com",
+    "gemini": "https://generativelanguage.googleapis.com",
+}
+WARMUP_TIMEOUT_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class HttpPoolSettings:
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 120.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 600.0
+    http2: bool = True
+    idle_seconds: float = 900.0
+
+
+def settings_from_config() -> HttpPoolSettings:
+    return HttpPoolSettings(
+        max_connections=PROVIDER_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=PROVIDER_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=PROVIDER_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        connect_timeout=PROVIDER_HTTP_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=PROVIDER_HTTP_READ_TIMEOUT_SECONDS,
+        # HTTP/2 comes from httpx's ``http2`` extra; fall back to HTTP/1.1
+        # where that extra wasn't installed.
+        http2=PROVIDER_HTTP2_ENABLED and importlib.util.find_spec("h2") is not None,
+        idle_seconds=PROVIDER_CLIENT_IDLE_SECONDS,
+    )
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+@dataclass
+class _HttpPool:
+    client: httpx.AsyncClient
+    # httpx connections belong to the loop that opened them.
+    loop: asyncio.AbstractEventLoop | None
+    last_used: float
+
+
+def _close_on_own_loop(pool: _HttpPool) -> None:
+    """Close a pool replaced from another event loop. Its connections can only
+    be closed on the loop that opened them; if that loop is gone they died
+    with it."""
+    loop = pool.loop
+    if loop is None or loop.is_closed():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(pool.client.aclose(), loop)
+    except RuntimeError:
+        pass
+
+
+@dataclass
+class _PooledClient:
+    client: Any
+    http_key: Tuple[str, str | None]
+    http_client: httpx.AsyncClient
+    last_used: float
+    leases: int = 0
+
+
+@dataclass
+class ClientLease:
+    """A session's hold on a pooled client; release it instead of closing."""
+
+    pool: "ProviderClientPool"
+    key: Tuple[str, str, str | None]
+    released: bool = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.pool._release(self.key)
+
+
+class ProviderClientPool:
+    def __init__(self, settings: HttpPoolSettings | None = None):
+        self.settings = settings or settings_from_config()
+        self._http_pools: Dict[Tuple[str, str | None], _HttpPool] = {}
+        self._clients: Dict[Tuple[str, str, str | None], _PooledClient] = {}
+
+    def http_client(
+        self, name: str, base_url: str | None = None, follow_redirects: bool = False
+    ) -> httpx.AsyncClient:
+        """The shared connection pool for one endpoint (or, for tool image
+        downloads, one purpose). ``follow_redirects`` applies when the pool
+        is created."""
+        key = (name, base_url)
+        loop = _running_loop()
+        pool = self._http_pools.get(key)
+        if pool is None or (loop is not None and pool.loop not in (None, loop)):
+            if pool is not None:
+                _close_on_own_loop(pool)
+            settings = self.settings
+            pool = _HttpPool(
+                client=httpx.AsyncClient(
+                    http2=settings.http2,
+                    limits=httpx.Limits(
+                        max_connections=settings.max_connections,
+                        max_keepalive_connections=settings.max_keepalive_connections,
+                        keepalive_expiry=settings.keepalive_expiry,
+                    ),
+                    timeout=httpx.Timeout(
+                        settings.read_timeout, connect=settings.connect_timeout
+                    ),
+                    follow_redirects=follow_redirects,
+                ),
+                loop=loop,
+                last_used=time.monotonic(),
+            )
+            self._http_pools[key] = pool
+        pool.loop = pool.loop or loop
+        pool.last_used = time.monotonic()
+        return pool.client
+
+    def acquire(
+        self, provider: PooledProvider, api_key: str, base_url: str | None = None
+    ) -> Tuple[Any, ClientLease]:
+        """The SDK client for ``provider`` and a lease to release when done."""
+        self._drop_idle_clients()
+        key = (provider, api_key, base_url)
+        http_key = (provider, base_url)
+        http_client = self.http_client(provider, base_url)
+        pooled = self._clients.get(key)
+        if pooled is None or pooled.http_client is not http_client:
+            pooled = _PooledClient(
+                client=self._build_client(provider, api_key, base_url, http_client),
+                http_key=http_key,
+                http_client=http_client,
+                last_used=time.monotonic(),
+            )
+            self._clients[key] = pooled
+        pooled.leases += 1
+        pooled.last_used = time.monotonic()
+        return pooled.client, ClientLease(self, key)
+
+    @staticmethod
+    def _build_client(
+        provider: PooledProvider,
+        api_key: str,
+        base_url: str | None,
+        http_client: httpx.AsyncClient,
+    ) -> Any:
+        if provider == "openai":
+            return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+        if provider == "anthropic":
+            return AsyncAnthropic(api_key=api_key, base_url=base_url, http_client=http_client)
+        return genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(base_url=base_url, httpx_async_client=http_client),
+        )
+
+    def _release(self, key: Tuple[str, str, str | None]) -> None:
+        pooled = self._clients.get(key)
+        if pooled is not None:
+            pooled.leases = max(pooled.leases - 1, 0)
+            pooled.last_used = time.monotonic()
+
+    def _drop_idle_clients(self, now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        idle_after = self.settings.idle_seconds
+        for key, pooled in list(self._clients.items()):
+            if pooled.leases == 0 and now - pooled.last_used > idle_after:
+                # The SDK client only wraps the shared pool; nothing to close.
+                del self._clients[key]
+
+    async def evict_idle(self, now: float | None = None) -> int:
+        """Drop idle clients and close connection pools no client uses.
+        Returns the number of pools closed."""
+        now = time.monotonic() if now is None else now
+        self._drop_idle_clients(now)
+        in_use = {pooled.http_key for pooled in self._clients.values()}
+        closed = 0
+        for key, pool in list(self._http_pools.items()):
+            if key in in_use or now - pool.last_used <= self.settings.idle_seconds:
+                continue
+            del self._http_pools[key]
+            await pool.client.aclose()
+            closed += 1
+        return closed
+
+    async def run_idle_eviction(self) -> None:
+        """Evict idle entries until cancelled."""
+        interval = max(self.settings.idle_seconds / 4, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            closed = await self.evict_idle()
+            if closed:
+                print(f"[PROVIDER CLIENTS] Closed {closed} idle connection pool(s)")
+
+    async def warm(self, targets: List[Tuple[PooledProvider, str, str | None]]) -> None:
+        """Create clients and open a connection to each target's endpoint."""
+
+        async def open_connection(
+            provider: PooledProvider, api_key: str, base_url: str | None
+        ) -> None:
+            _, lease = self.acquire(provider, api_key, base_url)
+            lease.release()
+            url = base_url or DEFAULT_BASE_URLS[provider]
+            try:
+                await self.http_client(provider, base_url).head(
+                    url, timeout=WARMUP_TIMEOUT_SECONDS
+                )
+            except Exception as exc:
+                print(f"[PROVIDER CLIENTS] Could not warm {provider} connection: {exc}")
+
+        await asyncio.gather(*(open_connection(*target) for target in targets))
+
+    async def close(self) -> None:
+        self._clients.clear()
+        pools, self._http_pools = list(self._http_pools.values()), {}
+        for pool in pools:
+            await pool.client.aclose()
+
+
+def configured_warmup_targets() -> List[Tuple[PooledProvider, str, str | None]]:
+    """Providers with server-side API keys."""
+    targets: List[Tuple[PooledProvider, str, str | None]] = []
+    if OPENAI_API_KEY:
+        targets.append(("openai", OPENAI_API_KEY, OPENAI_BASE_URL))
+    if ANTHROPIC_API_KEY:
+        targets.append(("anthropic", ANTHROPIC_API_KEY, None))
+    if GEMINI_API_KEY:
+        targets.append(("gemini", GEMINI_API_KEY, None))
+    return targets
+
+
+provider_clients = ProviderClientPool()
@@ -0,0 +1,211 @@
+"""Compaction of stale tool output in multi-turn agent sessions.
+
+Every ``screenshot_preview`` adds full-page PNGs and every ``edit_file`` a
+unified diff, and providers re-send all of it on each turn. Only the latest
+ones matter: older screenshots show a page that has since changed, and older
+diffs are already reflected in the file.
+
+Providers register each such item with ``ToolOutputCompactor.track`` as they
+append tool results, along with a callback that rewrites it in place in
+their native message format. Before each turn ``compact`` replaces all but
+the latest few of each kind with a short stub.
+
+Rewriting history changes the prompt prefix, so every compaction costs one
+prompt-cache miss from the first rewritten item on. To keep that rare,
+nothing is rewritten until at least ``min_reclaim_bytes`` can be dropped, and
+then everything stale goes in one pass. The initial prompt (the user's own
+images and history) is never touched.
+"""
+
+import copy
+import struct
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Literal
+
+from agent.tools.types import ToolMultimodalPart
+
+from config import (
+    CONTEXT_COMPACTION_ENABLED,
+    CONTEXT_COMPACTION_KEEP_DIFFS,
+    CONTEXT_COMPACTION_KEEP_PREVIEW_IMAGES,
+    CONTEXT_COMPACTION_MIN_RECLAIM_BYTES,
+)
+
+CompactableKind = Literal["preview_image", "diff"]
+
+# Rough provider-agnostic estimates; images are resized to about this many
+# tokens at most by every provider.
+MAX_IMAGE_TOKENS = 1600
+CHARS_PER_TOKEN = 4
+
+
+@dataclass(frozen=True)
+class CompactionPolicy:
+    enabled: bool = True
+    keep_preview_images: int = 2
+    keep_diffs: int = 2
+    min_reclaim_bytes: int = 256 * 1024
+
+    def keep(self, kind: CompactableKind) -> int:
+        return self.keep_preview_images if kind == "preview_image" else self.keep_diffs
+
+
+def policy_from_config() -> CompactionPolicy:
+    return CompactionPolicy(
+        enabled=CONTEXT_COMPACTION_ENABLED,
+        keep_preview_images=max(CONTEXT_COMPACTION_KEEP_PREVIEW_IMAGES, 0),
+        keep_diffs=max(CONTEXT_COMPACTION_KEEP_DIFFS, 0),
+        min_reclaim_bytes=CONTEXT_COMPACTION_MIN_RECLAIM_BYTES,
+    )
+
+
+@dataclass
+class CompactionStats:
+    images: int = 0
+    diffs: int = 0
+    bytes_saved: int = 0
+    tokens_saved: int = 0
+
+    def add(self, other: "CompactionStats") -> None:
+        self.images += other.images
+        self.diffs += other.diffs
+        self.bytes_saved += other.bytes_saved
+        self.tokens_saved += other.tokens_saved
+
+
+@dataclass
+class _Tracked:
+    kind: CompactableKind
+    size_bytes: int
+    tokens: int
+    apply: Callable[[], None]
+
+
+PREVIEW_IMAGE_TOOLS = {"screenshot_preview"}
+DIFF_TOOLS = {"edit_file"}
+
+
+def estimate_image_tokens(data: bytes | None) -> int:
+    """Tokens an image costs, from its PNG dimensions when available."""
+    if data and data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return min(MAX_IMAGE_TOKENS, max(1, width * height // 750))
+    return MAX_IMAGE_TOKENS
+
+
+def estimate_text_tokens(size: int) -> int:
+    return size // CHARS_PER_TOKEN
+
+
+def preview_image_stub(display_name: str) -> str:
+    return (
+        f"[{display_name} from an earlier screenshot_preview was removed to save "
+        "context; the page has changed since.]"
+    )
+
+
+def compact_edit_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """``edit_file`` result with its diff replaced by a one-line stub."""
+    compacted = copy.deepcopy(result)
+    details = compacted.get("details")
+    if isinstance(details, dict):
+        diff = details.get("diff")
+        if isinstance(diff, str):
+            details["diff"] = (
+                f"[diff of {diff.count(chr(10)) + 1} lines omitted; already applied]"
+            )
+    return compacted
+
+
+def edit_result_diff_size(result: Dict[str, Any]) -> int:
+    details = result.get("details")
+    if isinstance(details, dict) and isinstance(details.get("diff"), str):
+        return len(details["diff"])
+    return 0
+
+
+class ToolOutputCompactor:
+    def __init__(self, provider: str, policy: CompactionPolicy | None = None):
+        self.provider = provider
+        self.policy = policy or policy_from_config()
+        self.total = CompactionStats()
+        self._pending: List[_Tracked] = []
+        self._turn = 0
+
+    def track(
+        self,
+        kind: CompactableKind,
+        size_bytes: int,
+        tokens: int,
+        apply: Callable[[], None],
+    ) -> None:
+        if self.policy.enabled:
+            self._pending.append(_Tracked(kind, size_bytes, tokens, apply))
+
+    def compact(self) -> CompactionStats | None:
+        """Rewrite stale items if enough can be reclaimed; call before a turn."""
+        self._turn += 1
+        stale: List[_Tracked] = []
+        keep: List[_Tracked] = []
+        seen: Dict[CompactableKind, int] = {}
+        for item in reversed(self._pending):
+            seen[item.kind] = seen.get(item.kind, 0) + 1
+            if seen[item.kind] > self.policy.keep(item.kind):
+                stale.append(item)
+            else:
+                keep.append(item)
+        reclaimable = sum(item.size_bytes for item in stale)
+        if not stale or reclaimable < self.policy.min_reclaim_bytes:
+            return None
+
+        stats = CompactionStats()
+        for item in stale:
+            item.apply()
+            if item.kind == "preview_image":
+                stats.images += 1
+            else:
+                stats.diffs += 1
+            stats.bytes_saved += item.size_bytes
+            stats.tokens_saved += item.tokens
+        self._pending = list(reversed(keep))
+        self.total.add(stats)
+        print(
+            f"[COMPACTION] provider={self.provider} turn={self._turn} | "
+            f"images={stats.images} diffs={stats.diffs} "
+            f"bytes_saved={stats.bytes_saved} est_tokens_saved={stats.tokens_saved} "
+            f"(session total bytes={self.total.bytes_saved} "
+            f"tokens={self.total.tokens_saved})"
+        )
+        return stats
+
+    def track_preview_image(
+        self,
+        tool_name: str,
+        part: ToolMultimodalPart,
+        apply: Callable[[str], None],
+    ) -> None:
+        """Track a screenshot; ``apply`` receives the stub text to put in its place."""
+        if tool_name not in PREVIEW_IMAGE_TOOLS:
+            return
+        size = len(part.data) if part.data is not None else len(part.image_url or "")
+        stub = preview_image_stub(part.display_name)
+        self.track(
+            "preview_image", size, estimate_image_tokens(part.data), lambda: apply(stub)
+        )
+
+    def track_edit_diff(
+        self,
+        tool_name: str,
+        result: Dict[str, Any],
+        apply: Callable[[Dict[str, Any]], None],
+    ) -> None:
+        """Track an edit diff; ``apply`` receives the result with the diff collapsed."""
+        size = edit_result_diff_size(result) if tool_name in DIFF_TOOLS else 0
+        if size == 0:
+            return
+        self.track(
+            "diff",
+            size,
+            estimate_text_tokens(size),
+            lambda: apply(compact_edit_result(result)),
+        )
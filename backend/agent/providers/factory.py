@@ -1,19 +1,50 @@
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Literal, Optional, Tuple
 
-from anthropic import AsyncAnthropic
-from google import genai
-from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletionMessageParam
 
 from agent.providers.anthropic import AnthropicProviderSession, serialize_anthropic_tools
 from agent.providers.base import ProviderSession
+from agent.providers.clients import provider_clients
 from agent.providers.gemini import GeminiProviderSession, serialize_gemini_tools
 from agent.providers.openai import OpenAIProviderSession, serialize_openai_tools
+from agent.providers.prompt_cache import prompt_prefix_digest
 from agent.tools import canonical_tool_definitions
-from config import REPLICATE_API_KEY
+from config import OPENAI_PREVIOUS_RESPONSE_ID_ENABLED, REPLICATE_API_KEY
 from llm import ANTHROPIC_MODELS, GEMINI_MODELS, OPENAI_MODELS, Llm
 from preview_screenshot import is_screenshot_preview_available
 
+ToolProvider = Literal["openai", "anthropic", "gemini"]
+
+
+@lru_cache(maxsize=None)
+def provider_tool_payload(
+    provider: ToolProvider,
+    image_generation_enabled: bool,
+    image_editing_enabled: bool,
+    asset_extraction_enabled: bool,
+    screenshot_enabled: bool,
+) -> Tuple[Any, ...]:
+    """Serialized tools for one provider and capability set.
+
+    There are only a few dozen combinations, so each is built once per
+    process and shared by every session. Besides skipping the schema
+    transforms, this keeps the tools block byte-identical across requests,
+    which provider prompt caching depends on. Sessions must not mutate the
+    returned entries.
+    """
+    canonical_tools = canonical_tool_definitions(
+        image_generation_enabled=image_generation_enabled,
+        image_editing_enabled=image_editing_enabled,
+        asset_extraction_enabled=asset_extraction_enabled,
+        screenshot_enabled=screenshot_enabled,
+    )
+    if provider == "openai":
+        return tuple(serialize_openai_tools(canonical_tools))
+    if provider == "anthropic":
+        return tuple(serialize_anthropic_tools(canonical_tools))
+    return tuple(serialize_gemini_tools(canonical_tools))
+
 
 def create_provider_session(
     model: Llm,
@@ -26,50 +57,55 @@ def create_provider_session(
     replicate_api_key: Optional[str],
     should_extract_assets: bool = True,
 ) -> ProviderSession:
-    canonical_tools = canonical_tool_definitions(
-        image_generation_enabled=should_generate_images,
+    capabilities = (
+        should_generate_images,
         # The edit_image tool calls Replicate, so don't offer it without a key.
-        image_editing_enabled=bool(replicate_api_key or REPLICATE_API_KEY),
+        bool(replicate_api_key or REPLICATE_API_KEY),
         # The extract_assets tool calls Gemini, so don't offer it without a key.
-        asset_extraction_enabled=should_extract_assets and bool(gemini_api_key),
+        should_extract_assets and bool(gemini_api_key),
         # screenshot_preview needs headless Chromium; skip it if it can't launch.
-        screenshot_enabled=is_screenshot_preview_available(),
+        is_screenshot_preview_available(),
     )
 
     if model in OPENAI_MODELS:
         if not openai_api_key:
             raise Exception("OpenAI API key is missing.")
 
-        client = AsyncOpenAI(api_key=openai_api_key, base_url=openai_base_url)
+        client, lease = provider_clients.acquire("openai", openai_api_key, openai_base_url)
         return OpenAIProviderSession(
             client=client,
             model=model,
             prompt_messages=prompt_messages,
-            tools=serialize_openai_tools(canonical_tools),
+            tools=list(provider_tool_payload("openai", *capabilities)),
+            chain_responses=OPENAI_PREVIOUS_RESPONSE_ID_ENABLED,
+            client_lease=lease,
         )
 
     if model in ANTHROPIC_MODELS:
         if not anthropic_api_key:
             raise Exception("Anthropic API key is missing.")
 
-        client = AsyncAnthropic(api_key=anthropic_api_key)
+        client, lease = provider_clients.acquire("anthropic", anthropic_api_key)
         return AnthropicProviderSession(
             client=client,
             model=model,
             prompt_messages=prompt_messages,
-            tools=serialize_anthropic_tools(canonical_tools),
+            tools=list(provider_tool_payload("anthropic", *capabilities)),
+            client_lease=lease,
         )
 
     if model in GEMINI_MODELS:
         if not gemini_api_key:
             raise Exception("Gemini API key is missing.")
 
-        client = genai.Client(api_key=gemini_api_key)
+        client, lease = provider_clients.acquire("gemini", gemini_api_key)
         return GeminiProviderSession(
             client=client,
             model=model,
             prompt_messages=prompt_messages,
-            tools=serialize_gemini_tools(canonical_tools),
+            tools=list(provider_tool_payload("gemini", *capabilities)),
+            context_cache_scope=prompt_prefix_digest(gemini_api_key)[:16],
+            client_lease=lease,
         )
 
     raise ValueError(f"Unsupported model: {model.value}")
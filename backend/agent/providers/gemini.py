@@ -2,10 +2,9 @@
 import base64
 import copy
 import uuid
-
-import httpx
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, cast
+from functools import partial
+from typing import Any, Dict, List, Set, cast
 
 from google import genai
 from google.genai import types
@@ -17,10 +16,20 @@ from agent.providers.base import (
     ProviderSession,
     ProviderTurn,
     StreamEvent,
+    emit_tool_call_complete,
 )
+from agent.providers.clients import ClientLease, provider_clients
+from agent.providers.compaction import ToolOutputCompactor
+from agent.providers.result_encoding import ToolResultEncoder
 from agent.providers.pricing import MODEL_PRICING
+from agent.providers.prompt_cache import (
+    gemini_context_caches,
+    prompt_cache_stats,
+    prompt_prefix_digest,
+)
 from agent.providers.token_usage import TokenUsage
-from agent.tools import CanonicalToolDefinition, ToolCall
+from agent.tools import CanonicalToolDefinition, StreamingToolArguments, ToolCall
+from config import GEMINI_CONTEXT_CACHE_ENABLED
 from fs_logging.prompt_reports import PromptReportLogger
 from llm import Llm
 
@@ -145,6 +154,25 @@ def _extract_images_from_content(content: str | List[Dict[str, Any]]) -> List[Di
     return images
 
 
+def _media_part(image_data: Dict[str, str]) -> types.Part | Dict[str, str]:
+    if "uri" in image_data:
+        return {"file_uri": image_data["uri"]}
+
+    mime_type = image_data["mime_type"]
+    media_bytes = base64.b64decode(image_data["data"])
+    if mime_type.startswith("video/"):
+        return types.Part(
+            inline_data=types.Blob(data=media_bytes, mime_type=mime_type),
+            video_metadata=types.VideoMetadata(fps=DEFAULT_VIDEO_FPS),
+            media_resolution=types.PartMediaResolutionLevel.MEDIA_RESOLUTION_HIGH,
+        )
+    return types.Part.from_bytes(
+        data=media_bytes,
+        mime_type=mime_type,
+        media_resolution=types.PartMediaResolutionLevel.MEDIA_RESOLUTION_ULTRA_HIGH,
+    )
+
+
 def _convert_message_to_gemini_content(
     message: ChatCompletionMessageParam,
 ) -> types.Content:
@@ -155,36 +183,21 @@ def _convert_message_to_gemini_content(
     parts: List[types.Part | Dict[str, str]] = []
 
     text = _extract_text_from_content(content)  # type: ignore
-    image_data_list = _extract_images_from_content(content)  # type: ignore
-
-    if text:
-        parts.append({"text": text})
-
-    for image_data in image_data_list:
-        if "data" in image_data:
-            mime_type = image_data["mime_type"]
-            media_bytes = base64.b64decode(image_data["data"])
-            if mime_type.startswith("video/"):
-                parts.append(
-                    types.Part(
-                        inline_data=types.Blob(data=media_bytes, mime_type=mime_type),
-                        video_metadata=types.VideoMetadata(fps=DEFAULT_VIDEO_FPS),
-                        media_resolution=types.PartMediaResolutionLevel.MEDIA_RESOLUTION_HIGH,
-                    )
-                )
-                continue
-
-            parts.append(
-                types.Part.from_bytes(
-                    data=media_bytes,
-                    mime_type=mime_type,
-                    media_resolution=types.PartMediaResolutionLevel.MEDIA_RESOLUTION_ULTRA_HIGH,
-                )
-            )
+    if isinstance(content, str):
+        items: List[Dict[str, Any]] = [{"type": "text", "text": text}]
+    else:
+        items = list(content)  # type: ignore
+
+    # Keep the message's own order of text and media, as the other providers
+    # receive it (prompts put the screenshots before the instruction).
+    for item in items:
+        if item.get("type") == "text":
+            if text:
+                parts.append({"text": text})
+                text = ""
             continue
-
-        if "uri" in image_data:
-            parts.append({"file_uri": image_data["uri"]})
+        for image_data in _extract_images_from_content([item]):
+            parts.append(_media_part(image_data))
 
     return types.Content(role=gemini_role, parts=parts)  # type: ignore
 
@@ -251,15 +264,19 @@ async def _parse_chunk(
             tool_id = part.function_call.id or f"tool-{uuid.uuid4().hex[:6]}"
             tool_name = part.function_call.name or "unknown_tool"
 
+            # The Gemini API delivers each function call whole.
             await on_event(
                 StreamEvent(
                     type="tool_call_delta",
                     tool_call_id=tool_id,
                     tool_name=tool_name,
                     tool_arguments=args,
+                    argument_stream=StreamingToolArguments.from_arguments(args),
                 )
             )
 
+            await emit_tool_call_complete(on_event, tool_id, tool_name, args)
+
             state.tool_calls.append(
                 ToolCall(
                     id=tool_id,
@@ -274,6 +291,53 @@ async def _parse_chunk(
             await on_event(StreamEvent(type="assistant_delta", text=part.text))
 
 
+def _split_cacheable_prefix(
+    contents: List[types.Content],
+) -> tuple[List[types.Content], types.Content] | None:
+    """Split the initial prompt into a prefix worth caching and the rest.
+
+    The prefix is the history plus the latest message's parts up to its last
+    image; the parts after it follow in the request, so the model sees them
+    in their original order. Text-only prompts aren't worth a cache.
+    """
+    if not contents or not contents[-1].parts:
+        return None
+    last = contents[-1]
+    parts = last.parts or []
+    # The request needs at least one part of its own.
+    media_indexes = [
+        index
+        for index, part in enumerate(parts[:-1])
+        if part.inline_data or part.file_data
+    ]
+    if not media_indexes:
+        return None
+    split = media_indexes[-1] + 1
+    return (
+        [*contents[:-1], types.Content(role=last.role, parts=parts[:split])],
+        types.Content(role=last.role, parts=parts[split:]),
+    )
+
+
+def _drop_response_part(
+    function_response: types.FunctionResponse,
+    response_part: types.FunctionResponsePart,
+    stub: str,
+) -> None:
+    function_response.parts = [
+        part for part in function_response.parts or [] if part is not response_part
+    ]
+    response = dict(function_response.response or {})
+    response["omittedImages"] = [*response.get("omittedImages", []), stub]
+    function_response.response = response
+
+
+def _replace_response(
+    function_response: types.FunctionResponse, result: Dict[str, Any]
+) -> None:
+    function_response.response = result
+
+
 class GeminiProviderSession(ProviderSession):
     def __init__(
         self,
@@ -281,11 +345,19 @@ class GeminiProviderSession(ProviderSession):
         model: Llm,
         prompt_messages: List[ChatCompletionMessageParam],
         tools: List[types.Tool],
+        context_cache_scope: str | None = None,
+        client_lease: ClientLease | None = None,
     ):
+        """``context_cache_scope`` identifies the API key behind ``client``;
+        sessions with the same scope share context caches. None disables
+        them. A pooled ``client`` comes with its ``client_lease``, released
+        on close."""
         self._client = client
+        self._client_lease = client_lease
         self._model = model
         self._tools = tools
         self._total_usage = TokenUsage()
+        self._tool_filter: Set[str] | None = None
         self._prompt_report_logger = PromptReportLogger(
             provider="gemini",
             model=model,
@@ -296,8 +368,28 @@ class GeminiProviderSession(ProviderSession):
         self._contents: List[types.Content] = [
             _convert_message_to_gemini_content(msg) for msg in prompt_messages[1:]
         ]
+        self._initial_content_count = len(self._contents)
+        self._context_cache_split = (
+            _split_cacheable_prefix(self._contents)
+            if context_cache_scope is not None and GEMINI_CONTEXT_CACHE_ENABLED
+            else None
+        )
+        self._context_cache_key = ""
+        self._holds_context_cache = False
+        if self._context_cache_split is not None:
+            prefix, _ = self._context_cache_split
+            self._context_cache_key = prompt_prefix_digest(
+                context_cache_scope,
+                _get_gemini_api_model_name(model),
+                self._system_prompt,
+                [tool.model_dump(mode="json", exclude_none=True) for tool in tools],
+                [content.model_dump(mode="json", exclude_none=True) for content in prefix],
+            )
+        self._compactor = ToolOutputCompactor(provider="gemini")
+        self._result_encoder = ToolResultEncoder()
 
     async def stream_turn(self, on_event: EventSink) -> ProviderTurn:
+        self._compactor.compact()
         thinking_level = _get_thinking_level_for_model(self._model)
         api_model_name = _get_gemini_api_model_name(self._model)
         config = types.GenerateContentConfig(
@@ -310,32 +402,73 @@ class GeminiProviderSession(ProviderSession):
             ),
             tools=self._tools,
         )
+        if self._tool_filter is not None:
+            allowed = [
+                declaration
+                for tool in self._tools
+                for declaration in tool.function_declarations or []
+                if declaration.name in self._tool_filter
+            ]
+            if allowed:
+                config.tools = [types.Tool(function_declarations=allowed)]
+            else:
+                config.tool_config = types.ToolConfig(
+                    function_calling_config=types.FunctionCallingConfig(
+                        mode=types.FunctionCallingConfigMode.NONE
+                    )
+                )
+
+        contents = self._contents
+        # A context cache holds the full tool list, so filtered turns skip it.
+        cached_content = (
+            await self._context_cache_name(api_model_name)
+            if self._tool_filter is None
+            else None
+        )
+        if cached_content is not None and self._context_cache_split is not None:
+            # The cache carries the system prompt and tools; the request
+            # must not repeat them.
+            config.cached_content = cached_content
+            config.system_instruction = None
+            config.tools = None
+            contents = [
+                self._context_cache_split[1],
+                *self._contents[self._initial_content_count :],
+            ]
 
         self._prompt_report_logger.record_request(
             {
                 "model": api_model_name,
-                "contents": self._contents,
+                "contents": contents,
                 "config": config,
-            }
+            },
+            tool_result_encoding=self._result_encoder.report(),
         )
 
         stream = await self._client.aio.models.generate_content_stream(
             model=api_model_name,
-            contents=cast(Any, self._contents),
+            contents=cast(Any, contents),
             config=config,
         )
 
         state = GeminiParseState()
         turn_usage: TokenUsage | None = None
-        async for chunk in stream:
-            await _parse_chunk(chunk, state, on_event)
-            chunk_usage = _extract_usage(chunk)
-            if chunk_usage is not None:
-                turn_usage = chunk_usage
+        try:
+            async for chunk in stream:
+                await _parse_chunk(chunk, state, on_event)
+                chunk_usage = _extract_usage(chunk)
+                if chunk_usage is not None:
+                    turn_usage = chunk_usage
+        finally:
+            # Close the underlying response right away if the turn is cancelled.
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
 
         if turn_usage is not None:
             self._prompt_report_logger.record_usage(turn_usage)
             self._total_usage.accumulate(turn_usage)
+            prompt_cache_stats.record("gemini", turn_usage)
 
         assistant_turn = (
             types.Content(role=state.model_role, parts=state.model_parts)
@@ -347,8 +480,39 @@ class GeminiProviderSession(ProviderSession):
             assistant_text=state.assistant_text,
             tool_calls=state.tool_calls,
             assistant_turn=assistant_turn,
+            usage=turn_usage,
+            pricing=MODEL_PRICING.get(api_model_name),
         )
 
+    async def _context_cache_name(self, api_model_name: str) -> str | None:
+        if self._context_cache_split is None:
+            return None
+        prefix, _ = self._context_cache_split
+
+        async def create(ttl_seconds: int) -> str:
+            cache = await self._client.aio.caches.create(
+                model=api_model_name,
+                config=types.CreateCachedContentConfig(
+                    contents=prefix,
+                    system_instruction=self._system_prompt,
+                    tools=self._tools,
+                    ttl=f"{ttl_seconds}s",
+                    display_name="screenshot-to-code prompt prefix",
+                ),
+            )
+            if not cache.name:
+                raise ValueError("cache was created without a name")
+            print(f"[PROMPT CACHE] Created Gemini context cache {cache.name}")
+            return cache.name
+
+        if not self._holds_context_cache:
+            self._holds_context_cache = True
+            gemini_context_caches.hold(self._context_cache_key)
+        return await gemini_context_caches.get_or_create(self._context_cache_key, create)
+
+    def limit_tools(self, tool_names: Set[str] | None) -> None:
+        self._tool_filter = tool_names
+
     @staticmethod
     async def _resolve_part_bytes(part: Any) -> tuple[bytes | None, str]:
         """Gemini only accepts inline bytes, so download public URLs."""
@@ -356,9 +520,11 @@ class GeminiProviderSession(ProviderSession):
             return part.data, part.mime_type
         if part.image_url:
             try:
-                async with httpx.AsyncClient(timeout=30) as client:
-                    response = await client.get(part.image_url)
-                    response.raise_for_status()
+                client = provider_clients.http_client(
+                    "tool-images", follow_redirects=True
+                )
+                response = await client.get(part.image_url, timeout=30)
+                response.raise_for_status()
                 content_type = (
                     response.headers.get("content-type", "").split(";")[0].strip()
                 )
@@ -382,30 +548,41 @@ class GeminiProviderSession(ProviderSession):
 
         tool_result_parts: List[types.Part] = []
         for executed in executed_tool_calls:
-            multimodal_parts: List[types.FunctionResponsePart] = []
+            encoded, _ = self._result_encoder.encode(
+                executed.tool_call.name, executed.result.result
+            )
+            function_response = types.FunctionResponse(
+                id=executed.tool_call.id,
+                name=executed.tool_call.name,
+                response=encoded,
+                parts=[],
+            )
             for part in executed.result.multimodal_parts or []:
                 data, mime_type = await self._resolve_part_bytes(part)
                 if data is None:
                     continue
-                multimodal_parts.append(
-                    types.FunctionResponsePart(
-                        inline_data=types.FunctionResponseBlob(
-                            mime_type=mime_type,
-                            display_name=part.display_name,
-                            data=data,
-                        )
+                response_part = types.FunctionResponsePart(
+                    inline_data=types.FunctionResponseBlob(
+                        mime_type=mime_type,
+                        display_name=part.display_name,
+                        data=data,
                     )
                 )
-            tool_result_parts.append(
-                types.Part(
-                    function_response=types.FunctionResponse(
-                        id=executed.tool_call.id,
-                        name=executed.tool_call.name,
-                        response=executed.result.result,
-                        parts=multimodal_parts,
-                    )
+                cast(List[types.FunctionResponsePart], function_response.parts).append(
+                    response_part
                 )
-            )
+                self._compactor.track_preview_image(
+                    executed.tool_call.name,
+                    part,
+                    partial(_drop_response_part, function_response, response_part),
+                )
+            if executed.result.ok:
+                self._compactor.track_edit_diff(
+                    executed.tool_call.name,
+                    encoded,
+                    partial(_replace_response, function_response),
+                )
+            tool_result_parts.append(types.Part(function_response=function_response))
 
         self._contents.append(types.Content(role="user", parts=tool_result_parts))
 
@@ -421,3 +598,13 @@ class GeminiProviderSession(ProviderSession):
             f"cache_read={u.cache_read} cache_write={u.cache_write} "
             f"total={u.total}{cache_hit_rate_str}{cost_str}"
         )
+        try:
+            if self._holds_context_cache:
+                self._holds_context_cache = False
+                await gemini_context_caches.release(
+                    self._context_cache_key,
+                    lambda name: self._client.aio.caches.delete(name=name),
+                )
+        finally:
+            if self._client_lease is not None:
+                self._client_lease.release()
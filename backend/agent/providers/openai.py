@@ -1,12 +1,12 @@
 # pyright: reportUnknownVariableType=false
 import base64
 import copy
-import json
 import uuid
 from dataclasses import dataclass, field
-from typing import Any, Dict, List
+from functools import partial
+from typing import Any, Dict, List, Set
 
-from openai import AsyncOpenAI
+from openai import APIStatusError, AsyncOpenAI
 from openai.types.chat import ChatCompletionMessageParam
 
 from agent.providers.base import (
@@ -15,11 +15,21 @@ from agent.providers.base import (
     ProviderSession,
     ProviderTurn,
     StreamEvent,
+    emit_tool_call_complete,
 )
+from agent.providers.clients import ClientLease
+from agent.providers.compaction import ToolOutputCompactor
+from agent.providers.result_encoding import ToolResultEncoder, dumps_tool_result
 from agent.providers.pricing import MODEL_PRICING
+from agent.providers.prompt_cache import openai_prompt_cache_key, prompt_cache_stats
 from agent.providers.token_usage import TokenUsage
 from agent.state import ensure_str
-from agent.tools import CanonicalToolDefinition, ToolCall, parse_json_arguments
+from agent.tools import (
+    CanonicalToolDefinition,
+    StreamingToolArguments,
+    ToolCall,
+    parse_json_arguments,
+)
 from fs_logging.prompt_reports import PromptReportLogger
 from llm import Llm, get_openai_api_name, get_openai_reasoning_effort
 
@@ -139,9 +149,13 @@ class OpenAIResponsesParseState:
     tool_calls: Dict[str, Dict[str, Any]] = field(default_factory=dict)
     item_to_call_id: Dict[str, str] = field(default_factory=dict)
     output_items_by_index: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    # Streamed argument text per call ID; ``tool_calls`` entries only hold
+    # arguments delivered whole.
+    argument_streams: Dict[str, StreamingToolArguments] = field(default_factory=dict)
     saw_reasoning_summary_text_delta: bool = False
     last_emitted_reasoning_summary_part: str = ""
     turn_usage: TokenUsage | None = None
+    response_id: str | None = None
 
 
 def _extract_openai_usage(response: Any) -> TokenUsage:
@@ -181,6 +195,10 @@ async def parse_event(
         "response.done",
         "response.output_item.done",
     ):
+        if event_type in ("response.created", "response.completed"):
+            response = _get_event_attr(event, "response")
+            if response:
+                state.response_id = _get_event_attr(response, "id") or state.response_id
         if event_type == "response.completed":
             response = _get_event_attr(event, "response")
             if response:
@@ -242,6 +260,10 @@ async def parse_event(
                         **existing,
                         "id": call_id,
                     }
+                    if item_id in state.argument_streams:
+                        state.argument_streams[call_id] = state.argument_streams.pop(
+                            item_id
+                        )
                 args_value = _get_event_attr(item, "arguments")
                 if args_value is None and item_type == "custom_tool_call":
                     args_value = _get_event_attr(item, "input")
@@ -250,16 +272,24 @@ async def parse_event(
                     {
                         "id": call_id,
                         "name": _get_event_attr(item, "name"),
-                        "arguments": args_value or "",
+                        # Streamed (string) arguments live in argument_streams.
+                        "arguments": args_value if isinstance(args_value, dict) else "",
                     },
                 )
                 if args_value:
+                    stream = _argument_stream(state, call_id)
+                    if isinstance(args_value, dict):
+                        stream = StreamingToolArguments.from_arguments(args_value)
+                        state.argument_streams[call_id] = stream
+                    else:
+                        stream.feed(ensure_str(args_value))
                     await on_event(
                         StreamEvent(
                             type="tool_call_delta",
                             tool_call_id=call_id,
                             tool_name=_get_event_attr(item, "name"),
                             tool_arguments=args_value,
+                            argument_stream=stream,
                         )
                     )
         return
@@ -291,14 +321,17 @@ async def parse_event(
         delta_value = _get_event_attr(event, "delta")
         if delta_value is None:
             delta_value = _get_event_attr(event, "input")
-        entry["arguments"] += ensure_str(delta_value)
+        delta_text = ensure_str(delta_value)
+        stream = _argument_stream(state, call_id)
+        stream.feed(delta_text)
 
         await on_event(
             StreamEvent(
                 type="tool_call_delta",
                 tool_call_id=call_id,
                 tool_name=entry.get("name"),
-                tool_arguments=entry.get("arguments"),
+                tool_arguments=delta_text,
+                argument_stream=stream,
             )
         )
         return
@@ -332,8 +365,12 @@ async def parse_event(
     final_value = _get_event_attr(event, "arguments")
     if final_value is None:
         final_value = _get_event_attr(event, "input")
+    stream = _argument_stream(state, call_id)
     if final_value is None:
-        final_value = entry["arguments"]
+        final_value = _accumulated_arguments(state, call_id, entry)
+    elif not stream.raw_text:
+        # Nothing was streamed; decode the final arguments once.
+        stream.feed(ensure_str(final_value))
     entry["arguments"] = final_value
     if _get_event_attr(event, "name"):
         entry["name"] = _get_event_attr(event, "name")
@@ -344,6 +381,7 @@ async def parse_event(
             tool_call_id=call_id,
             tool_name=entry.get("name"),
             tool_arguments=entry.get("arguments"),
+            argument_stream=stream,
         )
     )
 
@@ -360,6 +398,31 @@ async def parse_event(
             "name": entry.get("name"),
         }
 
+    await emit_tool_call_complete(
+        on_event, call_id, entry.get("name"), entry["arguments"]
+    )
+
+
+def _argument_stream(
+    state: OpenAIResponsesParseState, call_id: str
+) -> StreamingToolArguments:
+    stream = state.argument_streams.get(call_id)
+    if stream is None:
+        stream = StreamingToolArguments()
+        state.argument_streams[call_id] = stream
+    return stream
+
+
+def _accumulated_arguments(
+    state: OpenAIResponsesParseState, call_id: str, entry: Dict[str, Any]
+) -> Any:
+    """The call's arguments: the final value if one arrived, else the text
+    streamed so far."""
+    stream = state.argument_streams.get(call_id)
+    if stream is not None and stream.raw_text and not entry.get("arguments"):
+        return stream.raw_text
+    return entry.get("arguments")
+
 
 def _build_provider_turn(state: OpenAIResponsesParseState) -> ProviderTurn:
     output_items = [
@@ -393,10 +456,11 @@ def _build_provider_turn(state: OpenAIResponsesParseState) -> ProviderTurn:
                 )
             )
     else:
-        for entry in state.tool_calls.values():
-            args, error = parse_json_arguments(entry.get("arguments"))
+        for key, entry in state.tool_calls.items():
+            raw_args = _accumulated_arguments(state, key, entry)
+            args, error = parse_json_arguments(raw_args)
             if error:
-                args = {"INVALID_JSON": ensure_str(entry.get("arguments"))}
+                args = {"INVALID_JSON": ensure_str(raw_args)}
             call_id = entry.get("id") or entry.get("call_id")
             tool_calls.append(
                 ToolCall(
@@ -415,6 +479,24 @@ def _build_provider_turn(state: OpenAIResponsesParseState) -> ProviderTurn:
     )
 
 
+def _is_missing_previous_response(exc: Exception) -> bool:
+    """Whether a request failed because its ``previous_response_id`` is no
+    longer stored (expired, deleted or never stored)."""
+    if not isinstance(exc, APIStatusError) or exc.status_code not in (400, 404):
+        return False
+    code = getattr(exc, "code", None)
+    return code == "previous_response_not_found" or "previous_response" in str(exc)
+
+
+def _replace_with_input_text(item: Dict[str, Any], text: str) -> None:
+    item.clear()
+    item.update({"type": "input_text", "text": text})
+
+
+def _replace_function_output(item: Dict[str, Any], result: Dict[str, Any]) -> None:
+    item["output"] = dumps_tool_result(result)
+
+
 class OpenAIProviderSession(ProviderSession):
     def __init__(
         self,
@@ -422,11 +504,30 @@ class OpenAIProviderSession(ProviderSession):
         model: Llm,
         prompt_messages: List[ChatCompletionMessageParam],
         tools: List[Dict[str, Any]],
+        chain_responses: bool = False,
+        client_lease: ClientLease | None = None,
     ):
+        """With ``chain_responses``, turns after the first send only the new
+        tool outputs and reference the previous turn by
+        ``previous_response_id``; the full input stays available for when the
+        stored response has expired. The stored response still holds the
+        uncompacted tool outputs, so a turn that compacts older outputs breaks
+        the chain and sends the full, compacted input instead: that turn
+        uploads more and only reuses the cached prefix up to the first
+        rewritten item, but every later turn chains from the smaller context.
+        Compaction waits until enough can be reclaimed, so this is rare.
+        A pooled ``client`` comes with its ``client_lease``, which is released
+        on close instead of closing it."""
         self._client = client
+        self._client_lease = client_lease
         self._model = model
         self._tools = tools
         self._total_usage = TokenUsage()
+        self._tool_filter: Set[str] | None = None
+        self._chain_responses = chain_responses
+        self._previous_response_id: str | None = None
+        # Input items added since the previous response.
+        self._pending_items: List[Dict[str, Any]] = []
         self._prompt_report_logger = PromptReportLogger(
             provider="openai",
             model=model,
@@ -437,8 +538,16 @@ class OpenAIProviderSession(ProviderSession):
             _convert_message_to_responses_input(message, image_detail=image_detail)
             for message in prompt_messages
         ]
+        self._prompt_cache_key = openai_prompt_cache_key(
+            get_openai_api_name(model), self._input_items, tools
+        )
+        self._compactor = ToolOutputCompactor(provider="openai")
+        self._result_encoder = ToolResultEncoder()
 
     async def stream_turn(self, on_event: EventSink) -> ProviderTurn:
+        if self._compactor.compact() is not None:
+            # Chaining would keep the previous response's full outputs.
+            self._previous_response_id = None
         model_name = get_openai_api_name(self._model)
         params: Dict[str, Any] = {
             "model": model_name,
@@ -448,24 +557,75 @@ class OpenAIProviderSession(ProviderSession):
             "stream": True,
             "max_output_tokens": 50000,
         }
+        if self._tool_filter is not None:
+            allowed = [tool for tool in self._tools if tool["name"] in self._tool_filter]
+            if allowed:
+                params["tools"] = allowed
+            else:
+                # Keep the definitions so earlier tool calls stay valid.
+                params["tool_choice"] = "none"
+        params["prompt_cache_key"] = self._prompt_cache_key
         if model_name == "gpt-5.4-2026-03-05":
             params["prompt_cache_retention"] = "24h"
         reasoning_effort = get_openai_reasoning_effort(self._model)
         if reasoning_effort:
             params["reasoning"] = {"effort": reasoning_effort, "summary": "auto"}
 
-        self._prompt_report_logger.record_request(params)
-
         state = OpenAIResponsesParseState()
-        stream = await self._client.responses.create(**params)  # type: ignore
-        async for event in stream:  # type: ignore
-            await parse_event(event, state, on_event)
+        stream = await self._create_response(params)
+        try:
+            async for event in stream:  # type: ignore
+                await parse_event(event, state, on_event)
+        finally:
+            # Release the HTTP response immediately if the turn is cancelled
+            # (e.g. the client disconnected) instead of leaving it to GC.
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+
+        if self._chain_responses:
+            # Without an id the next turn can't be chained: send everything.
+            self._previous_response_id = state.response_id
+            self._pending_items = []
 
         if state.turn_usage is not None:
             self._prompt_report_logger.record_usage(state.turn_usage)
             self._total_usage.accumulate(state.turn_usage)
+            prompt_cache_stats.record("openai", state.turn_usage)
+
+        turn = _build_provider_turn(state)
+        turn.usage = state.turn_usage
+        turn.pricing = MODEL_PRICING.get(model_name)
+        return turn
+
+    async def _create_response(self, params: Dict[str, Any]) -> Any:
+        if self._previous_response_id is not None:
+            chained = {
+                **params,
+                "input": self._pending_items,
+                "previous_response_id": self._previous_response_id,
+            }
+            self._prompt_report_logger.record_request(
+                chained, tool_result_encoding=self._result_encoder.report()
+            )
+            try:
+                return await self._client.responses.create(**chained)  # type: ignore
+            except Exception as exc:
+                if not _is_missing_previous_response(exc):
+                    raise
+                print(
+                    f"[OPENAI] Previous response {self._previous_response_id} is "
+                    "no longer stored; resending the full input"
+                )
+                self._previous_response_id = None
+
+        self._prompt_report_logger.record_request(
+            params, tool_result_encoding=self._result_encoder.report()
+        )
+        return await self._client.responses.create(**params)  # type: ignore
 
-        return _build_provider_turn(state)
+    def limit_tools(self, tool_names: Set[str] | None) -> None:
+        self._tool_filter = tool_names
 
     @staticmethod
     def _image_ref(part: Any) -> str | None:
@@ -489,7 +649,9 @@ class OpenAIProviderSession(ProviderSession):
         image_detail = _get_image_detail_for_model(self._model)
         tool_output_items: List[Dict[str, Any]] = []
         for executed in executed_tool_calls:
-            result_json = json.dumps(executed.result.result)
+            encoded, result_json = self._result_encoder.encode(
+                executed.tool_call.name, executed.result.result
+            )
             parts = executed.result.multimodal_parts or []
             output: Any = result_json
             if parts and executed.result.ok:
@@ -501,21 +663,31 @@ class OpenAIProviderSession(ProviderSession):
                     image_url = self._image_ref(part)
                     if image_url is None:
                         continue
-                    output.append(
-                        {
-                            "type": "input_image",
-                            "detail": image_detail,
-                            "image_url": image_url,
-                        }
+                    image_item = {
+                        "type": "input_image",
+                        "detail": image_detail,
+                        "image_url": image_url,
+                    }
+                    output.append(image_item)
+                    self._compactor.track_preview_image(
+                        executed.tool_call.name,
+                        part,
+                        partial(_replace_with_input_text, image_item),
                     )
-            tool_output_items.append(
-                {
-                    "type": "function_call_output",
-                    "call_id": executed.tool_call.id,
-                    "output": output,
-                }
-            )
+            output_item = {
+                "type": "function_call_output",
+                "call_id": executed.tool_call.id,
+                "output": output,
+            }
+            tool_output_items.append(output_item)
+            if isinstance(output, str) and executed.result.ok:
+                self._compactor.track_edit_diff(
+                    executed.tool_call.name,
+                    encoded,
+                    partial(_replace_function_output, output_item),
+                )
         self._input_items.extend(tool_output_items)
+        self._pending_items.extend(tool_output_items)
 
     async def close(self) -> None:
         u = self._total_usage
@@ -529,4 +701,7 @@ class OpenAIProviderSession(ProviderSession):
             f"cache_read={u.cache_read} cache_write={u.cache_write} "
             f"total={u.total}{cache_hit_rate_str}{cost_str}"
         )
-        await self._client.close()
+        if self._client_lease is not None:
+            self._client_lease.release()
+        else:
+            await self._client.close()
@@ -0,0 +1,204 @@
+"""Prompt-cache layout shared by the provider sessions.
+
+A request's variants all send the same system prompt, tool schemas and
+screenshot, and every agent turn resends them plus the history so far. Each
+provider caches that prefix differently:
+
+- Anthropic caches up to explicit ``cache_control`` breakpoints. Requests
+  mark the end of the tools, the system prompt, the initial prompt and the
+  latest message, so each turn reads everything up to the previous turn's
+  last breakpoint and variants read each other's initial prompt.
+- OpenAI caches prefixes automatically but routes requests by a hash of the
+  first few hundred tokens. A ``prompt_cache_key`` derived from the initial
+  prompt sends a request's variants and turns to the same cache.
+- Gemini only reuses a prefix reliably through an explicit CachedContent.
+  One is created per distinct system prompt, tools and screenshot prefix and
+  shared by every Gemini variant of the request. Caches are billed while
+  stored, so the last session using one deletes it.
+
+``prompt_cache_stats`` collects token usage per provider so cache hit rates
+can be compared at ``/prompt-cache``.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+from agent.providers.token_usage import TokenUsage
+from config import GEMINI_CONTEXT_CACHE_TTL_SECONDS
+
+ANTHROPIC_CACHE_CONTROL = {"type": "ephemeral"}
+
+# Stop using a Gemini cache this long before it expires so requests already
+# on their way don't reference a deleted cache.
+GEMINI_CACHE_EXPIRY_MARGIN_SECONDS = 30
+
+
+def prompt_prefix_digest(*parts: Any) -> str:
+    """Stable digest of the JSON-serializable ``parts`` of a prompt."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def openai_prompt_cache_key(
+    model_name: str,
+    input_items: Sequence[Dict[str, Any]],
+    tools: Sequence[Dict[str, Any]],
+) -> str:
+    """Routing key shared by all requests that start with the same prompt."""
+    tool_names = [tool.get("name") for tool in tools]
+    return f"s2c-{prompt_prefix_digest(model_name, tool_names, list(input_items))[:40]}"
+
+
+def _with_cache_control(block: Dict[str, Any]) -> Dict[str, Any]:
+    return {**block, "cache_control": ANTHROPIC_CACHE_CONTROL}
+
+
+def _mark_last_block(message: Dict[str, Any]) -> Dict[str, Any]:
+    content = message.get("content")
+    if isinstance(content, str):
+        if not content:
+            return message
+        return {**message, "content": [_with_cache_control({"type": "text", "text": content})]}
+    if not isinstance(content, list) or not content:
+        return message
+    return {**message, "content": [*content[:-1], _with_cache_control(content[-1])]}
+
+
+def anthropic_cache_layout(
+    system_prompt: str,
+    tools: List[Dict[str, Any]],
+    messages: List[Dict[str, Any]],
+    initial_message_count: int,
+) -> Tuple[Any, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """The system, tools and messages of a request with cache breakpoints.
+
+    Breakpoints go after the tools, the system prompt, the initial prompt
+    (the first ``initial_message_count`` messages) and the latest message:
+    Anthropic's limit is four. Only copies are marked, so tracked history
+    and the shared tool payload are never modified.
+    """
+    marked_tools = [*tools[:-1], _with_cache_control(tools[-1])] if tools else tools
+    system: Any = (
+        [_with_cache_control({"type": "text", "text": system_prompt})]
+        if system_prompt
+        else system_prompt
+    )
+    marked_messages = list(messages)
+    breakpoints = {initial_message_count - 1, len(messages) - 1}
+    for index in sorted(breakpoints):
+        if 0 <= index < len(marked_messages):
+            marked_messages[index] = _mark_last_block(marked_messages[index])
+    return system, marked_tools, marked_messages
+
+
+class _GeminiCacheEntry:
+    def __init__(self, task: "asyncio.Task[str | None]", expires_at: float):
+        self.task = task
+        self.expires_at = expires_at
+
+
+class GeminiContextCacheRegistry:
+    """Process-wide Gemini CachedContent names by prompt prefix.
+
+    Concurrent variants asking for the same prefix share one creation call.
+    A failed creation is remembered until it would have expired so each
+    turn doesn't retry it. Sessions ``hold`` a prefix while they use it, and
+    the cache is deleted when the last holder releases it.
+    """
+
+    def __init__(self, ttl_seconds: int = GEMINI_CONTEXT_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, _GeminiCacheEntry] = {}
+        self._holders: Dict[str, int] = {}
+
+    def hold(self, key: str) -> None:
+        self._holders[key] = self._holders.get(key, 0) + 1
+
+    async def get_or_create(
+        self, key: str, create: Callable[[int], Awaitable[str]]
+    ) -> str | None:
+        """The cache name for ``key``; ``create`` gets the TTL in seconds."""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= now:
+            for stale in [k for k, e in self._entries.items() if e.expires_at <= now]:
+                del self._entries[stale]
+            entry = _GeminiCacheEntry(
+                asyncio.ensure_future(self._create(create)),
+                now + self.ttl_seconds - GEMINI_CACHE_EXPIRY_MARGIN_SECONDS,
+            )
+            self._entries[key] = entry
+        # Shielded so one cancelled variant doesn't cancel the others' wait.
+        return await asyncio.shield(entry.task)
+
+    async def _create(self, create: Callable[[int], Awaitable[str]]) -> str | None:
+        try:
+            return await create(self.ttl_seconds)
+        except Exception as exc:
+            print(f"[PROMPT CACHE] Gemini context cache unavailable: {exc}")
+            return None
+
+    async def release(self, key: str, delete: Callable[[str], Awaitable[Any]]) -> None:
+        """Drop one hold on ``key``; the last one deletes the cache with
+        ``delete``, which gets the cache name."""
+        holders = self._holders.get(key, 0) - 1
+        if holders > 0:
+            self._holders[key] = holders
+            return
+        self._holders.pop(key, None)
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        name = await asyncio.shield(entry.task)
+        if name is None:
+            # Keep the failure so the next request doesn't retry it at once.
+            return
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+        try:
+            await delete(name)
+            print(f"[PROMPT CACHE] Deleted Gemini context cache {name}")
+        except Exception as exc:
+            # It still expires after its TTL.
+            print(f"[PROMPT CACHE] Could not delete Gemini context cache {name}: {exc}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._holders.clear()
+
+
+gemini_context_caches = GeminiContextCacheRegistry()
+
+
+class PromptCacheStats:
+    """Process-wide token usage per provider, for cache hit rates."""
+
+    def __init__(self) -> None:
+        self.usage: Dict[str, TokenUsage] = {}
+        self.turns: Dict[str, int] = {}
+
+    def record(self, provider: str, usage: TokenUsage) -> None:
+        self.usage.setdefault(provider, TokenUsage()).accumulate(usage)
+        self.turns[provider] = self.turns.get(provider, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            provider: {
+                "turns": self.turns.get(provider, 0),
+                "input": usage.input,
+                "cache_read": usage.cache_read,
+                "cache_write": usage.cache_write,
+                "cache_hit_rate_percent": round(usage.cache_hit_rate_percent(), 2),
+            }
+            for provider, usage in sorted(self.usage.items())
+        }
+
+
+prompt_cache_stats = PromptCacheStats()
+
@@ -0,0 +1,187 @@
+"""Compact encoding of tool results sent back to the model.
+
+Tool results are built for the client as much as for the model, and every
+provider used to ``json.dumps`` them wholesale into the next request. The
+model doesn't need all of it:
+
+- ``edit_file`` diffs carry three lines of context per hunk; one is enough
+  to locate a change in a file the model just edited.
+- ``extract_assets`` repeats each asset's Gemini box, label and source image
+  and lists the unresolved ones a second time.
+
+``ToolResultEncoder.encode`` rewrites results per tool and serializes them
+without padding whitespace or ``\\u`` escapes. It keeps per-tool counts of the
+characters saved, which providers add to their prompt reports.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+
+# Context lines kept around each change in diffs sent to the model.
+MODEL_DIFF_CONTEXT_LINES = 1
+CHARS_PER_TOKEN = 4
+
+# extract_assets fields the model uses: the rest are for the client's UI.
+MODEL_ASSET_FIELDS = (
+    "description",
+    "status",
+    "public_url",
+    "image_part_index",
+    "image_display_name",
+)
+
+_HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def dumps_tool_result(result: Dict[str, Any]) -> str:
+    return json.dumps(result, separators=(",", ":"), ensure_ascii=False)
+
+
+def _hunk_range(first_line: int, count: int) -> str:
+    # difflib's convention: an empty range names the line before it.
+    if count == 1:
+        return f"{first_line}"
+    if count == 0:
+        return f"{first_line - 1},0"
+    return f"{first_line},{count}"
+
+
+def _first_line(start: str, count: str | None) -> int:
+    return int(start) + 1 if count == "0" else int(start)
+
+
+def _trim_hunk(old_start: int, new_start: int, body: List[str], context: int) -> List[str]:
+    numbered: List[Tuple[str, int, int]] = []
+    old_line, new_line = old_start, new_start
+    for line in body:
+        numbered.append((line, old_line, new_line))
+        tag = line[:1]
+        if tag in (" ", "-"):
+            old_line += 1
+        if tag in (" ", "+"):
+            new_line += 1
+
+    changed = [index for index, (line, _, _) in enumerate(numbered) if line[:1] in "+-"]
+    if not changed:
+        return []
+    groups: List[Tuple[int, int]] = []
+    first = last = changed[0]
+    for index in changed[1:]:
+        if index - last - 1 > 2 * context:
+            groups.append((first, last))
+            first = index
+        last = index
+    groups.append((first, last))
+
+    trimmed: List[str] = []
+    for first, last in groups:
+        chunk = numbered[max(first - context, 0) : last + context + 1]
+        old_count = sum(1 for line, _, _ in chunk if line[:1] in (" ", "-"))
+        new_count = sum(1 for line, _, _ in chunk if line[:1] in (" ", "+"))
+        trimmed.append(
+            f"@@ -{_hunk_range(chunk[0][1], old_count)} "
+            f"+{_hunk_range(chunk[0][2], new_count)} @@\n"
+        )
+        trimmed.extend(line for line, _, _ in chunk)
+    return trimmed
+
+
+def trim_diff_context(diff: str, context: int = MODEL_DIFF_CONTEXT_LINES) -> str:
+    """Re-hunk a unified diff with at most ``context`` unchanged lines around
+    each change."""
+    output: List[str] = []
+    hunk: Tuple[int, int, List[str]] | None = None
+    for line in diff.splitlines(keepends=True):
+        header = _HUNK_HEADER_RE.match(line)
+        if header is not None:
+            if hunk is not None:
+                output.extend(_trim_hunk(*hunk, context))
+            hunk = (
+                _first_line(header.group(1), header.group(2)),
+                _first_line(header.group(3), header.group(4)),
+                [],
+            )
+        elif hunk is None:
+            output.append(line)
+        else:
+            hunk[2].append(line)
+    if hunk is not None:
+        output.extend(_trim_hunk(*hunk, context))
+    return "".join(output)
+
+
+def _encode_edit_file(result: Dict[str, Any]) -> Dict[str, Any]:
+    details = result.get("details")
+    if not isinstance(details, dict) or not isinstance(details.get("diff"), str):
+        return result
+    return {**result, "details": {**details, "diff": trim_diff_context(details["diff"])}}
+
+
+def _encode_extract_assets(result: Dict[str, Any]) -> Dict[str, Any]:
+    assets = result.get("assets")
+    if not isinstance(assets, list):
+        return result
+    encoded = {
+        key: value
+        for key, value in result.items()
+        # Unresolved assets are already in ``assets`` with their status.
+        if key not in ("assets", "unresolved_assets")
+    }
+    encoded["assets"] = [
+        {
+            field: asset[field]
+            for field in MODEL_ASSET_FIELDS
+            if asset.get(field) is not None
+        }
+        if isinstance(asset, dict)
+        else asset
+        for asset in assets
+    ]
+    return encoded
+
+
+TOOL_RESULT_ENCODERS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "edit_file": _encode_edit_file,
+    "extract_assets": _encode_extract_assets,
+}
+
+
+@dataclass
+class EncodingSavings:
+    calls: int = 0
+    raw_chars: int = 0
+    encoded_chars: int = 0
+
+    def report(self) -> Dict[str, Any]:
+        saved = self.raw_chars - self.encoded_chars
+        return {
+            "calls": self.calls,
+            "raw_chars": self.raw_chars,
+            "encoded_chars": self.encoded_chars,
+            "saved_chars": saved,
+            "estimated_tokens_saved": saved // CHARS_PER_TOKEN,
+        }
+
+
+class ToolResultEncoder:
+    def __init__(self) -> None:
+        self.savings: Dict[str, EncodingSavings] = {}
+
+    def encode(self, tool_name: str, result: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        """The model-facing result and its JSON text."""
+        encoder = TOOL_RESULT_ENCODERS.get(tool_name)
+        encoded = encoder(result) if encoder is not None else result
+        text = dumps_tool_result(encoded)
+
+        savings = self.savings.setdefault(tool_name, EncodingSavings())
+        savings.calls += 1
+        # Measured against the previous encoding: plain json.dumps of the result.
+        savings.raw_chars += len(json.dumps(result))
+        savings.encoded_chars += len(text)
+        return encoded, text
+
+    def report(self) -> Dict[str, Any]:
+        """Cumulative savings per tool for prompt reports."""
+        return {name: savings.report() for name, savings in sorted(self.savings.items())}
@@ -0,0 +1,356 @@
+"""Section-wise parallel generation for long pages.
+
+A single ``create_file`` call streams the whole page through one model, so
+for long landing pages decode time dominates. In sectioned mode a planning
+call splits the screenshot into full-width bands (``detect_page_sections``),
+one sub-agent per band generates that section concurrently, and the section
+documents are merged into one page. A last agent pass over the merged page
+takes a ``screenshot_preview`` against the full screenshot and fixes the
+seams with ``edit_file``.
+
+Only stacks whose output is a plain HTML document can be merged this way.
+Anything that can't be split or generated falls back to the regular
+single-agent run.
+
+All agents of a variant draw on one budget (a shared ``BudgetTracker``
+parent), so a split page costs no more time, tokens or money than the
+single-agent run would have been allowed. Each provider call (the planning
+call, every section agent and the verify pass) holds its own admission slot
+while it runs, so sectioned variants count against the provider limits like
+everything else.
+"""
+
+import asyncio
+import re
+from contextlib import nullcontext
+from typing import (
+    Any,
+    AsyncContextManager,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    cast,
+)
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from agent.budget import BudgetTracker, VariantBudget, budget_from_config
+from agent.cancellation import CancellationScope
+from agent.engine import AgentEngine
+from asset_extraction import ASSET_EXTRACTION_GEMINI_MODEL, detect_page_sections
+from config import SECTIONED_GENERATION_MAX_SECTIONS
+from llm import MODEL_PROVIDER, Llm
+
+SECTIONED_GENERATION_STACKS = frozenset({"html_css", "html_tailwind", "bootstrap"})
+
+SendMessage = Callable[
+    [str, Optional[str], int, Optional[Dict[str, Any]], Optional[str]],
+    Awaitable[None],
+]
+# Holds an admission slot for one provider call: ``(provider, model name)``.
+AdmissionSlot = Callable[[str, str], AsyncContextManager[None]]
+
+_HEAD_RE = re.compile(r"<head\b[^>]*>(.*?)</head\s*>", re.IGNORECASE | re.DOTALL)
+_BODY_RE = re.compile(r"<body\b([^>]*)>(.*?)(?:</body\s*>|$)", re.IGNORECASE | re.DOTALL)
+_HTML_ATTRS_RE = re.compile(r"<html\b([^>]*)>", re.IGNORECASE)
+_HEAD_RESOURCE_RE = re.compile(
+    r"<(script|style)\b[^>]*>.*?</\1\s*>|<link\b[^>]*>",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def _section_instructions(index: int, count: int, label: str) -> str:
+    return f"""
+
+## Section {index + 1} of {count}: {label}
+
+The page is being generated in sections by parallel agents. The attached screenshot is only the "{label}" band of the full page. Build ONLY this section, exactly as it appears, as a complete HTML document whose <body> contains just this section. Do not add content from other sections, and do not call screenshot_preview.
+Prefix any custom CSS class names, ids and keyframes with "s{index + 1}-" so they don't collide with the other sections."""
+
+
+VERIFY_INSTRUCTIONS = """
+
+## Assembled page
+
+The page has already been generated section by section and the sections were merged into index.html. Do not rewrite the file from scratch. Call screenshot_preview, compare it with the screenshot, and use edit_file to fix any differences, in particular at the seams between sections (spacing, backgrounds, duplicated or inconsistent styles)."""
+
+
+def _with_instructions(
+    prompt_messages: List[ChatCompletionMessageParam],
+    instructions: str,
+    image_data_url: Optional[str] = None,
+) -> List[ChatCompletionMessageParam]:
+    """Copy of the prompt with ``instructions`` appended to the last user
+    message and, if given, its image replaced."""
+    messages: List[Dict[str, Any]] = [dict(message) for message in prompt_messages]
+    for message in reversed(messages):
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        parts: List[Dict[str, Any]] = (
+            [dict(part) for part in content]
+            if isinstance(content, list)
+            else [{"type": "text", "text": str(content or "")}]
+        )
+        if image_data_url is not None:
+            parts = [
+                {"type": "image_url", "image_url": {"url": image_data_url, "detail": "high"}}
+                if part.get("type") == "image_url"
+                else part
+                for part in parts
+            ]
+        parts.append({"type": "text", "text": instructions})
+        message["content"] = parts
+        break
+    return cast(List[ChatCompletionMessageParam], messages)
+
+
+def _input_image_urls(prompt_messages: List[ChatCompletionMessageParam]) -> List[str]:
+    urls: List[str] = []
+    for message in prompt_messages:
+        content = message.get("content")
+        if message.get("role") != "user" or not isinstance(content, list):
+            continue
+        for part in content:
+            if isinstance(part, dict) and part.get("type") == "image_url":
+                url = part.get("image_url", {}).get("url")  # type: ignore[union-attr]
+                if isinstance(url, str) and url.startswith("data:image/"):
+                    urls.append(url)
+    return urls
+
+
+def _split_document(html: str) -> Tuple[str, str, str, str]:
+    """``(html_attrs, head, body_attrs, body)`` of an HTML document."""
+    html_attrs = _HTML_ATTRS_RE.search(html)
+    head = _HEAD_RE.search(html)
+    body = _BODY_RE.search(html)
+    if body is not None:
+        body_attrs, body_html = body.group(1), body.group(2)
+    else:
+        body_attrs = ""
+        body_html = _HEAD_RE.sub("", html)
+        body_html = re.sub(r"</?html\b[^>]*>|<!doctype[^>]*>", "", body_html, flags=re.IGNORECASE)
+    return (
+        html_attrs.group(1) if html_attrs else "",
+        head.group(1).strip() if head else "",
+        body_attrs,
+        body_html.strip(),
+    )
+
+
+def merge_section_documents(documents: List[str], labels: List[str]) -> str:
+    """Merge section documents into one page.
+
+    The first section's ``<html>``/``<head>``/``<body>`` are the base. Scripts,
+    stylesheets and style blocks the other sections add are appended to the
+    head once each. Section bodies are concatenated in order; a section whose
+    ``<body>`` attributes differ from the base keeps them on a wrapping div.
+    """
+    html_attrs, head, body_attrs, _ = _split_document(documents[0])
+    head_parts = [head] if head else []
+    seen = {" ".join(match.group(0).split()) for match in _HEAD_RESOURCE_RE.finditer(head)}
+    sections: List[str] = []
+    for index, (document, label) in enumerate(zip(documents, labels)):
+        _, section_head, section_body_attrs, body = _split_document(document)
+        for match in _HEAD_RESOURCE_RE.finditer(section_head):
+            key = " ".join(match.group(0).split())
+            if key not in seen:
+                seen.add(key)
+                head_parts.append(match.group(0))
+        if section_body_attrs.strip() and section_body_attrs != body_attrs:
+            body = f"<div{section_body_attrs}>\n{body}\n</div>"
+        sections.append(f"<!-- Section {index + 1}: {label} -->\n{body}")
+
+    head_html = "\n".join(head_parts)
+    body_html = "\n\n".join(sections)
+    return (
+        f"<!DOCTYPE html>\n<html{html_attrs}>\n<head>\n{head_html}\n</head>\n"
+        f"<body{body_attrs}>\n{body_html}\n</body>\n</html>\n"
+    )
+
+
+class SectionedAgent:
+    """Drop-in for ``Agent`` that generates a page's sections in parallel.
+
+    Takes the same arguments as ``AgentEngine``; ``run`` and ``budget_report``
+    behave the same from the caller's point of view.
+    """
+
+    def __init__(
+        self,
+        send_message: SendMessage,
+        variant_index: int,
+        gemini_api_key: Optional[str],
+        cancellation_scope: Optional[CancellationScope] = None,
+        budget: Optional[VariantBudget] = None,
+        max_sections: int = SECTIONED_GENERATION_MAX_SECTIONS,
+        engine_factory: Callable[..., AgentEngine] = AgentEngine,
+        admission_slot: Optional[AdmissionSlot] = None,
+        **engine_kwargs: Any,
+    ):
+        self.send_message = send_message
+        self.variant_index = variant_index
+        self.gemini_api_key = gemini_api_key
+        self.cancellation_scope = cancellation_scope or CancellationScope()
+        self.budget = budget or budget_from_config()
+        self.max_sections = max_sections
+        self.engine_factory = engine_factory
+        self.admission_slot = admission_slot
+        self.engine_kwargs = engine_kwargs
+        self.engine_kwargs.pop("initial_file_state", None)
+        # Started by ``run``; every sub-agent's tracker charges to it.
+        self.budget_tracker: Optional[BudgetTracker] = None
+        self._final: Optional[AgentEngine] = None
+        self._section_reports: List[Dict[str, Any]] = []
+
+    def _engine(
+        self,
+        send_message: SendMessage,
+        initial_file_state: Optional[Dict[str, str]] = None,
+    ) -> AgentEngine:
+        return self.engine_factory(
+            send_message=send_message,
+            variant_index=self.variant_index,
+            gemini_api_key=self.gemini_api_key,
+            cancellation_scope=self.cancellation_scope,
+            budget=self.budget,
+            parent_budget_tracker=self.budget_tracker,
+            initial_file_state=initial_file_state,
+            **self.engine_kwargs,
+        )
+
+    def _slot(self, provider: str, model_name: str) -> AsyncContextManager[None]:
+        if self.admission_slot is None:
+            return nullcontext()
+        return self.admission_slot(provider, model_name)
+
+    async def _run_engine(
+        self,
+        engine: AgentEngine,
+        model: Llm,
+        prompt_messages: List[ChatCompletionMessageParam],
+    ) -> str:
+        async with self._slot(MODEL_PROVIDER.get(model, "unknown"), model.value):
+            return await engine.run(model, prompt_messages)
+
+    async def _status(self, text: str, data: Optional[Dict[str, Any]] = None) -> None:
+        await self.send_message("status", text, self.variant_index, data, None)
+
+    async def _plan(
+        self, prompt_messages: List[ChatCompletionMessageParam]
+    ) -> List[Dict[str, Any]]:
+        image_urls = _input_image_urls(prompt_messages)
+        if not self.gemini_api_key or len(image_urls) != 1:
+            return []
+        try:
+            async with self._slot("gemini", ASSET_EXTRACTION_GEMINI_MODEL):
+                return await detect_page_sections(
+                    image_urls[0], self.gemini_api_key, self.max_sections
+                )
+        except Exception as e:
+            print(f"[SECTIONS] Variant {self.variant_index + 1}: planning failed: {e}")
+            return []
+
+    async def _generate_sections(
+        self,
+        model: Llm,
+        prompt_messages: List[ChatCompletionMessageParam],
+        sections: List[Dict[str, Any]],
+    ) -> Optional[List[str]]:
+        done = 0
+
+        async def quiet(
+            type: str,
+            value: Optional[str],
+            variant_index: int,
+            data: Optional[Dict[str, Any]],
+            event_id: Optional[str],
+        ) -> None:
+            return None
+
+        async def generate(index: int, section: Dict[str, Any]) -> str:
+            nonlocal done
+            engine = self._engine(quiet)
+            messages = _with_instructions(
+                prompt_messages,
+                _section_instructions(index, len(sections), section["label"]),
+                image_data_url=section["data_url"],
+            )
+            completion = await self._run_engine(engine, model, messages)
+            report = engine.budget_report()
+            if report:
+                self._section_reports.append({"section": index, **report})
+            done += 1
+            await self._status(f"Generated {done} of {len(sections)} sections...")
+            return completion
+
+        results = await asyncio.gather(
+            *(generate(index, section) for index, section in enumerate(sections)),
+            return_exceptions=True,
+        )
+        completions: List[str] = []
+        for index, result in enumerate(results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, BaseException) or not result:
+                print(
+                    f"[SECTIONS] Variant {self.variant_index + 1}: section "
+                    f"{index + 1} failed: {result!r}"
+                )
+                return None
+            completions.append(result)
+        return completions
+
+    async def run(
+        self, model: Llm, prompt_messages: List[ChatCompletionMessageParam]
+    ) -> str:
+        self.budget_tracker = BudgetTracker(self.budget)
+        await self._status("Planning page sections...")
+        sections = await self._plan(prompt_messages)
+        if len(sections) < 2:
+            print(f"[SECTIONS] Variant {self.variant_index + 1}: not split; running one agent")
+            self._final = self._engine(self.send_message)
+            return await self._run_engine(self._final, model, prompt_messages)
+
+        labels = [section["label"] for section in sections]
+        print(
+            f"[SECTIONS] Variant {self.variant_index + 1}: generating "
+            f"{len(sections)} sections in parallel: {', '.join(labels)}"
+        )
+        await self._status(
+            f"Generating {len(sections)} sections in parallel...",
+            {"sections": labels},
+        )
+        completions = await self._generate_sections(model, prompt_messages, sections)
+        if completions is None:
+            self._final = self._engine(self.send_message)
+            return await self._run_engine(self._final, model, prompt_messages)
+
+        merged = merge_section_documents(completions, labels)
+        await self.send_message("setCode", merged, self.variant_index, None, None)
+        await self._status("Checking the assembled page...")
+        self._final = self._engine(
+            self.send_message,
+            initial_file_state={"path": "index.html", "content": merged},
+        )
+        return await self._run_engine(
+            self._final,
+            model,
+            _with_instructions(prompt_messages, VERIFY_INSTRUCTIONS),
+        )
+
+    def budget_report(self) -> Optional[Dict[str, Any]]:
+        """The variant's combined usage; ``phase`` is the last agent's."""
+        if self.budget_tracker is None:
+            return None
+        report = self.budget_tracker.report()
+        final_report = self._final.budget_report() if self._final is not None else None
+        report["phase"] = (final_report or {}).get("phase", report["phase"])
+        if self._section_reports:
+            report["sections"] = sorted(
+                self._section_reports, key=lambda r: r["section"]
+            )
+        return report
@@ -1,15 +1,29 @@
-from dataclasses import dataclass
 from typing import Any, List
 
 from openai.types.chat import ChatCompletionMessageParam
 
+from agent.document import Document
 from codegen.utils import extract_html_content
 
 
-@dataclass
 class AgentFileState:
-    path: str = "index.html"
-    content: str = ""
+    """The agent's working file. Edits go through ``document``; assigning
+    ``content`` replaces the whole file."""
+
+    def __init__(self, path: str = "index.html", content: str = ""):
+        self.path = path
+        self.document = Document(content)
+
+    @property
+    def content(self) -> str:
+        return self.document.text
+
+    @content.setter
+    def content(self, value: str) -> None:
+        self.document = Document(value)
+
+    def __repr__(self) -> str:
+        return f"AgentFileState(path={self.path!r}, length={len(self.document)})"
 
 
 def ensure_str(value: Any) -> str:
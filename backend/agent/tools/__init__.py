@@ -1,10 +1,18 @@
 from agent.tools.definitions import canonical_tool_definitions
 from agent.tools.parsing import (
+    StreamingToolArguments,
     extract_content_from_args,
     extract_path_from_args,
     parse_json_arguments,
 )
 from agent.tools.runtime import AgentToolRuntime, AgentToolbox
+from agent.tools.scheduling import (
+    FILE_STATE_TOOLS,
+    SPECULATIVE_TOOLS,
+    cancel_pending,
+    schedule_tool_calls,
+    touches_file_state,
+)
 from agent.tools.summaries import summarize_text, summarize_tool_input
 from agent.tools.types import (
     CanonicalToolDefinition,
@@ -13,15 +21,21 @@ from agent.tools.types import (
 )
 
 __all__ = [
+    "FILE_STATE_TOOLS",
+    "SPECULATIVE_TOOLS",
     "AgentToolRuntime",
     "AgentToolbox",
+    "StreamingToolArguments",
     "CanonicalToolDefinition",
     "ToolCall",
     "ToolExecutionResult",
+    "cancel_pending",
     "canonical_tool_definitions",
     "extract_content_from_args",
     "extract_path_from_args",
     "parse_json_arguments",
+    "schedule_tool_calls",
     "summarize_text",
     "summarize_tool_input",
+    "touches_file_state",
 ]
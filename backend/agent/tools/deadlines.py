@@ -0,0 +1,124 @@
+"""Wall-clock deadlines for agent tool calls.
+
+Tools that call external services (Replicate, Gemini, Chromium) each get a
+deadline so one slow call can't hold a variant hostage. Tools that fan out
+over several items (``generate_images``, ``remove_background``) return the
+items that finished in time and mark the rest as timed out; other tools
+return a timeout error. The model sees either result and can carry on.
+
+Timeouts are counted per tool for the ``/tool-deadlines`` endpoint.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, List, Sequence
+
+from config import TOOL_DEADLINES
+
+# Seconds per tool; tools missing here (the in-memory file tools) have none.
+DEFAULT_TOOL_DEADLINES: Dict[str, float] = {
+    "generate_images": 90.0,
+    "remove_background": 60.0,
+    "edit_image": 90.0,
+    "extract_assets": 60.0,
+    "screenshot_preview": 45.0,
+    "save_assets": 30.0,
+}
+
+
+class ToolTimeout(Exception):
+    """Stands in for an item that didn't finish before the tool's deadline."""
+
+
+def parse_deadline_overrides(raw: str) -> Dict[str, float]:
+    """Parse ``"generate_images=60,screenshot_preview=30"``; 0 disables a deadline."""
+    deadlines: Dict[str, float] = {}
+    for entry in raw.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, sep, value = entry.partition("=")
+        try:
+            if not sep or not name.strip():
+                raise ValueError(entry)
+            deadlines[name.strip()] = max(0.0, float(value))
+        except ValueError:
+            print(f"[TOOL DEADLINES] Ignoring malformed override: {entry!r}")
+    return deadlines
+
+
+def tool_deadlines_from_config() -> Dict[str, float]:
+    return {**DEFAULT_TOOL_DEADLINES, **parse_deadline_overrides(TOOL_DEADLINES)}
+
+
+class ToolTimeoutCounters:
+    """Process-wide count of calls and timeouts per tool."""
+
+    def __init__(self) -> None:
+        self.calls: Dict[str, int] = {}
+        self.timeouts: Dict[str, int] = {}
+        self.partial: Dict[str, int] = {}
+
+    def record_call(self, tool_name: str) -> None:
+        self.calls[tool_name] = self.calls.get(tool_name, 0) + 1
+
+    def record_timeout(self, tool_name: str, partial: bool = False) -> None:
+        counts = self.partial if partial else self.timeouts
+        counts[tool_name] = counts.get(tool_name, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "deadlines": tool_deadlines_from_config(),
+            "calls": dict(self.calls),
+            # Calls that ran out of time with nothing to return.
+            "timeouts": dict(self.timeouts),
+            # Calls that returned some items and timed out the rest.
+            "partialTimeouts": dict(self.partial),
+        }
+
+
+tool_timeout_counters = ToolTimeoutCounters()
+
+
+async def gather_until(
+    awaitables: Sequence[Awaitable[Any]],
+    timeout: float | None,
+    concurrency: int = 20,
+) -> List[Any]:
+    """Like ``gather(..., return_exceptions=True)`` with a deadline.
+
+    At most ``concurrency`` awaitables run at once. Whatever hasn't finished
+    when ``timeout`` seconds are up is cancelled and reported as a
+    ``ToolTimeout`` in its slot.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(awaitable: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await awaitable
+
+    tasks = [asyncio.ensure_future(limited(awaitable)) for awaitable in awaitables]
+    if not tasks:
+        return []
+    started_at = time.monotonic()
+    try:
+        _, pending = await asyncio.wait(tasks, timeout=timeout or None)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+    elapsed = time.monotonic() - started_at
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results: List[Any] = []
+    for task in tasks:
+        if task.cancelled():
+            results.append(ToolTimeout(f"Did not finish within {elapsed:.0f}s"))
+        elif task.exception() is not None:
+            results.append(task.exception())
+        else:
+            results.append(task.result())
+    return results
@@ -164,7 +164,21 @@ def _retrieve_option_schema() -> Dict[str, Any]:
             "option_number": {
                 "type": "integer",
                 "description": "1-based option number to retrieve (Option 1, Option 2, etc.).",
-            }
+            },
+            "section": {
+                "type": "string",
+                "description": (
+                    "Optional element id or tag name (e.g. 'pricing' or 'footer') "
+                    "to retrieve only that element instead of the whole option."
+                ),
+            },
+            "diff": {
+                "type": "boolean",
+                "description": (
+                    "Return a unified diff from the current file (or its matching "
+                    "section) to the option instead of the option's full HTML."
+                ),
+            },
         },
         "required": ["option_number"],
     }
@@ -270,8 +284,9 @@ def canonical_tool_definitions(
             CanonicalToolDefinition(
                 name="retrieve_option",
                 description=(
-                    "Retrieve the full HTML for a specific option (variant) so you can "
-                    "reference it."
+                    "Retrieve the HTML for a specific option (variant) so you can "
+                    "reference it. Use section and diff to fetch only the part you "
+                    "need."
                 ),
                 parameters=_retrieve_option_schema(),
             ),
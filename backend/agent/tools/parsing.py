@@ -1,6 +1,7 @@
 # pyright: reportUnknownVariableType=false
 import json
-from typing import Any, Dict, Optional, Tuple
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from agent.state import ensure_str
 
@@ -96,3 +97,361 @@ def extract_path_from_args(raw_args: Any) -> Optional[str]:
         return ensure_str(path) if path is not None else None
     raw_text = ensure_str(raw_args)
     return _extract_partial_json_string(raw_text, "path")
+
+
+# Streamed tool arguments
+#
+# Providers stream tool arguments as JSON text in arbitrary chunks. Re-parsing
+# the whole accumulated text on every chunk (as ``extract_content_from_args``
+# does) is quadratic in the argument size, so streaming providers feed their
+# chunks into one ``StreamingToolArguments`` per tool call instead. It keeps
+# the tokenizer state between chunks and decodes each chunk exactly once.
+
+STREAMED_ARGUMENT_FIELDS = ("content", "path")
+# Top-level arrays whose elements are reported as soon as each one closes.
+STREAMED_ARRAY_FIELDS = ("edits",)
+
+_SIMPLE_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+_STRING_SPECIAL = re.compile(r'["\\]')
+_NESTED_SPECIAL = re.compile(r'["\\{}\[\]]')
+_SCALAR_END = re.compile(r"[,}]")
+
+# Tokenizer states.
+_BEFORE_OBJECT = 0
+_EXPECT_KEY = 1
+_IN_KEY = 2
+_AFTER_KEY = 3
+_BEFORE_VALUE = 4
+_IN_STRING = 5
+_IN_NESTED = 6
+_IN_SCALAR = 7
+_AFTER_VALUE = 8
+_DONE = 9
+
+
+class StreamingToolArguments:
+    """Incremental decoder for one tool call's streamed JSON arguments.
+
+    Only the top-level string values of ``fields`` are decoded; everything
+    else is skipped. ``feed`` returns the newly decoded text per field, so the
+    cost of each chunk is proportional to the chunk, not to the arguments
+    received so far. Object or array elements of the top-level arrays in
+    ``array_fields`` are parsed as each one closes; see ``items``.
+    """
+
+    def __init__(
+        self,
+        fields: Iterable[str] = STREAMED_ARGUMENT_FIELDS,
+        array_fields: Iterable[str] = STREAMED_ARRAY_FIELDS,
+    ):
+        self.fields = frozenset(fields)
+        self.array_fields = frozenset(array_fields)
+        self.complete = False
+        self._state = _BEFORE_OBJECT
+        self._chunks: List[str] = []
+        self._raw_cache = ""
+        self._raw_cached_chunks = 0
+        # Unconsumed input (a split escape sequence) carried to the next chunk.
+        self._carry = ""
+        self._key_parts: List[str] = []
+        self._key_escape = False
+        self._current_field: Optional[str] = None
+        self._nested_depth = 0
+        self._nested_in_string = False
+        self._nested_escape = False
+        self._current_array: Optional[str] = None
+        self._nested_array: Optional[str] = None
+        self._element_parts: Optional[List[str]] = None
+        self._items: Dict[str, List[Any]] = {}
+        self._pieces: Dict[str, List[str]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._joined: Dict[str, Tuple[int, str]] = {}
+
+    @classmethod
+    def from_arguments(
+        cls,
+        arguments: Dict[str, Any],
+        fields: Iterable[str] = STREAMED_ARGUMENT_FIELDS,
+        array_fields: Iterable[str] = STREAMED_ARRAY_FIELDS,
+    ) -> "StreamingToolArguments":
+        """Wrap arguments a provider delivered already parsed."""
+        stream = cls(fields, array_fields)
+        for name in stream.fields:
+            value = arguments.get(name)
+            if value is not None:
+                stream.feed_value(name, ensure_str(value))
+        for name in stream.array_fields:
+            value = arguments.get(name)
+            if isinstance(value, list):
+                stream._items[name] = list(value)
+        stream.complete = True
+        return stream
+
+    @property
+    def raw_text(self) -> str:
+        """All JSON text fed so far."""
+        if self._raw_cached_chunks != len(self._chunks):
+            self._raw_cache += "".join(self._chunks[self._raw_cached_chunks :])
+            self._raw_cached_chunks = len(self._chunks)
+        return self._raw_cache
+
+    def value(self, name: str) -> Optional[str]:
+        """The decoded value so far, or None if the field hasn't started."""
+        pieces = self._pieces.get(name)
+        if pieces is None:
+            return None
+        joined_count, joined = self._joined.get(name, (0, ""))
+        if joined_count != len(pieces):
+            joined += "".join(pieces[joined_count:])
+            self._joined[name] = (len(pieces), joined)
+        return joined
+
+    def items(self, name: str) -> Optional[List[Any]]:
+        """Elements of array field ``name`` that have closed so far, or None
+        if the array hasn't started."""
+        return self._items.get(name)
+
+    def length(self, name: str) -> Optional[int]:
+        """Length of ``value(name)`` without joining it."""
+        if name not in self._pieces:
+            return None
+        return self._lengths[name]
+
+    def feed_value(self, name: str, text: str) -> Dict[str, str]:
+        """Append already-decoded text to a field (for providers that stream
+        argument values rather than JSON text)."""
+        self._start_field(name)
+        self._append(name, text)
+        return {name: text} if text else {}
+
+    def feed(self, chunk: str) -> Dict[str, str]:
+        """Consume the next chunk of JSON text; returns newly decoded text per
+        watched field."""
+        if not chunk:
+            return {}
+        self._chunks.append(chunk)
+        text = self._carry + chunk if self._carry else chunk
+        self._carry = ""
+        decoded: Dict[str, List[str]] = {}
+        i = 0
+        end = len(text)
+        while i < end and self._state != _DONE:
+            state = self._state
+            if state == _IN_STRING:
+                i = self._consume_string(text, i, decoded)
+                if i < 0:
+                    break
+            elif state == _IN_NESTED:
+                i = self._consume_nested(text, i)
+            elif state == _IN_KEY:
+                i = self._consume_key(text, i)
+            elif state == _IN_SCALAR:
+                match = _SCALAR_END.search(text, i)
+                if match is None:
+                    i = end
+                else:
+                    i = match.start()
+                    self._state = _AFTER_VALUE
+            else:
+                i = self._consume_structural(text, i)
+        return {name: "".join(parts) for name, parts in decoded.items() if parts}
+
+    def _consume_structural(self, text: str, i: int) -> int:
+        ch = text[i]
+        if ch.isspace():
+            return i + 1
+        state = self._state
+        if state == _BEFORE_OBJECT:
+            if ch == "{":
+                self._state = _EXPECT_KEY
+        elif state == _EXPECT_KEY:
+            if ch == '"':
+                self._state = _IN_KEY
+                self._key_parts = []
+                self._key_escape = False
+            elif ch == "}":
+                self._finish()
+        elif state == _AFTER_KEY:
+            if ch == ":":
+                self._state = _BEFORE_VALUE
+        elif state == _BEFORE_VALUE:
+            if ch == '"':
+                self._state = _IN_STRING
+                if self._current_field is not None:
+                    self._start_field(self._current_field)
+            elif ch in "{[":
+                self._state = _IN_NESTED
+                self._nested_depth = 1
+                self._nested_in_string = False
+                self._nested_escape = False
+                self._nested_array = self._current_array if ch == "[" else None
+                if self._nested_array is not None:
+                    self._items[self._nested_array] = []
+            else:
+                self._state = _IN_SCALAR
+                return i
+        elif state == _AFTER_VALUE:
+            if ch == ",":
+                self._state = _EXPECT_KEY
+            elif ch == "}":
+                self._finish()
+        return i + 1
+
+    def _consume_key(self, text: str, i: int) -> int:
+        start = i
+        end = len(text)
+        while i < end:
+            ch = text[i]
+            if self._key_escape:
+                self._key_escape = False
+            elif ch == "\\":
+                self._key_escape = True
+            elif ch == '"':
+                self._key_parts.append(text[start:i])
+                raw_key = "".join(self._key_parts)
+                try:
+                    key = json.loads(f'"{raw_key}"')
+                except json.JSONDecodeError:
+                    key = raw_key
+                self._current_field = key if key in self.fields else None
+                self._current_array = key if key in self.array_fields else None
+                self._state = _AFTER_KEY
+                return i + 1
+            i += 1
+        self._key_parts.append(text[start:])
+        return end
+
+    def _consume_string(
+        self, text: str, i: int, decoded: Dict[str, List[str]]
+    ) -> int:
+        """Decode string contents from ``i``; returns the next index, or -1 if
+        the rest of ``text`` was carried over as an incomplete escape."""
+        name = self._current_field
+        end = len(text)
+        while i < end:
+            match = _STRING_SPECIAL.search(text, i)
+            stop = end if match is None else match.start()
+            if name is not None and stop > i:
+                self._emit(name, text[i:stop], decoded)
+            if match is None:
+                return end
+            if text[stop] == '"':
+                self._state = _AFTER_VALUE
+                self._current_field = None
+                return stop + 1
+            escaped, consumed = self._decode_escape(text, stop)
+            if consumed == 0:
+                self._carry = text[stop:]
+                return -1
+            if name is not None:
+                self._emit(name, escaped, decoded)
+            i = stop + consumed
+        return end
+
+    def _decode_escape(self, text: str, i: int) -> Tuple[str, int]:
+        """Decode the escape at ``text[i]`` (a backslash); 0 chars consumed
+        means it's split across chunks."""
+        if i + 1 >= len(text):
+            return "", 0
+        kind = text[i + 1]
+        if kind != "u":
+            return _SIMPLE_ESCAPES.get(kind, kind), 2
+        if i + 6 > len(text):
+            return "", 0
+        try:
+            code = int(text[i + 2 : i + 6], 16)
+        except ValueError:
+            return text[i : i + 6], 6
+        if 0xD800 <= code < 0xDC00:
+            # High surrogate: combine with the following low surrogate.
+            if i + 12 > len(text):
+                rest = text[i + 6 : i + 8]
+                if rest in ("", "\\") or rest == "\\u":
+                    return "", 0
+            elif text.startswith("\\u", i + 6):
+                try:
+                    low = int(text[i + 8 : i + 12], 16)
+                except ValueError:
+                    low = 0
+                if 0xDC00 <= low < 0xE000:
+                    return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), 12
+        return chr(code), 6
+
+    def _consume_nested(self, text: str, i: int) -> int:
+        end = len(text)
+        # Start of the watched array element being captured in this chunk.
+        element_start = i if self._element_parts is not None else None
+        while i < end:
+            if self._nested_escape:
+                self._nested_escape = False
+                i += 1
+                continue
+            match = _NESTED_SPECIAL.search(text, i)
+            if match is None:
+                break
+            ch = match.group()
+            i = match.end()
+            if self._nested_in_string:
+                if ch == "\\":
+                    self._nested_escape = True
+                elif ch == '"':
+                    self._nested_in_string = False
+            elif ch == '"':
+                self._nested_in_string = True
+            elif ch in "{[":
+                self._nested_depth += 1
+                if self._nested_depth == 2 and self._nested_array is not None:
+                    self._element_parts = []
+                    element_start = match.start()
+            elif ch in "}]":
+                self._nested_depth -= 1
+                if self._nested_depth == 1 and element_start is not None:
+                    self._close_element(text[element_start:i])
+                    element_start = None
+                if self._nested_depth == 0:
+                    self._nested_array = None
+                    self._state = _AFTER_VALUE
+                    return i
+        if element_start is not None and self._element_parts is not None:
+            self._element_parts.append(text[element_start:end])
+        return end
+
+    def _close_element(self, tail: str) -> None:
+        parts = self._element_parts or []
+        parts.append(tail)
+        self._element_parts = None
+        try:
+            element = json.loads("".join(parts))
+        except json.JSONDecodeError:
+            return
+        if self._nested_array is not None:
+            self._items[self._nested_array].append(element)
+
+    def _start_field(self, name: str) -> None:
+        # A repeated key replaces the earlier value, as in ``json.loads``.
+        if name not in self._pieces or self._state == _IN_STRING:
+            self._pieces[name] = []
+            self._lengths[name] = 0
+            self._joined.pop(name, None)
+
+    def _append(self, name: str, text: str) -> None:
+        if text:
+            self._pieces[name].append(text)
+            self._lengths[name] += len(text)
+
+    def _emit(self, name: str, text: str, decoded: Dict[str, List[str]]) -> None:
+        self._append(name, text)
+        decoded.setdefault(name, []).append(text)
+
+    def _finish(self) -> None:
+        self._state = _DONE
+        self.complete = True
@@ -3,12 +3,19 @@ import asyncio
 import difflib
 from typing import Any, Dict, List, Optional, Tuple, Union, cast
 
-from codegen.utils import extract_html_content
+from codegen.utils import extract_html_content, find_html_element
 from config import REPLICATE_API_KEY
+from agent.cancellation import CancellationScope
+from agent.tools.deadlines import (
+    ToolTimeout,
+    gather_until,
+    tool_deadlines_from_config,
+    tool_timeout_counters,
+)
 from agent.tools.extract_assets import run_extract_assets
 from agent.tools.local_assets import guess_image_mime, local_asset_url_to_data_url
 from agent.tools.screenshot_preview import run_screenshot_preview
-from image_generation.generation import process_tasks
+from image_generation.generation import REPLICATE_BATCH_SIZE, process_tasks
 from image_generation.replicate import (
     P_IMAGE_EDIT_ASPECT_RATIOS,
     PImageEditAspectRatio,
@@ -17,11 +24,146 @@ from image_generation.replicate import (
 )
 from uploaded_assets.tools import run_save_assets
 
+from agent.document import Document
 from agent.state import AgentFileState, ensure_str
 from agent.tools.types import ToolCall, ToolExecutionResult, ToolMultimodalPart
 from agent.tools.summaries import summarize_text
 
 
+# Unchanged lines kept around each hunk, as difflib.unified_diff defaults to.
+DIFF_CONTEXT_LINES = 3
+
+# Context lines in retrieve_option diffs, which only need to locate changes.
+OPTION_DIFF_CONTEXT_LINES = 1
+
+# Tools that return the items finished before their deadline.
+PARTIAL_RESULT_TOOLS = frozenset({"generate_images", "remove_background"})
+
+
+def _timeout_note(deadline: Optional[float]) -> str:
+    return (
+        f"Items with status 'timeout' did not finish within {deadline or 0:g}s and "
+        "were stopped. Use the finished ones and continue without the rest, or "
+        "retry only those."
+    )
+
+
+def _line_start(text: str, position: int, lines_before: int) -> int:
+    for _ in range(lines_before + 1):
+        position = text.rfind("\n", 0, position)
+        if position == -1:
+            return 0
+    return position + 1
+
+
+def _line_end(text: str, position: int, lines_after: int) -> int:
+    for _ in range(lines_after + 1):
+        newline = text.find("\n", position)
+        if newline == -1:
+            return len(text)
+        position = newline + 1
+    return position
+
+
+def _format_range(start: int, stop: int) -> str:
+    # Same as difflib's _format_range_unified.
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def _windowed_unified_diff(
+    old_content: str,
+    new_content: str,
+    path: str,
+    document: Document,
+) -> Optional[List[str]]:
+    """difflib.unified_diff limited to the lines around the document's touched spans.
+
+    Each window is diffed on its own, so the result is a valid diff of the
+    whole file, but it can differ from a full-file diff: changes in separate
+    windows always get separate hunks, and around repeated lines difflib may
+    pair lines differently (autojunk also only sees the window). Returns None
+    when the windows would cover most of the file anyway.
+    """
+    spans = document.touched_spans()
+    if not spans:
+        return []
+
+    # (new start, new end, old start, old end) of each window, in characters.
+    windows: List[List[int]] = []
+    shift = 0
+    for span in spans:
+        old_span_start = span.start - shift
+        start = _line_start(new_content, span.start, DIFF_CONTEXT_LINES + 1)
+        end = _line_end(new_content, span.end, DIFF_CONTEXT_LINES + 1)
+        old_start = old_span_start - (span.start - start)
+        old_end = old_span_start + span.original_length + (end - span.end)
+        shift += (span.end - span.start) - span.original_length
+        if windows and start <= windows[-1][1]:
+            windows[-1][1], windows[-1][3] = end, old_end
+        else:
+            windows.append([start, end, old_start, old_end])
+    if sum(end - start for start, end, _, _ in windows) * 2 > len(new_content):
+        return None
+
+    diff_lines: List[str] = []
+    line_shift = 0
+    for start, end, old_start, old_end in windows:
+        old_lines = old_content[old_start:old_end].splitlines(keepends=True)
+        new_lines = new_content[start:end].splitlines(keepends=True)
+        new_offset = document.line_number(start)
+        old_offset = new_offset - line_shift
+        line_shift += len(new_lines) - len(old_lines)
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+        for group in matcher.get_grouped_opcodes(DIFF_CONTEXT_LINES):
+            if not diff_lines:
+                diff_lines += [f"--- {path}\n", f"+++ {path}\n"]
+            first, last = group[0], group[-1]
+            old_range = _format_range(first[1] + old_offset, last[2] + old_offset)
+            new_range = _format_range(first[3] + new_offset, last[4] + new_offset)
+            diff_lines.append(f"@@ -{old_range} +{new_range} @@\n")
+            for tag, i1, i2, j1, j2 in group:
+                if tag == "equal":
+                    diff_lines += [" " + line for line in old_lines[i1:i2]]
+                    continue
+                if tag in ("replace", "delete"):
+                    diff_lines += ["-" + line for line in old_lines[i1:i2]]
+                if tag in ("replace", "insert"):
+                    diff_lines += ["+" + line for line in new_lines[j1:j2]]
+    return diff_lines
+
+
+def apply_edit(
+    document: Document,
+    old_text: str,
+    new_text: str,
+    count: Optional[int],
+) -> int:
+    """Apply one edit_file replacement; returns how many occurrences changed.
+
+    ``count`` None replaces the first occurrence, a negative count all of them.
+    """
+    if count is None:
+        limit: Optional[int] = 1
+    elif count < 0:
+        limit = None
+    else:
+        limit = count
+    if limit == 0:
+        return 0
+
+    matches = document.find_all(old_text, limit)
+    # Right to left so earlier offsets stay valid.
+    for position in reversed(matches):
+        document.replace(position, position + len(old_text), new_text)
+    return len(matches)
+
+
 class AgentToolRuntime:
     def __init__(
         self,
@@ -35,6 +177,8 @@ class AgentToolRuntime:
         asset_base_url: str = "",
         user_id: Optional[str] = None,
         option_codes: Optional[List[str]] = None,
+        cancellation_scope: Optional[CancellationScope] = None,
+        tool_deadlines: Optional[Dict[str, float]] = None,
     ):
         self.file_state = file_state
         self.should_generate_images = should_generate_images
@@ -46,11 +190,18 @@ class AgentToolRuntime:
         self.asset_base_url = asset_base_url
         self.user_id = user_id
         self.option_codes = option_codes or []
+        self.cancellation_scope = cancellation_scope or CancellationScope()
+        self.tool_deadlines = (
+            tool_deadlines if tool_deadlines is not None else tool_deadlines_from_config()
+        )
 
     def _effective_replicate_api_key(self) -> str | None:
         return self.replicate_api_key or REPLICATE_API_KEY
 
     async def execute(self, tool_call: ToolCall) -> ToolExecutionResult:
+        # Tools spend money (Replicate, Gemini) or CPU (Chromium); don't start
+        # one for a client that has already gone away.
+        self.cancellation_scope.raise_if_cancelled()
         if "INVALID_JSON" in tool_call.arguments:
             invalid_json = ensure_str(tool_call.arguments.get("INVALID_JSON"))
             return ToolExecutionResult(
@@ -62,14 +213,41 @@ class AgentToolRuntime:
                 summary={"error": "Invalid JSON tool arguments"},
             )
 
+        deadline = self.tool_deadlines.get(tool_call.name) or None
+        if deadline is None:
+            return await self._dispatch(tool_call, None)
+
+        tool_timeout_counters.record_call(tool_call.name)
+        if tool_call.name in PARTIAL_RESULT_TOOLS:
+            # These return the items that finished and time out the rest.
+            return await self._dispatch(tool_call, deadline)
+        try:
+            return await asyncio.wait_for(self._dispatch(tool_call, deadline), deadline)
+        except asyncio.TimeoutError:
+            print(f"[TOOL DEADLINES] {tool_call.name} timed out after {deadline:g}s")
+            tool_timeout_counters.record_timeout(tool_call.name)
+            return ToolExecutionResult(
+                ok=False,
+                result={
+                    "error": (
+                        f"{tool_call.name} did not finish within {deadline:g}s "
+                        "and was stopped. Continue without it."
+                    )
+                },
+                summary={"error": "Timed out", "timeoutSeconds": deadline},
+            )
+
+    async def _dispatch(
+        self, tool_call: ToolCall, deadline: Optional[float]
+    ) -> ToolExecutionResult:
         if tool_call.name == "create_file":
             return self._create_file(tool_call.arguments)
         if tool_call.name == "edit_file":
             return self._edit_file(tool_call.arguments)
         if tool_call.name == "generate_images":
-            return await self._generate_images(tool_call.arguments)
+            return await self._generate_images(tool_call.arguments, deadline)
         if tool_call.name == "remove_background":
-            return await self._remove_background(tool_call.arguments)
+            return await self._remove_background(tool_call.arguments, deadline)
         if tool_call.name == "edit_image":
             return await self._edit_image(tool_call.arguments)
         if tool_call.name == "extract_assets":
@@ -129,13 +307,28 @@ class AgentToolRuntime:
         )
 
     @staticmethod
-    def _generate_diff(old_content: str, new_content: str, path: str) -> Dict[str, Any]:
-        """Generate a unified diff between old and new content."""
-        old_lines = old_content.splitlines(keepends=True)
-        new_lines = new_content.splitlines(keepends=True)
-        diff_lines = list(
-            difflib.unified_diff(old_lines, new_lines, fromfile=path, tofile=path)
+    def _generate_diff(
+        old_content: str,
+        new_content: str,
+        path: str,
+        document: Optional[Document] = None,
+    ) -> Dict[str, Any]:
+        """Generate a unified diff between old and new content.
+
+        With a ``document``, only the lines around its touched spans are
+        diffed; hunk line numbers still refer to the whole file.
+        """
+        diff_lines = (
+            _windowed_unified_diff(old_content, new_content, path, document)
+            if document is not None
+            else None
         )
+        if diff_lines is None:
+            old_lines = old_content.splitlines(keepends=True)
+            new_lines = new_content.splitlines(keepends=True)
+            diff_lines = list(
+                difflib.unified_diff(old_lines, new_lines, fromfile=path, tofile=path)
+            )
         diff_str = "".join(diff_lines)
 
         first_changed_line: Optional[int] = None
@@ -154,26 +347,6 @@ class AgentToolRuntime:
             "firstChangedLine": first_changed_line,
         }
 
-    def _apply_single_edit(
-        self,
-        content: str,
-        old_text: str,
-        new_text: str,
-        count: Optional[int],
-    ) -> Tuple[str, int]:
-        if old_text not in content:
-            return content, 0
-
-        if count is None:
-            replace_count = 1
-        elif count < 0:
-            replace_count = content.count(old_text)
-        else:
-            replace_count = count
-
-        updated = content.replace(old_text, new_text, replace_count)
-        return updated, min(replace_count, content.count(old_text))
-
     def _edit_file(self, args: Dict[str, Any]) -> ToolExecutionResult:
         if not self.file_state.content:
             return ToolExecutionResult(
@@ -196,22 +369,26 @@ class AgentToolRuntime:
                 summary={"error": "Invalid edits payload"},
             )
 
-        content = self.file_state.content
-        original_content = content
+        document = self.file_state.document
+        original_content = document.text
+        checkpoint = document.checkpoint()
+        document.mark_clean()
         summary_edits: List[Dict[str, Any]] = []
         for edit in edits:
             old_text = ensure_str(edit.get("old_text"))
             new_text = ensure_str(edit.get("new_text"))
             count = edit.get("count")
             if not old_text:
+                document.rollback(checkpoint)
                 return ToolExecutionResult(
                     ok=False,
                     result={"error": "edit_file requires old_text"},
                     summary={"error": "Missing old_text"},
                 )
 
-            content, replaced = self._apply_single_edit(content, old_text, new_text, count)
+            replaced = apply_edit(document, old_text, new_text, count)
             if replaced == 0:
+                document.rollback(checkpoint)
                 return ToolExecutionResult(
                     ok=False,
                     result={"error": "old_text not found", "old_text": old_text},
@@ -229,9 +406,9 @@ class AgentToolRuntime:
                 }
             )
 
-        self.file_state.content = content
+        content = document.text
         path = self.file_state.path or "index.html"
-        diff_info = self._generate_diff(original_content, content, path)
+        diff_info = self._generate_diff(original_content, content, path, document)
         summary = {
             "path": path,
             "edits": summary_edits,
@@ -253,7 +430,9 @@ class AgentToolRuntime:
             updated_content=self.file_state.content,
         )
 
-    async def _generate_images(self, args: Dict[str, Any]) -> ToolExecutionResult:
+    async def _generate_images(
+        self, args: Dict[str, Any], deadline: Optional[float] = None
+    ) -> ToolExecutionResult:
         if not self.should_generate_images:
             return ToolExecutionResult(
                 ok=False,
@@ -288,19 +467,37 @@ class AgentToolRuntime:
         api_key = replicate_api_key
         base_url = None
 
-        generated = await process_tasks(unique_prompts, api_key, base_url, model)
-        merged_results = {
-            prompt: url for prompt, url in zip(unique_prompts, generated)
-        }
+        # One task per prompt so the prompts that finish before the deadline
+        # are returned even if others are still running.
+        generated = await gather_until(
+            [
+                process_tasks([prompt], api_key, base_url, model)
+                for prompt in unique_prompts
+            ],
+            deadline,
+            concurrency=REPLICATE_BATCH_SIZE,
+        )
+        merged_results: Dict[str, Optional[str]] = {}
+        timed_out: List[str] = []
+        for prompt, urls in zip(unique_prompts, generated):
+            if isinstance(urls, ToolTimeout):
+                timed_out.append(prompt)
+            merged_results[prompt] = urls[0] if isinstance(urls, list) else None
+        self._record_partial_timeout("generate_images", timed_out, unique_prompts)
         summary_items = [
             {
                 "prompt": prompt,
                 "url": url,
-                "status": "ok" if url else "error",
+                "status": (
+                    "timeout" if prompt in timed_out else "ok" if url else "error"
+                ),
             }
             for prompt, url in merged_results.items()
         ]
-        result = {"images": merged_results}
+        result: Dict[str, Any] = {"images": merged_results}
+        if timed_out:
+            result["timed_out"] = timed_out
+            result["note"] = _timeout_note(deadline)
         summary = {"images": summary_items}
         multimodal_parts = [
             ToolMultimodalPart(
@@ -318,7 +515,22 @@ class AgentToolRuntime:
             multimodal_parts=multimodal_parts,
         )
 
-    async def _remove_background(self, args: Dict[str, Any]) -> ToolExecutionResult:
+    def _record_partial_timeout(
+        self, tool_name: str, timed_out: List[str], requested: List[str]
+    ) -> None:
+        if not timed_out:
+            return
+        print(
+            f"[TOOL DEADLINES] {tool_name}: {len(timed_out)} of "
+            f"{len(requested)} item(s) timed out"
+        )
+        tool_timeout_counters.record_timeout(
+            tool_name, partial=len(timed_out) < len(requested)
+        )
+
+    async def _remove_background(
+        self, args: Dict[str, Any], deadline: Optional[float] = None
+    ) -> ToolExecutionResult:
         replicate_api_key = self._effective_replicate_api_key()
         if not replicate_api_key:
             return ToolExecutionResult(
@@ -346,20 +558,27 @@ class AgentToolRuntime:
                 summary={"error": "No valid image_urls"},
             )
 
-        batch_size = 20
-        raw_results: list[str | BaseException] = []
-        for i in range(0, len(unique_urls), batch_size):
-            batch = unique_urls[i : i + batch_size]
-            # Replicate can't fetch localhost; inline local assets as data URLs.
-            tasks = [
+        # Replicate can't fetch localhost; inline local assets as data URLs.
+        raw_results = await gather_until(
+            [
                 remove_background(local_asset_url_to_data_url(url), replicate_api_key)
-                for url in batch
-            ]
-            raw_results.extend(await asyncio.gather(*tasks, return_exceptions=True))
+                for url in unique_urls
+            ],
+            deadline,
+            concurrency=20,
+        )
+        timed_out = [
+            url for url, raw in zip(unique_urls, raw_results) if isinstance(raw, ToolTimeout)
+        ]
+        self._record_partial_timeout("remove_background", timed_out, unique_urls)
 
         results: List[Dict[str, Any]] = []
         for url, raw in zip(unique_urls, raw_results):
-            if isinstance(raw, BaseException):
+            if isinstance(raw, ToolTimeout):
+                results.append(
+                    {"image_url": url, "result_url": None, "status": "timeout"}
+                )
+            elif isinstance(raw, BaseException):
                 print(f"Background removal failed for {url}: {raw}")
                 results.append(
                     {"image_url": url, "result_url": None, "status": "error"}
@@ -386,9 +605,12 @@ class AgentToolRuntime:
             for index, result in enumerate(results)
             if result["status"] == "ok" and result["result_url"]
         ]
+        result: Dict[str, Any] = {"images": results}
+        if timed_out:
+            result["note"] = _timeout_note(deadline)
         return ToolExecutionResult(
             ok=True,
-            result={"images": results},
+            result=result,
             summary={"images": summary_items},
             multimodal_parts=multimodal_parts,
         )
@@ -547,12 +769,46 @@ class AgentToolRuntime:
                 summary={"error": "Option code unavailable"},
             )
 
-        summary = {
-            "option_number": resolved_index + 1,
+        option_number = resolved_index + 1
+        section = ensure_str(args.get("section")).strip()
+        current = self.file_state.content
+        if section:
+            option_section = find_html_element(code, section)
+            if option_section is None:
+                return ToolExecutionResult(
+                    ok=False,
+                    result={
+                        "error": f"No element with id or tag '{section}' in the option",
+                        "option_number": option_number,
+                    },
+                    summary={"error": "Section not found", "section": section},
+                )
+            code = option_section
+            current = (find_html_element(current, section) or "") if current else ""
+
+        summary: Dict[str, Any] = {
+            "option_number": option_number,
             "contentLength": len(code),
             "preview": summarize_text(code, 200),
         }
-        result = {"option_number": resolved_index + 1, "code": code}
+        result: Dict[str, Any] = {"option_number": option_number}
+        if section:
+            result["section"] = summary["section"] = section
+        if args.get("diff") is True and current:
+            # Only what the option does differently from the current file.
+            diff = "".join(
+                difflib.unified_diff(
+                    current.splitlines(keepends=True),
+                    code.splitlines(keepends=True),
+                    fromfile="current",
+                    tofile=f"option_{option_number}",
+                    n=OPTION_DIFF_CONTEXT_LINES,
+                )
+            )
+            result["diff"] = diff or "(no differences)"
+            summary["diffLength"] = len(diff)
+        else:
+            result["code"] = code
         return ToolExecutionResult(ok=True, result=result, summary=summary)
 
 
@@ -0,0 +1,79 @@
+"""Concurrent execution of the tool calls in one agent turn.
+
+Tools that read or write the file state (``FILE_STATE_TOOLS``) run one after
+another in call order, so an ``edit_file`` always sees the preceding
+``create_file``, and ``screenshot_preview`` and ``retrieve_option`` (whose
+diffs and sections compare against the current file) see the code as of
+their position in the turn. Every other tool only talks to the network (image
+generation, Replicate, Gemini, the asset store) or reads request-constant
+data, so it starts right away alongside the file-state chain.
+
+``SPECULATIVE_TOOLS`` go one step further: they have no side effects the
+model could observe other than their result, so the engine starts them as
+soon as their arguments finish streaming, while the model is still decoding
+the rest of the turn.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, List, TypeVar
+
+from agent.tools.types import ToolCall
+
+T = TypeVar("T")
+
+FILE_STATE_TOOLS = frozenset(
+    {"create_file", "edit_file", "screenshot_preview", "retrieve_option"}
+)
+SPECULATIVE_TOOLS = frozenset(
+    {"generate_images", "extract_assets", "remove_background", "edit_image"}
+)
+
+
+def touches_file_state(tool_call: ToolCall) -> bool:
+    return tool_call.name in FILE_STATE_TOOLS
+
+
+def schedule_tool_calls(
+    tool_calls: List[ToolCall],
+    run: Callable[[int, ToolCall], Awaitable[T]],
+) -> List["asyncio.Task[T]"]:
+    """Start every call and return their tasks in call order.
+
+    ``run`` receives the call's index. A file-state call starts once the
+    previous one has finished; if that one failed, it fails the same way.
+    """
+    tasks: List["asyncio.Task[T]"] = []
+    previous_file_task: "asyncio.Task[T] | None" = None
+    for index, tool_call in enumerate(tool_calls):
+        if touches_file_state(tool_call):
+            task = asyncio.create_task(
+                _run_after(previous_file_task, run, index, tool_call)
+            )
+            previous_file_task = task
+        else:
+            task = asyncio.create_task(_run_now(run, index, tool_call))
+        tasks.append(task)
+    return tasks
+
+
+async def _run_now(
+    run: Callable[[int, ToolCall], Awaitable[T]], index: int, tool_call: ToolCall
+) -> T:
+    return await run(index, tool_call)
+
+
+async def _run_after(
+    previous: "asyncio.Task[T] | None",
+    run: Callable[[int, ToolCall], Awaitable[T]],
+    index: int,
+    tool_call: ToolCall,
+) -> T:
+    if previous is not None:
+        await previous
+    return await run(index, tool_call)
+
+
+async def cancel_pending(tasks: List["asyncio.Task[T]"]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -440,3 +440,124 @@ async def extract_assets_from_images(
         )
 
     return result
+
+
+class PageSection(BaseModel):
+    label: str = Field(
+        description="A short name for the section, such as 'navigation bar' or 'pricing'."
+    )
+    box_2d: list[float] = Field(
+        description=(
+            "[ymin, xmin, ymax, xmax] of the whole section normalized to 0-1000."
+        ),
+        min_length=4,
+        max_length=4,
+    )
+
+
+class PageSectionPlan(BaseModel):
+    sections: list[PageSection] = Field(
+        description="The page's sections from top to bottom, covering the whole page."
+    )
+
+
+PAGE_SECTION_SYSTEM_INSTRUCTION = """You split screenshots of web pages into their top-level layout sections.
+Return only one schema-valid JSON object. Never return markdown fences or prose.
+"""
+
+# Bands thinner than this (on the 0-1000 scale) are merged into the previous one.
+MIN_SECTION_HEIGHT = 40.0
+
+
+def _build_section_prompt(max_sections: int) -> str:
+    return f"""Split the attached web page screenshot into at most {max_sections} top-level sections, from top to bottom (for example: navigation, hero, features, testimonials, pricing, footer).
+
+RULES:
+- Sections are full-width horizontal bands that do not overlap and together cover the whole page.
+- Never cut through text, an image, a card or any other element; cut in the whitespace or on the background change between sections.
+- Group small neighbouring bands together rather than returning tiny sections.
+- Return a single section if the page has no clear sections.
+"""
+
+
+def _section_bands(
+    sections: Sequence[PageSection], max_sections: int
+) -> list[tuple[str, float, float]]:
+    """Turn the model's boxes into ordered, non-overlapping full-width bands
+    that cover the page from 0 to 1000."""
+    boxes: list[tuple[float, float, str]] = []
+    for section in sections:
+        box = _normalize_box(section.box_2d)
+        if box is not None:
+            boxes.append((box[0], box[2], section.label))
+    boxes.sort()
+
+    bands: list[tuple[str, float, float]] = []
+    for index, (_, ymax, label) in enumerate(boxes[:max_sections]):
+        top = bands[-1][2] if bands else 0.0
+        bottom = 1000.0 if index == min(len(boxes), max_sections) - 1 else ymax
+        if bottom - top < MIN_SECTION_HEIGHT:
+            if bands:
+                previous_label, previous_top, _ = bands[-1]
+                bands[-1] = (previous_label, previous_top, max(bottom, top))
+            continue
+        bands.append((label, top, bottom))
+    return bands
+
+
+async def detect_page_sections(
+    image_data_url: str,
+    gemini_api_key: str,
+    max_sections: int,
+) -> List[Dict[str, Any]]:
+    """Split a page screenshot into top-to-bottom sections with Gemini.
+
+    Returns ``{"label", "box_2d", "data_url"}`` per section, where the crop is
+    a full-width band of the screenshot. An empty list means the screenshot
+    couldn't be split.
+    """
+    source = _data_url_to_source_image(image_data_url)
+    if source is None:
+        return []
+
+    client = genai.Client(
+        api_key=gemini_api_key,
+        http_options=types.HttpOptions(api_version="v1alpha"),
+    )
+    response = await client.aio.models.generate_content(
+        model=ASSET_EXTRACTION_GEMINI_MODEL,
+        contents=[
+            types.Content(
+                role="user",
+                parts=[source.part, types.Part(text=_build_section_prompt(max_sections))],
+            )
+        ],
+        config=types.GenerateContentConfig(
+            system_instruction=PAGE_SECTION_SYSTEM_INSTRUCTION,
+            temperature=0.5,
+            response_mime_type="application/json",
+            response_schema=PageSectionPlan,
+            thinking_config=types.ThinkingConfig(
+                thinking_level=types.ThinkingLevel.MINIMAL
+            ),
+        ),
+    )
+    try:
+        parsed = response.parsed
+        if isinstance(parsed, PageSectionPlan):
+            plan = parsed
+        elif parsed is not None:
+            plan = PageSectionPlan.model_validate(parsed)
+        else:
+            plan = PageSectionPlan.model_validate_json(response.text or "")
+    except (ValidationError, TypeError, ValueError):
+        return []
+
+    sections: List[Dict[str, Any]] = []
+    for label, top, bottom in _section_bands(plan.sections, max_sections):
+        box = [top, 0.0, bottom, 1000.0]
+        data_url = _crop_box_to_data_url(source.image, box)
+        if data_url is None:
+            return []
+        sections.append({"label": label, "box_2d": box, "data_url": data_url})
+    return sections
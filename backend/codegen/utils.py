@@ -1,33 +1,143 @@
 import re
 
 
+# Markdown fences. Both patterns are anchored and free of nested lazy groups,
+# so they already run in linear time.
+_FENCE_OPEN_RE = re.compile(r"^```html?\s*\n?", re.MULTILINE)
+_FENCE_CLOSE_RE = re.compile(r"\n?```\s*$", re.MULTILINE)
+
+# Case-insensitive literals. Searching for a plain literal is linear, and
+# re.IGNORECASE keeps the old patterns' Unicode case folding.
+_FILE_OPEN_RE = re.compile(r"<file", re.IGNORECASE)
+_FILE_PATH_RE = re.compile(r'path="', re.IGNORECASE)
+_FILE_CLOSE_RE = re.compile(r"</file>", re.IGNORECASE)
+_DOCTYPE_RE = re.compile(r"<!DOCTYPE", re.IGNORECASE)
+_DOCTYPE_HTML_RE = re.compile(r"html", re.IGNORECASE)
+_HTML_TAGS = (re.compile(r"<html", re.IGNORECASE), re.compile(r"</html>", re.IGNORECASE))
+# Unlike the doctype search, the bare <html> fallback is case-sensitive.
+_HTML_TAGS_CASED = (re.compile(r"<html"), re.compile(r"</html>"))
+
+
+def _skip_whitespace(text: str, position: int) -> int:
+    while position < len(text) and text[position].isspace():
+        position += 1
+    return position
+
+
+def _file_tag_body(text: str) -> str | None:
+    """Stripped body of the first ``<file path="...">...</file>``.
+
+    Each step only searches forward from the previous one, and a later
+    opening tag can never succeed where an earlier one ran out of text, so
+    the scan is linear.
+    """
+    search_from = 0
+    while True:
+        opening = _FILE_OPEN_RE.search(text, search_from)
+        if opening is None:
+            return None
+        start = opening.start()
+        search_from = start + 1
+        path = _skip_whitespace(text, start + 5)
+        if path == start + 5 or not _FILE_PATH_RE.match(text, path):
+            continue
+        quote = text.find('"', path + 6)
+        if quote == -1:
+            return None
+        if quote == path + 6 or not text.startswith(">", quote + 1):
+            continue
+        close = _FILE_CLOSE_RE.search(text, quote + 2)
+        if close is None:
+            return None
+        return text[quote + 2 : close.start()].strip()
+
+
+def _html_document(
+    text: str, start: int, tags: tuple[re.Pattern[str], re.Pattern[str]] = _HTML_TAGS
+) -> tuple[int, int] | None:
+    """Span of the first ``<html ...>...</html>`` that starts at or after
+    ``start``."""
+    html_open, html_close = tags
+    html = html_open.search(text, start)
+    if html is None:
+        return None
+    tag_end = text.find(">", html.end())
+    if tag_end == -1:
+        return None
+    close = html_close.search(text, tag_end + 1)
+    return None if close is None else (html.start(), close.end())
+
+
+def _doctype_document(text: str) -> str | None:
+    search_from = 0
+    while True:
+        doctype = _DOCTYPE_RE.search(text, search_from)
+        if doctype is None:
+            return None
+        start = doctype.start()
+        search_from = start + 1
+        html = _skip_whitespace(text, start + 9)
+        if html == start + 9 or not _DOCTYPE_HTML_RE.match(text, html):
+            continue
+        doctype_end = text.find(">", html + 4)
+        if doctype_end == -1:
+            return None
+        document = _html_document(text, doctype_end + 1)
+        return None if document is None else text[start : document[1]]
+
+
 def extract_html_content(text: str) -> str:
-    file_match = re.search(
-        r"<file\s+path=\"[^\"]+\">\s*(.*?)\s*</file>",
-        text,
-        re.DOTALL | re.IGNORECASE,
-    )
-    if file_match:
-        return extract_html_content(file_match.group(1).strip())
-
-    # First, strip markdown code fences if present
-    text = re.sub(r'^```html?\s*\n?', '', text, flags=re.MULTILINE)
-    text = re.sub(r'\n?```\s*$', '', text, flags=re.MULTILINE)
-
-    # Try to find DOCTYPE + html tags together
-    match_with_doctype = re.search(
-        r"(<!DOCTYPE\s+html[^>]*>.*?<html.*?>.*?</html>)", text, re.DOTALL | re.IGNORECASE
-    )
-    if match_with_doctype:
-        return match_with_doctype.group(1)
-
-    # Fall back to just <html> tags
-    match = re.search(r"(<html.*?>.*?</html>)", text, re.DOTALL)
-    if match:
-        return match.group(1)
-    else:
-        # Otherwise, we just send the previous HTML over
-        print(
-            "[HTML Extraction] No <html> tags found in the generated content"
-        )
-        return text
+    """The HTML document in a model's output.
+
+    Unwraps ``<file path="...">`` tags and markdown fences, then returns the
+    first ``<!DOCTYPE html>...</html>`` document, else the first
+    ``<html>...</html>``, else the text as is. Scans in linear time.
+    """
+    body = _file_tag_body(text)
+    while body is not None:
+        text = body
+        body = _file_tag_body(text)
+
+    if "```" in text:
+        text = _FENCE_OPEN_RE.sub("", text)
+        text = _FENCE_CLOSE_RE.sub("", text)
+
+    document = _doctype_document(text)
+    if document is not None:
+        return document
+
+    document = _html_document(text, 0, _HTML_TAGS_CASED)
+    if document is not None:
+        return text[document[0] : document[1]]
+
+    # Otherwise, we just send the previous HTML over
+    print("[HTML Extraction] No <html> tags found in the generated content")
+    return text
+
+
+VOID_ELEMENTS = frozenset(
+    {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+)
+
+
+def find_html_element(html: str, name: str) -> str | None:
+    """Outer HTML of the element with id ``name``, or else of the first
+    ``<name>`` element; None if there is neither."""
+    opening = re.search(
+        rf"<([a-zA-Z][\w-]*)\b[^>]*\bid\s*=\s*[\"']{re.escape(name)}[\"'][^>]*>", html
+    ) or re.search(rf"<({re.escape(name)})\b[^>]*>", html, re.IGNORECASE)
+    if opening is None:
+        return None
+    tag = opening.group(1).lower()
+    if tag in VOID_ELEMENTS or opening.group(0).endswith("/>"):
+        return opening.group(0)
+
+    depth = 0
+    start = opening.start()
+    for match in re.compile(rf"<(/?){re.escape(tag)}\b[^>]*>", re.IGNORECASE).finditer(
+        html, start
+    ):
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return html[start : match.end()]
+    return html[start:]
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 NUM_VARIANTS = 4
 NUM_VARIANTS_VIDEO = 2
@@ -31,3 +32,150 @@ LOCAL_ASSET_BASE_URL = os.environ.get("LOCAL_ASSET_BASE_URL", "http://127.0.0.1:
 # Set to True when running in production (on the hosted version)
 # Used as a feature flag to enable or disable certain features
 IS_PROD = os.environ.get("IS_PROD", False)
+
+# Admission control: process-wide caps on concurrent provider sessions.
+# Overrides are comma-separated "name=limit" pairs, e.g.
+# ADMISSION_PROVIDER_LIMITS="openai=8,anthropic=4" and
+# ADMISSION_MODEL_LIMITS="claude-opus-4-8 (high effort)=2".
+ADMISSION_DEFAULT_PROVIDER_LIMIT = int(
+    os.environ.get("ADMISSION_DEFAULT_PROVIDER_LIMIT", "16")
+)
+ADMISSION_PROVIDER_LIMITS = os.environ.get("ADMISSION_PROVIDER_LIMITS", "")
+ADMISSION_MODEL_LIMITS = os.environ.get("ADMISSION_MODEL_LIMITS", "")
+# Maximum queued sessions before new ones are rejected (0 = unbounded).
+ADMISSION_MAX_QUEUED = int(os.environ.get("ADMISSION_MAX_QUEUED", "200"))
+
+# Resumable generation sessions (clients opt in with `resumable: true`).
+# A detached session keeps generating and stays resumable for this long.
+SESSION_RESUME_TTL_SECONDS = float(os.environ.get("SESSION_RESUME_TTL_SECONDS", "120"))
+SESSION_MAX_SESSIONS = int(os.environ.get("SESSION_MAX_SESSIONS", "200"))
+SESSION_EVENT_LOG_MAX_EVENTS = int(
+    os.environ.get("SESSION_EVENT_LOG_MAX_EVENTS", "20000")
+)
+SESSION_EVENT_LOG_MAX_BYTES = int(
+    os.environ.get("SESSION_EVENT_LOG_MAX_BYTES", str(16 * 1024 * 1024))
+)
+
+# Out-of-band media uploads (POST /api/media), referenced as media IDs in params.
+MEDIA_UPLOAD_DIR = os.environ.get(
+    "MEDIA_UPLOAD_DIR",
+    os.path.join(tempfile.gettempdir(), "screenshot-to-code-media"),
+)
+MEDIA_UPLOAD_MAX_BYTES = int(
+    os.environ.get("MEDIA_UPLOAD_MAX_BYTES", str(200 * 1024 * 1024))
+)
+# Uploads unused this long are deleted, and the least recently used ones go
+# first once the store holds more than MEDIA_UPLOAD_MAX_TOTAL_BYTES.
+MEDIA_UPLOAD_TTL_SECONDS = float(os.environ.get("MEDIA_UPLOAD_TTL_SECONDS", "86400"))
+MEDIA_UPLOAD_MAX_TOTAL_BYTES = int(
+    os.environ.get("MEDIA_UPLOAD_MAX_TOTAL_BYTES", str(2 * 1024 * 1024 * 1024))
+)
+
+# Server-side conversation store (clients opt in with `conversation: true`).
+CONVERSATION_STORE_MAX_CONVERSATIONS = int(
+    os.environ.get("CONVERSATION_STORE_MAX_CONVERSATIONS", "500")
+)
+CONVERSATION_STORE_MAX_COMMITS = int(
+    os.environ.get("CONVERSATION_STORE_MAX_COMMITS", "200")
+)
+# Total size of stored turns (text, data URLs, variant code) across conversations.
+CONVERSATION_STORE_MAX_BYTES = int(
+    os.environ.get("CONVERSATION_STORE_MAX_BYTES", str(256 * 1024 * 1024))
+)
+
+# Generation jobs. "" / "inline" runs generation in the socket handler;
+# "memory" queues jobs in-process; "sqlite" shares a job database with
+# standalone workers (`python -m jobs.worker`).
+GENERATION_JOB_BACKEND = os.environ.get("GENERATION_JOB_BACKEND", "")
+# Created owner-only (0600) in an owner-only directory.
+GENERATION_JOB_DB_PATH = os.environ.get(
+    "GENERATION_JOB_DB_PATH",
+    os.path.join(tempfile.gettempdir(), "screenshot-to-code-jobs", "jobs.sqlite3"),
+)
+# Workers this process runs when jobs are enabled (0 = front-end only).
+GENERATION_JOB_WORKERS = int(os.environ.get("GENERATION_JOB_WORKERS", "4"))
+# How long the SQLite backend keeps a finished job and its outcome.
+GENERATION_JOB_RETENTION_SECONDS = float(
+    os.environ.get("GENERATION_JOB_RETENTION_SECONDS", "3600")
+)
+
+# Per-variant agent budgets (0 = unlimited). A request's `budget` param can
+# tighten these but not loosen them.
+VARIANT_MAX_SECONDS = float(os.environ.get("VARIANT_MAX_SECONDS", "0"))
+VARIANT_MAX_OUTPUT_TOKENS = int(os.environ.get("VARIANT_MAX_OUTPUT_TOKENS", "0"))
+VARIANT_MAX_COST_USD = float(os.environ.get("VARIANT_MAX_COST_USD", "0"))
+VARIANT_MAX_STEPS = int(os.environ.get("VARIANT_MAX_STEPS", "20"))
+# Share of any budget after which expensive tools are no longer offered.
+VARIANT_BUDGET_WIND_DOWN_AT = float(os.environ.get("VARIANT_BUDGET_WIND_DOWN_AT", "0.8"))
+
+# Context compaction in agent sessions: older screenshot_preview images and
+# edit_file diffs are replaced with short stubs. History is only rewritten
+# once at least CONTEXT_COMPACTION_MIN_RECLAIM_BYTES can be dropped, since each
+# rewrite costs one provider prompt-cache miss.
+CONTEXT_COMPACTION_ENABLED = os.environ.get("CONTEXT_COMPACTION_ENABLED", "true").lower() != "false"
+CONTEXT_COMPACTION_KEEP_PREVIEW_IMAGES = int(
+    os.environ.get("CONTEXT_COMPACTION_KEEP_PREVIEW_IMAGES", "2")
+)
+CONTEXT_COMPACTION_KEEP_DIFFS = int(os.environ.get("CONTEXT_COMPACTION_KEEP_DIFFS", "2"))
+CONTEXT_COMPACTION_MIN_RECLAIM_BYTES = int(
+    os.environ.get("CONTEXT_COMPACTION_MIN_RECLAIM_BYTES", str(256 * 1024))
+)
+
+# Apply edit_file edits to a shadow copy of the file and push them to the
+# client as each one finishes streaming, before the turn completes.
+LIVE_EDIT_PREVIEW_ENABLED = (
+    os.environ.get("LIVE_EDIT_PREVIEW_ENABLED", "true").lower() != "false"
+)
+
+# Opt-in section-wise generation (`sectionedGeneration: true`): the most
+# sections a screenshot is split into for parallel sub-agents.
+SECTIONED_GENERATION_MAX_SECTIONS = int(
+    os.environ.get("SECTIONED_GENERATION_MAX_SECTIONS", "6")
+)
+
+# Per-tool deadlines for agent tool calls, overriding the defaults in
+# agent/tools/deadlines.py: TOOL_DEADLINES="generate_images=60,screenshot_preview=30"
+# (seconds, 0 = no deadline).
+TOOL_DEADLINES = os.environ.get("TOOL_DEADLINES", "")
+
+# Gemini context caching: the system prompt, tools and screenshot shared by a
+# request's Gemini variants go in one explicit CachedContent. Caches are
+# billed per hour stored: the last variant using one deletes it, and any
+# left behind expire after GEMINI_CONTEXT_CACHE_TTL_SECONDS.
+GEMINI_CONTEXT_CACHE_ENABLED = (
+    os.environ.get("GEMINI_CONTEXT_CACHE_ENABLED", "true").lower() != "false"
+)
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(
+    os.environ.get("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "600")
+)
+
+# Chain OpenAI agent turns with the Responses API's previous_response_id and
+# send only the new tool outputs, instead of re-uploading the whole input
+# (screenshots included) every turn. Needs stored responses (the default);
+# falls back to the full input if the stored response has expired.
+OPENAI_PREVIOUS_RESPONSE_ID_ENABLED = (
+    os.environ.get("OPENAI_PREVIOUS_RESPONSE_ID_ENABLED", "false").lower() == "true"
+)
+
+# Provider SDK clients are pooled per provider, API key and base URL and share
+# keep-alive connections (HTTP/2 when the h2 package is installed). Clients
+# unused for PROVIDER_CLIENT_IDLE_SECONDS are dropped.
+PROVIDER_HTTP_MAX_CONNECTIONS = int(os.environ.get("PROVIDER_HTTP_MAX_CONNECTIONS", "100"))
+PROVIDER_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get("PROVIDER_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+PROVIDER_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(
+    os.environ.get("PROVIDER_HTTP_KEEPALIVE_EXPIRY_SECONDS", "120")
+)
+PROVIDER_HTTP_CONNECT_TIMEOUT_SECONDS = float(
+    os.environ.get("PROVIDER_HTTP_CONNECT_TIMEOUT_SECONDS", "10")
+)
+PROVIDER_HTTP_READ_TIMEOUT_SECONDS = float(
+    os.environ.get("PROVIDER_HTTP_READ_TIMEOUT_SECONDS", "600")
+)
+PROVIDER_HTTP2_ENABLED = os.environ.get("PROVIDER_HTTP2_ENABLED", "true").lower() != "false"
+PROVIDER_CLIENT_IDLE_SECONDS = float(os.environ.get("PROVIDER_CLIENT_IDLE_SECONDS", "900"))
+# Open connections to the providers with server-side keys at startup.
+PROVIDER_CLIENT_WARMUP_ENABLED = (
+    os.environ.get("PROVIDER_CLIENT_WARMUP_ENABLED", "true").lower() != "false"
+)
@@ -0,0 +1,216 @@
+"""Server-side conversation history, so update requests only send the new turn.
+
+Without this, every update resends the selected variant's whole history
+(including every earlier screenshot), all option codes and the file snapshot.
+With it, a client starts a conversation by sending ``conversation: true``; after
+each generation the server records a commit and tells the client its ID in a
+``commit`` message. An update then only sends the new instruction plus
+``conversationId``, ``parentCommitId`` and ``selectedVariantIndex``, and the
+server fills in ``history``, ``optionCodes`` and ``fileState``.
+
+A commit stores only its own user turn and variant codes, plus which commit
+and variant it was built on. A variant's history is rebuilt by walking that
+chain, so storage grows with the number of turns rather than quadratically.
+Besides the conversation and commit counts, the store keeps a total-bytes
+budget (screenshots are stored as data URLs) and evicts least recently used
+conversations to stay within it.
+It mirrors how the frontend builds per-variant history: the user turn, then
+the variant's code as the assistant turn when it produced any.
+"""
+
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from config import (
+    CONVERSATION_STORE_MAX_BYTES,
+    CONVERSATION_STORE_MAX_COMMITS,
+    CONVERSATION_STORE_MAX_CONVERSATIONS,
+)
+from prompts.prompt_types import PromptHistoryMessage
+
+
+class UnknownCommitError(ValueError):
+    """The referenced conversation, commit or variant isn't in the store."""
+
+
+@dataclass(frozen=True)
+class ConversationCommit:
+    commit_id: str
+    conversation_id: str
+    parent_commit_id: str | None
+    parent_variant_index: int | None
+    user_turn: PromptHistoryMessage
+    variant_codes: Tuple[str, ...]
+    created_at: float = field(default_factory=time.time)
+
+
+@dataclass(frozen=True)
+class ConversationState:
+    """What an update request built on a stored commit would have sent."""
+
+    history: List[PromptHistoryMessage]
+    option_codes: List[str]
+    file_state: Dict[str, str] | None
+
+
+def _new_id() -> str:
+    return secrets.token_urlsafe(12)
+
+
+def _commit_size(user_turn: PromptHistoryMessage, variant_codes: List[str]) -> int:
+    return (
+        len(user_turn["text"])
+        + sum(len(item) for item in user_turn["images"])
+        + sum(len(item) for item in user_turn["videos"])
+        + sum(len(code) for code in variant_codes)
+    )
+
+
+class ConversationStore:
+    def __init__(
+        self,
+        max_conversations: int = 500,
+        max_commits: int = 200,
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.max_conversations = max_conversations
+        self.max_commits = max_commits
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # conversation_id -> commit_id -> commit; least recently used first.
+        self._conversations: "OrderedDict[str, Dict[str, ConversationCommit]]" = (
+            OrderedDict()
+        )
+        self._conversation_bytes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def start_conversation(self) -> str:
+        conversation_id = _new_id()
+        self._conversations[conversation_id] = {}
+        self._conversation_bytes[conversation_id] = 0
+        while len(self._conversations) > self.max_conversations:
+            self._evict_oldest()
+        return conversation_id
+
+    def add_commit(
+        self,
+        conversation_id: str,
+        user_turn: PromptHistoryMessage,
+        variant_codes: List[str],
+        parent_commit_id: str | None = None,
+        parent_variant_index: int | None = None,
+    ) -> ConversationCommit:
+        commits = self._commits(conversation_id)
+        if parent_commit_id is not None:
+            self._variant_code(commits, parent_commit_id, parent_variant_index)
+        if len(commits) >= self.max_commits:
+            raise UnknownCommitError(
+                f"Conversation {conversation_id} has reached {self.max_commits} commits"
+            )
+        size = _commit_size(user_turn, variant_codes)
+        conversation_bytes = self._conversation_bytes[conversation_id]
+        if conversation_bytes + size > self.max_bytes:
+            raise UnknownCommitError(
+                f"Conversation {conversation_id} has reached {self.max_bytes} bytes"
+            )
+        # ``_commits`` made this conversation the most recently used one.
+        while self.total_bytes + size > self.max_bytes:
+            self._evict_oldest()
+        commit = ConversationCommit(
+            commit_id=_new_id(),
+            conversation_id=conversation_id,
+            parent_commit_id=parent_commit_id,
+            parent_variant_index=parent_variant_index,
+            user_turn=user_turn,
+            variant_codes=tuple(variant_codes),
+        )
+        commits[commit.commit_id] = commit
+        self._conversation_bytes[conversation_id] = conversation_bytes + size
+        self.total_bytes += size
+        return commit
+
+    def get_commit(self, conversation_id: str, commit_id: str) -> ConversationCommit:
+        commits = self._commits(conversation_id)
+        commit = commits.get(commit_id)
+        if commit is None:
+            raise UnknownCommitError(f"Unknown commit: {commit_id}")
+        return commit
+
+    def variant_history(
+        self, conversation_id: str, commit_id: str, variant_index: int
+    ) -> List[PromptHistoryMessage]:
+        """The history the given variant of a commit was built from, plus its
+        own turn pair."""
+        commits = self._commits(conversation_id)
+        segments: List[List[PromptHistoryMessage]] = []
+        current_id: str | None = commit_id
+        current_index: int | None = variant_index
+        while current_id is not None:
+            commit = commits.get(current_id)
+            if commit is None:
+                raise UnknownCommitError(f"Unknown commit: {current_id}")
+            code = self._variant_code(commits, current_id, current_index)
+            segment: List[PromptHistoryMessage] = [commit.user_turn]
+            if code.strip():
+                segment.append(
+                    {"role": "assistant", "text": code, "images": [], "videos": []}
+                )
+            segments.append(segment)
+            current_id = commit.parent_commit_id
+            current_index = commit.parent_variant_index
+
+        history: List[PromptHistoryMessage] = []
+        for segment in reversed(segments):
+            history.extend(segment)
+        return history
+
+    def state_for_update(
+        self, conversation_id: str, parent_commit_id: str, variant_index: int
+    ) -> ConversationState:
+        commits = self._commits(conversation_id)
+        code = self._variant_code(commits, parent_commit_id, variant_index)
+        return ConversationState(
+            history=self.variant_history(
+                conversation_id, parent_commit_id, variant_index
+            ),
+            option_codes=list(commits[parent_commit_id].variant_codes),
+            file_state={"path": "index.html", "content": code} if code else None,
+        )
+
+    def _commits(self, conversation_id: str) -> Dict[str, ConversationCommit]:
+        commits = self._conversations.get(conversation_id)
+        if commits is None:
+            raise UnknownCommitError(f"Unknown conversation: {conversation_id}")
+        self._conversations.move_to_end(conversation_id)
+        return commits
+
+    def _evict_oldest(self) -> None:
+        conversation_id, _ = self._conversations.popitem(last=False)
+        self.total_bytes -= self._conversation_bytes.pop(conversation_id)
+
+    def _variant_code(
+        self,
+        commits: Dict[str, ConversationCommit],
+        commit_id: str,
+        variant_index: int | None,
+    ) -> str:
+        commit = commits.get(commit_id)
+        if commit is None:
+            raise UnknownCommitError(f"Unknown commit: {commit_id}")
+        if variant_index is None or not 0 <= variant_index < len(commit.variant_codes):
+            raise UnknownCommitError(
+                f"Commit {commit_id} has no variant {variant_index}"
+            )
+        return commit.variant_codes[variant_index]
+
+
+conversation_store = ConversationStore(
+    max_conversations=CONVERSATION_STORE_MAX_CONVERSATIONS,
+    max_commits=CONVERSATION_STORE_MAX_COMMITS,
+    max_bytes=CONVERSATION_STORE_MAX_BYTES,
+)
@@ -0,0 +1,76 @@
+"""Benchmark for extracting the HTML document from model output.
+
+Run from ``backend``::
+
+    poetry run python -m evals.html_extraction_benchmark
+
+Times ``extract_html_content`` against the regex implementation it replaced
+on generated outputs of a few hundred KB. A complete document costs both
+about the same, but once the closing ``</html>`` is missing (truncated or
+cancelled generations) each regex search rescans the rest of the text from
+every candidate start and the old cost grows quadratically or worse. The
+regex version only runs on the complete output unless ``--include-slow`` is
+passed, which takes minutes beyond a few tens of KB.
+"""
+
+import argparse
+import re
+import time
+from typing import Callable, Dict
+
+from codegen.utils import extract_html_content
+
+def regex_extract_html_content(text: str) -> str:
+    """The previous regex implementation, kept as the reference behavior."""
+    file_match = re.search(
+        r"<file\s+path=\"[^\"]+\">\s*(.*?)\s*</file>",
+        text,
+        re.DOTALL | re.IGNORECASE,
+    )
+    if file_match:
+        return regex_extract_html_content(file_match.group(1).strip())
+    text = re.sub(r"^```html?\s*\n?", "", text, flags=re.MULTILINE)
+    text = re.sub(r"\n?```\s*$", "", text, flags=re.MULTILINE)
+    match_with_doctype = re.search(
+        r"(<!DOCTYPE\s+html[^>]*>.*?<html.*?>.*?</html>)", text, re.DOTALL | re.IGNORECASE
+    )
+    if match_with_doctype:
+        return match_with_doctype.group(1)
+    match = re.search(r"(<html.*?>.*?</html>)", text, re.DOTALL)
+    return match.group(1) if match else text
+
+
+def build_outputs(size: int) -> Dict[str, str]:
+    line = '<div class="card">Café card</div>\n'
+    body = (line * (size // len(line) + 1))[:size]
+    return {
+        "complete": f"```html\n<!DOCTYPE html>\n<html><body>{body}</body></html>\n```",
+        "truncated": f'<file path="index.html">\n<!DOCTYPE html>\n<html><body>{body}',
+        "repeated_openings": ("<!DOCTYPE html><html><body>" * (size // 27 + 1))[:size],
+    }
+
+
+def _time_ms(extract: Callable[[str], str], text: str) -> float:
+    start = time.perf_counter()
+    extract(text)
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=400_000)
+    parser.add_argument("--include-slow", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'output':>18}  {'size':>8}  {'regex ms':>10}  {'scanner ms':>10}")
+    for name, text in build_outputs(args.size).items():
+        scanner_ms = _time_ms(extract_html_content, text)
+        if name == "complete" or args.include_slow:
+            regex_ms = f"{_time_ms(regex_extract_html_content, text):>10.1f}"
+        else:
+            regex_ms = f"{'skipped':>10}"
+        print(f"{name:>18}  {len(text):>8}  {regex_ms}  {scanner_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Microbenchmark for streamed tool-argument parsing.
+
+Run from ``backend``::
+
+    poetry run python -m evals.tool_argument_parsing_benchmark
+
+Streams a ``create_file`` call in provider-sized chunks and reports the
+average cost per delta at increasing offsets into the document, for the old
+approach (re-extract ``content`` from the whole accumulated text on every
+delta) and for ``StreamingToolArguments``. The old cost grows with the offset;
+the incremental parser's should stay flat.
+"""
+
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from typing import Callable, List
+
+from agent.tools.parsing import StreamingToolArguments, extract_content_from_args
+
+
+@dataclass
+class DeltaCost:
+    offset: int
+    rescan_us: float
+    incremental_us: float
+
+
+def build_arguments(size: int) -> str:
+    line = '<div class="card">Café "quoted" \\ text</div>\n'
+    content = (line * (size // len(line) + 1))[:size]
+    return json.dumps({"path": "index.html", "content": content})
+
+
+def _time_per_delta(chunks: List[str], consume: Callable[[int], None]) -> float:
+    start = time.perf_counter()
+    for index in range(len(chunks)):
+        consume(index)
+    return (time.perf_counter() - start) / max(len(chunks), 1) * 1e6
+
+
+def measure(size: int, chunk_size: int = 24, windows: int = 5) -> List[DeltaCost]:
+    raw = build_arguments(size)
+    chunks = [raw[i : i + chunk_size] for i in range(0, len(raw), chunk_size)]
+    window = max(len(chunks) // windows, 1)
+
+    # Old approach: accumulate the text, rescan it all on every delta.
+    accumulated: List[str] = [""]
+    stream = StreamingToolArguments()
+    results: List[DeltaCost] = []
+    for start in range(0, len(chunks), window):
+        batch = chunks[start : start + window]
+
+        def rescan(index: int) -> None:
+            accumulated[0] += batch[index]
+            extract_content_from_args(accumulated[0])
+
+        def incremental(index: int) -> None:
+            stream.feed(batch[index])
+
+        results.append(
+            DeltaCost(
+                offset=start * chunk_size,
+                rescan_us=_time_per_delta(batch, rescan),
+                incremental_us=_time_per_delta(batch, incremental),
+            )
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=50_000)
+    parser.add_argument("--chunk-size", type=int, default=24)
+    args = parser.parse_args()
+
+    print(f"{'offset':>8}  {'rescan us/delta':>16}  {'incremental us/delta':>21}")
+    for row in measure(args.size, args.chunk_size):
+        print(f"{row.offset:>8}  {row.rescan_us:>16.1f}  {row.incremental_us:>21.1f}")
+
+
+if __name__ == "__main__":
+    main()
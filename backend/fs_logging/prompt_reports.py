@@ -86,7 +86,11 @@ class PromptReportLogger:
     _current_report: dict[str, Any] | None = None
     _current_filepath: str | None = None
 
-    def record_request(self, request_payload: Any) -> str | None:
+    def record_request(
+        self,
+        request_payload: Any,
+        tool_result_encoding: dict[str, Any] | None = None,
+    ) -> str | None:
         if not self.enabled:
             return None
 
@@ -103,6 +107,9 @@ class PromptReportLogger:
             "request": to_serializable(request_payload),
             "usage": None,
         }
+        if tool_result_encoding:
+            # Characters/tokens saved by compact tool-result encoding so far.
+            report["tool_result_encoding"] = tool_result_encoding
 
         filename = (
             f"{PROMPT_REPORT_FILENAME_PREFIX}{now.strftime('%Y%m%d_%H%M%S')}"
@@ -73,6 +73,18 @@ async def _poll_prediction(
     raise TimeoutError("Inference timed out")
 
 
+async def _cancel_prediction(
+    client: httpx.AsyncClient, prediction_id: str, headers: dict[str, str]
+) -> None:
+    cancel_url = f"{REPLICATE_API_BASE_URL}/predictions/{prediction_id}/cancel"
+    try:
+        # Shielded so the cancel request itself survives the task cancellation
+        # that triggered it.
+        await asyncio.shield(client.post(cancel_url, headers=headers))
+    except (asyncio.CancelledError, httpx.HTTPError) as exc:
+        print(f"Failed to cancel Replicate prediction {prediction_id}: {exc!r}")
+
+
 async def _run_prediction(
     endpoint_url: str, payload: dict[str, Any], api_token: str
 ) -> Any:
@@ -87,7 +99,13 @@ async def _run_prediction(
                 raise ValueError("Invalid prediction creation response.")
 
             prediction_id = _extract_prediction_id(response_json)
-            final_response = await _poll_prediction(client, prediction_id, headers)
+            try:
+                final_response = await _poll_prediction(client, prediction_id, headers)
+            except (asyncio.CancelledError, TimeoutError):
+                # Nobody will read this prediction's output (the client went
+                # away or we stopped polling), so stop paying for the GPU.
+                await _cancel_prediction(client, prediction_id, headers)
+                raise
             return final_response.get("output")
         except httpx.HTTPStatusError as exc:
             raise ValueError(f"HTTP error occurred: {exc}") from exc
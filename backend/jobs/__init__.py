@@ -0,0 +1,44 @@
+"""Generation jobs: run ``AgenticGenerationStage`` outside the socket handler.
+
+- ``types``    — the job spec, states and records
+- ``backend``  — the ``JobBackend`` interface (queue + event stream)
+- ``memory``   — in-process backend (single process, tests)
+- ``sqlite``   — SQLite backend shared by front-ends and workers on one host
+- ``worker``   — the worker pool (also ``python -m jobs.worker``)
+- ``registry`` — the configured backend and this process's pool
+"""
+
+from jobs.backend import JobBackend, completions_from_terminal_event
+from jobs.memory import InProcessJobBackend
+from jobs.registry import (
+    get_job_backend,
+    set_job_backend,
+    start_job_workers,
+    stop_job_workers,
+)
+from jobs.sqlite import SQLiteJobBackend
+from jobs.types import (
+    JOB_TERMINAL_EVENT_TYPES,
+    ClaimedJob,
+    GenerationJobSpec,
+    JobRecord,
+    JobState,
+)
+from jobs.worker import WorkerPool
+
+__all__ = [
+    "JOB_TERMINAL_EVENT_TYPES",
+    "ClaimedJob",
+    "GenerationJobSpec",
+    "InProcessJobBackend",
+    "JobBackend",
+    "JobRecord",
+    "JobState",
+    "SQLiteJobBackend",
+    "WorkerPool",
+    "completions_from_terminal_event",
+    "get_job_backend",
+    "set_job_backend",
+    "start_job_workers",
+    "stop_job_workers",
+]
@@ -0,0 +1,82 @@
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict
+
+from jobs.types import ClaimedJob, GenerationJobSpec, JobRecord, JobState
+
+
+class JobBackend(ABC):
+    """Queue + event channel connecting socket front-ends and workers.
+
+    Front-ends ``submit`` jobs and read ``events``; workers ``claim`` jobs,
+    ``publish`` their messages and ``finish`` them. Each event is a
+    generate-code message payload with a per-job ``seq``; a job's stream ends
+    with one of ``JOB_TERMINAL_EVENT_TYPES``.
+    """
+
+    @abstractmethod
+    async def submit(self, spec: GenerationJobSpec) -> str:
+        """Queue a job and return its ID."""
+
+    @abstractmethod
+    async def claim(self, worker_id: str, timeout: float) -> ClaimedJob | None:
+        """Take the oldest queued job, waiting up to ``timeout`` seconds."""
+
+    @abstractmethod
+    async def publish(self, job_id: str, payload: Dict[str, Any]) -> None:
+        """Append an event to the job's stream."""
+
+    @abstractmethod
+    def events(self, job_id: str, after_seq: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """Replay events after ``after_seq``, then follow live until the
+        terminal event (inclusive)."""
+
+    @abstractmethod
+    async def finish(
+        self,
+        job_id: str,
+        state: JobState,
+        completions: Dict[int, str] | None = None,
+        error: str | None = None,
+    ) -> None:
+        """Record the outcome and publish the matching terminal event."""
+
+    @abstractmethod
+    async def request_cancel(self, job_id: str) -> None:
+        """Ask the worker running the job (or the queue) to drop it."""
+
+    @abstractmethod
+    async def is_cancel_requested(self, job_id: str) -> bool: ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> JobRecord | None: ...
+
+    async def heartbeat(self, job_id: str) -> None:
+        """Tell the backend the worker running ``job_id`` is still alive."""
+        return None
+
+    async def close(self) -> None:
+        return None
+
+
+def terminal_event(
+    state: JobState, completions: Dict[int, str] | None, error: str | None
+) -> Dict[str, Any]:
+    if state == "completed":
+        return {
+            "type": "jobCompleted",
+            "variantIndex": 0,
+            "data": {
+                "completions": {
+                    str(index): code for index, code in (completions or {}).items()
+                }
+            },
+        }
+    if state == "failed":
+        return {"type": "jobFailed", "variantIndex": 0, "value": error or "Job failed"}
+    return {"type": "jobCancelled", "variantIndex": 0, "value": error or "Job cancelled"}
+
+
+def completions_from_terminal_event(event: Dict[str, Any]) -> Dict[int, str]:
+    data = event.get("data") or {}
+    raw = data.get("completions") or {}
+    return {int(index): code for index, code in raw.items()}
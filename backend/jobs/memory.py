@@ -0,0 +1,157 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, List, Tuple
+
+from jobs.backend import JobBackend, terminal_event
+from jobs.types import (
+    JOB_TERMINAL_EVENT_TYPES,
+    TERMINAL_JOB_STATES,
+    ClaimedJob,
+    GenerationJobSpec,
+    JobRecord,
+    JobState,
+)
+
+
+@dataclass
+class _MemoryJob:
+    spec: GenerationJobSpec
+    state: JobState = "queued"
+    worker_id: str | None = None
+    cancel_requested: bool = False
+    completions: Dict[int, str] = field(default_factory=dict)
+    error: str | None = None
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    # Events dropped from the front of ``events`` once the job finished.
+    dropped_events: int = 0
+
+    @property
+    def event_count(self) -> int:
+        return self.dropped_events + len(self.events)
+
+
+class InProcessJobBackend(JobBackend):
+    """Jobs, queue and event streams in this process's memory.
+
+    Front-ends and workers must share the process (and event loop). Finished
+    jobs are kept for ``retain_finished`` more jobs so late subscribers can
+    still read the outcome; ``event_grace_seconds`` after finishing, only
+    their terminal event (which carries the completions) is kept.
+    """
+
+    def __init__(self, retain_finished: int = 200, event_grace_seconds: float = 60.0):
+        self.retain_finished = retain_finished
+        self.event_grace_seconds = event_grace_seconds
+        self._jobs: Dict[str, _MemoryJob] = {}
+        self._queue: Deque[str] = deque()
+        self._finished: Deque[str] = deque()
+        # (finished at, job ID) of finished jobs whose events aren't dropped yet.
+        self._uncompacted: Deque[Tuple[float, str]] = deque()
+        self._changed = asyncio.Condition()
+
+    async def submit(self, spec: GenerationJobSpec) -> str:
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = _MemoryJob(spec=spec)
+        async with self._changed:
+            self._queue.append(job_id)
+            self._changed.notify_all()
+        return job_id
+
+    async def claim(self, worker_id: str, timeout: float) -> ClaimedJob | None:
+        async with self._changed:
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: bool(self._queue)), timeout
+                )
+            except asyncio.TimeoutError:
+                return None
+            job_id = self._queue.popleft()
+        job = self._jobs[job_id]
+        job.state = "running"
+        job.worker_id = worker_id
+        return ClaimedJob(job_id=job_id, spec=job.spec)
+
+    async def publish(self, job_id: str, payload: Dict[str, Any]) -> None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        async with self._changed:
+            job.events.append({**payload, "seq": job.event_count + 1})
+            self._changed.notify_all()
+
+    async def events(
+        self, job_id: str, after_seq: int = 0
+    ) -> AsyncIterator[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        index = max(after_seq, 0)
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: job.event_count > index)
+                batch = job.events[max(index - job.dropped_events, 0) :]
+            index = job.event_count
+            for event in batch:
+                yield event
+                if event["type"] in JOB_TERMINAL_EVENT_TYPES:
+                    return
+
+    async def finish(
+        self,
+        job_id: str,
+        state: JobState,
+        completions: Dict[int, str] | None = None,
+        error: str | None = None,
+    ) -> None:
+        job = self._jobs.get(job_id)
+        if job is None or job.state in TERMINAL_JOB_STATES:
+            return
+        job.state = state
+        job.completions = dict(completions or {})
+        job.error = error
+        # Drop the prompt (and API keys) now that nobody needs them.
+        job.spec = GenerationJobSpec(
+            variant_models=job.spec.variant_models, prompt_messages=[]
+        )
+        await self.publish(job_id, terminal_event(state, completions, error))
+        now = time.monotonic()
+        self._finished.append(job_id)
+        self._uncompacted.append((now, job_id))
+        while len(self._finished) > self.retain_finished:
+            self._jobs.pop(self._finished.popleft(), None)
+        grace = self.event_grace_seconds
+        while self._uncompacted and now - self._uncompacted[0][0] >= grace:
+            finished = self._jobs.get(self._uncompacted.popleft()[1])
+            if finished is not None and len(finished.events) > 1:
+                finished.dropped_events += len(finished.events) - 1
+                finished.events = finished.events[-1:]
+
+    async def request_cancel(self, job_id: str) -> None:
+        job = self._jobs.get(job_id)
+        if job is None or job.state in TERMINAL_JOB_STATES:
+            return
+        job.cancel_requested = True
+        if job.state == "queued":
+            async with self._changed:
+                if job_id in self._queue:
+                    self._queue.remove(job_id)
+            await self.finish(job_id, "cancelled")
+
+    async def is_cancel_requested(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        return job is None or job.cancel_requested
+
+    async def get(self, job_id: str) -> JobRecord | None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return JobRecord(
+            job_id=job_id,
+            state=job.state,
+            worker_id=job.worker_id,
+            completions=dict(job.completions),
+            error=job.error,
+        )
@@ -0,0 +1,62 @@
+from config import (
+    GENERATION_JOB_BACKEND,
+    GENERATION_JOB_DB_PATH,
+    GENERATION_JOB_RETENTION_SECONDS,
+    GENERATION_JOB_WORKERS,
+)
+from jobs.backend import JobBackend
+from jobs.worker import WorkerPool
+
+# None = generate inline in the socket handler (the default). Built lazily from
+# GENERATION_JOB_BACKEND; a deployment can install its own via set_job_backend.
+_backend: JobBackend | None = None
+_configured = False
+_pool: WorkerPool | None = None
+
+
+def _backend_from_config() -> JobBackend | None:
+    kind = GENERATION_JOB_BACKEND.strip().lower()
+    if kind in ("", "inline"):
+        return None
+    if kind == "memory":
+        from jobs.memory import InProcessJobBackend
+
+        return InProcessJobBackend()
+    if kind == "sqlite":
+        from jobs.sqlite import SQLiteJobBackend
+
+        return SQLiteJobBackend(
+            GENERATION_JOB_DB_PATH, retention_seconds=GENERATION_JOB_RETENTION_SECONDS
+        )
+    raise ValueError(f"Unknown GENERATION_JOB_BACKEND: {GENERATION_JOB_BACKEND}")
+
+
+def set_job_backend(backend: JobBackend | None) -> None:
+    global _backend, _configured
+    _backend = backend
+    _configured = True
+
+
+def get_job_backend() -> JobBackend | None:
+    global _backend, _configured
+    if not _configured:
+        _backend = _backend_from_config()
+        _configured = True
+    return _backend
+
+
+async def start_job_workers() -> None:
+    """Start this process's worker pool, if jobs are enabled and sized > 0."""
+    global _pool
+    backend = get_job_backend()
+    if backend is None or GENERATION_JOB_WORKERS <= 0 or _pool is not None:
+        return
+    _pool = WorkerPool(backend, GENERATION_JOB_WORKERS)
+    _pool.start()
+
+
+async def stop_job_workers() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.stop()
+        _pool = None
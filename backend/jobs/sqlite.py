@@ -0,0 +1,385 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple, TypeVar
+
+from jobs.backend import JobBackend, terminal_event
+from jobs.types import (
+    JOB_TERMINAL_EVENT_TYPES,
+    TERMINAL_JOB_STATES,
+    ClaimedJob,
+    GenerationJobSpec,
+    JobRecord,
+    JobState,
+)
+
+T = TypeVar("T")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    worker_id TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    completions TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    heartbeat_at REAL,
+    event_seq INTEGER NOT NULL DEFAULT 0,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (state, created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+# Columns added since the first version of the schema.
+MIGRATIONS = {
+    "event_seq": "ALTER TABLE jobs ADD COLUMN event_seq INTEGER NOT NULL DEFAULT 0",
+    "finished_at": "ALTER TABLE jobs ADD COLUMN finished_at REAL",
+}
+
+
+def _create_private_file(path: str) -> None:
+    """Create ``path`` readable only by this user, in a directory that is
+    too. SQLite gives its WAL and shared-memory files the same mode."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+    os.chmod(path, 0o600)
+
+
+class SQLiteJobBackend(JobBackend):
+    """Jobs and event streams in a SQLite file shared by several processes.
+
+    Socket front-ends and ``python -m jobs.worker`` processes on one host can
+    point at the same file. Waiting for jobs and events is done by polling
+    every ``poll_interval`` seconds. A running job whose worker hasn't
+    heartbeated for ``lease_seconds`` (e.g. it was restarted) goes back on the
+    queue with its events cleared and is picked up by another worker.
+
+    The process running a job numbers its events in memory and writes them in
+    batches: whatever is published while one write is in flight goes into the
+    next. ``event_seq`` keeps numbering monotonic across reruns, so a follower
+    continues with the rerun's events. ``event_grace_seconds`` after a job
+    finishes only its terminal event (which carries the completions) is kept,
+    and ``retention_seconds`` after it the job is deleted.
+
+    API keys are never written to the file. The submitting process keeps a
+    job's keys in memory and hands them to its own workers; a worker in
+    another process runs the job with its configured keys instead.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        poll_interval: float = 0.05,
+        lease_seconds: float = 60.0,
+        event_grace_seconds: float = 60.0,
+        retention_seconds: float = 3600.0,
+    ):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.event_grace_seconds = event_grace_seconds
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        _create_private_file(path)
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                self._conn.execute(statement)
+        # Last seq handed out, for jobs this process publishes to.
+        self._seq: Dict[str, int] = {}
+        self._pending: List[Tuple[str, int, str]] = []
+        self._flusher: asyncio.Task[None] | None = None
+        self._last_prune = 0.0
+        # API keys of jobs submitted here, until they finish.
+        self._secrets: Dict[str, Dict[str, str | None]] = {}
+
+    async def _run(self, operation: Callable[[sqlite3.Connection], T]) -> T:
+        def locked() -> T:
+            with self._lock:
+                return operation(self._conn)
+
+        return await asyncio.to_thread(locked)
+
+    @staticmethod
+    def _transaction(
+        conn: sqlite3.Connection, operation: Callable[[sqlite3.Connection], T]
+    ) -> T:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = operation(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    async def submit(self, spec: GenerationJobSpec) -> str:
+        job_id = uuid.uuid4().hex
+        self._secrets[job_id] = spec.secrets()
+        stored = json.dumps(spec.without_secrets().to_dict())
+        await self._run(
+            lambda conn: conn.execute(
+                "INSERT INTO jobs (job_id, state, spec, created_at) VALUES (?, 'queued', ?, ?)",
+                (job_id, stored, time.time()),
+            )
+        )
+        return job_id
+
+    def _claim_now(
+        self, conn: sqlite3.Connection, worker_id: str
+    ) -> Tuple[ClaimedJob, int] | None:
+        def claim(conn: sqlite3.Connection) -> Tuple[ClaimedJob, int] | None:
+            now = time.time()
+            stale = [
+                job_id
+                for (job_id,) in conn.execute(
+                    "SELECT job_id FROM jobs WHERE state = 'running' AND heartbeat_at < ?",
+                    (now - self.lease_seconds,),
+                )
+            ]
+            for job_id in stale:
+                # The rerun starts over; its events replace the lost run's.
+                conn.execute(
+                    "UPDATE jobs SET state = 'queued', worker_id = NULL WHERE job_id = ?",
+                    (job_id,),
+                )
+                conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+            row = conn.execute(
+                "SELECT job_id, spec, event_seq FROM jobs WHERE state = 'queued' "
+                "AND cancel_requested = 0 ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            spec = GenerationJobSpec.from_dict(json.loads(row[1]))
+            # Rewritten without keys in case an older version stored them.
+            conn.execute(
+                "UPDATE jobs SET state = 'running', worker_id = ?, heartbeat_at = ?, "
+                "spec = ? WHERE job_id = ?",
+                (worker_id, now, json.dumps(spec.without_secrets().to_dict()), row[0]),
+            )
+            secrets = self._secrets.get(row[0])
+            if secrets is not None:
+                spec = spec.with_secrets(secrets)
+            return ClaimedJob(job_id=row[0], spec=spec), row[2]
+
+        return self._transaction(conn, claim)
+
+    async def claim(self, worker_id: str, timeout: float) -> ClaimedJob | None:
+        deadline = time.monotonic() + timeout
+        await self._prune_if_due()
+        while True:
+            claimed = await self._run(lambda conn: self._claim_now(conn, worker_id))
+            if claimed is not None:
+                job, event_seq = claimed
+                self._seq[job.job_id] = event_seq
+                return job
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.poll_interval)
+
+    async def publish(self, job_id: str, payload: Dict[str, Any]) -> None:
+        if job_id not in self._seq:
+            # Not claimed here (e.g. a cancel for a queued job): continue the
+            # job's numbering.
+            row = await self._run(
+                lambda conn: conn.execute(
+                    "SELECT event_seq FROM jobs WHERE job_id = ?", (job_id,)
+                ).fetchone()
+            )
+            if row is None:
+                return
+            self._seq.setdefault(job_id, row[0])
+        seq = self._seq[job_id] + 1
+        self._seq[job_id] = seq
+        self._pending.append((job_id, seq, json.dumps({**payload, "seq": seq})))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_pending())
+
+    async def _flush_pending(self) -> None:
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                await self._run(
+                    lambda conn: self._transaction(
+                        conn, lambda conn: self._write_events(conn, batch)
+                    )
+                )
+            except Exception as e:
+                print(f"[JOBS] Failed to write {len(batch)} job event(s): {e}")
+
+    async def _flush(self) -> None:
+        """Wait until every event published so far is written."""
+        while self._flusher is not None and not self._flusher.done():
+            await asyncio.shield(self._flusher)
+
+    @staticmethod
+    def _write_events(
+        conn: sqlite3.Connection, batch: List[Tuple[str, int, str]]
+    ) -> None:
+        # A worker whose lease expired may still be writing; the rerun's
+        # events win.
+        conn.executemany(
+            "INSERT OR IGNORE INTO job_events (job_id, seq, payload) VALUES (?, ?, ?)",
+            batch,
+        )
+        last_seq: Dict[str, int] = {}
+        for job_id, seq, _ in batch:
+            last_seq[job_id] = max(seq, last_seq.get(job_id, 0))
+        conn.executemany(
+            "UPDATE jobs SET event_seq = MAX(event_seq, ?) WHERE job_id = ?",
+            [(seq, job_id) for job_id, seq in last_seq.items()],
+        )
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        now = time.time()
+        conn.execute(
+            "DELETE FROM job_events WHERE job_id IN "
+            "(SELECT job_id FROM jobs WHERE finished_at < ?) AND seq < "
+            "(SELECT event_seq FROM jobs WHERE jobs.job_id = job_events.job_id)",
+            (now - self.event_grace_seconds,),
+        )
+        conn.execute(
+            "DELETE FROM job_events WHERE job_id IN "
+            "(SELECT job_id FROM jobs WHERE finished_at < ?)",
+            (now - self.retention_seconds,),
+        )
+        conn.execute(
+            "DELETE FROM jobs WHERE finished_at < ?", (now - self.retention_seconds,)
+        )
+
+    async def _prune_if_due(self) -> None:
+        if time.monotonic() - self._last_prune < self.event_grace_seconds / 2:
+            return
+        self._last_prune = time.monotonic()
+        await self._run(lambda conn: self._transaction(conn, self._prune))
+
+    async def events(
+        self, job_id: str, after_seq: int = 0
+    ) -> AsyncIterator[Dict[str, Any]]:
+        seq = max(after_seq, 0)
+        while True:
+            rows: List[tuple[str]] = await self._run(
+                lambda conn: conn.execute(
+                    "SELECT payload FROM job_events WHERE job_id = ? AND seq > ? "
+                    "ORDER BY seq",
+                    (job_id, seq),
+                ).fetchall()
+            )
+            for (raw,) in rows:
+                event = json.loads(raw)
+                seq = event["seq"]
+                yield event
+                if event["type"] in JOB_TERMINAL_EVENT_TYPES:
+                    return
+            if not rows:
+                if await self.get(job_id) is None:
+                    return
+                await asyncio.sleep(self.poll_interval)
+
+    async def finish(
+        self,
+        job_id: str,
+        state: JobState,
+        completions: Dict[int, str] | None = None,
+        error: str | None = None,
+    ) -> None:
+        await self._flush()
+        published_seq = self._seq.pop(job_id, 0)
+        self._secrets.pop(job_id, None)
+
+        def finish(conn: sqlite3.Connection) -> None:
+            row = conn.execute(
+                "SELECT state, spec, event_seq FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None or row[0] in TERMINAL_JOB_STATES:
+                return
+            # Keep the model list but drop the prompt from disk.
+            models = json.loads(row[1]).get("variant_models", [])
+            seq = max(row[2], published_seq) + 1
+            conn.execute(
+                "UPDATE jobs SET state = ?, completions = ?, error = ?, spec = ?, "
+                "event_seq = ?, finished_at = ? WHERE job_id = ?",
+                (
+                    state,
+                    json.dumps({str(k): v for k, v in (completions or {}).items()}),
+                    error,
+                    json.dumps({"variant_models": models, "prompt_messages": []}),
+                    seq,
+                    time.time(),
+                    job_id,
+                ),
+            )
+            event = {**terminal_event(state, completions, error), "seq": seq}
+            self._write_events(conn, [(job_id, seq, json.dumps(event))])
+
+        await self._run(lambda conn: self._transaction(conn, finish))
+        await self._prune_if_due()
+
+    async def request_cancel(self, job_id: str) -> None:
+        record = await self.get(job_id)
+        if record is None or record.state in TERMINAL_JOB_STATES:
+            return
+        await self._run(
+            lambda conn: conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,)
+            )
+        )
+        if record.state == "queued":
+            await self.finish(job_id, "cancelled")
+
+    async def is_cancel_requested(self, job_id: str) -> bool:
+        row = await self._run(
+            lambda conn: conn.execute(
+                "SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        )
+        return row is None or bool(row[0])
+
+    async def heartbeat(self, job_id: str) -> None:
+        await self._run(
+            lambda conn: conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE job_id = ?",
+                (time.time(), job_id),
+            )
+        )
+
+    async def get(self, job_id: str) -> JobRecord | None:
+        row = await self._run(
+            lambda conn: conn.execute(
+                "SELECT state, worker_id, completions, error FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        )
+        if row is None:
+            return None
+        completions = json.loads(row[2]) if row[2] else {}
+        return JobRecord(
+            job_id=job_id,
+            state=row[0],
+            worker_id=row[1],
+            completions={int(k): v for k, v in completions.items()},
+            error=row[3],
+        )
+
+    async def close(self) -> None:
+        await self._flush()
+        await self._run(lambda conn: conn.close())
@@ -0,0 +1,77 @@
+from dataclasses import asdict, dataclass, field, replace
+from typing import Any, Dict, List, Literal
+
+JobState = Literal["queued", "running", "completed", "failed", "cancelled"]
+TERMINAL_JOB_STATES = ("completed", "failed", "cancelled")
+
+# Event types the job system adds on top of the generate-code message types.
+# Exactly one of them ends every job's event stream.
+JOB_TERMINAL_EVENT_TYPES = ("jobCompleted", "jobFailed", "jobCancelled")
+
+# Spec fields a job store must never write to disk.
+SECRET_SPEC_FIELDS = (
+    "openai_api_key",
+    "anthropic_api_key",
+    "gemini_api_key",
+    "replicate_api_key",
+)
+
+
+@dataclass
+class GenerationJobSpec:
+    """Everything a worker needs to run ``AgenticGenerationStage``.
+
+    JSON-serializable so it can cross process boundaries (see ``to_dict``).
+    """
+
+    variant_models: List[str]
+    prompt_messages: List[Dict[str, Any]]
+    openai_api_key: str | None = None
+    openai_base_url: str | None = None
+    anthropic_api_key: str | None = None
+    gemini_api_key: str | None = None
+    replicate_api_key: str | None = None
+    should_generate_images: bool = True
+    should_extract_assets: bool = True
+    file_state: Dict[str, str] | None = None
+    asset_base_url: str = ""
+    option_codes: List[str] = field(default_factory=list)
+    tenant: str = "client:unknown"
+    first_variant_wins: bool = False
+    winner_quality_gate: str = "none"
+    # ``VariantBudget`` fields; None uses the worker's configured budget.
+    budget: Dict[str, Any] | None = None
+    sectioned_generation: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def secrets(self) -> Dict[str, str | None]:
+        return {name: getattr(self, name) for name in SECRET_SPEC_FIELDS}
+
+    def without_secrets(self) -> "GenerationJobSpec":
+        return replace(self, **{name: None for name in SECRET_SPEC_FIELDS})
+
+    def with_secrets(self, secrets: Dict[str, str | None]) -> "GenerationJobSpec":
+        return replace(self, **secrets)
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> "GenerationJobSpec":
+        known = cls.__dataclass_fields__.keys()
+        return cls(**{key: value for key, value in raw.items() if key in known})
+
+
+@dataclass(frozen=True)
+class ClaimedJob:
+    job_id: str
+    spec: GenerationJobSpec
+
+
+@dataclass(frozen=True)
+class JobRecord:
+    job_id: str
+    state: JobState
+    worker_id: str | None = None
+    # Variant index -> completion, once the job has completed.
+    completions: Dict[int, str] = field(default_factory=dict)
+    error: str | None = None
@@ -0,0 +1,154 @@
+"""Worker pool that runs generation jobs from a ``JobBackend``.
+
+Socket front-ends start an in-process pool when ``GENERATION_JOB_WORKERS`` is
+above zero. To size workers separately, set it to 0 on the front-ends and run
+``python -m jobs.worker`` against the same (SQLite) backend.
+"""
+
+import asyncio
+import os
+import socket
+import traceback
+from typing import Any, Awaitable, Callable, Dict, List, cast
+
+from agent.cancellation import CancellationScope
+from jobs.backend import JobBackend
+from jobs.types import ClaimedJob, GenerationJobSpec
+
+SendMessage = Callable[
+    [str, str | None, int, Dict[str, Any] | None, str | None], Awaitable[None]
+]
+JobRunner = Callable[
+    [GenerationJobSpec, SendMessage, CancellationScope], Awaitable[Dict[int, str]]
+]
+
+
+async def _default_runner(
+    spec: GenerationJobSpec, send_message: SendMessage, scope: CancellationScope
+) -> Dict[int, str]:
+    # Imported lazily: the route module imports this package.
+    from routes.generate_code import run_generation_job
+
+    return await run_generation_job(spec, send_message, scope)
+
+
+class WorkerPool:
+    def __init__(
+        self,
+        backend: JobBackend,
+        concurrency: int,
+        run_job: JobRunner | None = None,
+        claim_timeout: float = 1.0,
+        cancel_poll_interval: float = 0.25,
+        heartbeat_interval: float = 5.0,
+    ):
+        self.backend = backend
+        self.concurrency = concurrency
+        self.run_job = run_job or _default_runner
+        self.claim_timeout = claim_timeout
+        self.cancel_poll_interval = cancel_poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.name = f"{socket.gethostname()}-{os.getpid()}"
+        self._tasks: List[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        for index in range(self.concurrency):
+            self._tasks.append(
+                asyncio.create_task(self._work(f"{self.name}-{index}"))
+            )
+        print(f"[JOBS] Started {self.concurrency} generation worker(s)")
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _work(self, worker_id: str) -> None:
+        while True:
+            try:
+                job = await self.backend.claim(worker_id, self.claim_timeout)
+            except Exception as e:
+                print(f"[JOBS] {worker_id} failed to claim a job: {e}")
+                await asyncio.sleep(self.claim_timeout)
+                continue
+            if job is not None:
+                await self.run_claimed(job)
+
+    async def run_claimed(self, job: ClaimedJob) -> None:
+        scope = CancellationScope()
+        job_id = job.job_id
+
+        async def send_message(
+            type: str,
+            value: str | None,
+            variant_index: int,
+            data: Dict[str, Any] | None = None,
+            event_id: str | None = None,
+        ) -> None:
+            payload: Dict[str, Any] = {"type": type, "variantIndex": variant_index}
+            if value is not None:
+                payload["value"] = value
+            if data is not None:
+                payload["data"] = data
+            if event_id is not None:
+                payload["eventId"] = event_id
+            await self.backend.publish(job_id, payload)
+
+        watcher = asyncio.create_task(self._watch(job_id, scope))
+        # Its own task, so a cancel request can't take the worker loop down.
+        run = asyncio.create_task(self.run_job(job.spec, send_message, scope))
+        scope.track(cast("asyncio.Task[object]", run))
+        completions: Dict[int, str] = {}
+        try:
+            completions = await run
+        except asyncio.CancelledError:
+            if not scope.cancelled:
+                raise
+        except Exception as e:
+            traceback.print_exception(type(e), e, e.__traceback__)
+            await self.backend.finish(job_id, "failed", error=str(e))
+            return
+        finally:
+            run.cancel()
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+
+        if scope.cancelled:
+            await self.backend.finish(job_id, "cancelled", error=scope.reason)
+        else:
+            await self.backend.finish(job_id, "completed", completions)
+
+    async def _watch(self, job_id: str, scope: CancellationScope) -> None:
+        """Relay cancel requests into the job's scope and keep its lease."""
+        since_heartbeat = 0.0
+        while True:
+            await asyncio.sleep(self.cancel_poll_interval)
+            since_heartbeat += self.cancel_poll_interval
+            if await self.backend.is_cancel_requested(job_id):
+                scope.cancel("job cancelled")
+                return
+            if since_heartbeat >= self.heartbeat_interval:
+                since_heartbeat = 0.0
+                await self.backend.heartbeat(job_id)
+
+
+async def _main() -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    from config import GENERATION_JOB_WORKERS
+    from jobs.registry import get_job_backend
+
+    backend = get_job_backend()
+    if backend is None:
+        raise SystemExit("Set GENERATION_JOB_BACKEND to run standalone workers.")
+    pool = WorkerPool(backend, max(GENERATION_JOB_WORKERS, 1))
+    pool.start()
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
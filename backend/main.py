@@ -4,18 +4,27 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from config import IS_DEBUG_ENABLED
+from config import IS_DEBUG_ENABLED, PROVIDER_CLIENT_WARMUP_ENABLED
 from routes import (
+    admission,
     screenshot,
     generate_code,
     home,
     evals,
     export,
+    generation_jobs,
     design_systems,
+    media,
+    prompt_cache,
     prompt_reports,
+    tool_deadlines,
 )
+from agent.providers.clients import configured_warmup_targets, provider_clients
+from jobs import start_job_workers, stop_job_workers
 from uploaded_assets import configure_uploaded_asset_routes
 
 app = FastAPI(openapi_url=None, docs_url=None, redoc_url=None)
@@ -36,6 +45,39 @@ async def probe_screenshot_preview_on_startup() -> None:
 
     await probe_screenshot_preview()
 
+
+@app.on_event("startup")
+async def start_generation_workers() -> None:
+    # No-op unless GENERATION_JOB_BACKEND is set.
+    await start_job_workers()
+
+
+@app.on_event("shutdown")
+async def stop_generation_workers() -> None:
+    await stop_job_workers()
+
+
+_provider_client_tasks: list[asyncio.Task[None]] = []
+
+
+@app.on_event("startup")
+async def start_provider_clients() -> None:
+    # Warm in the background so a slow provider doesn't delay startup.
+    if PROVIDER_CLIENT_WARMUP_ENABLED:
+        _provider_client_tasks.append(
+            asyncio.create_task(provider_clients.warm(configured_warmup_targets()))
+        )
+    _provider_client_tasks.append(asyncio.create_task(provider_clients.run_idle_eviction()))
+
+
+@app.on_event("shutdown")
+async def close_provider_clients() -> None:
+    for task in _provider_client_tasks:
+        task.cancel()
+    await asyncio.gather(*_provider_client_tasks, return_exceptions=True)
+    _provider_client_tasks.clear()
+    await provider_clients.close()
+
 # Configure CORS settings
 app.add_middleware(
     CORSMiddleware,
@@ -53,3 +95,8 @@ app.include_router(evals.router)
 app.include_router(export.router)
 app.include_router(design_systems.router)
 app.include_router(prompt_reports.router)
+app.include_router(admission.router)
+app.include_router(media.router)
+app.include_router(generation_jobs.router)
+app.include_router(tool_deadlines.router)
+app.include_router(prompt_cache.router)
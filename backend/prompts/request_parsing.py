@@ -1,6 +1,8 @@
+import asyncio
 from typing import List, cast
 
 from prompts.prompt_types import PromptHistoryMessage, UserTurnInput
+from uploaded_assets.media import is_media_id, resolve_media_reference
 
 
 def _to_string_list(value: object) -> List[str]:
@@ -10,6 +12,12 @@ def _to_string_list(value: object) -> List[str]:
     return [item for item in raw_list if isinstance(item, str)]
 
 
+def _to_media_list(value: object) -> List[str]:
+    """Images/videos as data URLs or ``media_<digest>`` IDs from ``POST /api/media``;
+    IDs are left for ``resolve_media_references``."""
+    return _to_string_list(value)
+
+
 def parse_prompt_content(raw_prompt: object) -> UserTurnInput:
     if not isinstance(raw_prompt, dict):
         return {"text": "", "images": [], "videos": []}
@@ -18,8 +26,8 @@ def parse_prompt_content(raw_prompt: object) -> UserTurnInput:
     text = prompt_dict.get("text")
     parsed: UserTurnInput = {
         "text": text if isinstance(text, str) else "",
-        "images": _to_string_list(prompt_dict.get("images")),
-        "videos": _to_string_list(prompt_dict.get("videos")),
+        "images": _to_media_list(prompt_dict.get("images")),
+        "videos": _to_media_list(prompt_dict.get("videos")),
     }
 
     full_text = prompt_dict.get("fullText")
@@ -49,9 +57,29 @@ def parse_prompt_history(raw_history: object) -> List[PromptHistoryMessage]:
             {
                 "role": role_value,
                 "text": text if isinstance(text, str) else "",
-                "images": _to_string_list(item_dict.get("images")),
-                "videos": _to_string_list(item_dict.get("videos")),
+                "images": _to_media_list(item_dict.get("images")),
+                "videos": _to_media_list(item_dict.get("videos")),
             }
         )
 
     return history
+
+
+def _resolve_in_place(media_lists: List[List[str]]) -> None:
+    for media in media_lists:
+        media[:] = [resolve_media_reference(item) for item in media]
+
+
+async def resolve_media_references(
+    prompt: UserTurnInput, history: List[PromptHistoryMessage]
+) -> None:
+    """Replace media IDs in the parsed prompt and history with data URLs.
+
+    Uploads can be large, so reading and base64-encoding them happens on a
+    worker thread. Raises ``UnknownMediaError`` for unknown or evicted IDs.
+    """
+    media_lists = [prompt["images"], prompt["videos"]]
+    for message in history:
+        media_lists += [message["images"], message["videos"]]
+    if any(is_media_id(item) for media in media_lists for item in media):
+        await asyncio.to_thread(_resolve_in_place, media_lists)
@@ -0,0 +1,19 @@
+"""Introspection endpoint for the process-wide admission controller."""
+
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from admission import admission_controller
+from config import IS_DEBUG_ENABLED
+
+router = APIRouter()
+
+
+@router.get("/admission")
+async def get_admission_state() -> Dict[str, Any]:
+    """Configured limits, active sessions and queue depth by provider.
+
+    Per-tenant counts name clients by IP, so they're only shown in debug mode.
+    """
+    return admission_controller.snapshot(include_tenants=IS_DEBUG_ENABLED)
@@ -1,5 +1,7 @@
 import asyncio
-from dataclasses import dataclass, field
+import json
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field
 from abc import ABC, abstractmethod
 import traceback
 from typing import Callable, Awaitable
@@ -24,6 +26,7 @@ from llm import (
 )
 from typing import (
     Any,
+    AsyncContextManager,
     Callable,
     Coroutine,
     Dict,
@@ -41,6 +44,7 @@ MessageType = Literal[
     "chunk",
     "status",
     "setCode",
+    "patchCode",
     "error",
     "variantComplete",
     "variantError",
@@ -50,16 +54,48 @@ MessageType = Literal[
     "assistant",
     "toolStart",
     "toolResult",
+    "session",
+    "commit",
 ]
+
+# Extra check a completion must pass to win a first-variant-wins race.
+# "screenshot" requires the page to render in the screenshot_preview backend.
+WinnerQualityGate = Literal["none", "screenshot"]
 from prompts.pipeline import build_prompt_messages
-from prompts.request_parsing import parse_prompt_content, parse_prompt_history
+from prompts.request_parsing import (
+    parse_prompt_content,
+    parse_prompt_history,
+    resolve_media_references,
+)
 from prompts.prompt_types import PromptHistoryMessage, Stack, UserTurnInput
 from uploaded_assets import (
+    UnknownMediaError,
     append_uploaded_asset_ids_to_history,
     append_uploaded_asset_ids_to_prompt,
     infer_local_asset_base_url,
 )
+from admission import (
+    AdmissionController,
+    AdmissionQueueFull,
+    admission_controller,
+    tenant_key,
+)
+from agent.budget import VariantBudget, budget_from_config
+from agent.cancellation import CancellationScope
+from conversation_store import UnknownCommitError, conversation_store
+from jobs import (
+    JOB_TERMINAL_EVENT_TYPES,
+    GenerationJobSpec,
+    JobBackend,
+    completions_from_terminal_event,
+    get_job_backend,
+)
 from agent.runner import Agent
+from agent.sections import SECTIONED_GENERATION_STACKS, SectionedAgent
+from preview_screenshot import (
+    capture_preview_screenshot,
+    is_screenshot_preview_available,
+)
 from routes.model_choice_sets import (
     ALL_KEYS_MODELS_DEFAULT,
     ALL_KEYS_MODELS_TEXT_CREATE,
@@ -74,7 +110,20 @@ from routes.model_choice_sets import (
 )
 
 # from utils import pprint_prompt
-from ws.constants import APP_ERROR_WEB_SOCKET_CODE  # type: ignore
+from ws.code_patches import CodePatchEncoder
+from ws.framing import (
+    MSGPACK_SUBPROTOCOL,
+    decode_binary_control,
+    decode_binary_params,
+    encode_binary_message,
+    negotiate_subprotocol,
+)
+from ws.outbound_queue import OutboundMessageQueue
+from ws.sessions import GenerationSession, session_registry
+from ws.constants import (  # type: ignore
+    APP_ERROR_WEB_SOCKET_CODE,
+    SLOW_CLIENT_WEB_SOCKET_CODE,
+)
 
 
 router = APIRouter()
@@ -93,6 +142,10 @@ class PipelineContext:
     completions: List[str] = field(default_factory=list)
     variant_completions: Dict[int, str] = field(default_factory=dict)
     metadata: Dict[str, Any] = field(default_factory=dict)
+    # Cancelled when the client disconnects mid-generation.
+    cancellation_scope: CancellationScope = field(default_factory=CancellationScope)
+    # Set for resumable generations (and for connections resuming one).
+    session: GenerationSession | None = None
 
     @property
     def send_message(self):
@@ -160,11 +213,110 @@ class WebSocketCommunicator:
     def __init__(self, websocket: WebSocket):
         self.websocket = websocket
         self.is_closed = False
+        self.code_patch_encoder: CodePatchEncoder | None = None
+        # Started on accept(); until then messages are sent inline.
+        self.outbound_queue: OutboundMessageQueue | None = None
+        self._disconnect_callbacks: List[Callable[[], None]] = []
+        self._listener_task: asyncio.Task[None] | None = None
+        # Closes the socket after the outbound queue gave up on the client.
+        self._slow_client_close: asyncio.Task[None] | None = None
+        # MessagePack frames instead of JSON, negotiated in accept().
+        self.binary_framing = False
+        # When set, messages go through the session's event log, which
+        # forwards them to whichever connection is attached.
+        self.session: GenerationSession | None = None
+
+    def on_disconnect(self, callback: Callable[[], None]) -> None:
+        """Register a callback for when the client goes away."""
+        self._disconnect_callbacks.append(callback)
+
+    def _mark_disconnected(self) -> None:
+        if self.is_closed:
+            return
+        self.is_closed = True
+        for callback in self._disconnect_callbacks:
+            callback()
+
+    def start_listening(self) -> None:
+        """Watch the socket after the params arrive so a disconnect is noticed
+        even while nothing is being sent."""
+        if self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        stopped = False
+        try:
+            while not self.is_closed:
+                try:
+                    message = await self.websocket.receive()
+                except (WebSocketDisconnect, RuntimeError):
+                    break
+                if message.get("type") == "websocket.disconnect":
+                    break
+                try:
+                    self._handle_client_message(message)
+                except Exception as e:
+                    print(f"Ignoring malformed client message: {e}")
+        except asyncio.CancelledError:
+            # Stopped by close() or throw_error(), which still own the socket.
+            stopped = True
+            raise
+        finally:
+            if not stopped:
+                print("WebSocket closed by client")
+                self._mark_disconnected()
+
+    def _handle_client_message(self, frame: Dict[str, Any]) -> None:
+        """Control messages the client may send while a generation runs."""
+        message: Any = None
+        if frame.get("bytes"):
+            message = decode_binary_control(frame["bytes"])
+        elif frame.get("text"):
+            try:
+                message = json.loads(frame["text"])
+            except json.JSONDecodeError:
+                return
+        if not isinstance(message, dict):
+            return
+        message = cast(Dict[str, Any], message)
+        # A client whose patchCode base hash didn't match asks for a snapshot.
+        if message.get("type") == "resyncCode" and self.code_patch_encoder:
+            variant_index = message.get("variantIndex")
+            self.code_patch_encoder.reset(
+                variant_index if isinstance(variant_index, int) else None
+            )
+
+    async def _stop_listening(self) -> None:
+        task = self._listener_task
+        if task is None:
+            return
+        self._listener_task = None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def enable_code_patches(self) -> None:
+        """Send later setCode updates as patchCode deltas (see ws.code_patches)."""
+        if self.code_patch_encoder is None:
+            self.code_patch_encoder = CodePatchEncoder()
 
     async def accept(self) -> None:
         """Accept the WebSocket connection"""
-        await self.websocket.accept()
-        print("Incoming websocket connection...")
+        subprotocol = negotiate_subprotocol(
+            self.websocket.scope.get("subprotocols")
+        )
+        await self.websocket.accept(subprotocol=subprotocol)
+        self.binary_framing = subprotocol == MSGPACK_SUBPROTOCOL
+        print(
+            "Incoming websocket connection"
+            + (" (MessagePack framing)..." if self.binary_framing else "...")
+        )
+        self.outbound_queue = OutboundMessageQueue(
+            self._send_payload, on_overflow=self._disconnect_slow_client
+        )
+        self.outbound_queue.start()
 
     async def send_message(
         self,
@@ -174,8 +326,12 @@ class WebSocketCommunicator:
         data: Dict[str, Any] | None = None,
         eventId: str | None = None,
     ) -> None:
-        """Send a message to the client with debug logging"""
-        if self.is_closed:
+        """Queue a message for the client with debug logging.
+
+        Provider stream callbacks await this per token, so it must not wait on
+        the socket; the outbound queue's sender task does the actual write.
+        """
+        if self.is_closed and self.session is None:
             return
 
         # Print for debugging on the backend
@@ -188,30 +344,125 @@ class WebSocketCommunicator:
         elif type == "variantError":
             print(f"Variant {variantIndex + 1} error: {value}")
 
+        payload: Dict[str, Any] = {"type": type, "variantIndex": variantIndex}
+        if value is not None:
+            payload["value"] = value
+        if data is not None:
+            payload["data"] = data
+        if eventId is not None:
+            payload["eventId"] = eventId
+
+        if self.session is not None:
+            await self.session.publish(payload)
+        else:
+            await self.deliver(payload)
+
+    async def deliver(self, payload: Dict[str, Any]) -> None:
+        """Hand a built payload to this connection's socket.
+
+        Doesn't yield to the event loop once the outbound queue is running,
+        which session replay relies on to keep events in order.
+        """
+        if self.is_closed:
+            return
+        if self.outbound_queue is not None and self.outbound_queue.is_running:
+            self.outbound_queue.enqueue(payload)
+        else:
+            await self._send_payload(payload)
+
+    def _disconnect_slow_client(self) -> None:
+        """The outbound queue hit its hard limit: treat the client as gone
+        (a resumable session keeps running) and close the socket."""
+        if self.is_closed:
+            return
+        self._mark_disconnected()
+        self._slow_client_close = asyncio.create_task(self._close_slow_client())
+
+    async def _close_slow_client(self) -> None:
         try:
-            payload: Dict[str, Any] = {"type": type, "variantIndex": variantIndex}
-            if value is not None:
-                payload["value"] = value
-            if data is not None:
-                payload["data"] = data
-            if eventId is not None:
-                payload["eventId"] = eventId
-            await self.websocket.send_json(payload)
+            await self.websocket.close(SLOW_CLIENT_WEB_SOCKET_CODE)
         except (
             ConnectionClosedOK,
             ConnectionClosedError,
             RuntimeError,
             WebSocketDisconnect,
         ):
-            print(f"WebSocket closed by client, skipping message: {type}")
-            self.is_closed = True
+            pass
+
+    async def _send_payload(self, payload: Dict[str, Any]) -> bool:
+        """Write one message to the socket. Returns False once it is closed."""
+        if self.is_closed:
+            return False
+
+        # Delta-encode at write time, after the queue has dropped superseded
+        # documents, so patches always chain from what the client received.
+        value = payload.get("value")
+        if (
+            payload["type"] == "setCode"
+            and isinstance(value, str)
+            and self.code_patch_encoder is not None
+        ):
+            encoded = self.code_patch_encoder.encode(payload["variantIndex"], value)
+            payload = {
+                key: item
+                for key, item in payload.items()
+                if key not in ("value", "data")
+            }
+            payload["type"] = encoded.type
+            if encoded.value is not None:
+                payload["value"] = encoded.value
+            if encoded.data is not None:
+                payload["data"] = encoded.data
+
+        try:
+            await self._write(payload)
+            return True
+        except (
+            ConnectionClosedOK,
+            ConnectionClosedError,
+            RuntimeError,
+            WebSocketDisconnect,
+        ):
+            print(f"WebSocket closed by client, skipping message: {payload['type']}")
+            self._mark_disconnected()
+            return False
+
+    async def _write(self, payload: Dict[str, Any]) -> None:
+        if self.binary_framing:
+            await self.websocket.send_bytes(encode_binary_message(payload))
+        else:
+            await self.websocket.send_json(payload)
+
+    async def _stop_outbound_queue(self) -> None:
+        """Flush queued messages and stop the sender task."""
+        queue = self.outbound_queue
+        if queue is None:
+            return
+        self.outbound_queue = None
+        await queue.close()
+        metrics = queue.metrics
+        print(
+            f"[WS QUEUE] sent={metrics.sent} flushes={metrics.flushes} "
+            f"coalesced={metrics.coalesced} superseded={metrics.superseded} "
+            f"dropped={metrics.dropped} max_depth={metrics.max_depth}"
+        )
 
     async def throw_error(self, message: str) -> None:
         """Send an error message and close the connection"""
         print(message)
+        session = self.session
+        if session is not None:
+            # Replayed to (or forwarded to) a client that resumes the session.
+            payload: Dict[str, Any] = {"type": "error", "value": message}
+            if session.is_attached_to(self):
+                session.record(payload)
+            else:
+                await session.publish(payload)
+        await self._stop_outbound_queue()
+        await self._stop_listening()
         if not self.is_closed:
             try:
-                await self.websocket.send_json({"type": "error", "value": message})
+                await self._write({"type": "error", "value": message})
                 await self.websocket.close(APP_ERROR_WEB_SOCKET_CODE)
             except (
                 ConnectionClosedOK,
@@ -225,15 +476,21 @@ class WebSocketCommunicator:
     async def receive_params(self) -> Dict[str, Any]:
         """Receive parameters from the client"""
         try:
-            params: Dict[str, Any] = await self.websocket.receive_json()
+            params: Dict[str, Any]
+            if self.binary_framing:
+                params = decode_binary_params(await self.websocket.receive_bytes())
+            else:
+                params = await self.websocket.receive_json()
         except WebSocketDisconnect:
-            self.is_closed = True
+            self._mark_disconnected()
             raise
         print("Received params")
         return params
 
     async def close(self) -> None:
         """Close the WebSocket connection"""
+        await self._stop_outbound_queue()
+        await self._stop_listening()
         if not self.is_closed:
             try:
                 await self.websocket.close()
@@ -265,6 +522,21 @@ class ExtractedParams:
     should_extract_assets: bool = True
     asset_base_url: str = ""
     design_system: str | None = None
+    code_patches: bool = False
+    resumable: bool = False
+    # Race the variants and stop at the first acceptable one.
+    first_variant_wins: bool = False
+    winner_quality_gate: WinnerQualityGate = "none"
+    # Server budget, tightened by the request's `budget` param.
+    budget: VariantBudget = field(default_factory=budget_from_config)
+    # Split the screenshot into sections generated by parallel sub-agents.
+    sectioned_generation: bool = False
+    # Server-side conversation this generation is recorded in, if any.
+    conversation_id: str | None = None
+    parent_commit_id: str | None = None
+    parent_variant_index: int | None = None
+    # The new turn as stored in the conversation (before asset annotation).
+    conversation_user_turn: PromptHistoryMessage | None = None
 
 
 class ParameterExtractionStage:
@@ -332,13 +604,48 @@ class ParameterExtractionStage:
             raise ValueError(f"Invalid generation type: {generation_type}")
         generation_type = cast(Literal["create", "update"], generation_type)
 
-        # Extract prompt content
-        prompt: UserTurnInput = parse_prompt_content(params.get("prompt"))
+        # Extract prompt content and history (default to empty list). Media
+        # may be inline data URLs or IDs from POST /api/media.
+        try:
+            prompt: UserTurnInput = parse_prompt_content(params.get("prompt"))
+            history: List[PromptHistoryMessage] = parse_prompt_history(
+                params.get("history")
+            )
+            await resolve_media_references(prompt, history)
+        except UnknownMediaError as e:
+            await self.throw_error(f"{e}. Please upload it again.")
+            raise
 
-        # Extract history (default to empty list)
-        history: List[PromptHistoryMessage] = parse_prompt_history(
-            params.get("history")
+        conversation_id, parent_commit_id, parent_variant_index = (
+            await self._extract_conversation_ref(params, generation_type)
         )
+        conversation_user_turn: PromptHistoryMessage | None = None
+        stored_state = None
+        if conversation_id is not None:
+            # Same shape the frontend keeps per variant: updates store the full
+            # instruction and no videos.
+            is_update = generation_type == "update"
+            conversation_user_turn = {
+                "role": "user",
+                "text": (prompt.get("full_text") or prompt["text"])
+                if is_update
+                else prompt["text"],
+                "images": list(prompt["images"]),
+                "videos": [] if is_update else list(prompt["videos"]),
+            }
+        if parent_commit_id is not None:
+            assert conversation_id is not None and parent_variant_index is not None
+            try:
+                stored_state = conversation_store.state_for_update(
+                    conversation_id, parent_commit_id, parent_variant_index
+                )
+            except UnknownCommitError as e:
+                await self.throw_error(
+                    f"{e}. The conversation may have expired; please start over."
+                )
+                raise
+            assert conversation_user_turn is not None
+            history = stored_state.history + [conversation_user_turn]
 
         prompt = append_uploaded_asset_ids_to_prompt(prompt, self.asset_base_url)
         history = append_uploaded_asset_ids_to_history(history, self.asset_base_url)
@@ -351,6 +658,8 @@ class ParameterExtractionStage:
             if isinstance(content, str) and content.strip():
                 path = raw_file_state.get("path") or "index.html"
                 file_state = {"path": path, "content": content}
+        if file_state is None and stored_state is not None:
+            file_state = stored_state.file_state
 
         raw_option_codes = params.get("optionCodes")
         option_codes: List[str] = []
@@ -362,6 +671,8 @@ class ParameterExtractionStage:
                     option_codes.append("")
                 else:
                     option_codes.append(str(entry))
+        if not option_codes and stored_state is not None:
+            option_codes = stored_state.option_codes
 
         raw_design_system = params.get("designSystem")
         design_system = (
@@ -370,6 +681,32 @@ class ParameterExtractionStage:
             else None
         )
 
+        # Opt-in delta encoding for setCode; older clients omit it.
+        code_patches = params.get("codePatches") is True
+        # Opt-in server-side event log so a dropped socket can resume.
+        resumable = params.get("resumable") is True
+
+        first_variant_wins = params.get("firstVariantWins") is True
+        winner_quality_gate = params.get("winnerQualityGate", "none")
+        if winner_quality_gate not in get_args(WinnerQualityGate):
+            await self.throw_error(
+                f"Invalid winner quality gate: {winner_quality_gate}"
+            )
+            raise ValueError(f"Invalid winner quality gate: {winner_quality_gate}")
+
+        budget = await self._extract_budget(params)
+
+        # Only single-screenshot creates in plain HTML stacks can be merged.
+        sectioned_generation = (
+            params.get("sectionedGeneration") is True
+            and generation_type == "create"
+            and validated_input_mode == "image"
+            and validated_stack in SECTIONED_GENERATION_STACKS
+            and len(prompt.get("images", [])) == 1
+        )
+        if params.get("sectionedGeneration") is True and not sectioned_generation:
+            print("[GENERATE_CODE] Sectioned generation not supported for this request")
+
         return ExtractedParams(
             stack=validated_stack,
             input_mode=validated_input_mode,
@@ -387,8 +724,70 @@ class ParameterExtractionStage:
             option_codes=option_codes,
             asset_base_url=self.asset_base_url,
             design_system=design_system,
+            code_patches=code_patches,
+            resumable=resumable,
+            first_variant_wins=first_variant_wins,
+            winner_quality_gate=cast(WinnerQualityGate, winner_quality_gate),
+            budget=budget,
+            sectioned_generation=sectioned_generation,
+            conversation_id=conversation_id,
+            parent_commit_id=parent_commit_id,
+            parent_variant_index=parent_variant_index,
+            conversation_user_turn=conversation_user_turn,
         )
 
+    async def _extract_budget(self, params: Dict[str, Any]) -> VariantBudget:
+        """``budget: {maxSeconds, maxOutputTokens, maxCostUsd}`` can only
+        tighten the server's per-variant limits."""
+        raw_budget = params.get("budget")
+        if raw_budget is None:
+            return budget_from_config()
+
+        limits: Dict[str, float] = {}
+        valid = isinstance(raw_budget, dict)
+        for key in ("maxSeconds", "maxOutputTokens", "maxCostUsd") if valid else ():
+            value = cast(Dict[str, Any], raw_budget).get(key)
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                valid = False
+                break
+            limits[key] = float(value)
+        if not valid:
+            await self.throw_error(f"Invalid budget: {raw_budget}")
+            raise ValueError(f"Invalid budget: {raw_budget}")
+
+        max_output_tokens = limits.get("maxOutputTokens")
+        return budget_from_config().tightened(
+            max_seconds=limits.get("maxSeconds"),
+            max_output_tokens=int(max_output_tokens) if max_output_tokens else None,
+            max_cost_usd=limits.get("maxCostUsd"),
+        )
+
+    async def _extract_conversation_ref(
+        self, params: Dict[str, Any], generation_type: str
+    ) -> tuple[str | None, str | None, int | None]:
+        """Resolve ``(conversation_id, parent_commit_id, parent_variant_index)``.
+
+        ``conversation: true`` starts a new server-side conversation; an update
+        that names ``conversationId`` + ``parentCommitId`` is built on it.
+        """
+        conversation_id = params.get("conversationId")
+        if not isinstance(conversation_id, str) or not conversation_id:
+            if params.get("conversation") is True:
+                return conversation_store.start_conversation(), None, None
+            return None, None, None
+
+        parent_commit_id = params.get("parentCommitId")
+        if generation_type != "update" or not isinstance(parent_commit_id, str):
+            return conversation_id, None, None
+
+        variant_index = params.get("selectedVariantIndex", 0)
+        if not isinstance(variant_index, int) or isinstance(variant_index, bool):
+            await self.throw_error(f"Invalid selectedVariantIndex: {variant_index}")
+            raise ValueError(f"Invalid selectedVariantIndex: {variant_index}")
+        return conversation_id, parent_commit_id, variant_index
+
     def _get_from_settings_dialog_or_env(
         self, params: dict[str, Any], key: str, env_var: str | None
     ) -> str | None:
@@ -559,6 +958,13 @@ class AgenticGenerationStage:
         asset_base_url: str,
         option_codes: List[str] | None,
         should_extract_assets: bool = True,
+        cancellation_scope: CancellationScope | None = None,
+        tenant: str = "client:unknown",
+        admission: AdmissionController | None = None,
+        first_variant_wins: bool = False,
+        winner_quality_gate: WinnerQualityGate = "none",
+        budget: VariantBudget | None = None,
+        sectioned_generation: bool = False,
     ):
         self.send_message = send_message
         self.openai_api_key = openai_api_key
@@ -571,6 +977,13 @@ class AgenticGenerationStage:
         self.file_state = file_state
         self.asset_base_url = asset_base_url
         self.option_codes = option_codes or []
+        self.cancellation_scope = cancellation_scope or CancellationScope()
+        self.tenant = tenant
+        self.admission = admission or admission_controller
+        self.first_variant_wins = first_variant_wins
+        self.winner_quality_gate = winner_quality_gate
+        self.budget = budget
+        self.sectioned_generation = sectioned_generation
 
     async def process_variants(
         self,
@@ -579,11 +992,14 @@ class AgenticGenerationStage:
     ) -> Dict[int, str]:
         tasks: List[asyncio.Task[str]] = []
         for index, model in enumerate(variant_models):
-            tasks.append(
-                asyncio.create_task(
-                    self._run_variant(index, model, prompt_messages)
-                )
+            task = asyncio.create_task(
+                self._run_variant(index, model, prompt_messages)
             )
+            self.cancellation_scope.track(cast("asyncio.Task[object]", task))
+            tasks.append(task)
+
+        if self.first_variant_wins:
+            return await self._race_variants(tasks)
 
         results = await asyncio.gather(*tasks, return_exceptions=True)
         variant_completions: Dict[int, str] = {}
@@ -596,6 +1012,67 @@ class AgenticGenerationStage:
 
         return variant_completions
 
+    async def _race_variants(self, tasks: List["asyncio.Task[str]"]) -> Dict[int, str]:
+        """Return the first completion that passes the quality gate and cancel
+        the variants still running.
+
+        If every variant finishes without passing the gate, the first
+        non-empty completion is used instead.
+        """
+        index_by_task = {task: index for index, task in enumerate(tasks)}
+        pending = set(tasks)
+        fallback: Dict[int, str] = {}
+        winner: Dict[int, str] = {}
+        while pending and not winner:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in sorted(done, key=lambda task: index_by_task[task]):
+                if task.cancelled() or task.exception() is not None:
+                    continue
+                completion = task.result()
+                if not completion:
+                    continue
+                index = index_by_task[task]
+                if await self._passes_quality_gate(index, completion):
+                    winner = {index: completion}
+                    break
+                fallback = fallback or {index: completion}
+
+        if not winner:
+            return fallback
+
+        (winner_index,) = winner
+        print(
+            f"[FIRST VARIANT WINS] Variant {winner_index + 1} won; "
+            f"cancelling {len(pending)} other variant(s)"
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in pending:
+            await self.send_message(
+                "variantError",
+                f"Stopped early: variant {winner_index + 1} finished first.",
+                index_by_task[task],
+                None,
+                None,
+            )
+        return winner
+
+    async def _passes_quality_gate(self, index: int, completion: str) -> bool:
+        if self.winner_quality_gate == "none":
+            return True
+        if not is_screenshot_preview_available():
+            print("[FIRST VARIANT WINS] Screenshot gate unavailable; skipping it")
+            return True
+        try:
+            await capture_preview_screenshot(completion, device="desktop")
+        except Exception as e:
+            print(f"[FIRST VARIANT WINS] Variant {index + 1} failed to render: {e}")
+            return False
+        return True
+
     async def _run_variant(
         self,
         index: int,
@@ -618,7 +1095,34 @@ class AgenticGenerationStage:
                     event_id,
                 )
 
-            runner = Agent(
+            was_queued = False
+
+            async def report_queue_position(position: int) -> None:
+                nonlocal was_queued
+                was_queued = True
+                await self.send_message(
+                    "status",
+                    f"Waiting for capacity (position {position} in queue)...",
+                    index,
+                    {"queuePosition": position},
+                    None,
+                )
+
+            runner_class: Any = Agent
+            runner_kwargs: Dict[str, Any] = {}
+            if self.sectioned_generation:
+                # Sectioned runs make several provider calls; each takes its
+                # own slot instead of the variant holding one for all of them.
+                runner_class = SectionedAgent
+                runner_kwargs["admission_slot"] = (
+                    lambda provider, model_name: self.admission.provider_slot(
+                        self.tenant,
+                        provider,
+                        model_name,
+                        on_position=report_queue_position,
+                    )
+                )
+            runner = runner_class(
                 send_message=send_runner_message,
                 variant_index=index,
                 openai_api_key=self.openai_api_key,
@@ -631,18 +1135,39 @@ class AgenticGenerationStage:
                 asset_base_url=self.asset_base_url,
                 initial_file_state=self.file_state,
                 option_codes=self.option_codes,
+                cancellation_scope=self.cancellation_scope,
+                budget=self.budget,
+                **runner_kwargs,
+            )
+            variant_slot: AsyncContextManager[None] = (
+                nullcontext()
+                if self.sectioned_generation
+                else self.admission.slot(
+                    self.tenant, model, on_position=report_queue_position
+                )
             )
-            completion = await runner.run(model, prompt_messages)
+
+            async with variant_slot:
+                if was_queued:
+                    await self.send_message(
+                        "status", "Generating code...", index, None, None
+                    )
+                completion = await runner.run(model, prompt_messages)
             if completion:
                 await self.send_message("setCode", completion, index, None, None)
+            budget_report = runner.budget_report()
             await self.send_message(
                 "variantComplete",
                 "Variant generation complete",
                 index,
-                None,
+                {"budget": budget_report} if budget_report else None,
                 None,
             )
             return completion
+        except AdmissionQueueFull as e:
+            print(f"[VARIANT {index + 1}] Rejected by admission control")
+            await self.send_message("variantError", str(e), index, None, None)
+            return ""
         except openai.AuthenticationError as e:
             print(f"[VARIANT {index + 1}] OpenAI Authentication failed", e)
             error_message = (
@@ -690,6 +1215,117 @@ class AgenticGenerationStage:
             return ""
 
 
+class JobDispatchStage:
+    """Runs generation on the job queue and relays the job's events.
+
+    Used instead of running ``AgenticGenerationStage`` in the socket handler
+    when ``GENERATION_JOB_BACKEND`` is set. Cancelling the scope (e.g. the
+    client disconnected) asks the worker to cancel the job.
+    """
+
+    def __init__(
+        self,
+        backend: JobBackend,
+        send_message: Callable[[MessageType, str | None, int, Dict[str, Any] | None, str | None], Coroutine[Any, Any, None]],
+        cancellation_scope: CancellationScope,
+    ):
+        self.backend = backend
+        self.send_message = send_message
+        self.cancellation_scope = cancellation_scope
+
+    async def run(self, spec: GenerationJobSpec) -> Dict[int, str]:
+        job_id = await self.backend.submit(spec)
+        print(f"[JOBS] Submitted generation job {job_id}")
+        relay = asyncio.create_task(self._relay(job_id))
+        self.cancellation_scope.track(cast("asyncio.Task[object]", relay))
+        try:
+            return await relay
+        except asyncio.CancelledError:
+            if not self.cancellation_scope.cancelled:
+                raise
+            await self.backend.request_cancel(job_id)
+            return {}
+
+    async def _relay(self, job_id: str) -> Dict[int, str]:
+        async for event in self.backend.events(job_id):
+            event_type = event["type"]
+            if event_type == "jobCompleted":
+                return completions_from_terminal_event(event)
+            if event_type in JOB_TERMINAL_EVENT_TYPES:
+                print(f"[JOBS] Job {job_id} ended with {event_type}: {event.get('value')}")
+                return {}
+            await self.send_message(
+                cast(MessageType, event_type),
+                event.get("value"),
+                event.get("variantIndex", 0),
+                event.get("data"),
+                event.get("eventId"),
+            )
+        return {}
+
+
+def build_generation_job_spec(
+    params: ExtractedParams,
+    variant_models: List[Llm],
+    prompt_messages: List[ChatCompletionMessageParam],
+    tenant: str,
+) -> GenerationJobSpec:
+    return GenerationJobSpec(
+        variant_models=[model.value for model in variant_models],
+        prompt_messages=cast(List[Dict[str, Any]], prompt_messages),
+        openai_api_key=params.openai_api_key,
+        openai_base_url=params.openai_base_url,
+        anthropic_api_key=params.anthropic_api_key,
+        gemini_api_key=params.gemini_api_key,
+        replicate_api_key=params.replicate_api_key,
+        should_generate_images=params.should_generate_images,
+        should_extract_assets=params.should_extract_assets,
+        file_state=params.file_state,
+        asset_base_url=params.asset_base_url,
+        option_codes=params.option_codes,
+        tenant=tenant,
+        first_variant_wins=params.first_variant_wins,
+        winner_quality_gate=params.winner_quality_gate,
+        budget=asdict(params.budget),
+        sectioned_generation=params.sectioned_generation,
+    )
+
+
+async def run_generation_job(
+    spec: GenerationJobSpec,
+    send_message: Callable[[MessageType, str | None, int, Dict[str, Any] | None, str | None], Coroutine[Any, Any, None]],
+    cancellation_scope: CancellationScope,
+) -> Dict[int, str]:
+    """Run a queued job's variants; called by the job workers.
+
+    Job stores don't persist API keys, so a worker that didn't receive the
+    submitter's keys uses its own configured ones.
+    """
+    generation_stage = AgenticGenerationStage(
+        send_message=send_message,
+        openai_api_key=spec.openai_api_key or OPENAI_API_KEY,
+        openai_base_url=spec.openai_base_url,
+        anthropic_api_key=spec.anthropic_api_key or ANTHROPIC_API_KEY,
+        gemini_api_key=spec.gemini_api_key or GEMINI_API_KEY,
+        replicate_api_key=spec.replicate_api_key or REPLICATE_API_KEY,
+        should_generate_images=spec.should_generate_images,
+        file_state=spec.file_state,
+        asset_base_url=spec.asset_base_url,
+        option_codes=spec.option_codes,
+        should_extract_assets=spec.should_extract_assets,
+        cancellation_scope=cancellation_scope,
+        tenant=spec.tenant,
+        first_variant_wins=spec.first_variant_wins,
+        winner_quality_gate=cast(WinnerQualityGate, spec.winner_quality_gate),
+        budget=VariantBudget(**spec.budget) if spec.budget else None,
+        sectioned_generation=spec.sectioned_generation,
+    )
+    return await generation_stage.process_variants(
+        variant_models=[Llm(model) for model in spec.variant_models],
+        prompt_messages=cast(List[ChatCompletionMessageParam], spec.prompt_messages),
+    )
+
+
 # Pipeline Middleware Implementations
 
 
@@ -700,14 +1336,30 @@ class WebSocketSetupMiddleware(Middleware):
         self, context: PipelineContext, next_func: Callable[[], Awaitable[None]]
     ) -> None:
         # Create and setup WebSocket communicator
-        context.ws_comm = WebSocketCommunicator(context.websocket)
-        await context.ws_comm.accept()
+        ws_comm = WebSocketCommunicator(context.websocket)
+        context.ws_comm = ws_comm
+
+        def handle_disconnect() -> None:
+            # A resumable session keeps generating until its resume window
+            # runs out; anything else is cancelled right away.
+            if context.session is not None and context.session.detach(ws_comm):
+                return
+            context.cancellation_scope.cancel("client disconnected")
+
+        ws_comm.on_disconnect(handle_disconnect)
+        await ws_comm.accept()
 
         try:
             await next_func()
         finally:
+            session = context.session
+            if session is not None and ws_comm.session is session:
+                # Only the connection that ran the generation finishes it.
+                session.finish()
             # Always close the WebSocket
-            await context.ws_comm.close()
+            await ws_comm.close()
+            if session is not None:
+                session.detach(ws_comm)
 
 
 class ParameterExtractionMiddleware(Middleware):
@@ -720,6 +1372,10 @@ class ParameterExtractionMiddleware(Middleware):
         assert context.ws_comm is not None
         context.params = await context.ws_comm.receive_params()
 
+        if "resumeSessionId" in context.params:
+            await SessionResumeStage(context).resume(context.params)
+            return  # The original connection's pipeline does the generating
+
         # Extract and validate
         param_extractor = ParameterExtractionStage(
             context.throw_error,
@@ -728,6 +1384,11 @@ class ParameterExtractionMiddleware(Middleware):
         context.extracted_params = await param_extractor.extract_and_validate(
             context.params
         )
+        if context.extracted_params.code_patches:
+            context.ws_comm.enable_code_patches()
+        if context.extracted_params.resumable:
+            await self._start_session(context)
+        context.ws_comm.start_listening()
 
         # Log what we're generating
         print(
@@ -736,6 +1397,75 @@ class ParameterExtractionMiddleware(Middleware):
 
         await next_func()
 
+    async def _start_session(self, context: PipelineContext) -> None:
+        assert context.ws_comm is not None
+        ws_comm = context.ws_comm
+        session = session_registry.create(
+            on_abandoned=lambda: context.cancellation_scope.cancel(
+                "session was not resumed"
+            )
+        )
+        if session is None:
+            return
+        session.attach(ws_comm, ws_comm.deliver)
+        ws_comm.session = session
+        context.session = session
+        await ws_comm.send_message(
+            "session",
+            None,
+            0,
+            {"sessionId": session.session_id, "resumeTtlSeconds": session.ttl_seconds},
+        )
+
+
+class SessionResumeStage:
+    """Reattaches a new connection to a running (or recently finished) session."""
+
+    def __init__(self, context: PipelineContext):
+        assert context.ws_comm is not None
+        self.context = context
+        self.ws_comm = context.ws_comm
+
+    async def resume(self, params: Dict[str, Any]) -> None:
+        session_id = params.get("resumeSessionId")
+        session = (
+            session_registry.get(session_id) if isinstance(session_id, str) else None
+        )
+        if session is None:
+            await self.ws_comm.throw_error(
+                "This generation can no longer be resumed. Please try again."
+            )
+            return
+
+        last_seq = params.get("lastSeq")
+        if not isinstance(last_seq, int) or isinstance(last_seq, bool):
+            last_seq = 0
+        if params.get("codePatches") is True:
+            self.ws_comm.enable_code_patches()
+
+        gone = asyncio.Event()
+        self.ws_comm.on_disconnect(gone.set)
+        self.context.session = session
+        backlog = session.attach(self.ws_comm, self.ws_comm.deliver, last_seq)
+        print(
+            f"[SESSION] {session.session_id} resumed after seq {last_seq}; "
+            f"replaying {len(backlog)} events"
+        )
+        for payload in backlog:
+            await self.ws_comm.deliver(payload)
+        self.ws_comm.start_listening()
+
+        # Stay open until the generation finishes or this client leaves too.
+        finished = asyncio.create_task(session.wait_finished())
+        disconnected = asyncio.create_task(gone.wait())
+        try:
+            await asyncio.wait(
+                {finished, disconnected}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            finished.cancel()
+            disconnected.cancel()
+
 
 class StatusBroadcastMiddleware(Middleware):
     """Sends initial status messages to all variants"""
@@ -802,24 +1532,58 @@ class CodeGenerationMiddleware(Middleware):
                     None,
                 )
 
-            generation_stage = AgenticGenerationStage(
-                send_message=context.send_message,
-                openai_api_key=context.extracted_params.openai_api_key,
-                openai_base_url=context.extracted_params.openai_base_url,
-                anthropic_api_key=context.extracted_params.anthropic_api_key,
-                gemini_api_key=context.extracted_params.gemini_api_key,
-                replicate_api_key=context.extracted_params.replicate_api_key,
-                should_generate_images=context.extracted_params.should_generate_images,
-                should_extract_assets=context.extracted_params.should_extract_assets,
-                file_state=context.extracted_params.file_state,
-                asset_base_url=context.extracted_params.asset_base_url,
-                option_codes=context.extracted_params.option_codes,
+            tenant = tenant_key(
+                [
+                    context.params.get("openAiApiKey"),
+                    context.params.get("anthropicApiKey"),
+                    context.params.get("geminiApiKey"),
+                ],
+                context.websocket.client.host if context.websocket.client else None,
             )
+            job_backend = get_job_backend()
+            if job_backend is not None:
+                context.variant_completions = await JobDispatchStage(
+                    job_backend, context.send_message, context.cancellation_scope
+                ).run(
+                    build_generation_job_spec(
+                        context.extracted_params,
+                        context.variant_models,
+                        context.prompt_messages,
+                        tenant,
+                    )
+                )
+            else:
+                generation_stage = AgenticGenerationStage(
+                    send_message=context.send_message,
+                    openai_api_key=context.extracted_params.openai_api_key,
+                    openai_base_url=context.extracted_params.openai_base_url,
+                    anthropic_api_key=context.extracted_params.anthropic_api_key,
+                    gemini_api_key=context.extracted_params.gemini_api_key,
+                    replicate_api_key=context.extracted_params.replicate_api_key,
+                    should_generate_images=context.extracted_params.should_generate_images,
+                    should_extract_assets=context.extracted_params.should_extract_assets,
+                    file_state=context.extracted_params.file_state,
+                    asset_base_url=context.extracted_params.asset_base_url,
+                    option_codes=context.extracted_params.option_codes,
+                    cancellation_scope=context.cancellation_scope,
+                    tenant=tenant,
+                    first_variant_wins=context.extracted_params.first_variant_wins,
+                    winner_quality_gate=context.extracted_params.winner_quality_gate,
+                    budget=context.extracted_params.budget,
+                    sectioned_generation=context.extracted_params.sectioned_generation,
+                )
 
-            context.variant_completions = await generation_stage.process_variants(
-                variant_models=context.variant_models,
-                prompt_messages=context.prompt_messages,
-            )
+                context.variant_completions = await generation_stage.process_variants(
+                    variant_models=context.variant_models,
+                    prompt_messages=context.prompt_messages,
+                )
+
+            if context.cancellation_scope.cancelled:
+                print(
+                    "[GENERATE_CODE] Generation cancelled: "
+                    f"{context.cancellation_scope.reason}"
+                )
+                return  # Nobody is listening for the results
 
             # Check if all variants failed
             if len(context.variant_completions) == 0:
@@ -850,6 +1614,8 @@ class PostProcessingMiddleware(Middleware):
     async def process(
         self, context: PipelineContext, next_func: Callable[[], Awaitable[None]]
     ) -> None:
+        await self._record_commit(context)
+
         post_processor = PostProcessingStage()
         await post_processor.process_completions(
             context.completions, context.websocket
@@ -857,6 +1623,33 @@ class PostProcessingMiddleware(Middleware):
 
         await next_func()
 
+    async def _record_commit(self, context: PipelineContext) -> None:
+        params = context.extracted_params
+        if (
+            params is None
+            or params.conversation_id is None
+            or params.conversation_user_turn is None
+        ):
+            return
+        try:
+            commit = conversation_store.add_commit(
+                params.conversation_id,
+                params.conversation_user_turn,
+                context.completions,
+                parent_commit_id=params.parent_commit_id,
+                parent_variant_index=params.parent_variant_index,
+            )
+        except UnknownCommitError as e:
+            print(f"[CONVERSATION] Not recording commit: {e}")
+            return
+        await context.send_message(
+            "commit",
+            None,
+            0,
+            {"conversationId": commit.conversation_id, "commitId": commit.commit_id},
+            None,
+        )
+
 
 @router.websocket("/generate-code")
 async def stream_code(websocket: WebSocket):
@@ -0,0 +1,126 @@
+"""HTTP access to generation jobs (requires ``GENERATION_JOB_BACKEND``).
+
+``POST /api/generation-jobs`` takes the same params as the first
+``/generate-code`` message and queues the generation without holding a socket
+open. Progress is read back as NDJSON from ``/events`` (resumable with
+``?after=<seq>``); the stream ends with ``jobCompleted``, ``jobFailed`` or
+``jobCancelled``.
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from admission import tenant_key
+from jobs import JobBackend, get_job_backend
+from routes.generate_code import (
+    ModelSelectionStage,
+    ParameterExtractionStage,
+    PromptCreationStage,
+    build_generation_job_spec,
+)
+from uploaded_assets import infer_local_asset_base_url
+
+router = APIRouter()
+
+
+class GenerationJobResponse(BaseModel):
+    jobId: str
+    state: str
+    variantModels: List[str] = []
+    completions: Dict[str, str] = {}
+    error: str | None = None
+
+
+def _require_backend() -> JobBackend:
+    backend = get_job_backend()
+    if backend is None:
+        raise HTTPException(
+            status_code=503, detail="Generation jobs are not enabled on this server"
+        )
+    return backend
+
+
+@router.post("/api/generation-jobs")
+async def submit_generation_job(request: Request) -> GenerationJobResponse:
+    backend = _require_backend()
+    params: Dict[str, Any] = await request.json()
+    errors: List[str] = []
+
+    async def throw_error(message: str) -> None:
+        errors.append(message)
+
+    try:
+        extracted = await ParameterExtractionStage(
+            throw_error, infer_local_asset_base_url(request)  # type: ignore[arg-type]
+        ).extract_and_validate(params)
+        variant_models = await ModelSelectionStage(throw_error).select_models(
+            generation_type=extracted.generation_type,
+            input_mode=extracted.input_mode,
+            openai_api_key=extracted.openai_api_key,
+            anthropic_api_key=extracted.anthropic_api_key,
+            gemini_api_key=extracted.gemini_api_key,
+        )
+        prompt_messages = await PromptCreationStage(throw_error).build_prompt_messages(
+            extracted
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=errors[0] if errors else str(e))
+
+    tenant = tenant_key(
+        [
+            params.get("openAiApiKey"),
+            params.get("anthropicApiKey"),
+            params.get("geminiApiKey"),
+        ],
+        request.client.host if request.client else None,
+    )
+    spec = build_generation_job_spec(extracted, variant_models, prompt_messages, tenant)
+    job_id = await backend.submit(spec)
+    print(f"[JOBS] Submitted generation job {job_id} over HTTP")
+    return GenerationJobResponse(
+        jobId=job_id, state="queued", variantModels=spec.variant_models
+    )
+
+
+@router.get("/api/generation-jobs/{job_id}")
+async def get_generation_job(job_id: str) -> GenerationJobResponse:
+    backend = _require_backend()
+    record = await backend.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return GenerationJobResponse(
+        jobId=record.job_id,
+        state=record.state,
+        completions={str(index): code for index, code in record.completions.items()},
+        error=record.error,
+    )
+
+
+@router.get("/api/generation-jobs/{job_id}/events")
+async def stream_generation_job_events(job_id: str, after: int = 0) -> StreamingResponse:
+    backend = _require_backend()
+    if await backend.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+    async def lines() -> AsyncIterator[str]:
+        async for event in backend.events(job_id, after):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post("/api/generation-jobs/{job_id}/cancel")
+async def cancel_generation_job(job_id: str) -> GenerationJobResponse:
+    backend = _require_backend()
+    if await backend.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    await backend.request_cancel(job_id)
+    record = await backend.get(job_id)
+    assert record is not None
+    return GenerationJobResponse(
+        jobId=record.job_id, state=record.state, error=record.error
+    )
@@ -0,0 +1,51 @@
+"""Out-of-band media uploads referenced by ID in generate-code params.
+
+``POST /api/media`` takes the raw file as a streamed (chunked) request body with
+its ``Content-Type`` and returns a content-addressed ``mediaId``. See
+``uploaded_assets.media`` for how IDs are derived and resolved.
+"""
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from pydantic import BaseModel
+
+from uploaded_assets import MediaUploadError, get_stored_media, store_media_stream
+
+router = APIRouter()
+
+
+class MediaUploadResponse(BaseModel):
+    mediaId: str
+    contentType: str
+    size: int
+    deduplicated: bool
+
+
+@router.post("/api/media")
+async def upload_media(request: Request) -> MediaUploadResponse:
+    try:
+        media = await store_media_stream(
+            request.stream(), request.headers.get("content-type")
+        )
+    except MediaUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(
+        f"[MEDIA] Stored {media.media_id} ({media.content_type}, {media.size} bytes"
+        + (", deduplicated)" if media.deduplicated else ")")
+    )
+    return MediaUploadResponse(
+        mediaId=media.media_id,
+        contentType=media.content_type,
+        size=media.size,
+        deduplicated=media.deduplicated,
+    )
+
+
+@router.head("/api/media/{media_id}")
+async def check_media(media_id: str) -> Response:
+    """Lets a client that already hashed a file skip uploading it again."""
+    media = get_stored_media(media_id)
+    if media is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    return Response(
+        headers={"content-type": media.content_type, "x-media-size": str(media.size)}
+    )
@@ -0,0 +1,15 @@
+"""Introspection endpoint for prompt-cache hit rates."""
+
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from agent.providers.prompt_cache import prompt_cache_stats
+
+router = APIRouter()
+
+
+@router.get("/prompt-cache")
+async def get_prompt_cache_stats() -> Dict[str, Any]:
+    """Input tokens, cache reads and hit rate per provider since startup."""
+    return prompt_cache_stats.snapshot()
@@ -0,0 +1,15 @@
+"""Introspection endpoint for agent tool deadlines and timeouts."""
+
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from agent.tools.deadlines import tool_timeout_counters
+
+router = APIRouter()
+
+
+@router.get("/tool-deadlines")
+async def get_tool_deadlines() -> Dict[str, Any]:
+    """Configured deadlines, calls and timeouts per tool since startup."""
+    return tool_timeout_counters.snapshot()
@@ -0,0 +1,122 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from admission import (
+    AdmissionController,
+    AdmissionLimits,
+    AdmissionQueueFull,
+    parse_limit_overrides,
+    tenant_key,
+)
+from llm import Llm
+
+OPENAI_MODEL = Llm.GPT_5_5_LOW
+ANTHROPIC_MODEL = Llm.CLAUDE_SONNET_4_6
+
+
+async def _hold(
+    controller: AdmissionController,
+    tenant: str,
+    model: Llm,
+    order: List[str],
+    release: asyncio.Event,
+    positions: List[int] | None = None,
+) -> None:
+    async def on_position(position: int) -> None:
+        if positions is not None:
+            positions.append(position)
+
+    async with controller.slot(tenant, model, on_position=on_position):
+        order.append(tenant)
+        await release.wait()
+
+
+def test_parse_limit_overrides_handles_model_names() -> None:
+    assert parse_limit_overrides(
+        "openai=8, claude-opus-4-8 (high effort)=2,bogus,gemini=x"
+    ) == {"openai": 8, "claude-opus-4-8 (high effort)": 2}
+
+
+def test_tenant_key_hashes_client_keys() -> None:
+    key = tenant_key(["sk-secret", None], "10.0.0.1")
+    assert key.startswith("key:") and "sk-secret" not in key
+    assert tenant_key([None, ""], "10.0.0.1") == "client:10.0.0.1"
+
+
+@pytest.mark.asyncio
+async def test_queue_is_round_robin_across_tenants() -> None:
+    controller = AdmissionController(AdmissionLimits(default_provider_limit=1))
+    order: List[str] = []
+    release = asyncio.Event()
+
+    first = asyncio.create_task(_hold(controller, "a", OPENAI_MODEL, order, release))
+    await asyncio.sleep(0)
+    # Tenant "a" queues three more before "b" shows up, but "b" is next.
+    waiting = [
+        asyncio.create_task(_hold(controller, "a", OPENAI_MODEL, order, asyncio.Event()))
+        for _ in range(3)
+    ]
+    b_positions: List[int] = []
+    waiting.append(
+        asyncio.create_task(
+            _hold(controller, "b", OPENAI_MODEL, order, asyncio.Event(), b_positions)
+        )
+    )
+    await asyncio.sleep(0)
+
+    assert controller.snapshot(include_tenants=True)["queued"]["byTenant"] == {
+        "a": 3,
+        "b": 1,
+    }
+    redacted = controller.snapshot()
+    assert "byTenant" not in redacted["active"] and "byTenant" not in redacted["queued"]
+    assert (redacted["active"]["tenants"], redacted["queued"]["tenants"]) == (1, 2)
+    assert b_positions == [1]
+
+    release.set()
+    await first
+    await asyncio.sleep(0)
+    assert order == ["a", "b"]
+    assert controller.snapshot()["active"]["byProvider"] == {"openai": 1}
+
+    for task in waiting:
+        task.cancel()
+    await asyncio.gather(*waiting, return_exceptions=True)
+    snapshot = controller.snapshot()
+    assert snapshot["queued"]["total"] == 0
+    assert snapshot["active"]["byProvider"] == {}
+
+
+@pytest.mark.asyncio
+async def test_saturated_provider_does_not_block_other_providers() -> None:
+    controller = AdmissionController(
+        AdmissionLimits(
+            default_provider_limit=4,
+            model_limits={OPENAI_MODEL.value: 1},
+            max_queued=1,
+        )
+    )
+    order: List[str] = []
+    release = asyncio.Event()
+
+    tasks = [
+        asyncio.create_task(_hold(controller, "a", OPENAI_MODEL, order, release)),
+        asyncio.create_task(_hold(controller, "b", OPENAI_MODEL, order, release)),
+        asyncio.create_task(_hold(controller, "c", ANTHROPIC_MODEL, order, release)),
+    ]
+    await asyncio.sleep(0)
+    assert order == ["a", "c"]
+
+    with pytest.raises(AdmissionQueueFull):
+        await _hold(controller, "d", OPENAI_MODEL, order, release)
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert order == ["a", "c", "b"]
+    assert controller.snapshot()["totals"] == {
+        "admitted": 3,
+        "queued": 1,
+        "rejected": 1,
+    }
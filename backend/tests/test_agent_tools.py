@@ -1,3 +1,4 @@
+import json
 from typing import Any, cast
 
 import pytest
@@ -265,3 +266,27 @@ def test_edit_image_tool_input_summary_uses_prompt_and_image_urls() -> None:
         "image_urls": ["https://example.com/input.png"],
         "aspect_ratio": "match_input_image",
     }
+
+
+def test_provider_sessions_share_cached_tool_payloads() -> None:
+    def openai_tools(gemini_api_key: str | None) -> list[Any]:
+        session = create_provider_session(
+            model=Llm.GPT_5_5_HIGH,
+            prompt_messages=[{"role": "user", "content": "Build a page."}],
+            should_generate_images=True,
+            openai_api_key="openai-key",
+            openai_base_url=None,
+            anthropic_api_key=None,
+            gemini_api_key=gemini_api_key,
+            replicate_api_key=None,
+        )
+        return cast(list[Any], getattr(session, "_tools"))
+
+    first, second = openai_tools("gemini-key"), openai_tools("gemini-key")
+    without_gemini = openai_tools(None)
+
+    # Each session gets its own list over the same serialized entries.
+    assert first is not second
+    assert all(a is b for a, b in zip(first, second)) and len(first) == len(second)
+    assert json.dumps(first) == json.dumps(second)
+    assert len(without_gemini) == len(first) - 1
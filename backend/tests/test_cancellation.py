@@ -0,0 +1,155 @@
+import asyncio
+import json
+from typing import Any, cast
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+
+from agent.cancellation import CancellationScope
+from image_generation import replicate
+from llm import Llm
+from routes.generate_code import AgenticGenerationStage, WebSocketCommunicator
+
+
+class HangingAgent:
+    started = 0
+    cancelled = 0
+
+    def __init__(self, **kwargs: Any) -> None:
+        self.cancellation_scope = kwargs["cancellation_scope"]
+
+    async def run(self, model: Llm, prompt_messages: Any) -> str:
+        HangingAgent.started += 1
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            HangingAgent.cancelled += 1
+            raise
+        return ""
+
+
+@pytest.mark.asyncio
+async def test_cancelling_scope_stops_all_variants(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("routes.generate_code.Agent", HangingAgent)
+    sent: list[str] = []
+
+    async def send_message(*args: Any) -> None:
+        sent.append(args[0])
+
+    scope = CancellationScope()
+    stage = AgenticGenerationStage(
+        send_message=send_message,
+        openai_api_key=None,
+        openai_base_url=None,
+        anthropic_api_key=None,
+        gemini_api_key=None,
+        replicate_api_key=None,
+        should_generate_images=False,
+        file_state=None,
+        asset_base_url="",
+        option_codes=None,
+        cancellation_scope=scope,
+    )
+
+    run = asyncio.create_task(
+        stage.process_variants([Llm.CLAUDE_SONNET_4_6] * 3, [])
+    )
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    scope.cancel("client disconnected")
+
+    assert await asyncio.wait_for(run, timeout=1) == {}
+    assert HangingAgent.cancelled == 3
+    assert "variantComplete" not in sent
+    with pytest.raises(asyncio.CancelledError):
+        scope.raise_if_cancelled()
+
+
+@pytest.mark.asyncio
+async def test_listener_reports_disconnect_and_handles_resync() -> None:
+    websocket = MagicMock()
+    websocket.receive = AsyncMock(
+        side_effect=[
+            {
+                "type": "websocket.receive",
+                "text": json.dumps({"type": "resyncCode", "variantIndex": 1}),
+            },
+            {"type": "websocket.disconnect", "code": 1001},
+        ]
+    )
+    communicator = WebSocketCommunicator(cast(Any, websocket))
+    communicator.enable_code_patches()
+    assert communicator.code_patch_encoder is not None
+    communicator.code_patch_encoder.encode(1, "<html></html>")
+    disconnected = asyncio.Event()
+    communicator.on_disconnect(disconnected.set)
+
+    communicator.start_listening()
+    await asyncio.wait_for(disconnected.wait(), timeout=1)
+
+    assert communicator.is_closed is True
+    assert communicator.code_patch_encoder.encode(1, "<html>!</html>").type == "setCode"
+
+
+@pytest.mark.asyncio
+async def test_listener_drops_bad_messages_and_always_reports_disconnect() -> None:
+    websocket = MagicMock()
+    websocket.receive = AsyncMock(
+        side_effect=[
+            {"type": "websocket.receive", "text": "{}"},
+            {"type": "websocket.receive", "text": "{}"},
+            OSError("transport lost"),
+        ]
+    )
+    communicator = WebSocketCommunicator(cast(Any, websocket))
+    handled: list[int] = []
+
+    def handle(frame: Any) -> None:
+        handled.append(len(handled))
+        if len(handled) == 1:
+            raise KeyError("variantIndex")
+
+    communicator._handle_client_message = handle  # type: ignore[method-assign]
+    disconnected = asyncio.Event()
+    communicator.on_disconnect(disconnected.set)
+
+    await asyncio.gather(communicator._listen(), return_exceptions=True)
+
+    assert handled == [0, 1]
+    assert disconnected.is_set() and communicator.is_closed
+
+
+@pytest.mark.asyncio
+async def test_cancelled_replicate_prediction_is_cancelled_remotely(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    requests: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(f"{request.method} {request.url.path}")
+        if request.url.path.endswith("/predictions"):
+            return httpx.Response(201, json={"id": "pred-1", "status": "starting"})
+        if request.url.path.endswith("/cancel"):
+            return httpx.Response(200, json={"id": "pred-1", "status": "canceled"})
+        return httpx.Response(200, json={"id": "pred-1", "status": "processing"})
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        replicate.httpx,
+        "AsyncClient",
+        lambda **kwargs: real_client(transport=httpx.MockTransport(handler)),
+    )
+
+    task = asyncio.create_task(
+        replicate.call_replicate_version("v1", {"image": "x"}, "token")
+    )
+    await asyncio.sleep(0.25)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert requests[0] == "POST /v1/predictions"
+    assert requests[-1] == "POST /v1/predictions/pred-1/cancel"
@@ -0,0 +1,81 @@
+from typing import Any, cast
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from routes.generate_code import WebSocketCommunicator
+from ws.code_patches import CodePatchEncoder, apply_code_patch, content_hash
+
+
+def test_first_update_is_a_snapshot_and_appends_become_patches() -> None:
+    encoder = CodePatchEncoder()
+    document = "<html><body>" + "x" * 500
+
+    first = encoder.encode(0, document)
+    assert first.type == "setCode"
+    assert first.value == document
+    assert first.data == {"hash": content_hash(document)}
+
+    appended = document + "<p>more</p>"
+    second = encoder.encode(0, appended)
+    assert second.type == "patchCode"
+    assert second.data is not None
+    assert second.data["start"] == len(document)
+    assert second.data["deleteCount"] == 0
+    assert second.data["text"] == "<p>more</p>"
+    assert apply_code_patch(document, second.data) == appended
+
+
+def test_splice_patch_round_trips_and_variants_are_independent() -> None:
+    encoder = CodePatchEncoder()
+    before = "<main>" + "a" * 300 + "<h1>old title</h1>" + "b" * 300 + "</main>"
+    after = before.replace("old title", "a much newer title")
+
+    encoder.encode(0, before)
+    encoder.encode(1, "<html>other</html>")
+    patch = encoder.encode(0, after)
+
+    assert patch.type == "patchCode"
+    assert patch.data is not None
+    assert len(patch.data["text"]) < 30
+    assert apply_code_patch(before, patch.data) == after
+
+
+def test_reset_and_large_rewrites_fall_back_to_snapshots() -> None:
+    encoder = CodePatchEncoder()
+    encoder.encode(0, "<p>short</p>")
+
+    rewrite = encoder.encode(0, "<div>completely different</div>")
+    assert rewrite.type == "setCode"
+
+    encoder.reset(0)
+    assert encoder.encode(0, "<div>completely different</div>!").type == "setCode"
+
+
+def test_apply_code_patch_rejects_mismatched_base() -> None:
+    encoder = CodePatchEncoder()
+    encoder.encode(0, "<p>" + "z" * 100)
+    patch = encoder.encode(0, "<p>" + "z" * 100 + "</p>")
+    assert patch.data is not None
+
+    with pytest.raises(ValueError):
+        apply_code_patch("<p>stale", patch.data)
+
+
+@pytest.mark.asyncio
+async def test_communicator_sends_patch_code_once_enabled() -> None:
+    websocket = MagicMock()
+    websocket.send_json = AsyncMock()
+    communicator = WebSocketCommunicator(cast(Any, websocket))
+    communicator.enable_code_patches()
+
+    await communicator.send_message("setCode", "<html>" + "y" * 100, 2)
+    await communicator.send_message("setCode", "<html>" + "y" * 100 + "</html>", 2)
+
+    first = websocket.send_json.await_args_list[0].args[0]
+    second = websocket.send_json.await_args_list[1].args[0]
+    assert first["type"] == "setCode"
+    assert second["type"] == "patchCode"
+    assert second["variantIndex"] == 2
+    assert "value" not in second
+    assert second["data"]["text"] == "</html>"
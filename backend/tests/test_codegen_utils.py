@@ -1,9 +1,87 @@
+import random
+import re
+import time
+
 from codegen.utils import extract_html_content
 
 
+PAGE = '<html lang="en">\n<head><title>Café</title></head>\n<body class="p-4">\n<h1>Hi</h1>\n</body>\n</html>'
+
+RECORDED_OUTPUTS = [
+    f'<file path="index.html">\n<!DOCTYPE html>\n{PAGE}\n</file>',
+    f"Here's the page:\n\n```html\n<!DOCTYPE html>\n{PAGE}\n```\n\nLet me know!",
+    f"<!doctype HTML>\n{PAGE.upper()}",
+    f'<FILE PATH="a.html">\n```html\n{PAGE}\n```\n</FILE>',
+    f'<file path="index.html">\n{PAGE[:-7]}',
+    f'<file path="">{PAGE}</file><file path="b">{PAGE}</file>',
+    f"Explanation first.\n<!DOCTYPE xhtml>\n<!DOCTYPE  html>{PAGE} trailing </html>",
+    f"{PAGE} Some text {PAGE.replace('Hi', 'Second')}",
+    "```html<head></head>```",
+    "No HTML content here.",
+    f"<!DOCTYPE html>\n<html lang='tr'>İıſK</HTML>",
+    f'<file\tpath="x"\n>{PAGE}</file>',
+]
+
+FRAGMENTS = [
+    "<!DOCTYPE html>", "<!doctype  HTML lang>", "<!DOCTYPE xhtml>", "<html>", "<HTML lang='en'>",
+    "<html", "</html>", "</HTML>", ">", '<file path="index.html">', '<FILE  path="x">',
+    '<file path="">', "</file>", "</FILE>", "```html\n", "```htm", "```\n", "```", "\n",
+    "  ", "text", "<body>", "İ", "K", '"',
+]
+
+
+def regex_extract_html_content(text: str) -> str:
+    """The previous regex implementation, kept as the reference behavior."""
+    file_match = re.search(
+        r"<file\s+path=\"[^\"]+\">\s*(.*?)\s*</file>",
+        text,
+        re.DOTALL | re.IGNORECASE,
+    )
+    if file_match:
+        return regex_extract_html_content(file_match.group(1).strip())
+    text = re.sub(r"^```html?\s*\n?", "", text, flags=re.MULTILINE)
+    text = re.sub(r"\n?```\s*$", "", text, flags=re.MULTILINE)
+    match_with_doctype = re.search(
+        r"(<!DOCTYPE\s+html[^>]*>.*?<html.*?>.*?</html>)", text, re.DOTALL | re.IGNORECASE
+    )
+    if match_with_doctype:
+        return match_with_doctype.group(1)
+    match = re.search(r"(<html.*?>.*?</html>)", text, re.DOTALL)
+    return match.group(1) if match else text
+
+
 def test_extract_html_content_from_wrapped_file_tag() -> None:
     text = '<file path="index.html">\n<html><body><p>Hello</p></body></html>\n</file>'
 
     result = extract_html_content(text)
 
     assert result == "<html><body><p>Hello</p></body></html>"
+
+
+def test_scanner_matches_the_regex_implementation() -> None:
+    corpus = list(RECORDED_OUTPUTS)
+    rng = random.Random(7)
+    for _ in range(5000):
+        corpus.append("".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 14))))
+
+    for text in corpus:
+        assert extract_html_content(text) == regex_extract_html_content(text), text
+
+
+def _fastest_extraction_seconds(text: str) -> float:
+    fastest = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        assert extract_html_content(text) == text
+        fastest = min(fastest, time.perf_counter() - started)
+    return fastest
+
+
+def test_scanner_stays_linear_on_unterminated_output() -> None:
+    # Many openings with no closing tags made every regex search rescan the rest.
+    unit = '<file path="index.html"><!DOCTYPE html><html><body>'
+    small = _fastest_extraction_seconds(unit * 2000)
+    large = _fastest_extraction_seconds(unit * 16000)
+
+    # 8x the input: linear work takes ~8x as long, quadratic work ~64x.
+    assert large < small * 24
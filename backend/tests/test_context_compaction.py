@@ -0,0 +1,159 @@
+import io
+import json
+import struct
+from typing import Any, List, cast
+
+import pytest
+from google.genai import types
+from PIL import Image
+
+from agent.providers.anthropic.provider import AnthropicProviderSession
+from agent.providers.base import ExecutedToolCall, ProviderTurn
+from agent.providers.compaction import (
+    CompactionPolicy,
+    ToolOutputCompactor,
+    estimate_image_tokens,
+)
+from agent.providers.gemini import GeminiProviderSession
+from agent.providers.openai import OpenAIProviderSession
+from agent.tools.types import ToolCall, ToolExecutionResult, ToolMultimodalPart
+from llm import Llm
+
+PROMPT = [{"role": "system", "content": "sys"}, {"role": "user", "content": "hi"}]
+EAGER = CompactionPolicy(keep_preview_images=1, keep_diffs=1, min_reclaim_bytes=0)
+
+
+def _png(width: int, height: int) -> bytes:
+    return b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + struct.pack(">II", width, height)
+
+
+def _screenshot(index: int) -> ExecutedToolCall:
+    buffer = io.BytesIO()
+    Image.new("RGB", (100, 100)).save(buffer, format="PNG")
+    part = ToolMultimodalPart(
+        display_name=f"preview_desktop_{index}.png",
+        mime_type="image/png",
+        data=buffer.getvalue(),
+    )
+    return ExecutedToolCall(
+        tool_call=ToolCall(id=f"shot-{index}", name="screenshot_preview", arguments={}),
+        result=ToolExecutionResult(
+            ok=True, result={"ok": True}, summary={}, multimodal_parts=[part]
+        ),
+    )
+
+
+def _edit(index: int) -> ExecutedToolCall:
+    result = {
+        "content": "Successfully edited index.html",
+        "details": {"diff": f"-old {index}\n+new {index}", "firstChangedLine": 1},
+    }
+    return ExecutedToolCall(
+        tool_call=ToolCall(id=f"edit-{index}", name="edit_file", arguments={}),
+        result=ToolExecutionResult(ok=True, result=result, summary={}),
+    )
+
+
+def test_compactor_keeps_latest_and_waits_for_threshold() -> None:
+    applied: List[int] = []
+    compactor = ToolOutputCompactor(
+        "test", CompactionPolicy(keep_preview_images=1, min_reclaim_bytes=250)
+    )
+    for index in range(3):
+        compactor.track("preview_image", 100, 10, lambda i=index: applied.append(i))
+
+    # Two stale images hold 200 bytes: not worth a cache miss yet.
+    assert compactor.compact() is None
+    compactor.track("preview_image", 100, 10, lambda: applied.append(3))
+
+    stats = compactor.compact()
+    assert stats is not None
+    assert (stats.images, stats.bytes_saved, stats.tokens_saved) == (3, 300, 30)
+    assert applied == [2, 1, 0]
+    # Compacted entries are never rewritten twice.
+    assert compactor.compact() is None
+    assert compactor.total.bytes_saved == 300
+
+
+def test_estimate_image_tokens_uses_png_dimensions() -> None:
+    assert estimate_image_tokens(_png(750, 10)) == 10
+    assert estimate_image_tokens(_png(4000, 4000)) == 1600
+    assert estimate_image_tokens(b"not a png") == 1600
+
+
+@pytest.mark.asyncio
+async def test_anthropic_compacts_old_screenshots_and_diffs() -> None:
+    session = AnthropicProviderSession(
+        client=object(),  # type: ignore[arg-type]
+        model=Llm.CLAUDE_SONNET_4_6,
+        prompt_messages=PROMPT,  # type: ignore[arg-type]
+        tools=[],
+    )
+    session._compactor = ToolOutputCompactor("anthropic", EAGER)
+    turn = ProviderTurn(assistant_text="", tool_calls=[], assistant_turn=None)
+    for index in range(2):
+        await session.append_tool_results(turn, [_screenshot(index), _edit(index)])
+
+    stats = session._compactor.compact()
+    assert stats is not None and (stats.images, stats.diffs) == (1, 1)
+
+    first, latest = session._messages[-3]["content"], session._messages[-1]["content"]
+    old_shot = cast(Any, first[0]["content"])
+    assert [block["type"] for block in old_shot] == ["text", "text", "text"]
+    assert "preview_desktop_0.png" in old_shot[-1]["text"]
+    assert "omitted" in json.loads(first[1]["content"])["details"]["diff"]
+    assert cast(Any, latest[0]["content"])[-1]["type"] == "image"
+    assert json.loads(latest[1]["content"])["details"]["diff"] == "-old 1\n+new 1"
+
+
+@pytest.mark.asyncio
+async def test_openai_compacts_old_screenshots_and_diffs() -> None:
+    session = OpenAIProviderSession(
+        client=object(),  # type: ignore[arg-type]
+        model=Llm.GPT_5_5_HIGH,
+        prompt_messages=PROMPT,  # type: ignore[arg-type]
+        tools=[],
+    )
+    session._compactor = ToolOutputCompactor("openai", EAGER)
+    turn = ProviderTurn(assistant_text="", tool_calls=[], assistant_turn=[])
+    for index in range(2):
+        await session.append_tool_results(turn, [_screenshot(index), _edit(index)])
+
+    session._compactor.compact()
+
+    old_shot, old_edit, new_shot, _ = session._input_items[-4:]
+    assert old_shot["output"][1] == {
+        "type": "input_text",
+        "text": old_shot["output"][1]["text"],
+    }
+    assert "omitted" in json.loads(old_edit["output"])["details"]["diff"]
+    assert new_shot["output"][1]["type"] == "input_image"
+
+
+@pytest.mark.asyncio
+async def test_gemini_drops_old_screenshot_parts() -> None:
+    session = GeminiProviderSession(
+        client=object(),  # type: ignore[arg-type]
+        model=Llm.GEMINI_3_FLASH_PREVIEW_MINIMAL,
+        prompt_messages=PROMPT,  # type: ignore[arg-type]
+        tools=[],
+    )
+    session._compactor = ToolOutputCompactor("gemini", EAGER)
+    model_turn = types.Content(
+        role="model",
+        parts=[types.Part.from_function_call(name="screenshot_preview", args={})],
+    )
+    turn = ProviderTurn(assistant_text="", tool_calls=[], assistant_turn=model_turn)
+    shots = [_screenshot(0), _screenshot(1)]
+    for shot in shots:
+        await session.append_tool_results(turn, [shot])
+
+    session._compactor.compact()
+
+    old = cast(Any, session._contents[-3].parts)[0].function_response
+    new = cast(Any, session._contents[-1].parts)[0].function_response
+    assert old.parts == []
+    assert "preview_desktop_0.png" in old.response["omittedImages"][0]
+    assert len(new.parts) == 1
+    # The tool's own result dict is left untouched.
+    assert shots[0].result.result == {"ok": True}
@@ -0,0 +1,122 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from conversation_store import ConversationStore, UnknownCommitError
+from prompts.prompt_types import PromptHistoryMessage
+from routes.generate_code import ParameterExtractionStage
+
+
+def _user(text: str, images: list[str] | None = None) -> PromptHistoryMessage:
+    return {"role": "user", "text": text, "images": images or [], "videos": []}
+
+
+def test_variant_history_follows_selected_parents() -> None:
+    store = ConversationStore()
+    conversation_id = store.start_conversation()
+    create = store.add_commit(
+        conversation_id, _user("Build this", ["data:image/png;base64,AA=="]), ["<a/>", "<b/>"]
+    )
+    edit = store.add_commit(
+        conversation_id,
+        _user("Make it blue"),
+        ["<b blue/>", ""],
+        parent_commit_id=create.commit_id,
+        parent_variant_index=1,
+    )
+
+    history = store.variant_history(conversation_id, edit.commit_id, 0)
+    assert [(item["role"], item["text"]) for item in history] == [
+        ("user", "Build this"),
+        ("assistant", "<b/>"),
+        ("user", "Make it blue"),
+        ("assistant", "<b blue/>"),
+    ]
+    # A variant that produced no code contributes no assistant turn.
+    assert len(store.variant_history(conversation_id, edit.commit_id, 1)) == 3
+
+    state = store.state_for_update(conversation_id, edit.commit_id, 0)
+    assert state.option_codes == ["<b blue/>", ""]
+    assert state.file_state == {"path": "index.html", "content": "<b blue/>"}
+
+    with pytest.raises(UnknownCommitError):
+        store.state_for_update(conversation_id, edit.commit_id, 5)
+    with pytest.raises(UnknownCommitError):
+        store.add_commit("missing", _user("x"), [])
+
+
+def test_store_evicts_least_recently_used_conversations() -> None:
+    store = ConversationStore(max_conversations=2, max_commits=1)
+    first = store.start_conversation()
+    second = store.start_conversation()
+    store.add_commit(first, _user("a"), ["<a/>"])
+    store.start_conversation()
+
+    assert len(store) == 2
+    with pytest.raises(UnknownCommitError):
+        store.add_commit(second, _user("b"), [])
+    with pytest.raises(UnknownCommitError):
+        store.add_commit(first, _user("c"), [])
+
+
+def test_store_evicts_least_recently_used_conversations_past_its_byte_budget() -> None:
+    store = ConversationStore(max_bytes=150)
+    screenshot = "data:image/png;base64," + "A" * 38
+    first = store.start_conversation()
+    second = store.start_conversation()
+    store.add_commit(first, _user("", [screenshot]), ["<a/>"])
+    store.add_commit(second, _user("", [screenshot]), ["<b/>"])
+    assert store.total_bytes == 128
+    # Adding to ``first`` makes ``second`` the least recently used one.
+    store.add_commit(first, _user("x" * 30), [])
+
+    assert len(store) == 1
+    with pytest.raises(UnknownCommitError):
+        store.get_commit(second, "anything")
+    with pytest.raises(UnknownCommitError):
+        store.add_commit(first, _user("y" * 100), [])
+    assert store.total_bytes == 94
+
+
+@pytest.mark.asyncio
+async def test_update_request_is_hydrated_from_the_parent_commit(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    store = ConversationStore()
+    monkeypatch.setattr("routes.generate_code.conversation_store", store)
+    conversation_id = store.start_conversation()
+    parent = store.add_commit(conversation_id, _user("Build a page"), ["<p>1</p>", "<p>2</p>"])
+    stage = ParameterExtractionStage(AsyncMock())
+
+    extracted = await stage.extract_and_validate(
+        {
+            "generatedCodeConfig": "html_tailwind",
+            "inputMode": "text",
+            "generationType": "update",
+            "prompt": {"text": "Bigger", "fullText": "Bigger heading"},
+            "conversationId": conversation_id,
+            "parentCommitId": parent.commit_id,
+            "selectedVariantIndex": 1,
+        }
+    )
+
+    assert [item["text"] for item in extracted.history] == [
+        "Build a page",
+        "<p>2</p>",
+        "Bigger heading",
+    ]
+    assert extracted.option_codes == ["<p>1</p>", "<p>2</p>"]
+    assert extracted.file_state == {"path": "index.html", "content": "<p>2</p>"}
+    assert extracted.conversation_user_turn == _user("Bigger heading")
+
+    with pytest.raises(UnknownCommitError):
+        await stage.extract_and_validate(
+            {
+                "generatedCodeConfig": "html_tailwind",
+                "inputMode": "text",
+                "generationType": "update",
+                "prompt": {"text": "Bigger"},
+                "conversationId": conversation_id,
+                "parentCommitId": "nope",
+            }
+        )
@@ -0,0 +1,156 @@
+import difflib
+import random
+from typing import List
+
+from agent.document import Document
+from agent.state import AgentFileState
+from agent.tools.runtime import AgentToolRuntime, _windowed_unified_diff
+
+WORDS = ["<div>", "</div>", "\n", "  ", "hello", "class=\"a\"", "\n    ", "x"]
+REPEATED_LINES = ["\n", "<div>\n", "</div>\n", "  </p>\n", "a\n"]
+
+
+def _page(sections: int) -> str:
+    return "".join(
+        f'<section id="s{i}">\n  <h2>Heading {i}</h2>\n  <p>Body {i}</p>\n</section>\n'
+        for i in range(sections)
+    )
+
+
+def test_find_and_replace_match_str_semantics() -> None:
+    rng = random.Random(7)
+    for _ in range(200):
+        text = "".join(rng.choice(WORDS) for _ in range(rng.choice([20, 400])))
+        document, expected = Document(text), text
+        for _ in range(rng.randint(1, 10)):
+            start = rng.randrange(max(len(expected) - 10, 1))
+            needle = expected[start : start + rng.randint(1, 30)] or "x"
+            replacement = "".join(rng.choice(WORDS) for _ in range(rng.randint(0, 3)))
+            limit = rng.choice([1, 2, None])
+
+            matches = document.find_all(needle, limit)
+            count = expected.count(needle)
+            assert len(matches) == (count if limit is None else min(limit, count))
+            for position in reversed(matches):
+                document.replace(position, position + len(needle), replacement)
+            if matches:
+                expected = expected.replace(needle, replacement, limit or -1)
+            assert document.slice(0, len(document)) == expected
+
+        assert document.text == expected
+        middle = len(expected) // 2
+        assert document.line_number(middle) == expected.count("\n", 0, middle)
+
+
+def test_touched_spans_track_original_lengths() -> None:
+    document = Document("aaaa bbbb cccc")
+    document.replace(5, 9, "BB")
+    document.replace(0, 4, "AAAAAA")
+
+    spans = document.touched_spans()
+    assert [(span.start, span.end, span.original_length) for span in spans] == [
+        (0, 6, 4),
+        (7, 9, 4),
+    ]
+    assert document.text == "AAAAAA BB cccc"
+
+
+def test_edit_file_diff_matches_full_file_diff() -> None:
+    original = _page(400)
+    runtime = AgentToolRuntime(
+        file_state=AgentFileState(content=original),
+        should_generate_images=False,
+        openai_api_key=None,
+        openai_base_url=None,
+    )
+    edits = [
+        {"old_text": f"<h2>Heading {i}</h2>", "new_text": f"<h2>Title {i}</h2>\n  <hr>"}
+        for i in (3, 4, 150, 398)
+    ]
+    edits.append({"old_text": "<p>Body 200</p>\n", "new_text": ""})
+
+    result = runtime._edit_file({"edits": edits})
+
+    updated = runtime.file_state.content
+    expected = "".join(
+        difflib.unified_diff(
+            original.splitlines(keepends=True),
+            updated.splitlines(keepends=True),
+            fromfile="index.html",
+            tofile="index.html",
+        )
+    )
+    assert result.result["details"]["diff"] == expected
+    assert result.result["details"]["firstChangedLine"] == 11
+
+
+def _apply_diff(old: str, diff: List[str]) -> str:
+    old_lines = old.splitlines(keepends=True)
+    result: List[str] = []
+    position = 0
+    for line in diff[2:]:
+        if line.startswith("@@"):
+            first, _, length = line.split()[1][1:].partition(",")
+            # Empty ranges name the line before the hunk.
+            start = int(first) if length == "0" else int(first) - 1
+            result += old_lines[position:start]
+            position = start
+        elif line[0] in " -":
+            assert old_lines[position] == line[1:]
+            position += 1
+            if line[0] == " ":
+                result.append(line[1:])
+        else:
+            result.append(line[1:])
+    return "".join(result + old_lines[position:])
+
+
+def test_windowed_diff_is_a_valid_diff_of_the_whole_file() -> None:
+    rng = random.Random(16)
+    windowed = 0
+    for _ in range(1000):
+        size = rng.choice([40, 250, 400])
+        repeated = rng.choice([0.2, 0.5, 0.8])
+        original = "".join(
+            rng.choice(REPEATED_LINES) if rng.random() < repeated else f"line {i}\n"
+            for i in range(size)
+        )
+        document = Document(original)
+        for _ in range(rng.randint(1, 4)):
+            start = rng.randrange(len(document))
+            end = min(start + rng.choice([0, 1, 2, 5, 20]), len(document))
+            replacement = rng.choice(
+                ["", "\n", "x", f"line {rng.randrange(size)}\n", "new\n</div>\n"]
+                + REPEATED_LINES
+            )
+            if start != end or replacement:
+                document.replace(start, end, replacement)
+
+        diff = _windowed_unified_diff(original, document.text, "f", document)
+        if diff is not None:
+            windowed += 1
+            assert _apply_diff(original, diff) == document.text
+    assert windowed > 200
+
+
+def test_failed_batch_leaves_file_untouched() -> None:
+    file_state = AgentFileState(content=_page(3))
+    runtime = AgentToolRuntime(
+        file_state=file_state,
+        should_generate_images=False,
+        openai_api_key=None,
+        openai_base_url=None,
+    )
+
+    result = runtime._edit_file(
+        {
+            "edits": [
+                {"old_text": "Heading 1", "new_text": "Title 1"},
+                {"old_text": "missing", "new_text": "x"},
+            ]
+        }
+    )
+
+    assert not result.ok
+    assert file_state.content == _page(3)
+    assert file_state.document.touched_spans() == []
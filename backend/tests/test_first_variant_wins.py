@@ -0,0 +1,105 @@
+import asyncio
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from llm import Llm
+from routes.generate_code import AgenticGenerationStage
+
+# Per-model (delay, completion) for the fake agent.
+SCRIPT: Dict[Llm, Tuple[float, str]] = {}
+CANCELLED: List[Llm] = []
+
+
+class ScriptedAgent:
+    def __init__(self, **kwargs: Any) -> None:
+        pass
+
+    async def run(self, model: Llm, prompt_messages: Any) -> str:
+        delay, completion = SCRIPT[model]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            CANCELLED.append(model)
+            raise
+        return completion
+
+    def budget_report(self) -> None:
+        return None
+
+
+def _stage(sent: List[Tuple[Any, ...]], **kwargs: Any) -> AgenticGenerationStage:
+    async def send_message(*args: Any) -> None:
+        sent.append(args)
+
+    return AgenticGenerationStage(
+        send_message=send_message,
+        openai_api_key=None,
+        openai_base_url=None,
+        anthropic_api_key=None,
+        gemini_api_key=None,
+        replicate_api_key=None,
+        should_generate_images=False,
+        file_state=None,
+        asset_base_url="",
+        option_codes=None,
+        first_variant_wins=True,
+        **kwargs,
+    )
+
+
+@pytest.fixture(autouse=True)
+def scripted_agent(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("routes.generate_code.Agent", ScriptedAgent)
+    SCRIPT.clear()
+    CANCELLED.clear()
+
+
+@pytest.mark.asyncio
+async def test_first_non_empty_variant_wins_and_rest_are_cancelled() -> None:
+    SCRIPT[Llm.GPT_5_5_LOW] = (0.0, "")
+    SCRIPT[Llm.CLAUDE_SONNET_4_6] = (0.01, "<html>fast</html>")
+    SCRIPT[Llm.GEMINI_3_5_FLASH_LOW] = (10, "<html>slow</html>")
+    sent: List[Tuple[Any, ...]] = []
+
+    result = await asyncio.wait_for(
+        _stage(sent).process_variants(
+            [Llm.GPT_5_5_LOW, Llm.CLAUDE_SONNET_4_6, Llm.GEMINI_3_5_FLASH_LOW], []
+        ),
+        timeout=1,
+    )
+
+    assert result == {1: "<html>fast</html>"}
+    assert CANCELLED == [Llm.GEMINI_3_5_FLASH_LOW]
+    assert ("variantError", 2) in [(message[0], message[2]) for message in sent]
+
+
+@pytest.mark.asyncio
+async def test_quality_gate_skips_variants_that_fail_to_render(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def capture(html: str, device: str = "desktop") -> bytes:
+        if "broken" in html:
+            raise RuntimeError("render failed")
+        return b"png"
+
+    monkeypatch.setattr("routes.generate_code.capture_preview_screenshot", capture)
+    monkeypatch.setattr(
+        "routes.generate_code.is_screenshot_preview_available", lambda: True
+    )
+    SCRIPT[Llm.GPT_5_5_LOW] = (0.0, "<html>broken</html>")
+    SCRIPT[Llm.CLAUDE_SONNET_4_6] = (0.01, "<html>ok</html>")
+    sent: List[Tuple[Any, ...]] = []
+    stage = _stage(sent, winner_quality_gate="screenshot")
+
+    result = await stage.process_variants(
+        [Llm.GPT_5_5_LOW, Llm.CLAUDE_SONNET_4_6], []
+    )
+    assert result == {1: "<html>ok</html>"}
+
+    # Nothing passes: fall back to the first non-empty completion.
+    SCRIPT[Llm.CLAUDE_SONNET_4_6] = (0.01, "<html>broken too</html>")
+    result = await stage.process_variants(
+        [Llm.GPT_5_5_LOW, Llm.CLAUDE_SONNET_4_6], []
+    )
+    assert result == {0: "<html>broken</html>"}
@@ -0,0 +1,203 @@
+import asyncio
+from typing import Any, Dict, List
+from unittest.mock import AsyncMock
+
+import pytest
+
+from agent.cancellation import CancellationScope
+from jobs import (
+    GenerationJobSpec,
+    InProcessJobBackend,
+    JobBackend,
+    SQLiteJobBackend,
+    WorkerPool,
+)
+from routes.generate_code import JobDispatchStage
+
+
+def _spec() -> GenerationJobSpec:
+    return GenerationJobSpec(
+        variant_models=["gpt-4.1-2025-04-14"],
+        prompt_messages=[{"role": "user", "content": "Build a page"}],
+        openai_api_key="sk-test",
+    )
+
+
+async def _fake_runner(
+    spec: GenerationJobSpec, send_message: Any, scope: CancellationScope
+) -> Dict[int, str]:
+    await send_message("chunk", "<p>", 0, None, None)
+    await send_message("setCode", "<p>done</p>", 0, None, None)
+    return {0: "<p>done</p>"}
+
+
+async def _run_dispatch(backend: JobBackend) -> tuple[Dict[int, str], List[Any]]:
+    pool = WorkerPool(backend, 1, run_job=_fake_runner, claim_timeout=0.05)
+    pool.start()
+    send_message = AsyncMock()
+    try:
+        completions = await asyncio.wait_for(
+            JobDispatchStage(backend, send_message, CancellationScope()).run(_spec()),
+            timeout=5,
+        )
+    finally:
+        await pool.stop()
+    return completions, [call.args[:2] for call in send_message.await_args_list]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_relays_worker_events_through_memory_backend() -> None:
+    backend = InProcessJobBackend()
+    completions, sent = await _run_dispatch(backend)
+
+    assert completions == {0: "<p>done</p>"}
+    assert sent == [("chunk", "<p>"), ("setCode", "<p>done</p>")]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_replays_events_and_drops_secrets(tmp_path: Any) -> None:
+    backend = SQLiteJobBackend(str(tmp_path / "jobs.sqlite3"), poll_interval=0.01)
+    completions, _ = await _run_dispatch(backend)
+    assert completions == {0: "<p>done</p>"}
+
+    (job_id,) = [row[0] for row in backend._conn.execute("SELECT job_id FROM jobs")]
+    replay = [event async for event in backend.events(job_id, after_seq=1)]
+    assert [event["type"] for event in replay] == ["setCode", "jobCompleted"]
+    assert [event["seq"] for event in replay] == [2, 3]
+
+    record = await backend.get(job_id)
+    assert record is not None and record.state == "completed"
+    assert "sk-test" not in backend._conn.execute("SELECT spec FROM jobs").fetchone()[0]
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_never_writes_api_keys_to_disk(tmp_path: Any) -> None:
+    path = tmp_path / "private" / "jobs.sqlite3"
+    backend = SQLiteJobBackend(str(path), poll_interval=0.01)
+    other_process = SQLiteJobBackend(str(path), poll_interval=0.01)
+    await backend.submit(_spec())
+
+    (stored,) = backend._conn.execute("SELECT spec FROM jobs").fetchone()
+    assert "sk-test" not in stored
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert path.parent.stat().st_mode & 0o777 == 0o700
+    claimed = await other_process.claim("worker-elsewhere", timeout=0.1)
+    assert claimed is not None and claimed.spec.openai_api_key is None
+    assert claimed.spec.prompt_messages == _spec().prompt_messages
+    await other_process.close()
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_requeues_jobs_with_stale_lease(tmp_path: Any) -> None:
+    backend = SQLiteJobBackend(
+        str(tmp_path / "jobs.sqlite3"), poll_interval=0.01, lease_seconds=0.05
+    )
+    job_id = await backend.submit(_spec())
+    first = await backend.claim("worker-a", timeout=0.1)
+    assert first is not None and first.job_id == job_id
+    assert await backend.claim("worker-b", timeout=0.02) is None
+
+    await asyncio.sleep(0.1)
+    second = await backend.claim("worker-b", timeout=0.1)
+    assert second is not None and second.job_id == job_id
+    assert second.spec.openai_api_key == "sk-test"
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_rerun_replaces_the_lost_runs_events(tmp_path: Any) -> None:
+    backend = SQLiteJobBackend(
+        str(tmp_path / "jobs.sqlite3"), poll_interval=0.01, lease_seconds=0.05
+    )
+    job_id = await backend.submit(_spec())
+    assert await backend.claim("worker-a", timeout=0.1) is not None
+    for index in range(3):
+        await backend.publish(job_id, {"type": "chunk", "value": str(index)})
+    await backend._flush()
+
+    await asyncio.sleep(0.1)
+    assert await backend.claim("worker-b", timeout=0.1) is not None
+    await backend.publish(job_id, {"type": "chunk", "value": "rerun"})
+    await backend.finish(job_id, "completed", {0: "<p>done</p>"})
+
+    events = [event async for event in backend.events(job_id)]
+    # Numbering continues, so a follower at seq 3 picks up the rerun.
+    assert [(event["seq"], event.get("value")) for event in events] == [
+        (4, "rerun"),
+        (5, None),
+    ]
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_prunes_finished_jobs(tmp_path: Any) -> None:
+    backend = SQLiteJobBackend(
+        str(tmp_path / "jobs.sqlite3"),
+        poll_interval=0.01,
+        event_grace_seconds=0.05,
+        retention_seconds=0.2,
+    )
+    job_id = await backend.submit(_spec())
+    assert await backend.claim("worker-a", timeout=0.1) is not None
+    for index in range(50):
+        await backend.publish(job_id, {"type": "setCode", "value": "x" * index})
+    await backend.finish(job_id, "completed", {0: "<p>done</p>"})
+
+    await asyncio.sleep(0.1)
+    await backend.claim("worker-a", timeout=0)
+    events = [event async for event in backend.events(job_id)]
+    assert [(event["seq"], event["type"]) for event in events] == [(51, "jobCompleted")]
+
+    await asyncio.sleep(0.2)
+    await backend.claim("worker-a", timeout=0)
+    assert await backend.get(job_id) is None
+    assert backend._conn.execute("SELECT COUNT(*) FROM job_events").fetchone()[0] == 0
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_keeps_only_the_outcome_of_old_jobs() -> None:
+    backend = InProcessJobBackend(event_grace_seconds=0)
+    first, second = await backend.submit(_spec()), await backend.submit(_spec())
+    for index in range(10):
+        await backend.publish(first, {"type": "chunk", "value": str(index)})
+    await backend.finish(first, "completed", {0: "<p>done</p>"})
+    await backend.finish(second, "cancelled")
+
+    events = [event async for event in backend.events(first)]
+    assert [(event["seq"], event["type"]) for event in events] == [(11, "jobCompleted")]
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_running_job() -> None:
+    backend = InProcessJobBackend()
+    started = asyncio.Event()
+
+    async def slow_runner(
+        spec: GenerationJobSpec, send_message: Any, scope: CancellationScope
+    ) -> Dict[int, str]:
+        started.set()
+        await asyncio.sleep(10)
+        return {0: "never"}
+
+    pool = WorkerPool(
+        backend, 1, run_job=slow_runner, claim_timeout=0.05, cancel_poll_interval=0.01
+    )
+    pool.start()
+    scope = CancellationScope()
+    dispatch = asyncio.create_task(
+        JobDispatchStage(backend, AsyncMock(), scope).run(_spec())
+    )
+    await asyncio.wait_for(started.wait(), timeout=5)
+    scope.cancel("client disconnected")
+
+    assert await asyncio.wait_for(dispatch, timeout=5) == {}
+    for _ in range(100):
+        record = await backend.get(next(iter(backend._jobs)))
+        if record is not None and record.state == "cancelled":
+            break
+        await asyncio.sleep(0.01)
+    assert record is not None and record.state == "cancelled"
+    await pool.stop()
@@ -0,0 +1,121 @@
+import json
+from typing import Any, Dict, List
+
+import pytest
+
+from agent.engine import AgentEngine
+from agent.live_edits import LiveEditPreview
+from agent.providers.base import (
+    EventSink,
+    ExecutedToolCall,
+    ProviderTurn,
+    StreamEvent,
+)
+from agent.tools import StreamingToolArguments, ToolCall
+
+PAGE = "<main>\n  <h1>Old title</h1>\n  <p>Old body</p>\n</main>\n"
+EDITS = [
+    {"old_text": "Old title", "new_text": "New title"},
+    {"old_text": "Old body", "new_text": 'New "body" {x}'},
+]
+
+
+def test_array_elements_are_reported_as_they_close() -> None:
+    raw = json.dumps({"path": "index.html", "edits": EDITS})
+    stream = StreamingToolArguments()
+    seen: List[int] = []
+    for index in range(0, len(raw), 5):
+        stream.feed(raw[index : index + 5])
+        seen.append(len(stream.items("edits") or []))
+
+    assert stream.items("edits") == EDITS
+    assert seen[0] == 0 and 1 in seen and seen[-1] == 2
+    assert stream.value("path") == "index.html"
+
+
+def test_preview_applies_new_edits_and_stops_on_a_miss() -> None:
+    preview = LiveEditPreview(PAGE)
+
+    assert preview.apply_new("call", EDITS[:1])
+    assert not preview.apply_new("call", EDITS[:1])
+    assert "New title" in preview.content
+
+    assert not preview.apply_new("call", EDITS[:1] + [{"old_text": "nope"}])
+    assert preview.stopped
+    assert not preview.apply_new("call", EDITS)
+
+
+class StreamingEditSession:
+    """Streams one edit_file call's JSON in small chunks, then finishes."""
+
+    def __init__(self) -> None:
+        self.turns = 0
+        self.code_before_turn_end: List[str] = []
+        self.sent: List[Dict[str, Any]] = []
+
+    async def stream_turn(self, on_event: EventSink) -> ProviderTurn:
+        self.turns += 1
+        if self.turns > 1:
+            return ProviderTurn(assistant_text="", tool_calls=[])
+        arguments = {"path": "index.html", "edits": EDITS}
+        raw = json.dumps(arguments)
+        stream = StreamingToolArguments()
+        for index in range(0, len(raw), 7):
+            stream.feed(raw[index : index + 7])
+            await on_event(
+                StreamEvent(
+                    type="tool_call_delta",
+                    tool_call_id="edit-1",
+                    tool_name="edit_file",
+                    argument_stream=stream,
+                )
+            )
+        self.code_before_turn_end = [
+            m["value"] for m in self.sent if m["type"] == "setCode"
+        ]
+        return ProviderTurn(
+            assistant_text="",
+            tool_calls=[ToolCall(id="edit-1", name="edit_file", arguments=arguments)],
+        )
+
+    async def append_tool_results(
+        self, turn: ProviderTurn, executed_tool_calls: List[ExecutedToolCall]
+    ) -> None:
+        return None
+
+    async def close(self) -> None:
+        return None
+
+
+@pytest.mark.asyncio
+async def test_engine_streams_each_edit_before_the_turn_ends() -> None:
+    session = StreamingEditSession()
+
+    async def send_message(
+        message_type: str,
+        value: str | None,
+        variant_index: int,
+        data: Dict[str, Any] | None,
+        event_id: str | None,
+    ) -> None:
+        session.sent.append({"type": message_type, "value": value})
+
+    engine = AgentEngine(
+        send_message=send_message,
+        variant_index=0,
+        openai_api_key=None,
+        openai_base_url=None,
+        anthropic_api_key=None,
+        gemini_api_key=None,
+        replicate_api_key=None,
+        should_generate_images=False,
+        initial_file_state={"path": "index.html", "content": PAGE},
+    )
+
+    result = await engine._run_with_session(session)  # type: ignore[arg-type]
+
+    first, second = session.code_before_turn_end
+    assert "New title" in first and "Old body" in first
+    assert second == result
+    # The authoritative edit matched the preview, so nothing is re-sent.
+    assert [m for m in session.sent if m["type"] == "setCode"][2:] == []
@@ -0,0 +1,154 @@
+import base64
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, List, cast
+
+import pytest
+from fastapi import HTTPException
+
+from prompts.request_parsing import (
+    parse_prompt_content,
+    parse_prompt_history,
+    resolve_media_references,
+)
+from routes.media import check_media, upload_media
+from uploaded_assets import UnknownMediaError, persist_data_url_as_temporary_asset
+from uploaded_assets.media import evict_media
+
+
+class FakeUploadRequest:
+    def __init__(self, chunks: List[bytes], content_type: str) -> None:
+        self.chunks = chunks
+        self.headers = {"content-type": content_type}
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        for chunk in self.chunks:
+            yield chunk
+
+
+@pytest.fixture(autouse=True)
+def media_dir(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Path:
+    directory = tmp_path / "media"
+    monkeypatch.setattr("uploaded_assets.media.MEDIA_UPLOAD_DIR", str(directory))
+    monkeypatch.setattr(
+        "uploaded_assets.store.TEMP_ASSET_DIR", str(tmp_path / "tmp-assets")
+    )
+    return directory
+
+
+async def _upload(chunks: List[bytes], content_type: str = "image/png") -> Any:
+    return await upload_media(cast(Any, FakeUploadRequest(chunks, content_type)))
+
+
+@pytest.mark.asyncio
+async def test_chunked_upload_is_content_addressed_and_deduplicated(
+    media_dir: Path,
+) -> None:
+    payload = b"\x89PNG" + b"x" * 1000
+    first = await _upload([payload[:10], payload[10:500], payload[500:]])
+    second = await _upload([payload])
+
+    digest = hashlib.sha256(payload).hexdigest()[:24]
+    assert first.mediaId == f"media_{digest}"
+    assert (first.size, first.deduplicated) == (len(payload), False)
+    assert (second.mediaId, second.deduplicated) == (first.mediaId, True)
+    assert sorted(path.suffix for path in media_dir.iterdir()) == [".bin", ".json"]
+
+    response = await check_media(first.mediaId)
+    assert response.headers["x-media-size"] == str(len(payload))
+    with pytest.raises(HTTPException):
+        await check_media("media_" + "0" * 24)
+
+
+@pytest.mark.asyncio
+async def test_upload_rejects_unsupported_types_and_oversized_bodies(
+    monkeypatch: pytest.MonkeyPatch, media_dir: Path
+) -> None:
+    with pytest.raises(HTTPException) as error:
+        await _upload([b"text"], "text/plain")
+    assert error.value.status_code == 400
+
+    monkeypatch.setattr("uploaded_assets.media.MEDIA_UPLOAD_MAX_BYTES", 8)
+    with pytest.raises(HTTPException):
+        await _upload([b"12345", b"67890"], "video/mp4")
+    assert list(media_dir.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_media_ids_resolve_to_data_urls_in_prompt_and_history() -> None:
+    image = await _upload([b"image-bytes"], "image/png")
+    video = await _upload([b"video-bytes"], "video/mp4")
+
+    prompt = parse_prompt_content(
+        {"text": "Build", "images": [image.mediaId], "videos": [video.mediaId]}
+    )
+    history = parse_prompt_history(
+        [{"role": "user", "text": "", "images": [image.mediaId, "data:image/png;base64,AA=="]}]
+    )
+    assert prompt["images"] == [image.mediaId]
+    await resolve_media_references(prompt, history)
+
+    image_url = "data:image/png;base64," + base64.b64encode(b"image-bytes").decode()
+    assert prompt["images"] == [image_url]
+    assert prompt["videos"] == [
+        "data:video/mp4;base64," + base64.b64encode(b"video-bytes").decode()
+    ]
+    assert history[0]["images"] == [image_url, "data:image/png;base64,AA=="]
+
+    # Staging the resolved image reuses the upload digest.
+    asset = persist_data_url_as_temporary_asset(prompt["images"][0], "")
+    again = persist_data_url_as_temporary_asset(prompt["images"][0], "")
+    assert asset is not None and again == asset
+    assert asset.asset_id == "tmp_asset_" + image.mediaId.removeprefix("media_")
+
+    with pytest.raises(UnknownMediaError):
+        await resolve_media_references(
+            parse_prompt_content({"images": ["media_" + "f" * 24]}), []
+        )
+
+
+def _age(media_dir: Path, media_id: str, seconds: float) -> None:
+    path = media_dir / f"{media_id}.bin"
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+@pytest.mark.asyncio
+async def test_unused_uploads_expire(
+    monkeypatch: pytest.MonkeyPatch, media_dir: Path
+) -> None:
+    monkeypatch.setattr("uploaded_assets.media.MEDIA_UPLOAD_TTL_SECONDS", 60)
+    old = await _upload([b"old"])
+    used = await _upload([b"used"])
+    _age(media_dir, old.mediaId, 120)
+    _age(media_dir, used.mediaId, 120)
+    await resolve_media_references(parse_prompt_content({"images": [used.mediaId]}), [])
+
+    assert evict_media() == 1
+    assert await check_media(used.mediaId)
+    with pytest.raises(HTTPException):
+        await check_media(old.mediaId)
+    assert sorted(path.name for path in media_dir.iterdir()) == [
+        f"{used.mediaId}.bin",
+        f"{used.mediaId}.json",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_store_evicts_least_recently_used_uploads_past_its_quota(
+    monkeypatch: pytest.MonkeyPatch, media_dir: Path
+) -> None:
+    monkeypatch.setattr("uploaded_assets.media.MEDIA_UPLOAD_MAX_TOTAL_BYTES", 25)
+    first = await _upload([b"a" * 10])
+    second = await _upload([b"b" * 10])
+    _age(media_dir, first.mediaId, 20)
+    _age(media_dir, second.mediaId, 10)
+
+    third = await _upload([b"c" * 10])
+
+    with pytest.raises(HTTPException):
+        await check_media(first.mediaId)
+    assert await check_media(second.mediaId)
+    assert await check_media(third.mediaId)
@@ -1,9 +1,12 @@
 import copy
 from typing import Any
 
+import httpx
+import openai
 import pytest
 
 from agent.providers.base import ExecutedToolCall, ProviderTurn
+from agent.providers.compaction import CompactionPolicy, ToolOutputCompactor
 from agent.providers.openai import OpenAIProviderSession
 from agent.tools import ToolCall, ToolExecutionResult
 from llm import Llm
@@ -57,7 +60,7 @@ def _test_tools() -> list[dict[str, Any]]:
 
 
 @pytest.mark.asyncio
-async def test_openai_provider_session_omits_prompt_cache_key_across_turns() -> None:
+async def test_openai_provider_session_keeps_prompt_cache_key_across_turns() -> None:
     client = _FakeOpenAIClient()
     session = OpenAIProviderSession(
         client=client,  # type: ignore[arg-type]
@@ -108,8 +111,8 @@ async def test_openai_provider_session_omits_prompt_cache_key_across_turns() ->
     first_input = first_call["input"]
     second_input = second_call["input"]
 
-    assert "prompt_cache_key" not in first_call
-    assert "prompt_cache_key" not in second_call
+    assert first_call["prompt_cache_key"].startswith("s2c-")
+    assert second_call["prompt_cache_key"] == first_call["prompt_cache_key"]
     assert "prompt_cache_retention" not in first_call
     assert "prompt_cache_retention" not in second_call
     assert isinstance(first_input, list)
@@ -118,7 +121,7 @@ async def test_openai_provider_session_omits_prompt_cache_key_across_turns() ->
 
 
 @pytest.mark.asyncio
-async def test_openai_provider_session_omits_prompt_cache_key_for_all_prompts() -> None:
+async def test_openai_provider_session_shares_prompt_cache_key_for_same_prompt() -> None:
     first_client = _FakeOpenAIClient()
     second_client = _FakeOpenAIClient()
     different_prompt_client = _FakeOpenAIClient()
@@ -146,9 +149,9 @@ async def test_openai_provider_session_omits_prompt_cache_key_for_all_prompts()
     await second_session.stream_turn(_noop_event_sink)
     await different_prompt_session.stream_turn(_noop_event_sink)
 
-    assert "prompt_cache_key" not in first_client.responses.calls[0]
-    assert "prompt_cache_key" not in second_client.responses.calls[0]
-    assert "prompt_cache_key" not in different_prompt_client.responses.calls[0]
+    first_key = first_client.responses.calls[0]["prompt_cache_key"]
+    assert second_client.responses.calls[0]["prompt_cache_key"] == first_key
+    assert different_prompt_client.responses.calls[0]["prompt_cache_key"] != first_key
 
 
 @pytest.mark.asyncio
@@ -332,3 +335,162 @@ async def test_openai_provider_session_keeps_high_image_detail_for_non_gpt_5_5()
 
     assert image_part["type"] == "input_image"
     assert image_part["detail"] == "high"
+
+
+class _RecordedStream:
+    def __init__(self, events: list[dict[str, Any]]) -> None:
+        self._events = iter(events)
+
+    def __aiter__(self) -> "_RecordedStream":
+        return self
+
+    async def __anext__(self) -> dict[str, Any]:
+        try:
+            return next(self._events)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _ChainingResponses:
+    def __init__(self, stored: set[str]) -> None:
+        self.calls: list[dict[str, Any]] = []
+        self.stored = stored
+
+    async def create(self, **kwargs: Any) -> _RecordedStream:
+        self.calls.append(copy.deepcopy(kwargs))
+        previous = kwargs.get("previous_response_id")
+        if previous is not None and previous not in self.stored:
+            raise openai.NotFoundError(
+                f"Previous response with id '{previous}' not found.",
+                response=httpx.Response(
+                    404, request=httpx.Request("POST", "https://api.openai.com/v1/responses")
+                ),
+                body={"code": "previous_response_not_found"},
+            )
+        response_id = f"resp_{len(self.calls)}"
+        self.stored.add(response_id)
+        return _RecordedStream(
+            [{"type": "response.completed", "response": {"id": response_id}}]
+        )
+
+
+async def _append_edit_result(session: OpenAIProviderSession, call_id: str) -> None:
+    await session.append_tool_results(
+        ProviderTurn(
+            assistant_text="",
+            tool_calls=[],
+            assistant_turn=[
+                {
+                    "type": "function_call",
+                    "call_id": call_id,
+                    "name": "edit_file",
+                    "arguments": '{"path":"index.html"}',
+                }
+            ],
+        ),
+        [
+            ExecutedToolCall(
+                tool_call=ToolCall(id=call_id, name="edit_file", arguments={}),
+                result=ToolExecutionResult(ok=True, result={"content": "ok"}, summary={}),
+            )
+        ],
+    )
+
+
+@pytest.mark.asyncio
+async def test_chained_session_sends_only_new_tool_outputs() -> None:
+    client = _FakeOpenAIClient()
+    client.responses = _ChainingResponses(stored=set())  # type: ignore[assignment]
+    session = OpenAIProviderSession(
+        client=client,  # type: ignore[arg-type]
+        model=Llm.GPT_5_5_HIGH,
+        prompt_messages=[{"role": "user", "content": "Build a landing page."}],
+        tools=_test_tools(),
+        chain_responses=True,
+    )
+
+    await session.stream_turn(_noop_event_sink)
+    await _append_edit_result(session, "call-1")
+    await session.stream_turn(_noop_event_sink)
+    await _append_edit_result(session, "call-2")
+    await session.stream_turn(_noop_event_sink)
+
+    first, second, third = client.responses.calls
+    assert "previous_response_id" not in first
+    assert second["previous_response_id"] == "resp_1"
+    assert third["previous_response_id"] == "resp_2"
+    assert [item["call_id"] for item in third["input"]] == ["call-2"]
+    assert third["input"][0]["type"] == "function_call_output"
+
+
+@pytest.mark.asyncio
+async def test_chained_session_resends_full_input_when_response_expired() -> None:
+    stored: set[str] = set()
+    client = _FakeOpenAIClient()
+    client.responses = _ChainingResponses(stored)  # type: ignore[assignment]
+    session = OpenAIProviderSession(
+        client=client,  # type: ignore[arg-type]
+        model=Llm.GPT_5_5_HIGH,
+        prompt_messages=[{"role": "user", "content": "Build a landing page."}],
+        tools=_test_tools(),
+        chain_responses=True,
+    )
+
+    await session.stream_turn(_noop_event_sink)
+    await _append_edit_result(session, "call-1")
+    stored.clear()
+    await session.stream_turn(_noop_event_sink)
+
+    _, expired, retried = client.responses.calls
+    assert expired["previous_response_id"] == "resp_1"
+    assert "previous_response_id" not in retried
+    assert [item.get("type", item.get("role")) for item in retried["input"]] == [
+        "user",
+        "function_call",
+        "function_call_output",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_chained_session_sends_full_input_after_compacting() -> None:
+    client = _FakeOpenAIClient()
+    client.responses = _ChainingResponses(stored=set())  # type: ignore[assignment]
+    session = OpenAIProviderSession(
+        client=client,  # type: ignore[arg-type]
+        model=Llm.GPT_5_5_HIGH,
+        prompt_messages=[{"role": "user", "content": "Build a landing page."}],
+        tools=_test_tools(),
+        chain_responses=True,
+    )
+    session._compactor = ToolOutputCompactor(
+        "openai", CompactionPolicy(keep_diffs=1, min_reclaim_bytes=0)
+    )
+
+    async def append_diff(call_id: str) -> None:
+        await session.append_tool_results(
+            ProviderTurn(assistant_text="", tool_calls=[], assistant_turn=[]),
+            [
+                ExecutedToolCall(
+                    tool_call=ToolCall(id=call_id, name="edit_file", arguments={}),
+                    result=ToolExecutionResult(
+                        ok=True,
+                        result={"content": "ok", "details": {"diff": "-a\n+b"}},
+                        summary={},
+                    ),
+                )
+            ],
+        )
+
+    await session.stream_turn(_noop_event_sink)
+    await append_diff("call-1")
+    await session.stream_turn(_noop_event_sink)
+    await append_diff("call-2")
+    await session.stream_turn(_noop_event_sink)
+    await session.stream_turn(_noop_event_sink)
+
+    _, chained, compacted, after = client.responses.calls
+    assert chained["previous_response_id"] == "resp_1"
+    assert "previous_response_id" not in compacted
+    outputs = [item["output"] for item in compacted["input"] if "output" in item]
+    assert "omitted" in outputs[0] and "omitted" not in outputs[1]
+    assert after["previous_response_id"] == "resp_3"
@@ -0,0 +1,150 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from ws.outbound_queue import OutboundMessageQueue
+
+
+class RecordingSender:
+    def __init__(self) -> None:
+        self.sent: List[Dict[str, Any]] = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, payload: Dict[str, Any]) -> bool:
+        await self.release.wait()
+        self.sent.append(payload)
+        return True
+
+
+def _delta(msg_type: str, text: str, variant: int = 0, event: str = "e1") -> Dict[str, Any]:
+    return {"type": msg_type, "variantIndex": variant, "value": text, "eventId": event}
+
+
+@pytest.mark.asyncio
+async def test_merges_text_deltas_per_event_and_variant() -> None:
+    sender = RecordingSender()
+    queue = OutboundMessageQueue(sender, flush_interval=0)
+
+    queue.enqueue(_delta("assistant", "Hel"))
+    queue.enqueue(_delta("assistant", "lo"))
+    queue.enqueue(_delta("assistant", "other", variant=1))
+    queue.enqueue(_delta("thinking", "hmm"))
+    queue.enqueue(_delta("assistant", "!", event="e2"))
+    queue.start()
+    await queue.close()
+
+    assert [(p["type"], p["variantIndex"], p["value"]) for p in sender.sent] == [
+        ("assistant", 0, "Hello"),
+        ("assistant", 1, "other"),
+        ("thinking", 0, "hmm"),
+        ("assistant", 0, "!"),
+    ]
+    assert queue.metrics.coalesced == 1
+
+
+@pytest.mark.asyncio
+async def test_keeps_only_latest_pending_set_code_per_variant() -> None:
+    sender = RecordingSender()
+    queue = OutboundMessageQueue(sender, flush_interval=0)
+
+    queue.enqueue({"type": "setCode", "variantIndex": 0, "value": "<p>1</p>"})
+    queue.enqueue({"type": "setCode", "variantIndex": 1, "value": "<p>a</p>"})
+    queue.enqueue({"type": "toolResult", "variantIndex": 0, "data": {}})
+    queue.enqueue({"type": "setCode", "variantIndex": 0, "value": "<p>2</p>"})
+    queue.start()
+    await queue.close()
+
+    assert [(p["type"], p.get("value")) for p in sender.sent] == [
+        ("setCode", "<p>a</p>"),
+        ("toolResult", None),
+        ("setCode", "<p>2</p>"),
+    ]
+    assert queue.metrics.superseded == 1
+
+
+@pytest.mark.asyncio
+async def test_set_code_is_not_superseded_past_a_patch_that_depends_on_it() -> None:
+    sender = RecordingSender()
+    queue = OutboundMessageQueue(sender, flush_interval=0)
+
+    queue.enqueue({"type": "setCode", "variantIndex": 0, "value": "<p>1</p>"})
+    queue.enqueue({"type": "patchCode", "variantIndex": 0, "data": {}})
+    queue.enqueue({"type": "setCode", "variantIndex": 0, "value": "<p>2</p>"})
+    queue.enqueue({"type": "setCode", "variantIndex": 0, "value": "<p>3</p>"})
+    queue.enqueue({"type": "variantComplete", "variantIndex": 0, "value": ""})
+    queue.start()
+    await queue.close()
+
+    assert [(p["type"], p.get("value")) for p in sender.sent] == [
+        ("setCode", "<p>1</p>"),
+        ("patchCode", None),
+        ("setCode", "<p>3</p>"),
+        ("variantComplete", ""),
+    ]
+    assert queue.metrics.superseded == 1
+
+
+@pytest.mark.asyncio
+async def test_enqueue_never_waits_on_a_slow_socket() -> None:
+    sender = RecordingSender()
+    sender.release.clear()
+    queue = OutboundMessageQueue(sender, flush_interval=0, max_depth=4)
+    queue.start()
+
+    for index in range(50):
+        queue.enqueue({"type": "status", "variantIndex": index % 4, "value": "..."})
+        queue.enqueue({"type": "toolStart", "variantIndex": index % 4, "data": {}})
+
+    assert queue.metrics.dropped > 0
+    assert queue.metrics.depth <= 50
+
+    sender.release.set()
+    await queue.close()
+    assert sum(1 for p in sender.sent if p["type"] == "toolStart") == 50
+
+
+@pytest.mark.asyncio
+async def test_stops_when_socket_reports_closed() -> None:
+    sent: List[Dict[str, Any]] = []
+
+    async def closed_sender(payload: Dict[str, Any]) -> bool:
+        sent.append(payload)
+        return False
+
+    queue = OutboundMessageQueue(closed_sender, flush_interval=0)
+    queue.start()
+    queue.enqueue({"type": "status", "variantIndex": 0, "value": "one"})
+    queue.enqueue({"type": "toolStart", "variantIndex": 0, "data": {}})
+    await queue.close()
+
+    assert len(sent) == 1
+    assert queue.is_running is False
+
+
+@pytest.mark.asyncio
+async def test_disconnects_a_client_that_stops_reading() -> None:
+    sender = RecordingSender()
+    sender.release.clear()
+    overflows: List[bool] = []
+    queue = OutboundMessageQueue(
+        sender,
+        flush_interval=0,
+        max_depth=4,
+        hard_limit=8,
+        on_overflow=lambda: overflows.append(True),
+    )
+    queue.start()
+    queue.enqueue({"type": "toolStart", "variantIndex": 0, "data": {}})
+    await asyncio.sleep(0)
+
+    for index in range(20):
+        queue.enqueue({"type": "status", "variantIndex": 0, "value": str(index)})
+        queue.enqueue({"type": "toolStart", "variantIndex": index % 4, "data": {}})
+
+    assert overflows == [True]
+    assert queue.metrics.overflowed == 1
+    assert queue.is_running is False
+    await queue.close()
+    assert sender.sent == []
@@ -0,0 +1,192 @@
+import copy
+from typing import Any, Dict, List
+
+import pytest
+from google.genai import types
+
+from agent.providers.gemini import GeminiProviderSession, _split_cacheable_prefix
+from agent.providers.prompt_cache import (
+    GeminiContextCacheRegistry,
+    PromptCacheStats,
+    anthropic_cache_layout,
+    gemini_context_caches,
+)
+from agent.providers.token_usage import TokenUsage
+from llm import Llm
+
+PNG_DATA_URL = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+
+
+def _count_breakpoints(value: Any) -> int:
+    if isinstance(value, dict):
+        return ("cache_control" in value) + sum(_count_breakpoints(v) for v in value.values())
+    if isinstance(value, list):
+        return sum(_count_breakpoints(item) for item in value)
+    return 0
+
+
+def test_anthropic_layout_marks_copies_at_four_breakpoints() -> None:
+    tools = [{"name": "create_file"}, {"name": "edit_file"}]
+    messages: List[Dict[str, Any]] = [
+        {"role": "user", "content": [{"type": "image"}, {"type": "text", "text": "Build"}]},
+        {"role": "assistant", "content": [{"type": "tool_use", "id": "1"}]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "1"}]},
+    ]
+    originals = copy.deepcopy((tools, messages))
+
+    system, marked_tools, marked_messages = anthropic_cache_layout(
+        "You are helpful.", tools, messages, initial_message_count=1
+    )
+
+    assert system == [
+        {"type": "text", "text": "You are helpful.", "cache_control": {"type": "ephemeral"}}
+    ]
+    assert "cache_control" in marked_tools[-1] and "cache_control" not in marked_tools[0]
+    assert "cache_control" in marked_messages[0]["content"][-1]
+    assert "cache_control" in marked_messages[2]["content"][-1]
+    assert _count_breakpoints([system, marked_tools, marked_messages]) == 4
+    assert (tools, messages) == originals
+
+
+class _FakeStream:
+    def __aiter__(self) -> "_FakeStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        raise StopAsyncIteration
+
+
+class _FakeGeminiClient:
+    def __init__(self, calls: Dict[str, List[Any]]) -> None:
+        self.calls = calls
+        self.aio = self
+        self.caches = self
+        self.models = self
+
+    async def create(self, model: str, config: types.CreateCachedContentConfig) -> Any:
+        self.calls["caches"].append(config)
+        return types.CachedContent(name="cachedContents/abc")
+
+    async def delete(self, name: str) -> None:
+        self.calls.setdefault("deleted", []).append(name)
+
+    async def generate_content_stream(self, **kwargs: Any) -> _FakeStream:
+        self.calls["requests"].append(kwargs)
+        return _FakeStream()
+
+
+def _gemini_session(calls: Dict[str, List[Any]]) -> GeminiProviderSession:
+    return GeminiProviderSession(
+        client=_FakeGeminiClient(calls),  # type: ignore[arg-type]
+        model=Llm.GEMINI_3_FLASH_PREVIEW_MINIMAL,
+        prompt_messages=[
+            {"role": "system", "content": "You are helpful."},
+            {
+                "role": "user",
+                "content": [
+                    {"type": "image_url", "image_url": {"url": PNG_DATA_URL}},
+                    {"type": "text", "text": "Build this page."},
+                ],
+            },
+        ],
+        tools=[types.Tool(function_declarations=[types.FunctionDeclaration(name="create_file")])],
+        context_cache_scope="key-1",
+    )
+
+
+async def _noop(_: Any) -> None:
+    return None
+
+
+@pytest.mark.asyncio
+async def test_gemini_variants_share_one_context_cache() -> None:
+    gemini_context_caches.clear()
+    calls: Dict[str, List[Any]] = {"caches": [], "requests": []}
+    first, second = _gemini_session(calls), _gemini_session(calls)
+
+    await first.stream_turn(_noop)
+    await second.stream_turn(_noop)
+    second.limit_tools({"create_file"})
+    await second.stream_turn(_noop)
+
+    assert len(calls["caches"]) == 1
+    cache_config = calls["caches"][0]
+    assert cache_config.system_instruction == "You are helpful."
+    assert cache_config.contents[0].parts[0].inline_data is not None
+    cached_request, _, filtered_request = calls["requests"]
+    assert cached_request["config"].cached_content == "cachedContents/abc"
+    assert cached_request["config"].system_instruction is None
+    assert cached_request["config"].tools is None
+    assert [part.text for part in cached_request["contents"][0].parts] == ["Build this page."]
+    # Filtered tool lists don't match the cached tools: send the whole prompt.
+    assert filtered_request["config"].cached_content is None
+    # Either way the turn keeps the prompt's order: screenshot, then text.
+    image_part, text_part = filtered_request["contents"][0].parts
+    assert image_part.inline_data is not None
+    assert text_part.text == "Build this page."
+    gemini_context_caches.clear()
+
+
+def test_gemini_cache_split_keeps_the_turn_in_its_original_order() -> None:
+    image = types.Part.from_bytes(data=b"png", mime_type="image/png")
+    intro, instruction = types.Part(text="Reference:"), types.Part(text="Build it.")
+    turn = types.Content(role="user", parts=[intro, image, instruction, image])
+
+    split = _split_cacheable_prefix([turn])
+
+    assert split is not None
+    prefix, rest = split
+    assert [*(prefix[-1].parts or []), *(rest.parts or [])] == turn.parts
+    assert rest.parts == [instruction, image]
+    assert _split_cacheable_prefix(
+        [types.Content(role="user", parts=[instruction, image])]
+    ) is None
+
+
+@pytest.mark.asyncio
+async def test_last_gemini_session_deletes_the_context_cache() -> None:
+    gemini_context_caches.clear()
+    calls: Dict[str, List[Any]] = {"caches": [], "requests": []}
+    first, second = _gemini_session(calls), _gemini_session(calls)
+    await first.stream_turn(_noop)
+    await second.stream_turn(_noop)
+
+    await first.close()
+    assert "deleted" not in calls
+    await second.close()
+    assert calls["deleted"] == ["cachedContents/abc"]
+
+    # A later request creates a fresh cache.
+    third = _gemini_session(calls)
+    await third.stream_turn(_noop)
+    await third.close()
+    assert len(calls["caches"]) == 2
+    assert calls["deleted"] == ["cachedContents/abc", "cachedContents/abc"]
+    gemini_context_caches.clear()
+
+
+@pytest.mark.asyncio
+async def test_failed_gemini_cache_is_not_retried_until_it_would_expire() -> None:
+    registry = GeminiContextCacheRegistry(ttl_seconds=600)
+    attempts: List[int] = []
+
+    async def create(ttl_seconds: int) -> str:
+        attempts.append(ttl_seconds)
+        raise RuntimeError("content is too small to cache")
+
+    assert await registry.get_or_create("key", create) is None
+    assert await registry.get_or_create("key", create) is None
+    assert attempts == [600]
+
+
+def test_prompt_cache_stats_report_hit_rate_per_provider() -> None:
+    stats = PromptCacheStats()
+    stats.record("anthropic", TokenUsage(input=100, cache_read=300, cache_write=100))
+    stats.record("anthropic", TokenUsage(input=100, cache_read=400))
+    stats.record("openai", TokenUsage(input=500))
+
+    snapshot = stats.snapshot()
+
+    assert snapshot["anthropic"]["turns"] == 2
+    assert snapshot["anthropic"]["cache_hit_rate_percent"] == 70.0
+    assert snapshot["openai"]["cache_hit_rate_percent"] == 0.0
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from typing import List
+
+import httpx
+import pytest
+
+from agent.providers.clients import HttpPoolSettings, ProviderClientPool
+from agent.providers.openai import OpenAIProviderSession
+from llm import Llm
+
+
+def _pool(idle_seconds: float = 60.0) -> ProviderClientPool:
+    return ProviderClientPool(HttpPoolSettings(http2=False, idle_seconds=idle_seconds))
+
+
+@pytest.mark.asyncio
+async def test_clients_are_shared_per_key_and_released_on_session_close() -> None:
+    pool = _pool()
+    first, first_lease = pool.acquire("openai", "key-1")
+    second, second_lease = pool.acquire("openai", "key-1")
+    other_key, other_lease = pool.acquire("openai", "key-2")
+
+    assert first is second and other_key is not first
+    # Clients for the same endpoint share one connection pool.
+    assert first._client is other_key._client is pool.http_client("openai")
+
+    session = OpenAIProviderSession(
+        client=first,
+        model=Llm.GPT_5_5_HIGH,
+        prompt_messages=[{"role": "user", "content": "Build a page."}],
+        tools=[],
+        client_lease=first_lease,
+    )
+    await session.close()
+    await session.close()
+
+    assert first_lease.released and not pool.http_client("openai").is_closed
+    for lease in (second_lease, other_lease):
+        lease.release()
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_idle_clients_are_evicted_and_their_pool_closed() -> None:
+    pool = _pool(idle_seconds=10)
+    idle, idle_lease = pool.acquire("anthropic", "key-1")
+    held, _ = pool.acquire("openai", "key-1")
+    idle_lease.release()
+    anthropic_http = pool.http_client("anthropic")
+
+    closed = await pool.evict_idle(now=pool._clients[idle_lease.key].last_used + 11)
+
+    assert closed == 1 and anthropic_http.is_closed
+    assert pool.acquire("anthropic", "key-1")[0] is not idle
+    assert pool.acquire("openai", "key-1")[0] is held
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_from_another_loop_is_replaced_and_closed_on_its_loop() -> None:
+    pool = _pool()
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+    thread.start()
+
+    async def open_pool() -> httpx.AsyncClient:
+        return pool.http_client("openai")
+
+    try:
+        stale = asyncio.run_coroutine_threadsafe(open_pool(), other_loop).result(5)
+        fresh = pool.http_client("openai")
+        assert fresh is not stale and not fresh.is_closed
+        for _ in range(100):
+            if stale.is_closed:
+                break
+            await asyncio.sleep(0.01)
+        assert stale.is_closed
+        assert not fresh.follow_redirects
+        assert pool.http_client("tool-images", follow_redirects=True).follow_redirects
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join(5)
+        other_loop.close()
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_warm_opens_a_connection_per_target_and_tolerates_failures(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    pool = _pool()
+    requested: List[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        if request.url.host == "api.anthropic.com":
+            raise httpx.ConnectError("unreachable", request=request)
+        return httpx.Response(404)
+
+    mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(pool, "http_client", lambda name, base_url=None, **_: mock_client)
+
+    await pool.warm(
+        [("openai", "key", "https://proxy.test/v1"), ("anthropic", "key", None)]
+    )
+
+    assert sorted(requested) == ["https://api.anthropic.com", "https://proxy.test/v1"]
+    assert all(pooled.leases == 0 for pooled in pool._clients.values())
+    await mock_client.aclose()
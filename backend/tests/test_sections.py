@@ -0,0 +1,166 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import pytest
+
+import agent.sections as sections_module
+from agent.sections import SectionedAgent, merge_section_documents
+from asset_extraction import ASSET_EXTRACTION_GEMINI_MODEL, PageSection, _section_bands
+from llm import Llm
+
+PROMPT: List[Any] = [
+    {"role": "system", "content": "sys"},
+    {
+        "role": "user",
+        "content": [
+            {"type": "image_url", "image_url": {"url": "data:image/png;base64,full"}},
+            {"type": "text", "text": "Build this page"},
+        ],
+    },
+]
+
+
+def _page(head: str, body_attrs: str, body: str) -> str:
+    return f"<!DOCTYPE html>\n<html lang=\"en\">\n<head>{head}</head>\n<body{body_attrs}>{body}</body>\n</html>"
+
+
+def test_merge_keeps_first_shell_and_unions_head_resources() -> None:
+    tailwind = '<script src="https://cdn.tailwindcss.com"></script>'
+    merged = merge_section_documents(
+        [
+            _page(f"<title>Site</title>{tailwind}", ' class="bg-white"', "<nav>Nav</nav>"),
+            _page(
+                f"{tailwind}<style>.s2-hero {{ color: red; }}</style>",
+                ' class="bg-black"',
+                "<section>Hero</section>",
+            ),
+        ],
+        ["navigation", "hero"],
+    )
+
+    assert merged.count("cdn.tailwindcss.com") == 1
+    assert ".s2-hero" in merged and merged.count("<title>") == 1
+    assert '<html lang="en">' in merged and '<body class="bg-white">' in merged
+    assert merged.index("<nav>Nav</nav>") < merged.index("<!-- Section 2: hero -->")
+    assert '<div class="bg-black">\n<section>Hero</section>\n</div>' in merged
+
+
+def test_section_bands_cover_the_page_without_overlaps() -> None:
+    bands = _section_bands(
+        [
+            PageSection(label="hero", box_2d=[120, 50, 480, 950]),
+            PageSection(label="nav", box_2d=[0, 0, 100, 1000]),
+            PageSection(label="sliver", box_2d=[470, 0, 490, 1000]),
+            PageSection(label="footer", box_2d=[500, 0, 990, 1000]),
+        ],
+        max_sections=6,
+    )
+
+    assert bands == [("nav", 0.0, 100.0), ("hero", 100.0, 490.0), ("footer", 490.0, 1000.0)]
+
+
+class FakeEngine:
+    def __init__(self, record: List[Dict[str, Any]], **kwargs: Any):
+        self.kwargs = kwargs
+        self.record = record
+
+    async def run(self, model: Llm, prompt_messages: List[Any]) -> str:
+        user = prompt_messages[-1]["content"]
+        instructions = user[-1]["text"]
+        self.record.append(
+            {
+                "image": user[0]["image_url"]["url"],
+                "instructions": instructions,
+                "file_state": self.kwargs.get("initial_file_state"),
+                "budget_parent": self.kwargs.get("parent_budget_tracker"),
+            }
+        )
+        if "Section" in instructions:
+            await asyncio.sleep(0)
+            label = instructions.split(": ", 1)[1].split("\n", 1)[0]
+            return _page("", "", f"<section>{label}</section>")
+        file_state = self.kwargs.get("initial_file_state")
+        return file_state["content"] if file_state else "<html>single</html>"
+
+    def budget_report(self) -> Optional[Dict[str, Any]]:
+        return {"steps": 1}
+
+
+def _sectioned_agent(
+    record: List[Dict[str, Any]],
+    sent: List[Any],
+    slots: Optional[List[Tuple[str, str]]] = None,
+) -> SectionedAgent:
+    async def send_message(*args: Any) -> None:
+        sent.append(args)
+
+    @asynccontextmanager
+    async def admission_slot(provider: str, model_name: str) -> AsyncIterator[None]:
+        if slots is not None:
+            slots.append((provider, model_name))
+        yield
+
+    return SectionedAgent(
+        send_message=send_message,
+        variant_index=0,
+        gemini_api_key="key",
+        engine_factory=lambda **kwargs: FakeEngine(record, **kwargs),
+        admission_slot=admission_slot,
+    )
+
+
+@pytest.mark.asyncio
+async def test_sections_are_generated_merged_and_verified(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def detect(url: str, key: str, max_sections: int) -> List[Dict[str, Any]]:
+        return [
+            {"label": "nav", "box_2d": [0, 0, 200, 1000], "data_url": "data:image/png;base64,a"},
+            {"label": "footer", "box_2d": [200, 0, 1000, 1000], "data_url": "data:image/png;base64,b"},
+        ]
+
+    monkeypatch.setattr(sections_module, "detect_page_sections", detect)
+    record: List[Dict[str, Any]] = []
+    sent: List[Any] = []
+    slots: List[Tuple[str, str]] = []
+    agent = _sectioned_agent(record, sent, slots)
+
+    result = await agent.run(Llm.CLAUDE_SONNET_4_6, PROMPT)
+
+    *section_runs, verify = record
+    assert sorted(run["image"] for run in section_runs) == [
+        "data:image/png;base64,a",
+        "data:image/png;base64,b",
+    ]
+    assert verify["image"] == "data:image/png;base64,full"
+    assert "screenshot_preview" in verify["instructions"]
+    assert verify["file_state"]["content"] == result
+    assert result.index("<section>nav</section>") < result.index("<section>footer</section>")
+    assert ("setCode", result, 0, None, None) in sent
+    report = agent.budget_report()
+    assert report is not None and len(report["sections"]) == 2
+    # Planning, two sections and the verify pass each held their own slot.
+    assert slots == [("gemini", ASSET_EXTRACTION_GEMINI_MODEL)] + [
+        ("anthropic", Llm.CLAUDE_SONNET_4_6.value)
+    ] * 3
+    # Every sub-agent charged the variant's one budget.
+    assert agent.budget_tracker is not None
+    assert all(run["budget_parent"] is agent.budget_tracker for run in record)
+    # The caller's prompt is not modified.
+    assert len(PROMPT[1]["content"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_unsplittable_page_falls_back_to_one_agent(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def detect(url: str, key: str, max_sections: int) -> List[Dict[str, Any]]:
+        raise RuntimeError("gemini unavailable")
+
+    monkeypatch.setattr(sections_module, "detect_page_sections", detect)
+    record: List[Dict[str, Any]] = []
+    agent = _sectioned_agent(record, [])
+
+    assert await agent.run(Llm.CLAUDE_SONNET_4_6, PROMPT) == "<html>single</html>"
+    assert len(record) == 1 and record[0]["instructions"] == "Build this page"
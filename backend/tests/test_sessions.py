@@ -0,0 +1,170 @@
+import asyncio
+from typing import Any, Dict, List, cast
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from routes.generate_code import (
+    PipelineContext,
+    SessionResumeStage,
+    WebSocketCommunicator,
+)
+from ws.sessions import GenerationSession, SessionRegistry, session_registry
+
+
+def _session(**kwargs: Any) -> GenerationSession:
+    options: Dict[str, Any] = {"max_events": 100, "max_bytes": 10_000, "ttl_seconds": 60}
+    options.update(kwargs)
+    return GenerationSession("s1", **options)
+
+
+def test_log_drops_superseded_code_and_replays_after_seq() -> None:
+    session = _session()
+    for payload in [
+        {"type": "setCode", "variantIndex": 0, "value": "<p>1</p>"},
+        {"type": "assistant", "variantIndex": 0, "value": "Hi"},
+        {"type": "setCode", "variantIndex": 0, "value": "<p>2</p>"},
+    ]:
+        session.record(payload)
+
+    replay = session.events_since(0)
+    assert [event["seq"] for event in replay] == [2, 3]
+    assert replay[1]["value"] == "<p>2</p>"
+    assert session.events_since(3) == []
+
+
+def test_code_snapshot_survives_ring_eviction() -> None:
+    session = _session(max_events=2)
+    session.record({"type": "setCode", "variantIndex": 1, "value": "<p>v1</p>"})
+    for index in range(5):
+        session.record({"type": "assistant", "variantIndex": 0, "value": str(index)})
+
+    replay = session.events_since(0)
+
+    assert [event["seq"] for event in replay] == [1, 5, 6]
+    assert replay[0]["value"] == "<p>v1</p>"
+    # A client that already saw the snapshot doesn't get it again.
+    assert [event["seq"] for event in session.events_since(1)] == [5, 6]
+
+
+def test_log_respects_byte_cap() -> None:
+    session = _session(max_bytes=1_000)
+    for _ in range(10):
+        session.record({"type": "assistant", "variantIndex": 0, "value": "x" * 200})
+
+    assert session.log_bytes <= 1_000
+    assert len(session.events_since(0)) == 3
+
+
+@pytest.mark.asyncio
+async def test_detached_session_is_abandoned_unless_resumed() -> None:
+    abandoned: List[str] = []
+    session = _session(ttl_seconds=0.01, on_abandoned=lambda: abandoned.append("x"))
+    owner, other = object(), object()
+    sink = AsyncMock()
+
+    session.attach(owner, sink)
+    assert session.detach(other) is False
+    assert session.detach(owner) is True
+    session.attach(other, sink, last_seq=0)
+    await asyncio.sleep(0.03)
+    assert abandoned == []
+
+    session.detach(other)
+    await asyncio.sleep(0.03)
+    assert abandoned == ["x"]
+
+
+def test_registry_evicts_expired_and_idle_sessions() -> None:
+    registry = SessionRegistry(max_sessions=2, ttl_seconds=60)
+    first = registry.create()
+    second = registry.create()
+    assert first is not None and second is not None
+    first.attach(object(), AsyncMock())
+    second.attach(object(), AsyncMock())
+
+    assert registry.create() is None
+
+    second._owner = None  # type: ignore[attr-defined]
+    second._sink = None  # type: ignore[attr-defined]
+    third = registry.create()
+    assert third is not None
+    assert registry.get(second.session_id) is None
+
+    first._owner = None  # type: ignore[attr-defined]
+    first._sink = None  # type: ignore[attr-defined]
+    first.last_active -= 120
+    assert registry.get(first.session_id) is None
+    assert len(registry) == 1
+
+
+@pytest.mark.asyncio
+async def test_registry_evicts_finished_sessions_before_abandoning_running_ones() -> None:
+    registry = SessionRegistry(max_sessions=2, ttl_seconds=60)
+    abandoned: List[str] = []
+    running = registry.create(on_abandoned=lambda: abandoned.append("running"))
+    finished = registry.create(on_abandoned=lambda: abandoned.append("finished"))
+    assert running is not None and finished is not None
+    finished.finish()
+
+    assert registry.create() is not None
+    assert registry.get(finished.session_id) is None
+    assert abandoned == []
+
+    assert registry.create() is not None
+    assert registry.get(running.session_id) is None
+    assert abandoned == ["running"]
+
+
+def _websocket(receive: List[Dict[str, Any]]) -> MagicMock:
+    websocket = MagicMock()
+    websocket.scope = {}
+    websocket.accept = AsyncMock()
+    websocket.close = AsyncMock()
+    websocket.send_json = AsyncMock()
+    websocket.receive = AsyncMock(side_effect=receive)
+    return websocket
+
+
+@pytest.mark.asyncio
+async def test_resumed_connection_gets_backlog_then_live_events() -> None:
+    session = session_registry.create()
+    assert session is not None
+    original = WebSocketCommunicator(cast(Any, _websocket([])))
+    original.session = session
+    session.attach(original, original.deliver)
+    original.is_closed = True
+    session.detach(original)
+
+    await original.send_message("assistant", "Hel", 0, None, "a-1")
+    await original.send_message("assistant", "lo", 0, None, "a-1")
+
+    hold = asyncio.Event()
+
+    async def wait_forever() -> Dict[str, Any]:
+        await hold.wait()
+        return {"type": "websocket.disconnect"}
+
+    websocket = _websocket([])
+    websocket.receive = AsyncMock(side_effect=wait_forever)
+    resumed = WebSocketCommunicator(cast(Any, websocket))
+    await resumed.accept()
+    context = PipelineContext(websocket=cast(Any, websocket), ws_comm=resumed)
+
+    resume = asyncio.create_task(
+        SessionResumeStage(context).resume(
+            {"resumeSessionId": session.session_id, "lastSeq": 1}
+        )
+    )
+    await asyncio.sleep(0)
+    await original.send_message("setCode", "<p>done</p>", 0)
+    session.finish()
+    await asyncio.wait_for(resume, timeout=1)
+    await resumed.close()
+
+    sent = [call.args[0] for call in websocket.send_json.await_args_list]
+    assert [(message["type"], message["seq"]) for message in sent] == [
+        ("assistant", 2),
+        ("setCode", 3),
+    ]
+    assert sent[0]["value"] == "lo"
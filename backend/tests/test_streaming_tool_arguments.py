@@ -0,0 +1,138 @@
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import pytest
+
+from agent.providers.anthropic.provider import AnthropicParseState, _parse_stream_event
+from agent.providers.base import StreamEvent
+from agent.tools import StreamingToolArguments
+from evals.tool_argument_parsing_benchmark import measure
+
+ARGS = {
+    "meta": {"skip": ["}", {"content": "nested, not top-level"}], "q": "\"]"},
+    "count": 3,
+    "path": "src/index.html",
+    "content": 'Line "one"\n\ttab \\ slash é 😀 \u0007 end',
+}
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 13])
+def test_feed_decodes_each_chunk_once_regardless_of_split(
+    ensure_ascii: bool, chunk_size: int
+) -> None:
+    raw = json.dumps(ARGS, ensure_ascii=ensure_ascii)
+    stream = StreamingToolArguments()
+    decoded: Dict[str, List[str]] = {}
+    for start in range(0, len(raw), chunk_size):
+        for name, text in stream.feed(raw[start : start + chunk_size]).items():
+            decoded.setdefault(name, []).append(text)
+
+    assert "".join(decoded["content"]) == ARGS["content"]
+    assert stream.value("content") == ARGS["content"]
+    assert stream.length("content") == len(ARGS["content"])
+    assert stream.value("path") == "src/index.html"
+    assert stream.complete
+    assert stream.raw_text == raw
+
+
+def test_field_is_visible_as_soon_as_its_string_starts() -> None:
+    stream = StreamingToolArguments()
+    stream.feed('{"path": "a.html", "content')
+    assert stream.value("content") is None
+    stream.feed('": "')
+    assert stream.value("content") == ""
+    assert stream.feed("<p>hi") == {"content": "<p>hi"}
+    assert not stream.complete
+
+
+def test_from_arguments_wraps_parsed_arguments() -> None:
+    stream = StreamingToolArguments.from_arguments({"content": "<p/>", "other": 1})
+    assert stream.value("content") == "<p/>"
+    assert stream.value("path") is None
+    assert stream.complete
+
+
+@pytest.mark.asyncio
+async def test_anthropic_parser_feeds_one_stream_per_tool_block() -> None:
+    state = AnthropicParseState()
+    events: List[StreamEvent] = []
+
+    async def on_event(event: StreamEvent) -> None:
+        events.append(event)
+
+    def event(**kwargs: Any) -> Any:
+        return SimpleNamespace(**kwargs)
+
+    await _parse_stream_event(
+        event(
+            type="content_block_start",
+            index=0,
+            content_block=SimpleNamespace(type="tool_use", id="t1", name="create_file", input={}),
+        ),
+        state,
+        on_event,
+    )
+    for piece in ['{"content": "<h1>', "Hi</h1>", '"}']:
+        await _parse_stream_event(
+            event(
+                type="content_block_delta",
+                index=0,
+                delta=SimpleNamespace(type="input_json_delta", partial_json=piece),
+            ),
+            state,
+            on_event,
+        )
+
+    assert [e.tool_arguments for e in events] == ['{"content": "<h1>', "Hi</h1>", '"}']
+    assert all(e.argument_stream is events[0].argument_stream for e in events)
+    assert events[-1].argument_stream is not None
+    assert events[-1].argument_stream.value("content") == "<h1>Hi</h1>"
+
+
+def test_benchmark_reports_each_window() -> None:
+    rows = measure(2_000, chunk_size=50, windows=4)
+    assert rows[0].offset == 0
+    assert [row.offset for row in rows] == sorted(row.offset for row in rows)
+    assert all(row.incremental_us > 0 for row in rows)
+
+
+@pytest.mark.asyncio
+async def test_anthropic_parser_reports_completed_arguments_at_block_stop() -> None:
+    state = AnthropicParseState()
+    events: List[StreamEvent] = []
+
+    async def on_event(event: StreamEvent) -> None:
+        events.append(event)
+
+    await _parse_stream_event(
+        SimpleNamespace(
+            type="content_block_start",
+            index=1,
+            content_block=SimpleNamespace(
+                type="tool_use", id="t2", name="generate_images", input={}
+            ),
+        ),
+        state,
+        on_event,
+    )
+    await _parse_stream_event(
+        SimpleNamespace(
+            type="content_block_delta",
+            index=1,
+            delta=SimpleNamespace(
+                type="input_json_delta", partial_json='{"prompts": ["a cat"]}'
+            ),
+        ),
+        state,
+        on_event,
+    )
+    await _parse_stream_event(
+        SimpleNamespace(type="content_block_stop", index=1), state, on_event
+    )
+
+    complete = [e for e in events if e.type == "tool_call_complete"]
+    assert len(complete) == 1
+    assert complete[0].tool_call_id == "t2"
+    assert complete[0].tool_arguments == {"prompts": ["a cat"]}
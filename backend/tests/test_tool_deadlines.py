@@ -0,0 +1,111 @@
+import asyncio
+from typing import Any, List
+
+import pytest
+
+from agent.state import AgentFileState
+from agent.tools.deadlines import (
+    ToolTimeout,
+    gather_until,
+    parse_deadline_overrides,
+    tool_timeout_counters,
+)
+from agent.tools.runtime import AgentToolRuntime
+from agent.tools.types import ToolCall
+
+
+def _runtime(**deadlines: float) -> AgentToolRuntime:
+    return AgentToolRuntime(
+        file_state=AgentFileState(),
+        should_generate_images=True,
+        openai_api_key=None,
+        openai_base_url=None,
+        tool_deadlines=deadlines,
+    )
+
+
+def test_parse_deadline_overrides_skips_malformed_entries() -> None:
+    assert parse_deadline_overrides("generate_images=60, screenshot_preview=0,bad,x=y") == {
+        "generate_images": 60.0,
+        "screenshot_preview": 0.0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_gather_until_returns_finished_items_and_times_out_the_rest() -> None:
+    cancelled: List[int] = []
+
+    async def item(index: int, delay: float) -> int:
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        if index == 1:
+            raise ValueError("boom")
+        return index
+
+    results = await gather_until([item(0, 0), item(1, 0), item(2, 10)], timeout=0.05)
+
+    assert results[0] == 0
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[2], ToolTimeout)
+    assert cancelled == [2]
+
+
+@pytest.mark.asyncio
+async def test_generate_images_returns_the_images_that_finished(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("agent.tools.runtime.REPLICATE_API_KEY", "fake-key")
+
+    async def fake_process_tasks(
+        prompts: List[str], api_key: str, base_url: Any, model: str
+    ) -> List[str]:
+        if prompts[0] == "slow":
+            await asyncio.sleep(10)
+        return [f"https://replicate.delivery/{prompts[0]}.png"]
+
+    monkeypatch.setattr("agent.tools.runtime.process_tasks", fake_process_tasks)
+    before = tool_timeout_counters.partial.get("generate_images", 0)
+
+    result = await _runtime(generate_images=0.05).execute(
+        ToolCall(id="t", name="generate_images", arguments={"prompts": ["fast", "slow"]})
+    )
+
+    assert result.ok
+    assert result.result["images"] == {
+        "fast": "https://replicate.delivery/fast.png",
+        "slow": None,
+    }
+    assert result.result["timed_out"] == ["slow"]
+    assert [item["status"] for item in result.summary["images"]] == ["ok", "timeout"]
+    assert result.multimodal_parts is not None and len(result.multimodal_parts) == 1
+    assert tool_timeout_counters.partial["generate_images"] == before + 1
+
+
+@pytest.mark.asyncio
+async def test_other_tools_return_a_timeout_error(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("agent.tools.runtime.REPLICATE_API_KEY", "fake-key")
+
+    async def slow_edit_image(**kwargs: Any) -> str:
+        await asyncio.sleep(10)
+        return "https://replicate.delivery/edited.png"
+
+    monkeypatch.setattr("agent.tools.runtime.edit_image", slow_edit_image)
+    before = tool_timeout_counters.timeouts.get("edit_image", 0)
+
+    result = await _runtime(edit_image=0.05).execute(
+        ToolCall(
+            id="t",
+            name="edit_image",
+            arguments={"prompt": "brighter", "image_urls": ["https://x.test/a.png"]},
+        )
+    )
+
+    assert not result.ok
+    assert "did not finish within 0.05s" in result.result["error"]
+    assert tool_timeout_counters.timeouts["edit_image"] == before + 1
+    assert tool_timeout_counters.snapshot()["calls"]["edit_image"] >= 1
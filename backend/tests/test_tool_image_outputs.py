@@ -157,19 +157,13 @@ async def test_gemini_inlines_local_bytes_and_fetches_public_url(
             pass
 
     class _Client:
-        def __init__(self, *a: Any, **k: Any) -> None:
-            pass
-
-        async def __aenter__(self) -> "_Client":
-            return self
-
-        async def __aexit__(self, *a: Any) -> bool:
-            return False
-
-        async def get(self, url: str) -> _Resp:
+        async def get(self, url: str, timeout: float | None = None) -> _Resp:
             return _Resp()
 
-    monkeypatch.setattr("agent.providers.gemini.httpx.AsyncClient", _Client)
+    monkeypatch.setattr(
+        "agent.providers.gemini.provider_clients.http_client",
+        lambda name, base_url=None, **_: _Client(),
+    )
 
     session = GeminiProviderSession(
         client=object(),  # type: ignore[arg-type]
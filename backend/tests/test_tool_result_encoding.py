@@ -0,0 +1,128 @@
+import difflib
+import json
+from pathlib import Path
+
+import pytest
+
+from agent.providers.result_encoding import ToolResultEncoder, trim_diff_context
+from agent.state import AgentFileState
+from agent.tools.runtime import AgentToolRuntime
+from agent.tools.types import ToolCall
+from fs_logging.prompt_reports import PromptReportLogger
+from llm import Llm
+
+
+def _diff(old: str, new: str, context: int) -> str:
+    return "".join(
+        difflib.unified_diff(
+            old.splitlines(keepends=True),
+            new.splitlines(keepends=True),
+            fromfile="index.html",
+            tofile="index.html",
+            n=context,
+        )
+    )
+
+
+def test_trimmed_diff_matches_difflib_with_less_context() -> None:
+    old_lines = [f"line {index}\n" for index in range(40)]
+    new_lines = list(old_lines)
+    new_lines[5] = "changed 5\n"
+    new_lines[9] = "changed 9\n"
+    new_lines.insert(30, "inserted\n")
+    del new_lines[37]
+    old, new = "".join(old_lines), "".join(new_lines)
+
+    for context in (0, 1, 2):
+        assert trim_diff_context(_diff(old, new, 3), context) == _diff(old, new, context)
+
+
+def test_encoder_drops_client_only_fields_and_reports_savings() -> None:
+    asset = {
+        "description": "logo",
+        "public_url": "http://127.0.0.1:7001/a.png",
+        "content_type": "image/png",
+        "status": "ok",
+        "image_part_index": 0,
+        "image_display_name": "asset_0.png",
+        "box_2d": [1.0, 2.0, 3.0, 4.0],
+        "image_index": 1,
+        "label": "top-left logo",
+    }
+    missing = {"description": "hero photo", "status": "missing", "box_2d": None}
+    result = {
+        "assets": [asset, missing],
+        "unresolved_assets": [{"description": "hero photo", "status": "missing"}],
+    }
+    encoder = ToolResultEncoder()
+
+    encoded, text = encoder.encode("extract_assets", result)
+
+    assert encoded == {
+        "assets": [
+            {
+                "description": "logo",
+                "status": "ok",
+                "public_url": "http://127.0.0.1:7001/a.png",
+                "image_part_index": 0,
+                "image_display_name": "asset_0.png",
+            },
+            {"description": "hero photo", "status": "missing"},
+        ]
+    }
+    assert json.loads(text) == encoded and ", " not in text
+    report = encoder.report()["extract_assets"]
+    assert report["calls"] == 1
+    assert report["saved_chars"] == len(json.dumps(result)) - len(text) > 0
+
+
+def test_prompt_report_includes_encoding_savings(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("LOGS_PATH", str(tmp_path))
+    encoder = ToolResultEncoder()
+    encoder.encode("edit_file", {"content": "ok", "details": {"diff": "", "firstChangedLine": 1}})
+    logger = PromptReportLogger(
+        provider="openai", model=Llm.GPT_5_5_HIGH, api_model_name="gpt-5.5", enabled=True
+    )
+
+    path = logger.record_request({"input": []}, tool_result_encoding=encoder.report())
+
+    assert path is not None
+    with open(path, encoding="utf-8") as report_file:
+        report = json.load(report_file)
+    assert report["tool_result_encoding"]["edit_file"]["calls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_retrieve_option_returns_a_section_diff() -> None:
+    page = "<body>\n<nav>Home</nav>\n<footer id=\"f\">\n<p>Old</p>\n</footer>\n</body>\n"
+    option = page.replace("<p>Old</p>", "<p>New</p>").replace("Home", "Start")
+    file_state = AgentFileState()
+    file_state.content = page
+    runtime = AgentToolRuntime(
+        file_state=file_state,
+        should_generate_images=False,
+        openai_api_key=None,
+        openai_base_url=None,
+        option_codes=[option],
+    )
+
+    section = await runtime.execute(
+        ToolCall(id="t", name="retrieve_option", arguments={"option_number": 1, "section": "f"})
+    )
+    diff = await runtime.execute(
+        ToolCall(
+            id="t",
+            name="retrieve_option",
+            arguments={"option_number": 1, "section": "footer", "diff": True},
+        )
+    )
+    missing = await runtime.execute(
+        ToolCall(id="t", name="retrieve_option", arguments={"option_number": 1, "section": "aside"})
+    )
+
+    assert section.result["code"] == '<footer id="f">\n<p>New</p>\n</footer>'
+    assert "-<p>Old</p>\n+<p>New</p>" in diff.result["diff"]
+    assert "Start" not in diff.result["diff"] and "code" not in diff.result
+    assert not missing.ok
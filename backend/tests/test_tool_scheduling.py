@@ -0,0 +1,251 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from agent.engine import AgentEngine
+from agent.providers.base import (
+    EventSink,
+    ExecutedToolCall,
+    ProviderTurn,
+    StreamEvent,
+)
+from agent.state import AgentFileState
+from agent.tools import (
+    AgentToolRuntime,
+    ToolCall,
+    ToolExecutionResult,
+    schedule_tool_calls,
+)
+
+
+def _call(name: str, call_id: str) -> ToolCall:
+    return ToolCall(id=call_id, name=name, arguments={})
+
+
+@pytest.mark.asyncio
+async def test_file_state_tools_stay_ordered_while_network_tools_overlap() -> None:
+    calls = [
+        _call("create_file", "c1"),
+        _call("generate_images", "g1"),
+        _call("edit_file", "e1"),
+        _call("remove_background", "r1"),
+        _call("screenshot_preview", "s1"),
+    ]
+    log: List[str] = []
+    both_network_started = asyncio.Event()
+    running_network = 0
+
+    async def run(index: int, tool_call: ToolCall) -> str:
+        nonlocal running_network
+        log.append(f"start:{tool_call.id}")
+        if tool_call.name in ("generate_images", "remove_background"):
+            running_network += 1
+            if running_network == 2:
+                both_network_started.set()
+            # Deadlocks (and times out) unless both run at once.
+            await asyncio.wait_for(both_network_started.wait(), timeout=2)
+        else:
+            await asyncio.sleep(0)
+        log.append(f"end:{tool_call.id}")
+        return tool_call.id or ""
+
+    tasks = schedule_tool_calls(calls, run)
+    assert [await task for task in tasks] == ["c1", "g1", "e1", "r1", "s1"]
+
+    file_events = [entry for entry in log if entry[-2:] in ("c1", "e1", "s1")]
+    assert file_events == [
+        "start:c1",
+        "end:c1",
+        "start:e1",
+        "end:e1",
+        "start:s1",
+        "end:s1",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_retrieve_option_diffs_against_a_file_created_in_the_same_turn() -> None:
+    page = "<body>\n<h1>Old</h1>\n</body>\n"
+    runtime = AgentToolRuntime(
+        file_state=AgentFileState(),
+        should_generate_images=False,
+        openai_api_key=None,
+        openai_base_url=None,
+        option_codes=[page.replace("Old", "New")],
+    )
+    calls = [
+        ToolCall(id="c1", name="create_file", arguments={"content": page}),
+        ToolCall(
+            id="o1",
+            name="retrieve_option",
+            arguments={"option_number": 1, "diff": True},
+        ),
+    ]
+
+    async def run(index: int, tool_call: ToolCall) -> ToolExecutionResult:
+        if tool_call.name == "create_file":
+            await asyncio.sleep(0.01)
+        return await runtime.execute(tool_call)
+
+    tasks = schedule_tool_calls(calls, run)
+    _, option = [await task for task in tasks]
+
+    assert option.ok
+    assert "-<h1>Old</h1>\n+<h1>New</h1>" in option.result["diff"]
+
+
+class OneToolTurnSession:
+    def __init__(self, tool_calls: List[ToolCall]) -> None:
+        self.tool_calls = tool_calls
+        self.appended: List[ExecutedToolCall] = []
+        self.turns = 0
+
+    async def stream_turn(self, on_event: EventSink) -> ProviderTurn:
+        self.turns += 1
+        if self.turns == 1:
+            return ProviderTurn(assistant_text="", tool_calls=self.tool_calls)
+        return ProviderTurn(assistant_text="<html>done</html>", tool_calls=[])
+
+    async def append_tool_results(
+        self, turn: ProviderTurn, executed_tool_calls: List[ExecutedToolCall]
+    ) -> None:
+        self.appended.extend(executed_tool_calls)
+
+    async def close(self) -> None:
+        return None
+
+
+@pytest.mark.asyncio
+async def test_engine_reports_concurrent_results_in_call_order() -> None:
+    calls = [
+        _call("generate_images", "slow"),
+        _call("extract_assets", "fast"),
+    ]
+    session = OneToolTurnSession(calls)
+    sent: List[Dict[str, Any]] = []
+
+    async def send_message(
+        message_type: str,
+        value: str | None,
+        variant_index: int,
+        data: Dict[str, Any] | None,
+        event_id: str | None,
+    ) -> None:
+        sent.append({"type": message_type, "eventId": event_id})
+
+    engine = AgentEngine(
+        send_message=send_message,
+        variant_index=0,
+        openai_api_key=None,
+        openai_base_url=None,
+        anthropic_api_key=None,
+        gemini_api_key=None,
+        replicate_api_key=None,
+        should_generate_images=True,
+    )
+    fast_done = asyncio.Event()
+
+    async def execute(tool_call: ToolCall) -> ToolExecutionResult:
+        if tool_call.id == "slow":
+            await asyncio.wait_for(fast_done.wait(), timeout=2)
+        else:
+            fast_done.set()
+        return ToolExecutionResult(ok=True, result={}, summary={"id": tool_call.id})
+
+    engine.tool_runtime.execute = execute  # type: ignore[method-assign]
+    await engine._run_with_session(session)  # type: ignore[arg-type]
+
+    results = [m["eventId"] for m in sent if m["type"] == "toolResult"]
+    assert results == ["slow", "fast"]
+    assert [e.tool_call.id for e in session.appended] == ["slow", "fast"]
+
+
+class SpeculatingSession(OneToolTurnSession):
+    """Announces finished arguments mid-stream, then keeps "decoding"."""
+
+    def __init__(
+        self,
+        tool_calls: List[ToolCall],
+        streamed_arguments: Dict[str, Any],
+        tool_started: asyncio.Event,
+    ) -> None:
+        super().__init__(tool_calls)
+        self.streamed_arguments = streamed_arguments
+        self.tool_started = tool_started
+
+    async def stream_turn(self, on_event: EventSink) -> ProviderTurn:
+        if self.turns == 0:
+            await on_event(
+                StreamEvent(
+                    type="tool_call_complete",
+                    tool_call_id="img",
+                    tool_name="generate_images",
+                    tool_arguments=self.streamed_arguments,
+                )
+            )
+            # Only finishes the turn once the tool is already running.
+            await asyncio.wait_for(self.tool_started.wait(), timeout=2)
+        return await super().stream_turn(on_event)
+
+
+def _engine(sent: List[Dict[str, Any]]) -> AgentEngine:
+    async def send_message(
+        message_type: str,
+        value: str | None,
+        variant_index: int,
+        data: Dict[str, Any] | None,
+        event_id: str | None,
+    ) -> None:
+        sent.append({"type": message_type, "eventId": event_id})
+
+    return AgentEngine(
+        send_message=send_message,
+        variant_index=0,
+        openai_api_key=None,
+        openai_base_url=None,
+        anthropic_api_key=None,
+        gemini_api_key=None,
+        replicate_api_key=None,
+        should_generate_images=True,
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("streamed_prompts", "expected_executions"),
+    [
+        (["a cat"], [["a cat"]]),
+        # The final turn disagrees: the speculative run is discarded.
+        (["a dog"], [["a dog"], ["a cat"]]),
+    ],
+)
+async def test_speculative_tool_starts_before_the_turn_ends(
+    streamed_prompts: List[str], expected_executions: List[List[str]]
+) -> None:
+    final_call = ToolCall(
+        id="img", name="generate_images", arguments={"prompts": ["a cat"]}
+    )
+    tool_started = asyncio.Event()
+    session = SpeculatingSession(
+        [final_call], {"prompts": streamed_prompts}, tool_started
+    )
+    sent: List[Dict[str, Any]] = []
+    engine = _engine(sent)
+    executions: List[List[str]] = []
+
+    async def execute(tool_call: ToolCall) -> ToolExecutionResult:
+        executions.append(tool_call.arguments["prompts"])
+        tool_started.set()
+        await asyncio.sleep(0)
+        return ToolExecutionResult(ok=True, result={}, summary={})
+
+    engine.tool_runtime.execute = execute  # type: ignore[method-assign]
+    await engine._run_with_session(session)  # type: ignore[arg-type]
+
+    assert executions == expected_executions
+    assert [m["type"] for m in sent if m["eventId"] == "img"] == [
+        "toolStart",
+        "toolResult",
+    ]
+    assert session.appended[0].tool_call is final_call
@@ -0,0 +1,127 @@
+from typing import Any, Dict, List, Set
+
+import pytest
+
+from agent.budget import WIND_DOWN_TOOLS, BudgetTracker, VariantBudget
+from agent.engine import AgentEngine
+from agent.providers.base import EventSink, ExecutedToolCall, ProviderTurn
+from agent.providers.pricing import ModelPricing
+from agent.providers.token_usage import TokenUsage
+from agent.tools import ToolCall, ToolExecutionResult
+
+
+def test_tracker_winds_down_then_forces_final_turn() -> None:
+    now = [0.0]
+    tracker = BudgetTracker(
+        VariantBudget(max_seconds=100, max_cost_usd=1.0, max_steps=20),
+        clock=lambda: now[0],
+    )
+    assert tracker.next_phase() == "normal"
+
+    # $0.85 of output at $10/M tokens: past the 80% wind-down mark.
+    tracker.record_turn(TokenUsage(output=85_000), ModelPricing(output=10.0))
+    assert tracker.cost_usd == pytest.approx(0.85)
+    assert tracker.next_phase() == "wind_down"
+
+    now[0] = 100.0
+    assert tracker.next_phase() == "final"
+    report = tracker.report()
+    assert report["outputTokens"] == 85_000
+    assert report["phase"] == "final"
+    assert report["limits"]["maxCostUsd"] == 1.0
+
+
+def test_child_trackers_share_the_parent_allowance() -> None:
+    now = [0.0]
+    budget = VariantBudget(max_seconds=100, max_output_tokens=1000, max_steps=5)
+    parent = BudgetTracker(budget, clock=lambda: now[0])
+    now[0] = 50.0
+    first = BudgetTracker(budget, clock=lambda: now[0], parent=parent)
+    second = BudgetTracker(budget, clock=lambda: now[0], parent=parent)
+
+    first.record_turn(TokenUsage(output=500), None)
+    second.record_turn(TokenUsage(output=400), None)
+
+    # 900 of 1000 shared tokens are used, though each child used under half.
+    assert second.next_phase() == "wind_down"
+    assert parent.usage.output == 900 and parent.steps == 2
+    assert first.steps == 1 and first.usage.output == 500
+    # The wall clock started with the parent, not with the later child.
+    now[0] = 100.0
+    assert BudgetTracker(budget, clock=lambda: now[0], parent=parent).next_phase() == "final"
+
+
+def test_request_limits_only_tighten_server_limits() -> None:
+    server = VariantBudget(max_seconds=60, max_output_tokens=0, max_cost_usd=0.5)
+    tightened = server.tightened(
+        max_seconds=120, max_output_tokens=10_000, max_cost_usd=0.1
+    )
+    assert tightened.max_seconds == 60
+    assert tightened.max_output_tokens == 10_000
+    assert tightened.max_cost_usd == 0.1
+
+
+class ToolLoopSession:
+    """Keeps asking for a screenshot; records which tools were offered."""
+
+    def __init__(self) -> None:
+        self.limits: List[Set[str] | None] = []
+        self.turns = 0
+
+    async def stream_turn(self, on_event: EventSink) -> ProviderTurn:
+        self.turns += 1
+        return ProviderTurn(
+            assistant_text="",
+            tool_calls=[
+                ToolCall(id=f"shot-{self.turns}", name="screenshot_preview", arguments={})
+            ],
+            usage=TokenUsage(output=400),
+            pricing=ModelPricing(output=10.0),
+        )
+
+    async def append_tool_results(
+        self, turn: ProviderTurn, executed_tool_calls: List[ExecutedToolCall]
+    ) -> None:
+        return None
+
+    def limit_tools(self, tool_names: Set[str] | None) -> None:
+        self.limits.append(tool_names)
+
+    async def close(self) -> None:
+        return None
+
+
+@pytest.mark.asyncio
+async def test_engine_stops_a_runaway_tool_loop_at_the_token_budget() -> None:
+    async def send_message(*args: Any) -> None:
+        return None
+
+    engine = AgentEngine(
+        send_message=send_message,
+        variant_index=0,
+        openai_api_key=None,
+        openai_base_url=None,
+        anthropic_api_key=None,
+        gemini_api_key=None,
+        replicate_api_key=None,
+        should_generate_images=False,
+        initial_file_state={"path": "index.html", "content": "<p>current</p>"},
+        budget=VariantBudget(max_output_tokens=1000, max_steps=20),
+    )
+    executed: List[str] = []
+
+    async def execute(tool_call: ToolCall) -> ToolExecutionResult:
+        executed.append(tool_call.id or "")
+        return ToolExecutionResult(ok=True, result={}, summary={})
+
+    engine.tool_runtime.execute = execute  # type: ignore[method-assign]
+    session = ToolLoopSession()
+    result = await engine._run_with_session(session)  # type: ignore[arg-type]
+
+    # 400 tokens: normal; 800: wind down; 1200: final turn, tool call ignored.
+    assert result == "<p>current</p>"
+    assert session.turns == 4
+    assert session.limits == [set(WIND_DOWN_TOOLS), set()]
+    assert executed == ["shot-1", "shot-2", "shot-3"]
+    report: Dict[str, Any] | None = engine.budget_report()
+    assert report is not None and report["outputTokens"] == 1600
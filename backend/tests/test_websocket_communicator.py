@@ -70,3 +70,24 @@ async def test_throw_error_ignores_already_completed_websocket() -> None:
     assert communicator.is_closed is True
     websocket.send_json.assert_awaited_once()
     websocket.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_send_message_after_accept_is_queued_and_flushed_on_close() -> None:
+    websocket = MagicMock()
+    websocket.accept = AsyncMock()
+    websocket.close = AsyncMock()
+    websocket.send_json = AsyncMock()
+    communicator = WebSocketCommunicator(cast(Any, websocket))
+    await communicator.accept()
+
+    await communicator.send_message("assistant", "Hel", 0, None, "evt")
+    await communicator.send_message("assistant", "lo", 0, None, "evt")
+    websocket.send_json.assert_not_awaited()
+
+    await communicator.close()
+
+    websocket.send_json.assert_awaited_once_with(
+        {"type": "assistant", "variantIndex": 0, "value": "Hello", "eventId": "evt"}
+    )
+    websocket.close.assert_awaited_once()
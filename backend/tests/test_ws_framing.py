@@ -0,0 +1,106 @@
+import base64
+from typing import Any, cast
+from unittest.mock import AsyncMock, MagicMock
+
+import msgpack
+import pytest
+
+from routes.generate_code import WebSocketCommunicator
+from ws.framing import (
+    MSGPACK_SUBPROTOCOL,
+    decode_binary_control,
+    decode_binary_message,
+    decode_binary_params,
+    encode_binary_message,
+    negotiate_subprotocol,
+)
+
+
+@pytest.mark.parametrize(
+    "frame",
+    [
+        b"\x81\x91\x01\x01",  # {[1]: 1}
+        b"\x81\x80\x01",  # {{}: 1}
+        b"\x91" * 100_000 + b"\xc0",
+        b"\x81\xc0" * 100_000 + b"\xc0",
+        b"\xa1\xff",
+        b"\xdd\xff\xff\xff\xff",
+        b"\xc1",
+        b"\x01\x02",
+    ],
+)
+def test_malformed_control_frames_are_ignored(frame: bytes) -> None:
+    assert decode_binary_control(frame) is None
+
+
+def test_message_records_are_compact_and_round_trip() -> None:
+    payload = {
+        "type": "assistant",
+        "variantIndex": 1,
+        "value": "Hel",
+        "eventId": "assistant-1-abcd1234",
+    }
+    encoded = encode_binary_message(payload)
+
+    assert msgpack.unpackb(encoded) == [10, 1, "assistant-1-abcd1234", "Hel"]
+    assert decode_binary_message(encoded) == payload
+    status = encode_binary_message({"type": "status", "variantIndex": 0})
+    assert msgpack.unpackb(status) == [1, 0]
+
+
+def test_binary_params_turn_raw_media_into_data_urls() -> None:
+    png = b"\x89PNG\r\n\x1a\n"
+    raw = msgpack.packb(
+        {
+            "generatedCodeConfig": "html_tailwind",
+            "prompt": {
+                "text": "Build this",
+                "images": [{"mimeType": "image/png", "data": png}],
+                "videos": [],
+            },
+            "history": [
+                {"role": "user", "text": "", "images": ["data:image/png;base64,AA=="]}
+            ],
+        }
+    )
+
+    params = decode_binary_params(raw)
+
+    encoded = base64.b64encode(png).decode("ascii")
+    assert params["prompt"]["images"] == [f"data:image/png;base64,{encoded}"]
+    assert params["history"][0]["images"] == ["data:image/png;base64,AA=="]
+
+
+def test_negotiation_defaults_to_json() -> None:
+    assert negotiate_subprotocol(None) is None
+    assert negotiate_subprotocol(["other"]) is None
+    assert negotiate_subprotocol(["other", MSGPACK_SUBPROTOCOL]) == MSGPACK_SUBPROTOCOL
+
+
+@pytest.mark.asyncio
+async def test_communicator_uses_binary_frames_when_negotiated() -> None:
+    websocket = MagicMock()
+    websocket.scope = {"subprotocols": [MSGPACK_SUBPROTOCOL]}
+    websocket.accept = AsyncMock()
+    websocket.close = AsyncMock()
+    websocket.send_bytes = AsyncMock()
+    websocket.send_json = AsyncMock()
+    websocket.receive_bytes = AsyncMock(
+        return_value=msgpack.packb({"generatedCodeConfig": "html_tailwind"})
+    )
+    communicator = WebSocketCommunicator(cast(Any, websocket))
+
+    await communicator.accept()
+    params = await communicator.receive_params()
+    await communicator.send_message("status", "Generating code...", 0)
+    await communicator.close()
+
+    websocket.accept.assert_awaited_once_with(subprotocol=MSGPACK_SUBPROTOCOL)
+    assert params == {"generatedCodeConfig": "html_tailwind"}
+    websocket.send_json.assert_not_awaited()
+    sent = websocket.send_bytes.await_args.args[0]
+    assert decode_binary_message(sent) == {
+        "type": "status",
+        "variantIndex": 0,
+        "value": "Generating code...",
+    }
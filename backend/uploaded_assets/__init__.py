@@ -1,3 +1,11 @@
+from uploaded_assets.media import (
+    MediaUploadError,
+    StoredMedia,
+    UnknownMediaError,
+    get_stored_media,
+    resolve_media_reference,
+    store_media_stream,
+)
 from uploaded_assets.prompts import (
     append_uploaded_asset_ids_to_history,
     append_uploaded_asset_ids_to_prompt,
@@ -13,13 +21,19 @@ from uploaded_assets.store import (
 )
 
 __all__ = [
+    "MediaUploadError",
     "SavedAsset",
+    "StoredMedia",
     "TemporaryAsset",
+    "UnknownMediaError",
     "append_uploaded_asset_ids_to_history",
     "append_uploaded_asset_ids_to_prompt",
     "configure_uploaded_asset_routes",
+    "get_stored_media",
     "infer_local_asset_base_url",
     "persist_data_url_as_asset",
     "persist_data_url_as_temporary_asset",
     "promote_temporary_asset_id",
+    "resolve_media_reference",
+    "store_media_stream",
 ]
@@ -0,0 +1,245 @@
+"""Content-addressed store for media uploaded out of band.
+
+Instead of inlining every screenshot and video as a data URL in the
+generate-code params, a client can stream each file to ``POST /api/media`` once
+and reference the returned ``media_<digest>`` ID in ``prompt.images`` /
+``prompt.videos`` / ``history[].images`` / ``history[].videos``. The digest is
+the first 24 hex chars of the file's SHA-256, so a client that has hashed a
+file can ``HEAD /api/media/{media_id}`` and skip re-uploading it.
+
+IDs are resolved back to data URLs while the request params are parsed, so
+everything downstream is unchanged.
+
+Uploads are unauthenticated, so the store is bounded: files unused for
+``MEDIA_UPLOAD_TTL_SECONDS`` are deleted, and the least recently used ones
+are deleted whenever the store grows past ``MEDIA_UPLOAD_MAX_TOTAL_BYTES``.
+A file's modification time records its last upload or use.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Dict, List, Tuple, cast
+
+from config import (
+    MEDIA_UPLOAD_DIR,
+    MEDIA_UPLOAD_MAX_BYTES,
+    MEDIA_UPLOAD_MAX_TOTAL_BYTES,
+    MEDIA_UPLOAD_TTL_SECONDS,
+)
+from uploaded_assets.store import SUPPORTED_IMAGE_TYPES
+
+MEDIA_ID_PREFIX = "media_"
+SUPPORTED_VIDEO_TYPES = {"video/mp4", "video/webm", "video/quicktime"}
+
+
+class MediaUploadError(ValueError):
+    """The upload was rejected (unsupported type, too large, empty)."""
+
+
+class UnknownMediaError(ValueError):
+    """A request referenced a media ID that isn't in the store."""
+
+
+@dataclass(frozen=True)
+class StoredMedia:
+    media_id: str
+    content_type: str
+    size: int
+    # True when identical bytes were already stored.
+    deduplicated: bool = False
+
+
+def is_media_id(value: str) -> bool:
+    return _digest_for_media_id(value) is not None
+
+
+def _digest_for_media_id(media_id: str) -> str | None:
+    if not media_id.startswith(MEDIA_ID_PREFIX):
+        return None
+    digest = media_id.removeprefix(MEDIA_ID_PREFIX)
+    if len(digest) != 24 or not all(c in "0123456789abcdef" for c in digest):
+        return None
+    return digest
+
+
+def _media_paths(media_id: str) -> tuple[str, str]:
+    base = os.path.join(MEDIA_UPLOAD_DIR, media_id)
+    return f"{base}.bin", f"{base}.json"
+
+
+def normalize_media_type(content_type: str | None) -> str:
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if media_type not in SUPPORTED_IMAGE_TYPES and media_type not in SUPPORTED_VIDEO_TYPES:
+        raise MediaUploadError(f"Unsupported media type: {media_type or 'missing'}")
+    return media_type
+
+
+async def store_media_stream(
+    chunks: AsyncIterable[bytes],
+    content_type: str | None,
+    max_bytes: int | None = None,
+) -> StoredMedia:
+    """Stream an upload to disk while hashing it, then file it by digest.
+
+    Memory use is one chunk regardless of file size; the upload is rejected as
+    soon as it passes ``max_bytes``. Disk work runs in a worker thread so a
+    large upload doesn't stall the event loop.
+    """
+    media_type = normalize_media_type(content_type)
+    limit = MEDIA_UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+
+    hasher = hashlib.sha256()
+    size = 0
+    fd, partial_path = await asyncio.to_thread(_create_partial_file)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > limit:
+                    raise MediaUploadError(f"Upload exceeds {limit} bytes")
+                hasher.update(chunk)
+                await asyncio.to_thread(file.write, chunk)
+        if size == 0:
+            raise MediaUploadError("Upload is empty")
+
+        media_id = f"{MEDIA_ID_PREFIX}{hasher.hexdigest()[:24]}"
+        deduplicated = await asyncio.to_thread(
+            _file_upload, partial_path, media_id, media_type, size
+        )
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    return StoredMedia(
+        media_id=media_id,
+        content_type=media_type,
+        size=size,
+        deduplicated=deduplicated,
+    )
+
+
+def _create_partial_file() -> Tuple[int, str]:
+    os.makedirs(MEDIA_UPLOAD_DIR, exist_ok=True)
+    return tempfile.mkstemp(dir=MEDIA_UPLOAD_DIR, suffix=".partial")
+
+
+def _file_upload(partial_path: str, media_id: str, media_type: str, size: int) -> bool:
+    """Move a finished upload into place; True when it was already stored."""
+    data_path, metadata_path = _media_paths(media_id)
+    deduplicated = os.path.exists(data_path)
+    if deduplicated:
+        os.remove(partial_path)
+        os.utime(data_path)
+    else:
+        os.replace(partial_path, data_path)
+    with open(metadata_path, "w") as file:
+        json.dump({"content_type": media_type, "size": size}, file)
+    removed = evict_media(keep=media_id)
+    if removed:
+        print(f"[MEDIA] Evicted {removed} stored upload(s)")
+    return deduplicated
+
+
+def evict_media(keep: str | None = None, now: float | None = None) -> int:
+    """Delete uploads unused for ``MEDIA_UPLOAD_TTL_SECONDS``, then the least
+    recently used ones until the store fits ``MEDIA_UPLOAD_MAX_TOTAL_BYTES``.
+
+    ``keep`` is never deleted. Abandoned partial uploads expire the same way.
+    Returns the number of uploads deleted.
+    """
+    now = time.time() if now is None else now
+    expires_before = now - MEDIA_UPLOAD_TTL_SECONDS
+    # media ID -> (last used, size)
+    stored: Dict[str, Tuple[float, int]] = {}
+    try:
+        entries = list(os.scandir(MEDIA_UPLOAD_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if entry.name.endswith(".partial"):
+            if stat.st_mtime < expires_before:
+                _remove(entry.path)
+        elif entry.name.endswith(".bin"):
+            stored[entry.name.removesuffix(".bin")] = (stat.st_mtime, stat.st_size)
+
+    removed = 0
+    total = sum(size for _, size in stored.values())
+    by_last_use: List[Tuple[float, int, str]] = sorted(
+        (last_used, size, media_id) for media_id, (last_used, size) in stored.items()
+    )
+    for last_used, size, media_id in by_last_use:
+        if media_id == keep:
+            continue
+        if last_used >= expires_before and total <= MEDIA_UPLOAD_MAX_TOTAL_BYTES:
+            break
+        for path in _media_paths(media_id):
+            _remove(path)
+        total -= size
+        removed += 1
+    return removed
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def get_stored_media(media_id: str) -> StoredMedia | None:
+    if not is_media_id(media_id):
+        return None
+    data_path, metadata_path = _media_paths(media_id)
+    try:
+        with open(metadata_path, "r") as file:
+            raw_metadata: Any = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if not isinstance(raw_metadata, dict) or not os.path.isfile(data_path):
+        return None
+    metadata = cast(dict[str, object], raw_metadata)
+    content_type = metadata.get("content_type")
+    if not isinstance(content_type, str):
+        return None
+    return StoredMedia(
+        media_id=media_id,
+        content_type=content_type,
+        size=os.path.getsize(data_path),
+    )
+
+
+def resolve_media_reference(value: str) -> str:
+    """Turn a ``media_<digest>`` reference into a data URL.
+
+    Anything that isn't a media ID (i.e. an inline data URL) passes through.
+    """
+    if not is_media_id(value):
+        return value
+    media = get_stored_media(value)
+    if media is None:
+        raise UnknownMediaError(f"Unknown media ID: {value}")
+
+    data_path, _ = _media_paths(value)
+    try:
+        with open(data_path, "rb") as file:
+            media_bytes = file.read()
+    except FileNotFoundError:
+        # Evicted since it was looked up.
+        raise UnknownMediaError(f"Unknown media ID: {value}")
+    # Referenced again, so it's the last to be evicted.
+    os.utime(data_path)
+    encoded = base64.b64encode(media_bytes).decode("ascii")
+    return f"data:{media.content_type};base64,{encoded}"
@@ -0,0 +1,139 @@
+"""Delta encoding for ``setCode`` messages on the generate-code socket.
+
+Every ``setCode`` carries the full document, so streaming a page in small steps
+re-sends it over and over. When a client opts in (``codePatches: true`` in the
+request params), the server remembers the last document it sent per variant and
+replaces ``setCode`` with a ``patchCode`` splice against it:
+
+    {"start": 120, "deleteCount": 0, "text": "<div>", "baseHash": "...", "hash": "..."}
+
+Apply it as ``base[:start] + text + base[start + deleteCount:]``. ``baseHash``
+and ``hash`` are the first 16 hex chars of the SHA-256 of the UTF-8 document
+before and after the patch; a client whose copy doesn't match ``baseHash``
+should drop the patch and ask for a snapshot. A full ``setCode`` snapshot is
+sent for the first document of each variant, after a reset (reconnect or
+client resync), and whenever the splice would rewrite most of the document.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+HASH_LENGTH = 16
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:HASH_LENGTH]
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    """Length of the shared prefix, compared in slices so the scan runs in C."""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[low:mid] == b[low:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def _common_suffix_length(a: str, b: str, limit: int) -> int:
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len(a) - mid : len(a) - low] == b[len(b) - mid : len(b) - low]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+@dataclass
+class _VariantDocument:
+    content: str
+    digest: str
+    # Running hash of ``content``; appends extend a copy instead of rehashing.
+    hasher: Any = field(repr=False)
+
+
+@dataclass(frozen=True)
+class EncodedCode:
+    """What to put on the wire for one ``setCode`` call."""
+
+    type: str
+    value: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None
+
+
+class CodePatchEncoder:
+    """Tracks the last document sent per variant and emits splice patches."""
+
+    def __init__(self) -> None:
+        self._documents: Dict[int, _VariantDocument] = {}
+
+    def reset(self, variant_index: Optional[int] = None) -> None:
+        """Forget sent state so the next update is a full snapshot."""
+        if variant_index is None:
+            self._documents.clear()
+        else:
+            self._documents.pop(variant_index, None)
+
+    def encode(self, variant_index: int, content: str) -> EncodedCode:
+        previous = self._documents.get(variant_index)
+        if previous is None:
+            return self._snapshot(variant_index, content)
+
+        base = previous.content
+        if content.startswith(base):
+            start = len(base)
+            delete_count = 0
+            text = content[start:]
+            hasher = previous.hasher.copy()
+            hasher.update(text.encode("utf-8"))
+        else:
+            start = _common_prefix_length(base, content)
+            suffix = _common_suffix_length(
+                base, content, min(len(base), len(content)) - start
+            )
+            delete_count = len(base) - start - suffix
+            text = content[start : len(content) - suffix]
+            hasher = None
+
+        # A splice that rewrites most of the document saves nothing over a
+        # snapshot and costs the client a hash check.
+        if len(text) * 2 > len(content):
+            return self._snapshot(variant_index, content)
+
+        if hasher is None:
+            hasher = hashlib.sha256(content.encode("utf-8"))
+        digest = hasher.hexdigest()[:HASH_LENGTH]
+        self._documents[variant_index] = _VariantDocument(content, digest, hasher)
+        return EncodedCode(
+            type="patchCode",
+            data={
+                "start": start,
+                "deleteCount": delete_count,
+                "text": text,
+                "baseHash": previous.digest,
+                "hash": digest,
+            },
+        )
+
+    def _snapshot(self, variant_index: int, content: str) -> EncodedCode:
+        hasher = hashlib.sha256(content.encode("utf-8"))
+        digest = hasher.hexdigest()[:HASH_LENGTH]
+        self._documents[variant_index] = _VariantDocument(content, digest, hasher)
+        return EncodedCode(type="setCode", value=content, data={"hash": digest})
+
+
+def apply_code_patch(base: str, patch: Dict[str, Any]) -> str:
+    """Reference client-side application of a ``patchCode`` payload."""
+    if content_hash(base) != patch["baseHash"]:
+        raise ValueError("patchCode base hash mismatch")
+    start = int(patch["start"])
+    end = start + int(patch["deleteCount"])
+    updated = base[:start] + patch["text"] + base[end:]
+    if content_hash(updated) != patch["hash"]:
+        raise ValueError("patchCode result hash mismatch")
+    return updated
@@ -1,2 +1,5 @@
 # WebSocket protocol (RFC 6455) allows for the use of custom close codes in the range 4000-4999
 APP_ERROR_WEB_SOCKET_CODE = 4332
+
+# Sent when a client reads too slowly for its outbound queue (RFC 6455 "Try Again Later").
+SLOW_CLIENT_WEB_SOCKET_CODE = 1013
@@ -0,0 +1,148 @@
+"""Binary framing option for the generate-code socket.
+
+JSON text frames stay the default. A client that lists ``MSGPACK_SUBPROTOCOL``
+in ``Sec-WebSocket-Protocol`` gets binary MessagePack frames both ways:
+
+Outbound, every message is a compact record instead of a keyed object::
+
+    [typeCode, variantIndex, eventId, value, data, seq]
+
+``typeCode`` is the index into ``MESSAGE_TYPE_CODES`` (or the type string for
+types newer than the table), and trailing nil fields are omitted, so a token
+delta is ``[10, 0, "assistant-0-ab12cd34", "Hel"]``. ``seq`` is only present
+for resumable sessions (see ``ws.sessions``).
+
+Inbound, the request params are the same map the JSON client sends, except
+that any entry of ``prompt.images`` / ``prompt.videos`` / ``history[].images``
+/ ``history[].videos`` may be ``{"mimeType": "image/png", "data": <bin>}``
+with raw bytes instead of a base64 data URL.
+
+Encoding and decoding use the ``msgpack`` package; every malformed frame
+makes ``msgpack.unpackb`` raise a ``ValueError`` subclass.
+"""
+
+import base64
+from typing import Any, Dict, List, Optional, Sequence, cast
+
+import msgpack
+
+MSGPACK_SUBPROTOCOL = "screenshot-to-code.msgpack.v1"
+
+# Wire codes for message types. Append only; never reorder.
+MESSAGE_TYPE_CODES: Dict[str, int] = {
+    name: code
+    for code, name in enumerate(
+        [
+            "chunk",
+            "status",
+            "setCode",
+            "patchCode",
+            "error",
+            "variantComplete",
+            "variantError",
+            "variantCount",
+            "variantModels",
+            "thinking",
+            "assistant",
+            "toolStart",
+            "toolResult",
+            "session",
+            "commit",
+        ]
+    )
+}
+MESSAGE_TYPES_BY_CODE: Dict[int, str] = {
+    code: name for name, code in MESSAGE_TYPE_CODES.items()
+}
+
+MEDIA_FIELDS = ("images", "videos")
+
+
+def negotiate_subprotocol(requested: Sequence[str] | None) -> Optional[str]:
+    """Pick the subprotocol to accept from the client's offered list."""
+    if requested and MSGPACK_SUBPROTOCOL in requested:
+        return MSGPACK_SUBPROTOCOL
+    return None
+
+
+def encode_binary_message(payload: Dict[str, Any]) -> bytes:
+    msg_type = payload["type"]
+    record: List[Any] = [
+        MESSAGE_TYPE_CODES.get(msg_type, msg_type),
+        payload.get("variantIndex", 0),
+        payload.get("eventId"),
+        payload.get("value"),
+        payload.get("data"),
+        payload.get("seq"),
+    ]
+    while len(record) > 2 and record[-1] is None:
+        record.pop()
+    return msgpack.packb(record)
+
+
+def decode_binary_message(raw: bytes) -> Dict[str, Any]:
+    """Inverse of ``encode_binary_message`` (used by tests and tooling)."""
+    record = cast(List[Any], msgpack.unpackb(raw))
+    record += [None] * (6 - len(record))
+    type_code, variant_index, event_id, value, data, seq = record[:6]
+    payload: Dict[str, Any] = {
+        "type": MESSAGE_TYPES_BY_CODE.get(type_code, type_code),
+        "variantIndex": variant_index,
+    }
+    if value is not None:
+        payload["value"] = value
+    if data is not None:
+        payload["data"] = data
+    if event_id is not None:
+        payload["eventId"] = event_id
+    if seq is not None:
+        payload["seq"] = seq
+    return payload
+
+
+def _media_to_data_url(item: object) -> object:
+    if not isinstance(item, dict):
+        return item
+    media = cast(Dict[str, object], item)
+    data = media.get("data")
+    mime_type = media.get("mimeType")
+    if not isinstance(data, bytes) or not isinstance(mime_type, str):
+        return item
+    encoded = base64.b64encode(data).decode("ascii")
+    return f"data:{mime_type};base64,{encoded}"
+
+
+def _convert_media_fields(container: object) -> None:
+    if not isinstance(container, dict):
+        return
+    fields = cast(Dict[str, object], container)
+    for key in MEDIA_FIELDS:
+        items = fields.get(key)
+        if isinstance(items, list):
+            fields[key] = [_media_to_data_url(item) for item in cast(List[object], items)]
+
+
+def decode_binary_params(raw: bytes) -> Dict[str, Any]:
+    """Decode binary request params into the JSON-equivalent params dict.
+
+    Raw media becomes data URLs here so everything downstream of
+    ``receive_params`` is framing-agnostic.
+    """
+    params = msgpack.unpackb(raw)
+    if not isinstance(params, dict):
+        raise ValueError("Binary params must be a MessagePack map")
+    params = cast(Dict[str, Any], params)
+    _convert_media_fields(params.get("prompt"))
+    history = params.get("history")
+    if isinstance(history, list):
+        for entry in cast(List[object], history):
+            _convert_media_fields(entry)
+    return params
+
+
+def decode_binary_control(raw: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        message = msgpack.unpackb(raw)
+    except ValueError:
+        return None
+    return cast(Dict[str, Any], message) if isinstance(message, dict) else None
@@ -0,0 +1,220 @@
+"""Per-connection outbound queue for the generate-code socket.
+
+Provider stream callbacks call ``send_message`` for every token. Awaiting the
+socket write inline means a slow browser stalls the OpenAI/Anthropic/Gemini
+stream reads, and every delta becomes its own frame. Instead, messages are
+enqueued without blocking and a single sender task writes them out:
+
+- Consecutive ``assistant``/``thinking`` deltas for the same event are merged
+  into one message (per variant, so ordering within a variant is preserved).
+- Only the latest pending ``setCode`` per variant is kept; an older unsent one
+  is superseded by the newer document. A ``patchCode``, ``variantComplete``
+  or ``variantError`` queued after it applies to that document, so once one
+  is pending the older ``setCode`` is kept and order is preserved.
+- The sender flushes at most once per frame interval so deltas that arrive
+  within a frame go out together.
+- The queue is bounded: past ``max_depth``, the oldest cosmetic messages
+  (thinking deltas, status) are dropped. Everything else is kept up to
+  ``hard_limit`` messages; past that the client can't keep up, so the queue
+  stops and calls ``on_overflow`` (the connection disconnects it).
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+DEFAULT_FLUSH_INTERVAL_SECONDS = 1 / 30
+DEFAULT_MAX_QUEUE_DEPTH = 512
+DEFAULT_HARD_QUEUE_LIMIT = 8192
+
+MERGEABLE_TYPES = {"assistant", "thinking"}
+LATEST_WINS_TYPES = {"setCode"}
+# Messages that depend on the variant's code sent before them.
+CODE_ORDERED_TYPES = {"patchCode", "variantComplete", "variantError"}
+DROPPABLE_TYPES = {"thinking", "status"}
+
+# Returns False once the socket is gone so the sender can stop.
+PayloadSender = Callable[[Dict[str, Any]], Awaitable[bool]]
+
+
+@dataclass
+class _QueuedMessage:
+    payload: Dict[str, Any]
+    superseded: bool = False
+
+
+@dataclass
+class OutboundQueueMetrics:
+    enqueued: int = 0
+    sent: int = 0
+    # Batches the sender wrote out (each message is still its own frame).
+    flushes: int = 0
+    coalesced: int = 0
+    superseded: int = 0
+    dropped: int = 0
+    depth: int = 0
+    max_depth: int = 0
+    overflowed: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+class OutboundMessageQueue:
+    def __init__(
+        self,
+        send_payload: PayloadSender,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+        max_depth: int = DEFAULT_MAX_QUEUE_DEPTH,
+        hard_limit: int = DEFAULT_HARD_QUEUE_LIMIT,
+        on_overflow: Optional[Callable[[], None]] = None,
+    ):
+        self.send_payload = send_payload
+        self.flush_interval = flush_interval
+        self.max_depth = max_depth
+        self.hard_limit = max(hard_limit, max_depth)
+        self.on_overflow = on_overflow
+        self.metrics = OutboundQueueMetrics()
+        self._pending: Deque[_QueuedMessage] = deque()
+        # Pending droppable messages, oldest first; may hold superseded ones.
+        self._droppable: Deque[_QueuedMessage] = deque()
+        # Most recent pending message per variant, for delta merging.
+        self._last_by_variant: Dict[int, _QueuedMessage] = {}
+        # Pending latest-wins message per (type, variant).
+        self._latest: Dict[tuple[str, int], _QueuedMessage] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._closing = False
+        self._stopped = False
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._stopped
+
+    def enqueue(self, payload: Dict[str, Any]) -> None:
+        """Queue a message without waiting on the socket."""
+        if self._stopped or self._closing:
+            return
+
+        self.metrics.enqueued += 1
+        msg_type = payload.get("type")
+        variant_index = payload.get("variantIndex", 0)
+
+        last = self._last_by_variant.get(variant_index)
+        if (
+            msg_type in MERGEABLE_TYPES
+            and last is not None
+            and not last.superseded
+            and last.payload.get("type") == msg_type
+            and last.payload.get("eventId") == payload.get("eventId")
+            and isinstance(last.payload.get("value"), str)
+            and isinstance(payload.get("value"), str)
+        ):
+            last.payload["value"] += payload["value"]
+            if "seq" in payload:
+                # Resumable sessions: the merged frame covers up to this seq.
+                last.payload["seq"] = payload["seq"]
+            self.metrics.coalesced += 1
+            return
+
+        if msg_type in LATEST_WINS_TYPES:
+            key = (msg_type, variant_index)
+            previous = self._latest.get(key)
+            if previous is not None and not previous.superseded:
+                previous.superseded = True
+                self.metrics.superseded += 1
+                self.metrics.depth -= 1
+
+        queued = _QueuedMessage(payload=payload)
+        self._pending.append(queued)
+        self._last_by_variant[variant_index] = queued
+        if msg_type in LATEST_WINS_TYPES:
+            self._latest[(msg_type, variant_index)] = queued
+        if msg_type in CODE_ORDERED_TYPES:
+            # A later setCode must not move past this message.
+            self._latest.pop(("setCode", variant_index), None)
+        if msg_type in DROPPABLE_TYPES:
+            self._droppable.append(queued)
+        self.metrics.depth += 1
+        if self.metrics.depth > self.max_depth:
+            self._drop_oldest_droppable()
+        self.metrics.max_depth = max(self.metrics.max_depth, self.metrics.depth)
+        if self.metrics.depth > self.hard_limit:
+            self._overflow()
+            return
+        self._wakeup.set()
+
+    def _drop_oldest_droppable(self) -> None:
+        while self._droppable:
+            queued = self._droppable.popleft()
+            if not queued.superseded:
+                queued.superseded = True
+                self.metrics.dropped += 1
+                self.metrics.depth -= 1
+                return
+
+    def _overflow(self) -> None:
+        """Give up on a client that has stopped reading."""
+        print(
+            f"[WS QUEUE] {self.metrics.depth} messages pending; "
+            "disconnecting the slow client"
+        )
+        self.metrics.overflowed += 1
+        self._stopped = True
+        self._clear()
+        if self._task is not None:
+            # The sender may be stuck writing to the socket.
+            self._task.cancel()
+        if self.on_overflow is not None:
+            self.on_overflow()
+
+    async def close(self) -> None:
+        """Flush what is pending, then stop the sender task."""
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            # An overflowed queue's task was cancelled; that's not an error here.
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def _take_batch(self) -> list[Dict[str, Any]]:
+        batch = [queued.payload for queued in self._pending if not queued.superseded]
+        self._clear()
+        return batch
+
+    def _clear(self) -> None:
+        self._pending.clear()
+        self._droppable.clear()
+        self._last_by_variant.clear()
+        self._latest.clear()
+        self.metrics.depth = 0
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        last_flush = 0.0
+        try:
+            while True:
+                await self._wakeup.wait()
+                if not self._closing:
+                    # Let deltas that arrive within the same frame pile up.
+                    wait = self.flush_interval - (loop.time() - last_flush)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                self._wakeup.clear()
+                batch = self._take_batch()
+                if batch:
+                    self.metrics.flushes += 1
+                for payload in batch:
+                    if not await self.send_payload(payload):
+                        return
+                    self.metrics.sent += 1
+                last_flush = loop.time()
+                if self._closing and not self._pending:
+                    return
+        finally:
+            self._stopped = True
+            self._clear()
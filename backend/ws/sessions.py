@@ -0,0 +1,277 @@
+"""Resumable generation sessions.
+
+A client that sends ``resumable: true`` gets a ``session`` message with a
+session ID. From then on every message of the generation is published through
+a ``GenerationSession``, which stamps it with a per-session ``seq`` number and
+keeps it in a bounded ring buffer before forwarding it to whichever socket is
+currently attached.
+
+If that socket drops, generation keeps running for ``ttl_seconds``. A new
+connection whose first message is ``{"resumeSessionId": ..., "lastSeq": N}``
+gets every retained event after ``N`` replayed and then continues live. If
+nobody reattaches in time the session is abandoned (which cancels the
+generation).
+
+The ring is capped by event count and payload bytes. Older ``setCode``
+snapshots are dropped as soon as a newer one for the same variant is logged,
+and the latest snapshot per variant is kept even once the ring evicts it, so a
+client that fell behind the ring still gets the current code back.
+"""
+
+import asyncio
+import secrets
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List
+
+from config import (
+    SESSION_EVENT_LOG_MAX_BYTES,
+    SESSION_EVENT_LOG_MAX_EVENTS,
+    SESSION_MAX_SESSIONS,
+    SESSION_RESUME_TTL_SECONDS,
+)
+
+PayloadSink = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Rough per-event overhead (keys, type, ids) on top of the value length.
+EVENT_OVERHEAD_BYTES = 64
+
+
+@dataclass
+class _LoggedEvent:
+    seq: int
+    payload: Dict[str, Any]
+    size: int
+    superseded: bool = False
+
+
+def _event_size(payload: Dict[str, Any]) -> int:
+    value = payload.get("value")
+    size = EVENT_OVERHEAD_BYTES + (len(value) if isinstance(value, str) else 0)
+    data = payload.get("data")
+    if isinstance(data, dict):
+        size += sum(len(str(item)) for item in data.values())
+    return size
+
+
+class GenerationSession:
+    def __init__(
+        self,
+        session_id: str,
+        max_events: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        on_abandoned: Callable[[], None] | None = None,
+    ):
+        self.session_id = session_id
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.on_abandoned = on_abandoned
+        self.next_seq = 1
+        self.log_bytes = 0
+        self.finished = False
+        self.last_active = time.monotonic()
+        self._events: Deque[_LoggedEvent] = deque()
+        self._latest_code: Dict[int, _LoggedEvent] = {}
+        self._sink: PayloadSink | None = None
+        self._owner: object | None = None
+        self._abandon_handle: asyncio.TimerHandle | None = None
+        self._finished_event = asyncio.Event()
+
+    @property
+    def is_attached(self) -> bool:
+        return self._sink is not None
+
+    def is_attached_to(self, owner: object) -> bool:
+        return self._owner is owner
+
+    async def publish(self, payload: Dict[str, Any]) -> None:
+        """Log a message and forward it to the attached socket, if any."""
+        self.record(payload)
+        if self._sink is not None:
+            await self._sink(payload)
+
+    def record(self, payload: Dict[str, Any]) -> None:
+        """Stamp ``payload`` with the next ``seq`` and append it to the log."""
+        payload["seq"] = self.next_seq
+        # The outbound queue coalesces deltas into its payload in place, so
+        # the log keeps its own copy.
+        event = _LoggedEvent(self.next_seq, dict(payload), _event_size(payload))
+        self.next_seq += 1
+        self.last_active = time.monotonic()
+
+        if payload.get("type") == "setCode":
+            variant_index = payload.get("variantIndex", 0)
+            previous = self._latest_code.get(variant_index)
+            if previous is not None and not previous.superseded:
+                previous.superseded = True
+                self.log_bytes -= previous.size
+            self._latest_code[variant_index] = event
+
+        self._events.append(event)
+        self.log_bytes += event.size
+        while self._events and (
+            len(self._events) > self.max_events or self.log_bytes > self.max_bytes
+        ):
+            evicted = self._events.popleft()
+            if not evicted.superseded:
+                self.log_bytes -= evicted.size
+
+    def events_since(self, last_seq: int) -> List[Dict[str, Any]]:
+        """Everything after ``last_seq`` the log can still reproduce.
+
+        Latest code snapshots the ring already evicted come first, so a client
+        that fell too far behind still ends up with the current code.
+        """
+        first_retained = self._events[0].seq if self._events else self.next_seq
+        replay = [
+            event
+            for event in self._latest_code.values()
+            if last_seq < event.seq < first_retained
+        ]
+        replay.sort(key=lambda event: event.seq)
+        replay.extend(
+            event
+            for event in self._events
+            if event.seq > last_seq and not event.superseded
+        )
+        return [dict(event.payload) for event in replay]
+
+    def attach(
+        self, owner: object, sink: PayloadSink, last_seq: int | None = None
+    ) -> List[Dict[str, Any]]:
+        """Route live events to ``sink``; returns the backlog to replay first.
+
+        Callers must deliver the backlog without yielding to the event loop
+        (a running outbound queue enqueues synchronously), or live events
+        could overtake it.
+        """
+        if self._abandon_handle is not None:
+            self._abandon_handle.cancel()
+            self._abandon_handle = None
+        self._owner = owner
+        self._sink = sink
+        self.last_active = time.monotonic()
+        return [] if last_seq is None else self.events_since(last_seq)
+
+    def detach(self, owner: object) -> bool:
+        """Stop forwarding to ``owner``'s socket and start the resume window."""
+        if self._owner is not owner:
+            return False
+        self._owner = None
+        self._sink = None
+        self.last_active = time.monotonic()
+        if not self.finished:
+            print(
+                f"[SESSION] {self.session_id} detached; resumable for "
+                f"{self.ttl_seconds:g}s"
+            )
+            self._abandon_handle = asyncio.get_running_loop().call_later(
+                self.ttl_seconds, self._abandon
+            )
+        return True
+
+    def _abandon(self) -> None:
+        self._abandon_handle = None
+        if self.is_attached or self.finished:
+            return
+        print(f"[SESSION] {self.session_id} was not resumed in time")
+        if self.on_abandoned is not None:
+            self.on_abandoned()
+
+    def abandon(self) -> None:
+        """Give up on a detached, unfinished session now (cancels generation)."""
+        if self._abandon_handle is not None:
+            self._abandon_handle.cancel()
+            self._abandon_handle = None
+        if self.is_attached or self.finished:
+            return
+        print(f"[SESSION] {self.session_id} evicted before it finished")
+        if self.on_abandoned is not None:
+            self.on_abandoned()
+
+    def finish(self) -> None:
+        self.finished = True
+        self.last_active = time.monotonic()
+        if self._abandon_handle is not None:
+            self._abandon_handle.cancel()
+            self._abandon_handle = None
+        self._finished_event.set()
+
+    async def wait_finished(self) -> None:
+        await self._finished_event.wait()
+
+    def is_expired(self, now: float) -> bool:
+        return not self.is_attached and now - self.last_active > self.ttl_seconds
+
+
+class SessionRegistry:
+    def __init__(
+        self,
+        max_sessions: int = 200,
+        max_events: int = 20000,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl_seconds: float = 120.0,
+    ):
+        self.max_sessions = max_sessions
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # Least recently created/resumed first.
+        self._sessions: "OrderedDict[str, GenerationSession]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(
+        self, on_abandoned: Callable[[], None] | None = None
+    ) -> GenerationSession | None:
+        """Start a new session, or return None if every slot holds a live one."""
+        self.evict_expired()
+        if len(self._sessions) >= self.max_sessions and not self._evict_one():
+            print("[SESSION] Session limit reached; generation won't be resumable")
+            return None
+        session = GenerationSession(
+            secrets.token_urlsafe(16),
+            max_events=self.max_events,
+            max_bytes=self.max_bytes,
+            ttl_seconds=self.ttl_seconds,
+            on_abandoned=on_abandoned,
+        )
+        self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id: str) -> GenerationSession | None:
+        self.evict_expired()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def evict_expired(self) -> None:
+        now = time.monotonic()
+        for session_id, session in list(self._sessions.items()):
+            if session.is_expired(now):
+                del self._sessions[session_id]
+
+    def _evict_one(self) -> bool:
+        """Drop the least recently used session nobody is attached to,
+        preferring finished ones. An unfinished one is abandoned so its
+        generation doesn't keep running unreachable."""
+        detached = [s for s in self._sessions.values() if not s.is_attached]
+        if not detached:
+            return False
+        session = next((s for s in detached if s.finished), detached[0])
+        del self._sessions[session.session_id]
+        session.abandon()
+        return True
+
+
+session_registry = SessionRegistry(
+    max_sessions=SESSION_MAX_SESSIONS,
+    max_events=SESSION_EVENT_LOG_MAX_EVENTS,
+    max_bytes=SESSION_EVENT_LOG_MAX_BYTES,
+    ttl_seconds=SESSION_RESUME_TTL_SECONDS,
+)